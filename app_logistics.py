@@ -11,8 +11,35 @@ Fecha: 2026-02
 
 import streamlit as st
 import pandas as pd
+import atexit
+import base64
+import os
+import tempfile
+import time
 import uuid
-from datetime import date, datetime
+from datetime import date, datetime, timedelta
+from functools import lru_cache
+
+from castano import arranque
+from castano.agenda import AGREGAR, QUITAR, AgendaFechada, RutaDia
+from castano.almacen_frames import AlmacenFrames
+from castano.anomalias import APROBADA, OBSERVADA, DetectorAnomalias
+from castano.busqueda import CacheIndices, IndiceBusqueda
+from castano.checkin import PRECISION_MAXIMA_METROS, ColaEventos, evaluar_checkin, salas_en_radio
+from castano.comprobantes import TIPOS_ACEPTADOS, ProcesadorComprobantes, clave_miniatura, crear_almacen_objetos
+from castano.cumplimiento import CacheCumplimiento, indicadores, lunes, totales_por_semana
+from castano.exportacion import FORMATOS, GestorExportaciones
+from castano.importacion import ErrorFormatoPlan, diferencia_plan, leer_plan, validar_plan
+from castano.itinerarios import a_minutos, formato_hora, programar_semana, resumen_dias
+from castano.mapas import ZOOM_MAXIMO, ZOOM_MINIMO, capas_ruta, encuadre, mapa_region, mapa_ruta, vista_region
+from castano.notificaciones import EXCEPCIONES, PLAN, RENDICIONES, BusCambios, crear_canal
+from castano.organizacion import ArbolOrganizacion, visitas_por_sala
+from castano.rendiciones import (CARGADA, CATEGORIAS, DUPLICADA, RECHAZADA, filas_a_cargar, leer_rendiciones,
+                                 parsear_fechas, validar_rendiciones)
+from castano.repositorio import (COLUMNAS_EXCEPCION, DIAS_SEMANA, TODOS, Repositorio, RepositorioGCP,
+                                 RepositorioSQLite)
+from castano.sesiones import GestorSesiones, crear_almacen
+from castano.usuarios import DirectorioUsuarios, LoginBloqueado
 
 # ================================================================
 # CONFIGURACIÓN DE PÁGINA
@@ -28,42 +55,124 @@ st.set_page_config(
 # CONFIGURACIÓN GCP (Modificar según tu proyecto)
 # ================================================================
 # IMPORTANTE: Cambiar a False cuando tengas GCP configurado
-DEMO_MODE = True  # Usar datos demo sin conexión a GCP
+DEMO_MODE = True  # Usar base SQLite local en vez de GCP
+
+# Base SQLite local (DEMO_MODE). En ':memory:' se siembra con los datos demo;
+# apuntar a un archivo sembrado con `python -m castano.semilla` para volúmenes reales.
+SQLITE_DB = os.environ.get("CASTANO_SQLITE_DB", ":memory:")
+
+# Almacén de datos compartido por todas las sesiones del proceso (límite en MB)
+CACHE_DATOS_MB = int(os.environ.get("CASTANO_CACHE_DATOS_MB", "256"))
+
+# Copy-on-write: los frames compartidos se entregan como copias superficiales (por defecto en pandas 3)
+if int(pd.__version__.split('.')[0]) < 3:
+    pd.set_option("mode.copy_on_write", True)
 
 GCP_PROJECT = "tu-proyecto-gcp"
 SPANNER_INSTANCE = "logistics-instance"
 SPANNER_DATABASE = "logistics-db"
 BIGQUERY_DATASET = "lakehouse_gold"
 BIGQUERY_TABLE = "Fact_Rendicion"
+BIGQUERY_TABLE_CHECKIN = "Fact_Checkin"
 
 # ================================================================
-# SISTEMA DE AUTENTICACIÓN SIMPLE (MVP)
-# Usuarios generados desde datos reales de Base de Datos
+# SESIONES (compartidas entre réplicas y reinicios)
 # ================================================================
-USUARIOS_VALIDOS = {
-    # Administrador
-    'admin': {'password': 'castano2026', 'nombre': 'Administrador', 'id': 'admin001', 'rol': 'admin'},
-    
-    # Zonales (Jefes de Zona) - Pueden gestionar rutas de su equipo
-    'ricardo': {'password': 'zonal123', 'nombre': 'Ricardo Millar', 'id': 'zce0bf2f8', 'rol': 'zonal'},
-    'alvaro': {'password': 'zonal123', 'nombre': 'Alvaro Sauterel', 'id': 'z002', 'rol': 'zonal'},
-    'jerson': {'password': 'zonal123', 'nombre': 'Jerson Placencia', 'id': 'z003', 'rol': 'zonal'},
-    
-    # Supervisores - Solo ven su ruta y rinden gastos
-    'harry': {'password': 'ruta123', 'nombre': 'Harry Urra', 'id': 's41861921', 'rol': 'supervisor'},
-    'rodrigo': {'password': 'ruta123', 'nombre': 'Rodrigo Castro', 'id': 's3048eab6', 'rol': 'supervisor'},
-    'daniela': {'password': 'ruta123', 'nombre': 'Daniela Leon', 'id': 's52b7164b', 'rol': 'supervisor'},
-    'alejandro': {'password': 'ruta123', 'nombre': 'Alejandro Perez', 'id': 's4e75d6f2', 'rol': 'supervisor'},
-    'lisset': {'password': 'ruta123', 'nombre': 'Lisset Medina', 'id': 's0d9492dc', 'rol': 'supervisor'},
-    'gema': {'password': 'ruta123', 'nombre': 'Gema Nuñez', 'id': 's1dc69e68', 'rol': 'supervisor'},
-    'wladimir': {'password': 'ruta123', 'nombre': 'Wladimir Lara', 'id': 's88ae2d48', 'rol': 'supervisor'},
-    'alexander': {'password': 'ruta123', 'nombre': 'Alexander Yañez', 'id': 's0df53ceb', 'rol': 'supervisor'},
-    'edgardo': {'password': 'ruta123', 'nombre': 'Edgardo Ordenes', 'id': 'sbe29bbd6', 'rol': 'supervisor'},
-    'mauro': {'password': 'ruta123', 'nombre': 'Mauro Saenz', 'id': 's03ff5266', 'rol': 'supervisor'},
+# memoria:// (una réplica), sqlite:///archivo.db (réplicas en un host) o redis://host:6379/0
+SESSION_STORE_URL = os.environ.get("CASTANO_SESSION_STORE", "sqlite:///castano_sesiones.db")
+SESSION_SECRET = os.environ.get("CASTANO_SESSION_SECRET")
+if not SESSION_SECRET:
+    # Con el secreto de ejemplo cualquiera podría firmar un token: sólo se acepta en la demo
+    if not DEMO_MODE:
+        raise RuntimeError("Falta CASTANO_SESSION_SECRET: define un secreto de firma (el mismo en todas las réplicas)")
+    SESSION_SECRET = "castano-dev-secret"
+SESSION_TTL_HORAS = 12
+SESSION_RENOVAR_SEGUNDOS = 300  # Frecuencia con que una sesión activa renueva su expiración
+
+# Claves de st.session_state que se persisten en el almacén
+CLAVES_SESION = ['usuario', 'pagina', 'supervisor_seleccionado']
+
+# Exportaciones: archivos generados en segundo plano, en disco hasta que expiran
+EXPORT_DIR = os.environ.get("CASTANO_EXPORT_DIR")  # Por defecto, un directorio temporal
+EXPORT_WORKERS = 2
+EXPORT_TTL_SEGUNDOS = 3600
+EXPORT_FILAS_POR_BLOQUE = 50_000
+
+# Comprobantes: fotos de boletas en un almacén de objetos (file:///directorio o gs://bucket/prefijo)
+COMPROBANTES_URL = os.environ.get(
+    "CASTANO_COMPROBANTES", "file://" + os.path.join(tempfile.gettempdir(), "castano_comprobantes")
+)
+COMPROBANTES_WORKERS = 2  # Procesos que reducen y recomprimen las fotos
+
+# Detección de duplicados y montos atípicos al ingresar rendiciones (alertas para el zonal)
+ANOMALIAS_VENTANA_DIAS = 90
+ANOMALIAS_UMBRAL_Z = 3.5
+ANOMALIAS_REFRESCO_SEGUNDOS = 6 * 3600  # Recalcula la ventana, incluidas las cargas de otras réplicas
+
+# Check-in de visitas: geocerca por sala y eventos escritos por lotes en segundo plano
+CHECKIN_RADIO_METROS = 150
+CHECKIN_INTERVALO_SEGUNDOS = 2.0  # Cada cuánto se vacía la cola de eventos al backend
+ZONA_HORARIA = "America/Santiago"  # Para mostrar las horas de llegada (los eventos se guardan en UTC)
+
+# Cumplimiento del plan: caché semanal local (Parquet) del cruce plan / check-ins / rendiciones
+CUMPLIMIENTO_DIR = os.environ.get(
+    "CASTANO_CUMPLIMIENTO_DIR", os.path.join(tempfile.gettempdir(), "castano_cumplimiento")
+)
+CUMPLIMIENTO_SEMANAS = 12
+CUMPLIMIENTO_REFRESCO_SEGUNDOS = 15 * 60
+
+# Itinerarios: horas estimadas de llegada dentro de la jornada del supervisor
+ITINERARIO_INICIO_JORNADA = "09:00"
+ITINERARIO_FIN_JORNADA = "18:00"
+
+# Agenda: itinerarios por fecha de las próximas semanas, con feriados y excepciones, regenerados cada noche
+AGENDA_DIR = os.environ.get("CASTANO_AGENDA_DIR", os.path.join(tempfile.gettempdir(), "castano_agenda"))
+AGENDA_SEMANAS = 4
+AGENDA_HORA_GENERACION = "03:00"
+
+# Explorador de la organización (administradores): árbol zonal → supervisor → sala en memoria
+ORGANIZACION_REFRESCO_SEGUNDOS = 60 * 60  # Recorrido completo del grafo; los cambios de plan se aplican al momento
+ORGANIZACION_SEMANAS_GASTO = 4
+
+# Búsqueda mientras se escribe: índices en memoria por versión de cada frame
+BUSQUEDA_ESPERA = "250ms"   # Pausa de tecleo antes de filtrar
+BUSQUEDA_MAX_OPCIONES = 50  # Salas del catálogo ofrecidas al agregar
+BUSQUEDA_COLUMNAS = {       # Columnas buscables de cada entidad del almacén
+    'equipo': ['nombre', 'email'],
+    'rutas_editables': ['sala_nombre', 'sala_id'],
+    'salas': ['nombre', 'id'],
 }
 
+# Notificaciones de cambios: las escrituras invalidan las cachés de todas las réplicas y recargan las páginas abiertas
+CAMBIOS_URL = os.environ.get("CASTANO_CAMBIOS", "sqlite:///castano_cambios.db")
+CAMBIOS_REVISION_SEGUNDOS = 5  # Cada cuánto una página abierta compara sus versiones (en memoria, sin backends)
+
+# ================================================================
+# AUTENTICACIÓN
+# Cuentas en la tabla Cuenta del repositorio, con contraseñas PBKDF2
+# Alta: python -m castano.usuarios --db castano.db alta --usuario ... --id ...
+# ================================================================
+LOGIN_MAX_FALLOS = 5          # Intentos fallidos por usuario antes de bloquear
+LOGIN_BLOQUEO_SEGUNDOS = 60
+DIRECTORIO_REFRESCO_SEGUNDOS = 300  # Las cuentas nuevas aparecen sin reiniciar
+
+def get_directorio_usuarios() -> DirectorioUsuarios:
+    """Retorna el directorio de cuentas del proceso."""
+    return arranque.recurso('directorio_usuarios', lambda: DirectorioUsuarios(
+        lambda: get_repositorio().cuentas(),
+        refresco=DIRECTORIO_REFRESCO_SEGUNDOS,
+        max_fallos=LOGIN_MAX_FALLOS,
+        bloqueo=LOGIN_BLOQUEO_SEGUNDOS,
+    ))
+
+def get_gestor_sesiones() -> GestorSesiones:
+    """Retorna el gestor de sesiones firmadas del proceso."""
+    return arranque.recurso('gestor_sesiones', lambda: GestorSesiones(
+        crear_almacen(SESSION_STORE_URL), SESSION_SECRET, SESSION_TTL_HORAS * 3600
+    ))
+
 def inicializar_sesion():
-    """Inicializa variables de sesión si no existen."""
+    """Inicializa variables de sesión si no existen y restaura la sesión del token en la URL."""
     if 'autenticado' not in st.session_state:
         st.session_state.autenticado = False
     if 'usuario' not in st.session_state:
@@ -72,26 +181,65 @@ def inicializar_sesion():
         st.session_state.pagina = 'Mi Ruta'
     if 'supervisor_seleccionado' not in st.session_state:
         st.session_state.supervisor_seleccionado = None
+    
+    token = st.query_params.get('sesion')
+    if token and not st.session_state.autenticado:
+        datos = get_gestor_sesiones().cargar(token)
+        if datos and datos.get('usuario'):
+            # Una cuenta dada de baja invalida sus sesiones abiertas
+            datos['usuario'] = get_directorio_usuarios().por_id(datos['usuario']['id'])
+        if datos and datos.get('usuario'):
+            for clave in CLAVES_SESION:
+                st.session_state[clave] = datos.get(clave)
+            st.session_state.autenticado = True
+            st.session_state.token_sesion = token
+            st.session_state.sesion_persistida = (datos, time.time())
+        else:
+            # Token inválido o expirado
+            del st.query_params['sesion']
+
+def persistir_sesion():
+    """Guarda en el almacén el estado de la sesión si cambió o debe renovarse."""
+    token = st.session_state.get('token_sesion')
+    if not token or not st.session_state.get('autenticado'):
+        return
+    datos = {clave: st.session_state.get(clave) for clave in CLAVES_SESION}
+    anteriores, guardado_en = st.session_state.get('sesion_persistida', (None, 0))
+    if datos != anteriores or time.time() - guardado_en > SESSION_RENOVAR_SEGUNDOS:
+        if not get_gestor_sesiones().actualizar(token, datos):
+            # Se cerró en otra pestaña o expiró: no se revive con un TTL nuevo
+            cerrar_sesion()
+            st.rerun()
+        st.session_state.sesion_persistida = (datos, time.time())
 
 def verificar_credenciales(usuario: str, password: str) -> bool:
-    """Verifica las credenciales del usuario."""
-    if usuario in USUARIOS_VALIDOS:
-        if USUARIOS_VALIDOS[usuario]['password'] == password:
-            st.session_state.autenticado = True
-            st.session_state.usuario = {
-                'username': usuario,
-                'nombre': USUARIOS_VALIDOS[usuario]['nombre'],
-                'id': USUARIOS_VALIDOS[usuario]['id'],
-                'rol': USUARIOS_VALIDOS[usuario].get('rol', 'supervisor')
-            }
-            # Zonales van directo a gestionar rutas
-            if st.session_state.usuario['rol'] == 'zonal':
-                st.session_state.pagina = 'Gestionar Rutas'
-            return True
-    return False
+    """Verifica las credenciales del usuario. Lanza LoginBloqueado tras varios fallos."""
+    cuenta = get_directorio_usuarios().autenticar(usuario, password)
+    if cuenta is None:
+        return False
+    
+    st.session_state.autenticado = True
+    st.session_state.usuario = cuenta
+    # Zonales van directo a gestionar rutas
+    if cuenta['rol'] == 'zonal':
+        st.session_state.pagina = 'Gestionar Rutas'
+    
+    # Sesión firmada: sobrevive a reinicios y funciona en cualquier réplica
+    datos = {clave: st.session_state.get(clave) for clave in CLAVES_SESION}
+    token = get_gestor_sesiones().crear(datos)
+    st.session_state.token_sesion = token
+    st.session_state.sesion_persistida = (datos, time.time())
+    st.query_params['sesion'] = token
+    return True
 
 def cerrar_sesion():
     """Cierra la sesión del usuario."""
+    token = st.session_state.pop('token_sesion', None)
+    if token:
+        get_gestor_sesiones().cerrar(token)
+    st.session_state.pop('sesion_persistida', None)
+    if 'sesion' in st.query_params:
+        del st.query_params['sesion']
     st.session_state.autenticado = False
     st.session_state.usuario = None
     st.session_state.pagina = 'Mi Ruta'
@@ -375,11 +523,16 @@ def mostrar_login():
             
             if submit:
                 if usuario and password:
-                    if verificar_credenciales(usuario, password):
-                        st.success(f"✅ ¡Bienvenido, {st.session_state.usuario['nombre']}!")
-                        st.rerun()
+                    try:
+                        valido = verificar_credenciales(usuario, password)
+                    except LoginBloqueado as e:
+                        st.error(f"🔒 Demasiados intentos fallidos. Espera {e.segundos:.0f} segundos e intenta de nuevo.")
                     else:
-                        st.error("❌ Usuario o contraseña incorrectos. Intenta de nuevo.")
+                        if valido:
+                            st.success(f"✅ ¡Bienvenido, {st.session_state.usuario['nombre']}!")
+                            st.rerun()
+                        else:
+                            st.error("❌ Usuario o contraseña incorrectos. Intenta de nuevo.")
                 else:
                     st.warning("⚠️ Por favor completa ambos campos")
         
@@ -436,102 +589,357 @@ def get_bigquery_client():
         st.warning(f"⚠️ No se pudo conectar a BigQuery: {e}")
         return None
 
+def get_repositorio() -> Repositorio:
+    """Retorna el repositorio de datos del proceso (GCP o SQLite local)."""
+    return arranque.recurso('repositorio', _crear_repositorio)
+
+def _crear_repositorio() -> Repositorio:
+    if not DEMO_MODE:
+        database = get_spanner_client()
+        client = get_bigquery_client()
+        if database is None or client is None:
+            # Sin caer a la base demo: lo escrito ahí se perdería. Al fallar no queda en el registro
+            # de recursos, así que la próxima llamada vuelve a intentar GCP.
+            raise ConnectionError("Sin conexión a GCP (Spanner o BigQuery); intenta de nuevo en unos segundos")
+        return RepositorioGCP(database, client, f"{GCP_PROJECT}.{BIGQUERY_DATASET}.{BIGQUERY_TABLE}",
+                              f"{GCP_PROJECT}.{BIGQUERY_DATASET}.{BIGQUERY_TABLE_CHECKIN}")
+    
+    repo = RepositorioSQLite(SQLITE_DB)
+    if repo.esta_vacio():
+        from castano.semilla import sembrar_demo
+        sembrar_demo(repo)
+    return repo
+
+def get_exportaciones() -> GestorExportaciones:
+    """Retorna la cola de exportaciones del proceso."""
+    return arranque.recurso('exportaciones', lambda: GestorExportaciones(
+        EXPORT_DIR, workers=EXPORT_WORKERS, ttl=EXPORT_TTL_SEGUNDOS
+    ))
+
+def get_procesador_comprobantes() -> ProcesadorComprobantes:
+    """Retorna el pool de procesamiento de fotos de boletas del proceso."""
+    return arranque.recurso('comprobantes', lambda: ProcesadorComprobantes(
+        crear_almacen_objetos(COMPROBANTES_URL), workers=COMPROBANTES_WORKERS
+    ))
+
+def get_detector_anomalias() -> DetectorAnomalias:
+    """Retorna el detector de anomalías de rendiciones del proceso."""
+    return arranque.recurso('detector_anomalias', lambda: DetectorAnomalias(
+        lambda desde, hasta: get_repositorio().iterar_rendiciones(None, desde, hasta, EXPORT_FILAS_POR_BLOQUE),
+        guardar_alertas,
+        ventana_dias=ANOMALIAS_VENTANA_DIAS, refresco=ANOMALIAS_REFRESCO_SEGUNDOS, umbral_z=ANOMALIAS_UMBRAL_Z,
+    ))
+
+def guardar_alertas(alertas: pd.DataFrame):
+    """Persiste alertas nuevas (desde el hilo del detector) e invalida las listas cacheadas."""
+    get_repositorio().guardar_alertas(alertas)
+    get_almacen_frames().invalidar_entidad('alertas')
+
+def get_cola_checkins() -> ColaEventos:
+    """Retorna la cola de eventos de check-in del proceso."""
+    return arranque.recurso('cola_checkins', _crear_cola_checkins)
+
+def _crear_cola_checkins() -> ColaEventos:
+    cola = ColaEventos(
+        lambda eventos: get_repositorio().registrar_checkins(eventos),
+        al_escribir=lambda eventos: [
+            get_almacen_frames().invalidar('checkins', f"{sup}|{fecha}")
+            for sup, fecha in eventos[['id_supervisor', 'fecha']].drop_duplicates().itertuples(index=False)
+        ],
+        intervalo=CHECKIN_INTERVALO_SEGUNDOS,
+    )
+    atexit.register(cola.cerrar)  # Lo que quede en el buffer se escribe al apagar la réplica
+    return cola
+
+def get_cache_cumplimiento() -> CacheCumplimiento:
+    """Retorna la caché de cumplimiento del proceso; se actualiza sola cada CUMPLIMIENTO_REFRESCO_SEGUNDOS."""
+    return arranque.recurso('cumplimiento', _crear_cache_cumplimiento)
+
+def _crear_cache_cumplimiento() -> CacheCumplimiento:
+    repo = get_repositorio
+    cache = CacheCumplimiento(
+        CUMPLIMIENTO_DIR,
+        cargar_plan=lambda: repo().iterar_plan(
+            get_almacen_frames().obtener_o_cargar('jerarquia', '*', repo().jerarquia)[1]['supervisor_id'].unique(),
+            EXPORT_FILAS_POR_BLOQUE,
+        ),
+        cargar_salas=lambda: get_almacen_frames().obtener_o_cargar('salas', '*', repo().catalogo_salas)[1],
+        cargar_checkins=lambda desde, hasta: repo().iterar_checkins(None, desde, hasta, EXPORT_FILAS_POR_BLOQUE),
+        cargar_rendiciones=lambda desde, hasta: repo().iterar_rendiciones(None, desde, hasta, EXPORT_FILAS_POR_BLOQUE),
+        semanas=CUMPLIMIENTO_SEMANAS, refresco=CUMPLIMIENTO_REFRESCO_SEGUNDOS,
+    )
+    atexit.register(cache.cerrar)
+    return cache
+
+def get_agenda() -> AgendaFechada:
+    """Retorna la agenda fechada del proceso; se regenera cada noche a las AGENDA_HORA_GENERACION."""
+    return arranque.recurso('agenda', _crear_agenda)
+
+def _crear_agenda() -> AgendaFechada:
+    repo = get_repositorio
+
+    def cargar_plan(supervisor_ids):
+        if supervisor_ids is None:
+            jerarquia = get_almacen_frames().obtener_o_cargar('jerarquia', '*', repo().jerarquia)[1]
+            supervisor_ids = jerarquia['supervisor_id'].unique()
+        return repo().plan_vigente(supervisor_ids)
+
+    agenda = AgendaFechada(
+        AGENDA_DIR, cargar_plan,
+        cargar_salas=lambda: get_almacen_frames().obtener_o_cargar('salas', '*', repo().catalogo_salas)[1],
+        cargar_excepciones=lambda desde, hasta: get_almacen_frames().obtener_o_cargar(
+            'excepciones', f"{desde}|{hasta}", lambda: repo().excepciones_agenda(desde, hasta))[1],
+        inicio=ITINERARIO_INICIO_JORNADA, fin=ITINERARIO_FIN_JORNADA, semanas=AGENDA_SEMANAS,
+        hora_generacion=AGENDA_HORA_GENERACION,
+    )
+    atexit.register(agenda.cerrar)
+    return agenda
+
+def get_organizacion() -> ArbolOrganizacion:
+    """Retorna el árbol de la organización del proceso; se carga con la primera lectura."""
+    return arranque.recurso('organizacion', _crear_organizacion)
+
+def _crear_organizacion() -> ArbolOrganizacion:
+    repo = get_repositorio
+    salas = lambda: get_almacen_frames().obtener_o_cargar('salas', '*', repo().catalogo_salas)[1]
+
+    def gasto_reciente():
+        tabla = get_cache_cumplimiento().tabla()
+        recientes = tabla[tabla['semana'] >= lunes(date.today()) - timedelta(weeks=ORGANIZACION_SEMANAS_GASTO - 1)]
+        return recientes.groupby('supervisor_id')['gasto_total'].sum()
+
+    return ArbolOrganizacion(
+        cargar_organizacion=lambda: repo().organizacion(),
+        cargar_visitas=lambda ids: visitas_por_sala(repo().plan_vigente(ids), salas()),
+        cargar_gasto=gasto_reciente,
+        version_gasto=lambda: get_cache_cumplimiento().actualizado_en,  # Cambia cada vez que se recalcula
+        refresco=ORGANIZACION_REFRESCO_SEGUNDOS,
+    )
+
+def get_bus_cambios() -> BusCambios:
+    """Retorna el bus de cambios del proceso, conectado a las demás réplicas."""
+    return arranque.recurso('bus_cambios', _crear_bus_cambios)
+
+def _crear_bus_cambios() -> BusCambios:
+    bus = BusCambios(crear_canal(CAMBIOS_URL, get_spanner_client), al_cambiar=aplicar_cambios)
+    atexit.register(bus.cerrar)
+    return bus
+
+def aplicar_cambios(cambios: list):
+    """Invalida las cachés que dependen de los cambios (de esta réplica o de otra) y recalcula lo derivado."""
+    ids = {}
+    for cambio in cambios:
+        ids.setdefault(cambio.tema, set()).add(cambio.id)
+    almacen = get_almacen_frames()
+    if PLAN in ids:
+        for supervisor_id in ids[PLAN]:
+            almacen.invalidar('rutas', supervisor_id)
+            almacen.invalidar('rutas_editables', supervisor_id)
+        almacen.invalidar_entidad('equipo')  # total_visitas del equipo
+        almacen.invalidar_entidad('cobertura_salas')
+        almacen.invalidar_entidad('itinerarios')  # Lotes por zonal
+        almacen.invalidar_entidad('resumen_dias')
+        get_agenda().recalcular(list(ids[PLAN]))
+        get_organizacion().actualizar_supervisores(ids[PLAN])
+    if EXCEPCIONES in ids:
+        almacen.invalidar_entidad('excepciones')
+        # Un feriado para todos regenera la agenda completa
+        get_agenda().recalcular(None if TODOS in ids[EXCEPCIONES] else list(ids[EXCEPCIONES]))
+    for supervisor_id in ids.get(RENDICIONES, ()):
+        almacen.invalidar('rendiciones', supervisor_id)
+
+def publicar_cambios(tema: str, ids: list):
+    """Aplica y difunde una escritura; la página de quien escribe no se recarga por su propio cambio."""
+    bus = get_bus_cambios()
+    bus.publicar(tema, ids)
+    if 'cambios_vigilados' in st.session_state:
+        claves, _ = st.session_state.cambios_vigilados
+        st.session_state.cambios_vigilados = (claves, bus.versiones(claves))
+
+def vigilar_cambios(claves: list):
+    """Recarga la página cuando otra sesión o réplica escribe en sus datos, [(tema, supervisor_id), ...].
+
+    Se llama antes de leer los datos de la página; la revisión compara contadores
+    en memoria, sin consultar los backends.
+    """
+    if st.session_state.pop('aviso_cambios', False):
+        st.toast("🔄 Hubo cambios: datos actualizados")
+    claves = tuple(claves)
+    st.session_state.cambios_vigilados = (claves, get_bus_cambios().versiones(claves))
+    _revisar_cambios()
+
+@st.fragment(run_every=CAMBIOS_REVISION_SEGUNDOS)
+def _revisar_cambios():
+    claves, vistas = st.session_state.get('cambios_vigilados', ((), ()))
+    if get_bus_cambios().versiones(claves) != vistas:
+        st.session_state.aviso_cambios = True
+        st.rerun(scope="app")
+
+def get_componente_gps():
+    """Botón que lee la ubicación del dispositivo (componente bidireccional, sin dependencias)."""
+    return arranque.recurso('componente_gps', lambda: st.components.v2.component(
+        "castano_gps",
+        html='<button class="gps" type="button"></button>',
+        css="""
+        .gps { width: 100%; padding: 0.6rem; border: none; border-radius: 0.5rem; cursor: pointer;
+               background: var(--st-primary-color); color: white; font-size: 1rem; }
+        .gps:disabled { opacity: 0.6; }
+        """,
+        js="""
+        export default function(component) {
+            const { data, parentElement, setTriggerValue } = component;
+            const boton = parentElement.querySelector('button.gps');
+            boton.textContent = data.etiqueta;
+            boton.onclick = () => {
+                if (!navigator.geolocation) {
+                    setTriggerValue('posicion', { error: 'el navegador no entrega ubicación' });
+                    return;
+                }
+                boton.disabled = true;
+                boton.textContent = data.esperando;
+                navigator.geolocation.getCurrentPosition(
+                    (p) => {
+                        boton.disabled = false;
+                        boton.textContent = data.etiqueta;
+                        setTriggerValue('posicion', {
+                            lat: p.coords.latitude, lon: p.coords.longitude, precision: p.coords.accuracy,
+                        });
+                    },
+                    (e) => {
+                        boton.disabled = false;
+                        boton.textContent = data.etiqueta;
+                        setTriggerValue('posicion', { error: e.message });
+                    },
+                    { enableHighAccuracy: true, timeout: 15000, maximumAge: 0 },
+                );
+            };
+        }
+        """,
+    ))
+
+def get_almacen_frames() -> AlmacenFrames:
+    """Retorna el almacén de DataFrames compartido entre sesiones."""
+    return arranque.recurso('almacen_frames', lambda: AlmacenFrames(CACHE_DATOS_MB * 1024 * 1024))
+
+def frame_compartido(entidad: str, id_: str, cargador) -> pd.DataFrame:
+    """Lee un frame del almacén compartido; la sesión sólo guarda su clave."""
+    clave, df = get_almacen_frames().obtener_o_cargar(entidad, id_, cargador)
+    st.session_state.setdefault('claves_datos', {})[entidad] = clave
+    return df
+
+def get_indices_busqueda() -> CacheIndices:
+    """Retorna los índices de búsqueda compartidos entre sesiones."""
+    return arranque.recurso('indices_busqueda', CacheIndices)
+
+def indice_busqueda(df: pd.DataFrame, entidad: str, id_: str) -> IndiceBusqueda:
+    """Índice de un frame del almacén, construido una vez por versión del frame."""
+    return get_indices_busqueda().obtener(get_almacen_frames().clave(entidad, id_), df, BUSQUEDA_COLUMNAS[entidad])
+
+def filtrar_busqueda(df: pd.DataFrame, entidad: str, id_: str, consulta: str) -> pd.DataFrame:
+    """Filas de un frame del almacén que calzan con la consulta (todas si está vacía)."""
+    if not consulta or not consulta.strip():
+        return df
+    return df.iloc[indice_busqueda(df, entidad, id_).buscar(consulta)]
+
+def obtener_catalogo_salas() -> pd.DataFrame:
+    """Catálogo completo de salas (datos de referencia, compartidos por todas las sesiones)."""
+    return frame_compartido('salas', '*', lambda: get_repositorio().catalogo_salas())
+
+def obtener_jerarquia() -> pd.DataFrame:
+    """Relación zonal → supervisor completa."""
+    return frame_compartido('jerarquia', '*', lambda: get_repositorio().jerarquia())
+
+def calentar_aplicacion(perfil: arranque.PerfilArranque = None):
+    """Crea los recursos del proceso y precarga los datos de referencia antes del primer request."""
+    perfil = perfil or arranque.PerfilArranque()
+    with perfil.fase("repositorio y clientes"):
+        repo = get_repositorio()
+    with perfil.fase("almacén de sesiones"):
+        get_gestor_sesiones()
+    with perfil.fase("directorio de usuarios"):
+        get_directorio_usuarios().recargar()
+    almacen = get_almacen_frames()
+    with perfil.fase("catálogo de salas"):
+        almacen.obtener_o_cargar('salas', '*', repo.catalogo_salas)
+    with perfil.fase("jerarquía"):
+        almacen.obtener_o_cargar('jerarquia', '*', repo.jerarquia)
+    with perfil.fase("índice de salas"):
+        indice_busqueda(almacen.obtener_o_cargar('salas', '*', repo.catalogo_salas)[1], 'salas', '*')
+    with perfil.fase("detector de anomalías"):
+        get_detector_anomalias().preparar()  # La ventana de rendiciones se arma en segundo plano
+    with perfil.fase("caché de cumplimiento"):
+        get_cache_cumplimiento()  # Lee las semanas del disco; las abiertas se recalculan en segundo plano
+    with perfil.fase("agenda"):
+        get_agenda()  # Lee la última agenda del disco; si es de ayer, se regenera en segundo plano
+    with perfil.fase("canal de cambios"):
+        get_bus_cambios()  # Escucha a las demás réplicas desde antes del primer request
+    return perfil
+
 # ================================================================
 # FUNCIONES DE DATOS - SPANNER (MI RUTA)
 # ================================================================
 
 def obtener_rutas_supervisor(supervisor_id: str) -> pd.DataFrame:
     """Obtiene las rutas planificadas del supervisor desde Spanner Graph."""
-    database = get_spanner_client()
-    
-    if database is None:
-        # Datos de demostración si no hay conexión
-        return pd.DataFrame({
-            'dia_semana': ['LUNES', 'LUNES', 'MARTES', 'MIERCOLES', 'JUEVES'],
-            'orden': [1, 2, 1, 1, 1],
-            'sala_nombre': ['Walmart Maipú', 'Jumbo Kennedy', 'Lider Providencia', 'Unimarc Las Condes', 'Tottus La Florida'],
-            'quintil': [3, 5, 4, 4, 3],
-            'latitud': [-33.51, -33.42, -33.43, -33.41, -33.52],
-            'longitud': [-70.76, -70.58, -70.60, -70.55, -70.59]
-        })
-    
-    # Consulta al grafo de Spanner
-    query = """
-    SELECT 
-        vp.dia_semana,
-        vp.orden,
-        s.nombre as sala_nombre,
-        s.quintil,
-        s.latitud,
-        s.longitud
-    FROM Visita_Planificada vp
-    JOIN Sala s ON vp.sala_id = s.id
-    WHERE vp.supervisor_id = @supervisor_id
-    ORDER BY 
-        CASE vp.dia_semana
-            WHEN 'LUNES' THEN 1
-            WHEN 'MARTES' THEN 2
-            WHEN 'MIERCOLES' THEN 3
-            WHEN 'JUEVES' THEN 4
-            WHEN 'VIERNES' THEN 5
-            WHEN 'SABADO' THEN 6
-        END,
-        vp.orden
-    """
-    
-    with database.snapshot() as snapshot:
-        results = snapshot.execute_sql(
-            query,
-            params={"supervisor_id": supervisor_id},
-            param_types={"supervisor_id": spanner.param_types.STRING}
-        )
-        
-        rows = list(results)
-        if rows:
-            return pd.DataFrame(rows, columns=['dia_semana', 'orden', 'sala_nombre', 'quintil', 'latitud', 'longitud'])
-    
-    return pd.DataFrame()
+    return frame_compartido('rutas', supervisor_id, lambda: get_repositorio().rutas_supervisor(supervisor_id))
+
+def obtener_itinerarios(alcance: str, supervisor_ids: list) -> pd.DataFrame:
+    """Itinerario con horas de la semana de un equipo completo, calculado en un solo lote."""
+    def cargar():
+        plan = get_repositorio().plan_vigente(supervisor_ids)
+        return programar_semana(plan, obtener_catalogo_salas(), ITINERARIO_INICIO_JORNADA, ITINERARIO_FIN_JORNADA)
+    return frame_compartido('itinerarios', alcance, cargar)
+
+def obtener_resumen_dias(alcance: str, supervisor_ids: list) -> pd.DataFrame:
+    """Término y holgura de cada día del equipo (resumen_dias del lote), guardado junto al itinerario."""
+    return frame_compartido('resumen_dias', alcance, lambda: resumen_dias(
+        obtener_itinerarios(alcance, supervisor_ids), ITINERARIO_FIN_JORNADA))
+
+def obtener_itinerario_supervisor(supervisor_id: str) -> pd.DataFrame:
+    """Itinerario de un solo supervisor: guardar en su detalle no recalcula el lote de todo el equipo."""
+    return obtener_itinerarios(supervisor_id, [supervisor_id])
+
+def obtener_ruta_del_dia(supervisor_id: str, fecha: date) -> RutaDia:
+    """Itinerario del supervisor en una fecha: una búsqueda por clave en la agenda precalculada."""
+    return get_agenda().ruta(supervisor_id, fecha)
+
+def obtener_excepciones_agenda() -> pd.DataFrame:
+    """Feriados y excepciones de las fechas que cubre la agenda."""
+    hoy = date.today()
+    return frame_compartido('excepciones', hoy.isoformat(), lambda: get_repositorio().excepciones_agenda(
+        hoy, hoy + timedelta(weeks=AGENDA_SEMANAS)))
+
+def obtener_checkins_hoy(supervisor_id: str) -> pd.DataFrame:
+    """Check-ins de hoy: los ya escritos en el backend más los que esperan en la cola."""
+    hoy = date.today()
+    escritos = frame_compartido('checkins', f"{supervisor_id}|{hoy}",
+                                lambda: get_repositorio().checkins_supervisor(supervisor_id, hoy))
+    pendientes = [e for e in get_cola_checkins().pendientes(supervisor_id) if e['fecha'] == hoy]
+    if not pendientes:
+        return escritos
+    pendientes = pd.DataFrame(pendientes, columns=escritos.columns)
+    return pd.concat([escritos, pendientes], ignore_index=True).drop_duplicates('id_evento')
+
+def registrar_checkin(supervisor_id: str, posicion: dict, salas_hoy: pd.DataFrame) -> dict:
+    """Valida la posición contra las salas del día y encola el evento (sin esperar al backend)."""
+    evento = evaluar_checkin(supervisor_id, posicion['lat'], posicion['lon'], posicion.get('precision') or 0,
+                             salas_hoy, radio=CHECKIN_RADIO_METROS)
+    get_cola_checkins().agregar(evento)
+    return evento
 
 def obtener_zonal_supervisor(supervisor_id: str) -> str:
     """Obtiene el nombre del zonal al que reporta el supervisor."""
-    database = get_spanner_client()
-    
-    if database is None:
-        return "María González (Demo)"
-    
-    query = """
-    SELECT z.nombre
-    FROM Reporta_A ra
-    JOIN Zonal z ON ra.zonal_id = z.id
-    WHERE ra.supervisor_id = @supervisor_id
-    """
-    
-    with database.snapshot() as snapshot:
-        results = snapshot.execute_sql(
-            query,
-            params={"supervisor_id": supervisor_id},
-            param_types={"supervisor_id": spanner.param_types.STRING}
-        )
-        
-        for row in results:
-            return row[0]
-    
-    return "No asignado"
+    df = obtener_jerarquia()
+    zonal = df.loc[df['supervisor_id'] == supervisor_id, 'zonal_nombre']
+    return zonal.iloc[0] if len(zonal) else "No asignado"
 
 # ================================================================
 # FUNCIONES DE DATOS - BIGQUERY (RENDIR GASTOS)
 # ================================================================
 
-def insertar_rendicion(supervisor_id: str, fecha: date, monto: int, categoria: str, comentario: str) -> bool:
+def insertar_rendicion(supervisor_id: str, fecha: date, monto: int, categoria: str, comentario: str,
+                       comprobante: str = None) -> bool:
     """Inserta una rendición usando Streaming Insert en BigQuery."""
-    client = get_bigquery_client()
-    
-    if client is None:
-        st.info("💡 Modo demo: La rendición se registraría en BigQuery")
-        return True
-    
-    table_id = f"{GCP_PROJECT}.{BIGQUERY_DATASET}.{BIGQUERY_TABLE}"
-    
     row = {
         "id_rendicion": str(uuid.uuid4()),
         "id_supervisor": supervisor_id,
@@ -539,45 +947,62 @@ def insertar_rendicion(supervisor_id: str, fecha: date, monto: int, categoria: s
         "monto": monto,
         "categoria": categoria,
         "comentario": comentario or "",
+        "comprobante": comprobante,
     }
     
-    errors = client.insert_rows_json(table_id, [row])
-    
-    if errors:
-        st.error(f"Error al insertar: {errors}")
+    try:
+        get_repositorio().insertar_rendicion(row)
+    except Exception as e:
+        st.error(f"Error al insertar: {e}")
         return False
     
+    publicar_cambios(RENDICIONES, [supervisor_id])
+    get_detector_anomalias().registrar(pd.DataFrame([row]))
     return True
 
+def guardar_comprobante(supervisor_id: str, archivo, fecha: date) -> str:
+    """Procesa y sube la foto fuera del hilo del script. Retorna la clave o None si falla."""
+    try:
+        with st.spinner("🧾 Procesando comprobante..."):
+            return get_procesador_comprobantes().guardar(supervisor_id, archivo.getvalue(), fecha)
+    except ValueError as e:
+        st.error(f"❌ {e}")
+    except Exception as e:
+        st.error(f"Error al guardar el comprobante: {e}")
+    return None
+
+@lru_cache(maxsize=2048)
+def miniatura_data_uri(clave: str) -> str:
+    """Miniatura del comprobante como data URI para la tabla (las claves no cambian de contenido)."""
+    try:
+        datos = get_procesador_comprobantes().almacen.leer(clave_miniatura(clave))
+    except KeyError:
+        return None
+    return "data:image/jpeg;base64," + base64.b64encode(datos).decode()
+
+def cargar_rendiciones_masivas(supervisor_id: str, filas: pd.DataFrame) -> int:
+    """Carga varias rendiciones con load jobs de BigQuery. Retorna los lotes o None si falla."""
+    try:
+        lotes = get_repositorio().cargar_rendiciones(filas)
+    except Exception as e:
+        st.error(f"Error al cargar: {e}")
+        publicar_cambios(RENDICIONES, [supervisor_id])  # Los lotes anteriores al error sí quedaron
+        return None
+    
+    publicar_cambios(RENDICIONES, [supervisor_id])
+    get_detector_anomalias().registrar(filas)
+    return lotes
+
+def obtener_rendiciones_periodo(supervisor_id: str, desde: date, hasta: date) -> pd.DataFrame:
+    """Rendiciones completas del supervisor entre dos fechas (para detectar duplicados)."""
+    bloques = list(get_repositorio().iterar_rendiciones([supervisor_id], desde, hasta, EXPORT_FILAS_POR_BLOQUE))
+    return pd.concat(bloques, ignore_index=True) if bloques else pd.DataFrame()
+
 def obtener_rendiciones_supervisor(supervisor_id: str) -> pd.DataFrame:
     """Obtiene el historial de rendiciones del supervisor."""
-    client = get_bigquery_client()
-    
-    if client is None:
-        # Datos de demostración
-        return pd.DataFrame({
-            'fecha': [date(2026, 2, 1), date(2026, 2, 3), date(2026, 2, 5)],
-            'monto': [15000, 8500, 22000],
-            'categoria': ['TRANSPORTE', 'ALIMENTACION', 'TRANSPORTE'],
-            'comentario': ['Combustible semana', 'Almuerzo reunión', 'Peajes + estacionamiento']
-        })
-    
-    query = f"""
-    SELECT fecha, monto, categoria, comentario
-    FROM `{GCP_PROJECT}.{BIGQUERY_DATASET}.{BIGQUERY_TABLE}`
-    WHERE id_supervisor = @supervisor_id
-    ORDER BY fecha DESC
-    LIMIT 20
-    """
-    
-    job_config = bigquery.QueryJobConfig(
-        query_parameters=[
-            bigquery.ScalarQueryParameter("supervisor_id", "STRING", supervisor_id)
-        ]
+    return frame_compartido(
+        'rendiciones', supervisor_id, lambda: get_repositorio().rendiciones_supervisor(supervisor_id, limite=20)
     )
-    
-    df = client.query(query, job_config=job_config).to_dataframe()
-    return df
 
 # ================================================================
 # PÁGINAS DE LA APLICACIÓN
@@ -589,6 +1014,7 @@ def pagina_mi_ruta():
     
     usuario = st.session_state.usuario
     supervisor_id = usuario['id']
+    vigilar_cambios([(PLAN, supervisor_id), (EXCEPCIONES, supervisor_id)])
     
     # Información del supervisor
     col1, col2 = st.columns(2)
@@ -600,51 +1026,139 @@ def pagina_mi_ruta():
     
     st.markdown("---")
     
-    # Obtener rutas
-    df_rutas = obtener_rutas_supervisor(supervisor_id)
+    # Días de la agenda precalculada (feriados y excepciones ya aplicados)
+    hoy = date.today()
+    try:
+        ruta_hoy = obtener_ruta_del_dia(supervisor_id, hoy)  # Espera la agenda si aún no se genera
+        fechas = [f for f in get_agenda().fechas(supervisor_id) if f >= hoy]
+    except TimeoutError:
+        st.warning("⏳ La agenda se está generando; intenta de nuevo en unos segundos.")
+        return
     
-    if df_rutas.empty:
+    if not fechas:
         st.info("No hay rutas planificadas asignadas.")
         return
     
-    # Selector de día
-    dias_disponibles = df_rutas['dia_semana'].unique().tolist()
-    dia_seleccionado = st.selectbox("📅 Seleccionar día:", dias_disponibles)
+    mostrar_checkin(supervisor_id, ruta_hoy)
     
-    # Filtrar por día
-    df_dia = df_rutas[df_rutas['dia_semana'] == dia_seleccionado].copy()
+    # Selector de día
+    fecha = st.selectbox("📅 Seleccionar día:", fechas, format_func=lambda f: formato_fecha(f, hoy))
+    ruta = ruta_hoy if fecha == hoy else obtener_ruta_del_dia(supervisor_id, fecha)
+    itinerario = ruta.paradas
+    if ruta.motivo and itinerario.empty:
+        st.info(f"🏖️ Sin visitas este día: {ruta.motivo}")
+        return
+    if ruta.motivo:
+        st.info(f"📌 Ruta modificada para este día: {ruta.motivo}")
     
     col1, col2 = st.columns([2, 1])
     
     with col1:
-        st.subheader(f"📍 Visitas para {dia_seleccionado}")
+        st.subheader(f"📍 Visitas para {formato_fecha(fecha)}")
         
-        # Mostrar tabla de visitas
-        df_mostrar = df_dia[['orden', 'sala_nombre', 'quintil']].copy()
-        df_mostrar.columns = ['Orden', 'Sala', 'Quintil']
+        # Mostrar tabla de visitas con horas estimadas
+        df_mostrar = pd.DataFrame({
+            'Orden': itinerario['orden'], 'Sala': itinerario['sala_nombre'], 'Quintil': itinerario['quintil'],
+            'Llega': itinerario['llegada'].map(formato_hora), 'Sale': itinerario['salida'].map(formato_hora),
+            'Nota': notas_paradas(itinerario),
+        })
         st.dataframe(df_mostrar, use_container_width=True, hide_index=True)
+        if (itinerario['orden'] != itinerario['orden_plan']).any():
+            st.info("🔀 El orden sugerido cambia el del plan para que el día quepa en la jornada.")
     
     with col2:
         st.subheader("📊 Resumen")
-        st.metric("Total visitas", len(df_dia))
-        if 'quintil' in df_dia.columns:
-            st.metric("Quintil promedio", f"{df_dia['quintil'].mean():.1f}")
+        st.metric("Total visitas", len(itinerario))
+        st.metric("Quintil promedio", f"{itinerario['quintil'].mean():.1f}")
+        termino = itinerario['salida'].max()
+        extra = int(max(termino - a_minutos([ITINERARIO_FIN_JORNADA])[0], 0))
+        st.metric("Término estimado", formato_hora(termino),
+                  delta=f"+{extra} min sobre la jornada" if extra else None, delta_color="inverse")
     
     # Mapa de ubicaciones
     st.subheader("🗺️ Mapa de Visitas")
-    if 'latitud' in df_dia.columns and df_dia['latitud'].notna().any():
-        df_mapa = df_dia[['latitud', 'longitud']].dropna()
-        df_mapa.columns = ['lat', 'lon']
-        st.map(df_mapa)
+    if itinerario['latitud'].notna().any():
+        st.pydeck_chart(mapa_ruta(itinerario[['orden', 'sala_nombre', 'latitud', 'longitud']]))
     else:
         st.info("No hay coordenadas disponibles para mostrar el mapa.")
 
+def formato_fecha(fecha: date, hoy: date = None) -> str:
+    """'Lunes 19-10' (días de la agenda, de lunes a sábado), con '(hoy)' si corresponde."""
+    texto = f"{DIAS_SEMANA[fecha.weekday()].capitalize()} {fecha:%d-%m}"
+    return f"{texto} (hoy)" if fecha == hoy else texto
+
+def notas_paradas(itinerario: pd.DataFrame) -> list:
+    """Aviso corto de cada parada del itinerario."""
+    return [
+        f"⏭️ {sugerencia}" if pd.notna(sugerencia) else
+        "⚠️ la sala cierra antes" if fuera_horario else
+        "⏰ fuera de jornada" if fuera_jornada else
+        f"⏳ abre a las {formato_hora(inicio)}" if espera > 0 else ""
+        for sugerencia, fuera_horario, fuera_jornada, espera, inicio in zip(
+            itinerario['sugerencia'], itinerario['fuera_horario'], itinerario['fuera_jornada'],
+            itinerario['espera_min'], itinerario['inicio'])
+    ]
+
+def _formato_distancia(metros: float) -> str:
+    return f"{metros / 1000:,.1f} km" if metros >= 1000 else f"{metros:,.0f} m"
+
+def mostrar_checkin(supervisor_id: str, ruta_hoy: RutaDia):
+    """Check-in con el GPS del dispositivo en las salas de la ruta de hoy."""
+    if ruta_hoy is None or ruta_hoy.paradas.empty:
+        return
+    salas_hoy = ruta_hoy.paradas
+    
+    st.subheader(f"📍 Check-in de hoy ({formato_fecha(ruta_hoy.fecha)})")
+    gps = get_componente_gps()(
+        data={'etiqueta': "📍 Marcar llegada", 'esperando': "⏳ Obteniendo ubicación..."},
+        key="gps_checkin", on_posicion_change=lambda: None,
+    )
+    posicion = gps.posicion  # Valor de un solo rerun: el del clic
+    if posicion and posicion.get('error'):
+        st.warning(f"⚠️ No se pudo obtener la ubicación: {posicion['error']}")
+    elif posicion:
+        evento = registrar_checkin(supervisor_id, posicion, salas_hoy)
+        nombres = salas_hoy.set_index('sala_id')['sala_nombre']
+        if evento['valido']:
+            st.success(f"✅ Llegada registrada en {nombres[evento['sala_id']]} "
+                       f"(a {_formato_distancia(evento['distancia_m'])})")
+        elif evento['precision_m'] > PRECISION_MAXIMA_METROS:
+            st.error(f"❌ Señal GPS imprecisa (±{_formato_distancia(evento['precision_m'])}); "
+                     "intenta de nuevo al aire libre")
+        else:
+            en_radio = salas_en_radio(evento['latitud'], evento['longitud'], obtener_catalogo_salas(),
+                                      CHECKIN_RADIO_METROS)
+            if not en_radio.empty:
+                st.error(f"❌ Estás en {en_radio['nombre'].iloc[0]}, que no está en tu ruta de hoy")
+            elif evento['sala_id'] is not None:
+                st.error(f"❌ Estás a {_formato_distancia(evento['distancia_m'])} de {nombres[evento['sala_id']]}, "
+                         f"la sala más cercana de tu ruta (máximo {CHECKIN_RADIO_METROS} m)")
+            else:
+                st.error("❌ Las salas de hoy no tienen coordenadas para validar la llegada")
+    
+    checkins = obtener_checkins_hoy(supervisor_id)
+    llegadas = checkins[checkins['valido'].astype(bool)].groupby('sala_id')['ts'].min()
+    estado = salas_hoy[['orden', 'sala_id', 'sala_nombre']].assign(
+        llegada=pd.to_datetime(llegadas.reindex(salas_hoy['sala_id']).to_numpy(), utc=True).tz_convert(ZONA_HORARIA)
+    )
+    visitadas = int(estado['llegada'].notna().sum())
+    st.progress(visitadas / len(estado), text=f"{visitadas} de {len(estado)} salas visitadas")
+    st.dataframe(
+        estado[['orden', 'sala_nombre', 'llegada']], width="stretch", hide_index=True,
+        column_config={
+            'orden': "Orden", 'sala_nombre': "Sala",
+            'llegada': st.column_config.DatetimeColumn("✅ Llegada", format="HH:mm"),
+        },
+    )
+    st.markdown("---")
+
 def pagina_rendir_gastos():
     """Página: Rendir Gastos - Formulario de ingesta a BigQuery."""
     st.header("💰 Rendir Gastos")
     
     usuario = st.session_state.usuario
     supervisor_id = usuario['id']
+    vigilar_cambios([(RENDICIONES, supervisor_id)])
     
     # Formulario de rendición
     st.subheader("📝 Nueva Rendición")
@@ -659,20 +1173,27 @@ def pagina_rendir_gastos():
         with col2:
             categoria = st.selectbox(
                 "📁 Categoría",
-                options=['TRANSPORTE', 'ALIMENTACION', 'MATERIALES', 'OTROS']
+                options=CATEGORIAS
             )
             comentario = st.text_area("💬 Comentario (opcional)", height=100)
         
+        foto = st.file_uploader("🧾 Foto de la boleta (opcional)", type=TIPOS_ACEPTADOS)
+        
         submitted = st.form_submit_button("✅ Registrar Rendición", use_container_width=True, type="primary")
         
         if submitted:
             if monto <= 0:
                 st.error("❌ El monto debe ser mayor a 0")
             else:
-                if insertar_rendicion(supervisor_id, fecha, monto, categoria, comentario):
+                comprobante = guardar_comprobante(supervisor_id, foto, fecha) if foto is not None else None
+                if (foto is None or comprobante) and insertar_rendicion(
+                    supervisor_id, fecha, monto, categoria, comentario, comprobante
+                ):
                     st.success(f"✅ Rendición registrada: ${monto:,} en {categoria}")
                     mostrar_exito_castano()
     
+    mostrar_carga_masiva_rendiciones(supervisor_id)
+    
     # Historial de rendiciones
     st.markdown("---")
     st.subheader("📋 Historial de Rendiciones")
@@ -691,8 +1212,85 @@ def pagina_rendir_gastos():
         with col3:
             st.metric("Número de rendiciones", len(df_historial))
         
-        # Tabla de historial
-        st.dataframe(df_historial, use_container_width=True, hide_index=True)
+        # Tabla de historial, con miniaturas de los comprobantes
+        tabla = df_historial.copy()
+        tabla['comprobante'] = [miniatura_data_uri(c) if isinstance(c, str) and c else None
+                                for c in tabla['comprobante']]
+        st.dataframe(
+            tabla, width="stretch", hide_index=True,
+            column_config={'comprobante': st.column_config.ImageColumn("🧾 Boleta")},
+        )
+        
+        con_foto = df_historial[df_historial['comprobante'].notna() & (df_historial['comprobante'] != '')]
+        if not con_foto.empty:
+            fila = st.selectbox(
+                "🧾 Ver comprobante", options=[None] + list(con_foto.index),
+                format_func=lambda i: "—" if i is None else
+                f"{con_foto.at[i, 'fecha']} · ${con_foto.at[i, 'monto']:,} · {con_foto.at[i, 'categoria']}",
+            )
+            if fila is not None:
+                try:
+                    st.image(get_procesador_comprobantes().almacen.leer(con_foto.at[fila, 'comprobante']))
+                except KeyError:
+                    st.warning("⚠️ El comprobante ya no está disponible")
+
+def mostrar_carga_masiva_rendiciones(supervisor_id: str):
+    """Carga de una planilla de gastos completa, con resultado por fila."""
+    with st.expander("📤 Carga masiva desde planilla (CSV / Excel)"):
+        st.caption(
+            "Columnas: fecha (dd-mm-aaaa o aaaa-mm-dd), monto en pesos enteros (15.000 o 15000), categoria y, "
+            "opcionales, comentario e id_rendicion. Las filas ya rendidas se detectan y no se duplican."
+        )
+        archivo = st.file_uploader("Planilla de gastos", type=['csv', 'xlsx'], key="archivo_rendiciones")
+        if archivo is None:
+            return
+        
+        carga = st.session_state.get('carga_rendiciones')
+        if carga is None or carga['archivo'] != archivo.file_id:
+            try:
+                df = leer_rendiciones(archivo, archivo.name)
+            except ValueError as e:
+                st.error(f"❌ No se pudo leer el archivo: {e}")
+                return
+            # Rendiciones ya registradas en el período de la planilla, para detectar duplicados
+            fechas = parsear_fechas(df['fecha']).dropna()
+            existentes = pd.DataFrame()
+            if len(fechas):
+                existentes = obtener_rendiciones_periodo(supervisor_id, fechas.min().date(), fechas.max().date())
+            carga = st.session_state.carga_rendiciones = {
+                'archivo': archivo.file_id,
+                'resultado': validar_rendiciones(df, supervisor_id, existentes),
+                'cargada': False,
+            }
+        
+        resultado = carga['resultado']
+        conteo = resultado['estado'].value_counts()
+        col1, col2, col3 = st.columns(3)
+        col1.metric("✅ Nuevas", int(conteo.get(CARGADA, 0)))
+        col2.metric("⚠️ Duplicadas", int(conteo.get(DUPLICADA, 0)))
+        col3.metric("❌ Con errores", int(conteo.get(RECHAZADA, 0)))
+        
+        estado_nuevas = "Cargada" if carga['cargada'] else "Por cargar"
+        detalle = resultado.assign(estado=resultado['estado'].replace({CARGADA: f"✅ {estado_nuevas}"}))
+        st.dataframe(
+            detalle[['fila', 'estado', 'motivo', 'fecha', 'monto', 'categoria', 'comentario']],
+            width="stretch", hide_index=True,
+        )
+        
+        nuevas = filas_a_cargar(resultado)
+        if carga['cargada'] or nuevas.empty:
+            return
+        if st.button(f"✅ Cargar {len(nuevas)} rendiciones (${nuevas['monto'].sum():,})", type="primary",
+                     width="stretch"):
+            lotes = cargar_rendiciones_masivas(supervisor_id, nuevas)
+            if lotes is not None:
+                carga['cargada'] = True
+                st.toast(f"✅ {len(nuevas)} rendiciones cargadas en {lotes} lotes")
+                st.rerun()
+            # Pudo fallar después de algunos lotes: se vuelve a validar contra lo ya guardado,
+            # así reintentar marca esas filas como duplicadas en vez de cargarlas otra vez
+            del st.session_state.carga_rendiciones
+            st.caption("Revisa el detalle de la planilla y vuelve a intentar.")
 
 # ================================================================
 # PÁGINA GESTIONAR RUTAS (SOLO ZONALES)
@@ -700,74 +1298,398 @@ def pagina_rendir_gastos():
 
 def obtener_supervisores_del_zonal(zonal_id: str) -> pd.DataFrame:
     """Obtiene los supervisores que reportan a este zonal."""
-    database = get_spanner_client()
-    
-    if database is None:
-        # Datos demo para el zonal Ricardo Millar
-        return pd.DataFrame({
-            'id': ['s41861921', 's3048eab6', 's52b7164b', 's4e75d6f2', 's0d9492dc', 's1dc69e68', 's88ae2d48', 's0df53ceb'],
-            'nombre': ['Harry Urra', 'Rodrigo Castro', 'Daniela Leon', 'Alejandro Perez', 'Lisset Medina', 'Gema Nuñez', 'Wladimir Lara', 'Alexander Yañez'],
-            'email': ['harry.urra@castano.cl', 'rodrigo.castro@castano.cl', 'daniela.leon@castano.cl', 'alejandro.perez@castano.cl', 'lisset.medina@castano.cl', 'gema.nunez@castano.cl', 'wladimir.lara@castano.cl', 'alexander.yanez@castano.cl'],
-            'total_visitas': [24, 18, 22, 20, 15, 19, 21, 17]
-        })
-    
-    query = """
-    SELECT s.id, s.nombre, s.email
-    FROM Reporta_A ra
-    JOIN Supervisor s ON ra.supervisor_id = s.id
-    WHERE ra.zonal_id = @zonal_id
-    """
-    
-    with database.snapshot() as snapshot:
-        results = snapshot.execute_sql(
-            query, params={"zonal_id": zonal_id},
-            param_types={"zonal_id": spanner.param_types.STRING}
-        )
-        rows = list(results)
-        if rows:
-            return pd.DataFrame(rows, columns=['id', 'nombre', 'email'])
-    return pd.DataFrame()
+    return frame_compartido('equipo', zonal_id, lambda: get_repositorio().supervisores_de_zonal(zonal_id))
 
 def obtener_rutas_supervisor_editable(supervisor_id: str) -> pd.DataFrame:
     """Obtiene las rutas del supervisor en formato editable."""
-    database = get_spanner_client()
-    
-    if database is None:
-        # Datos demo
-        return pd.DataFrame({
-            'sala_id': ['sala001', 'sala002', 'sala003', 'sala004', 'sala005'],
-            'sala_nombre': ['TOT FLO WALKER MARTINEZ / 55', 'S10 ROJAS MAGALLANES / 80', 'UNI FLO ROJAS MAGALLANES / 258', 'JUMBO KENNEDY', 'LIDER EXPRESS MAIPU'],
-            'LUNES': [True, True, True, False, True],
-            'MARTES': [True, False, True, True, False],
-            'MIERCOLES': [True, False, True, False, True],
-            'JUEVES': [True, False, True, True, False],
-            'VIERNES': [True, True, True, False, True],
-            'SABADO': [True, True, True, False, False]
-        })
-    
-    # Consulta real a Spanner - obtener visitas pivotadas por día
-    query = """
-    SELECT sala_id, sala_nombre, dia_semana
-    FROM Visita_Planificada vp
-    JOIN Sala s ON vp.sala_id = s.id
-    WHERE vp.supervisor_id = @supervisor_id
-    """
-    # ... (implementar lógica de pivot)
-    return pd.DataFrame()
+    return frame_compartido('rutas_editables', supervisor_id, lambda: get_repositorio().rutas_editables(supervisor_id))
 
 def guardar_cambios_rutas(supervisor_id: str, sala_id: str, dias: dict) -> bool:
     """Guarda los cambios de días de visita en Spanner."""
-    database = get_spanner_client()
+    try:
+        get_repositorio().guardar_dias_sala(supervisor_id, sala_id, dias)
+    except Exception as e:
+        st.error(f"Error al guardar: {e}")
+        return False
     
-    if database is None:
-        st.info("💡 Modo demo: Los cambios se guardarían en Spanner")
-        return True
+    publicar_cambios(PLAN, [supervisor_id])
+    return True
+
+def aplicar_plan_importado(diferencia) -> int:
+    """Aplica en Spanner, en lotes de mutaciones, un plan importado. Retorna los commits o None si falla."""
+    try:
+        commits = get_repositorio().aplicar_plan(diferencia.altas, diferencia.bajas)
+    except Exception as e:
+        st.error(f"Error al aplicar el plan: {e}")
+        return None
     
-    # Implementar INSERT/DELETE de visitas
-    # DELETE FROM Visita_Planificada WHERE supervisor_id = X AND sala_id = Y
-    # INSERT INTO Visita_Planificada ... para cada día marcado
+    publicar_cambios(PLAN, set(diferencia.altas['supervisor_id']) | set(diferencia.bajas['supervisor_id']))
+    return commits
+
+def guardar_excepcion(fecha: date, supervisor_id: str, sala_id: str, tipo: str, motivo: str) -> bool:
+    """Guarda un feriado o excepción de la agenda y recalcula los supervisores afectados."""
+    fila = pd.DataFrame([[fecha, supervisor_id, sala_id, tipo, motivo or None]], columns=COLUMNAS_EXCEPCION)
+    try:
+        get_repositorio().guardar_excepciones(fila)
+    except Exception as e:
+        st.error(f"Error al guardar la excepción: {e}")
+        return False
+    publicar_cambios(EXCEPCIONES, [supervisor_id])
     return True
 
+def eliminar_excepcion(excepcion: pd.Series) -> bool:
+    """Elimina un feriado o excepción de la agenda."""
+    try:
+        get_repositorio().eliminar_excepciones(excepcion.to_frame().T)
+    except Exception as e:
+        st.error(f"Error al eliminar la excepción: {e}")
+        return False
+    publicar_cambios(EXCEPCIONES, [excepcion['supervisor_id']])
+    return True
+
+def mostrar_importacion_plan(df_supervisores: pd.DataFrame):
+    """Carga masiva del plan de rutas del equipo desde CSV o Excel."""
+    with st.expander("📥 Importar plan desde CSV / Excel"):
+        st.caption(
+            "Columnas: supervisor_id, sala_id y una columna por día (LUNES ... SABADO, marcar con 1 o x), "
+            "o bien supervisor_id, sala_id, dia_semana. La columna orden es opcional."
+        )
+        archivo = st.file_uploader("Archivo del plan", type=['csv', 'xlsx'], key="archivo_plan")
+        reemplazar = st.checkbox(
+            "Reemplazar el plan completo de los supervisores del archivo", value=True,
+            help="Si se desmarca, sólo se agregan visitas y no se elimina ninguna.",
+        )
+        if archivo is None:
+            return
+        
+        # El análisis se hace una vez por archivo y modo, no en cada rerun
+        firma = (archivo.file_id, reemplazar)
+        importacion = st.session_state.get('importacion_plan')
+        if importacion is None or importacion['firma'] != firma:
+            inicio = time.perf_counter()
+            try:
+                plan = leer_plan(archivo, archivo.name)
+            except (ErrorFormatoPlan, ValueError) as e:
+                st.error(f"❌ No se pudo leer el archivo: {e}")
+                return
+            validas, errores = validar_plan(plan, obtener_catalogo_salas()['id'], df_supervisores['id'])
+            actual = get_repositorio().plan_vigente(validas['supervisor_id'].unique().tolist())
+            importacion = st.session_state.importacion_plan = {
+                'firma': firma,
+                'filas': len(plan),
+                'errores': errores,
+                'diferencia': diferencia_plan(validas, actual, reemplazar=reemplazar),
+                'segundos': time.perf_counter() - inicio,
+            }
+        
+        diferencia = importacion['diferencia']
+        errores = importacion['errores']
+        st.caption(f"⏱️ {importacion['filas']} visitas leídas y validadas en {importacion['segundos']:.1f} s")
+        
+        col1, col2, col3, col4 = st.columns(4)
+        col1.metric("➕ Altas", len(diferencia.altas))
+        col2.metric("➖ Bajas", len(diferencia.bajas))
+        col3.metric("= Sin cambios", diferencia.sin_cambios)
+        col4.metric("⚠️ Con errores", len(errores))
+        
+        if len(errores):
+            st.warning(f"{len(errores)} visitas con errores no se importarán:")
+            st.dataframe(errores.head(500), width="stretch", hide_index=True)
+        
+        if diferencia.vacia:
+            st.info("El archivo no cambia el plan vigente.")
+            return
+        
+        resumen = diferencia.resumen_por_supervisor().merge(
+            df_supervisores[['id', 'nombre']], left_on='supervisor_id', right_on='id', how='left'
+        )
+        st.dataframe(resumen[['nombre', 'altas', 'bajas']], width="stretch", hide_index=True)
+        
+        if st.button("✅ Aplicar plan", type="primary", width="stretch"):
+            commits = aplicar_plan_importado(diferencia)
+            if commits is not None:
+                del st.session_state['importacion_plan']
+                st.toast(
+                    f"✅ Plan aplicado: {len(diferencia.altas)} altas y {len(diferencia.bajas)} bajas "
+                    f"en {commits} commits"
+                )
+                st.rerun()
+
+def mostrar_exportaciones(supervisor_ids: list, alcance: str):
+    """Exportación de plan de rutas y rendiciones; supervisor_ids=None exporta todo (admin)."""
+    with st.expander("📤 Exportar plan y rendiciones"):
+        col1, col2 = st.columns(2)
+        with col1:
+            contenido = st.selectbox("Contenido", ["Rendiciones", "Plan de rutas"], key="export_contenido")
+        with col2:
+            formato = st.selectbox("Formato", list(FORMATOS), key="export_formato")
+        
+        hoy = date.today()
+        if contenido == "Rendiciones":
+            rango = st.date_input("Período", value=(hoy.replace(day=1), hoy), key="export_rango")
+            if len(rango) != 2:
+                st.info("Selecciona la fecha final del período.")
+                return
+            desde, hasta = rango
+        
+        if st.button("⚙️ Generar archivo", width="stretch"):
+            repo = get_repositorio()
+            if contenido == "Rendiciones":
+                titulo = f"Rendiciones {alcance} {desde:%Y%m%d}-{hasta:%Y%m%d}"
+                generar = lambda: repo.iterar_rendiciones(supervisor_ids, desde, hasta, EXPORT_FILAS_POR_BLOQUE)
+            else:
+                ids = supervisor_ids if supervisor_ids is not None else obtener_jerarquia()['supervisor_id'].tolist()
+                titulo = f"Plan de rutas {alcance} {hoy:%Y%m%d}"
+                generar = lambda: repo.iterar_plan(ids, EXPORT_FILAS_POR_BLOQUE)
+            st.session_state.setdefault('exportaciones', []).insert(
+                0, get_exportaciones().solicitar(titulo, formato, generar)
+            )
+        
+        # La sesión sólo guarda los ids; el archivo vive en disco en el gestor
+        gestor = get_exportaciones()
+        trabajos = [t for t in map(gestor.obtener, st.session_state.get('exportaciones', [])) if t]
+        for trabajo in trabajos:
+            if trabajo.estado == 'lista':
+                st.download_button(
+                    f"⬇️ {trabajo.nombre_archivo} ({trabajo.filas:,} filas)",
+                    data=trabajo.leer,  # Se lee recién al hacer clic
+                    file_name=trabajo.nombre_archivo, mime=trabajo.mime,
+                    key=f"descarga_{trabajo.id}", on_click="ignore", width="stretch",
+                )
+            elif trabajo.estado == 'error':
+                st.error(f"❌ {trabajo.titulo}: {trabajo.error}")
+            else:
+                st.caption(f"⏳ {trabajo.titulo} ({trabajo.formato}): {trabajo.estado}, {trabajo.filas:,} filas escritas")
+        if any(t.estado in ('en cola', 'generando') for t in trabajos):
+            st.button("🔄 Actualizar estado", key="export_actualizar")
+
+def mostrar_alertas_rendiciones(alcance: str, supervisor_ids: list):
+    """Rendiciones marcadas como posible duplicado o monto atípico, pendientes de revisión."""
+    alertas = frame_compartido('alertas', alcance, lambda: get_repositorio().alertas_rendiciones(supervisor_ids))
+    if alertas.empty:
+        return
+    
+    with st.expander(f"🚩 Rendiciones por revisar ({len(alertas)})"):
+        nombres = obtener_jerarquia().set_index('supervisor_id')['supervisor_nombre']
+        alertas = alertas.assign(supervisor=alertas['id_supervisor'].map(nombres).fillna(alertas['id_supervisor']))
+        st.dataframe(
+            alertas[['fecha', 'supervisor', 'categoria', 'monto', 'motivo', 'puntaje']],
+            width="stretch", hide_index=True,
+            column_config={'monto': st.column_config.NumberColumn(format="$%d"),
+                           'puntaje': st.column_config.NumberColumn("z", help="Desviaciones sobre lo habitual")},
+        )
+        etiquetas = {
+            a.id_rendicion: f"{a.fecha} · {a.supervisor} · ${a.monto:,} · {a.motivo}"
+            for a in alertas.itertuples()
+        }
+        seleccion = st.multiselect("Rendiciones revisadas", options=list(etiquetas), format_func=etiquetas.get,
+                                   key="alertas_seleccion")
+        col1, col2 = st.columns(2)
+        with col1:
+            aprobar = st.button("✅ Aprobar", width="stretch", disabled=not seleccion)
+        with col2:
+            observar = st.button("⚠️ Observar", width="stretch", disabled=not seleccion)
+        if aprobar or observar:
+            get_repositorio().resolver_alertas(seleccion, APROBADA if aprobar else OBSERVADA)
+            get_almacen_frames().invalidar_entidad('alertas')
+            st.toast(f"✅ {len(seleccion)} rendiciones revisadas")
+            del st.session_state['alertas_seleccion']
+            st.rerun()
+
+def mostrar_cumplimiento(supervisor_ids: list):
+    """Plan versus visitas con check-in y gasto por semana (desde la caché local, sin consultar los backends)."""
+    with st.expander("📈 Cumplimiento del plan", key="expander_cumplimiento", on_change="rerun") as seccion:
+        if not seccion.open:
+            return  # Cerrada no se calcula: el contenido de un expander corre aunque no se vea
+        cache = get_cache_cumplimiento()
+        tabla = cache.tabla(supervisor_ids)
+        if cache.actualizado_en is None and tabla.empty:
+            st.info("⏳ Calculando el cumplimiento por primera vez; estará listo en unos minutos.")
+            return
+        if tabla.empty:
+            st.caption("Sin visitas planificadas ni rendiciones en las últimas semanas.")
+            return
+        
+        semanas = totales_por_semana(tabla)
+        semana = st.selectbox("Semana", semanas['semana'].iloc[::-1].tolist(),
+                              format_func=lambda s: f"Semana del {s:%d-%m-%Y}", key="cumplimiento_semana")
+        posicion = semanas.index[semanas['semana'] == semana][0]
+        total = semanas.loc[posicion]
+        anterior = semanas.loc[posicion - 1, 'cumplimiento'] if posicion > 0 else None
+        
+        col1, col2, col3, col4 = st.columns(4)
+        with col1:
+            delta = None
+            if pd.notna(total['cumplimiento']) and anterior is not None and pd.notna(anterior):
+                delta = f"{(total['cumplimiento'] - anterior) * 100:+.0f} pp"
+            st.metric("✅ Cumplimiento", "—" if pd.isna(total['cumplimiento']) else f"{total['cumplimiento']:.0%}",
+                      delta=delta)
+        with col2:
+            st.metric("📍 Visitas", f"{total['visitas_realizadas']} / {total['visitas_planificadas']}")
+        with col3:
+            st.metric("💰 Gasto", f"${total['gasto_total']:,.0f}")
+        with col4:
+            st.metric("🚗 Transporte por km", "—" if pd.isna(total['gasto_por_km']) else f"${total['gasto_por_km']:,.0f}")
+        
+        nombres = obtener_jerarquia().set_index('supervisor_id')['supervisor_nombre']
+        # Tendencia por supervisor como sparkline en la tabla (más liviano que un gráfico por rerun)
+        historia = indicadores(tabla[tabla['semana'] <= semana])
+        tendencia = historia['cumplimiento'].fillna(0).groupby(historia['supervisor_id']).agg(list)
+        detalle = indicadores(tabla[tabla['semana'] == semana])
+        detalle = detalle.assign(supervisor=detalle['supervisor_id'].map(nombres).fillna(detalle['supervisor_id']),
+                                 tendencia=detalle['supervisor_id'].map(tendencia))
+        st.dataframe(
+            detalle.sort_values('cumplimiento', na_position='first')[[
+                'supervisor', 'cumplimiento', 'tendencia', 'visitas_realizadas', 'visitas_planificadas', 'visitas_fuera_plan',
+                'km_planificados', 'gasto_total', 'gasto_por_km',
+            ]],
+            width="stretch", hide_index=True,
+            column_config={
+                'supervisor': "Supervisor",
+                'cumplimiento': st.column_config.ProgressColumn("Cumplimiento", format="percent", min_value=0, max_value=1),
+                'tendencia': st.column_config.LineChartColumn("Semanas anteriores", y_min=0, y_max=1),
+                'visitas_realizadas': "Realizadas",
+                'visitas_planificadas': "Planificadas",
+                'visitas_fuera_plan': st.column_config.NumberColumn("Fuera de plan", help="Check-ins en salas no planificadas ese día"),
+                'km_planificados': st.column_config.NumberColumn("Km ruta", format="%.1f"),
+                'gasto_total': st.column_config.NumberColumn("Gasto", format="$%d"),
+                'gasto_por_km': st.column_config.NumberColumn("Transporte/km", format="$%d"),
+            },
+        )
+        if cache.actualizado_en:
+            st.caption(f"🕒 Actualizado a las {cache.actualizado_en:%H:%M}; se recalcula cada "
+                       f"{CUMPLIMIENTO_REFRESCO_SEGUNDOS // 60} minutos")
+
+def obtener_cobertura_salas(alcance: str, supervisor_ids: list) -> pd.DataFrame:
+    """Catálogo de salas con las visitas planificadas del equipo (planificadas) y si tiene alguna (con_visitas)."""
+    def cargar():
+        ids = supervisor_ids if supervisor_ids is not None else obtener_jerarquia()['supervisor_id'].unique()
+        visitas = get_repositorio().plan_vigente(ids).groupby('sala_id').size()
+        salas = obtener_catalogo_salas()
+        planificadas = salas['id'].map(visitas).fillna(0).astype(int)
+        return salas.assign(planificadas=planificadas, con_visitas=(planificadas > 0).astype(int))
+    return frame_compartido('cobertura_salas', alcance, cargar)
+
+def mostrar_mapa_salas(alcance: str, supervisor_ids: list):
+    """Salas de la región agrupadas en el servidor según el zoom; clic en un grupo para acercar."""
+    with st.expander("🗺️ Mapa de salas", key="expander_mapa_salas", on_change="rerun") as seccion:
+        if not seccion.open:
+            return
+        salas = obtener_cobertura_salas(alcance, supervisor_ids)
+        foco = st.session_state.get('mapa_foco')
+        if foco is None:
+            # Encuadre inicial: las salas con visitas del equipo (o todo el catálogo si no hay)
+            base = salas[salas['planificadas'] > 0].dropna(subset=['latitud', 'longitud'])
+            base = base if len(base) else salas.dropna(subset=['latitud', 'longitud'])
+            if base.empty:
+                st.info("No hay salas con coordenadas para mostrar.")
+                return
+            foco = encuadre(base['latitud'], base['longitud'])
+        vista = vista_region(salas, centro=foco[:2], zoom=foco[2], sumar=('con_visitas',))
+        
+        nombres = obtener_jerarquia().set_index('supervisor_id')['supervisor_nombre']
+        ids = supervisor_ids if supervisor_ids is not None else nombres.index.tolist()
+        col1, col2 = st.columns(2)
+        with col1:
+            ruta_de = st.selectbox("Mostrar ruta de", [None] + list(ids), key="mapa_supervisor",
+                                   format_func=lambda s: "— Ninguno —" if s is None else nombres.get(s, s))
+        with col2:
+            dia = st.selectbox("Día", DIAS_SEMANA, key="mapa_dia", disabled=ruta_de is None)
+        capas = []
+        if ruta_de is not None:
+            df_dia = obtener_rutas_supervisor(ruta_de)
+            df_dia = df_dia[df_dia['dia_semana'] == dia] if not df_dia.empty else df_dia
+            if not df_dia.empty:
+                capas = capas_ruta(df_dia)
+        
+        # La clave cambia con el foco: la selección anterior no vuelve a disparar el acercamiento
+        evento = st.pydeck_chart(mapa_region(vista, capas), on_select="rerun", selection_mode="single-object",
+                                 key=f"mapa_salas_{foco[0]:.5f}_{foco[1]:.5f}_{foco[2]}")
+        seleccion = evento.selection.objects.get('salas', []) if evento else []
+        if seleccion and seleccion[0]['n'] > 1 and vista.ampliable:
+            st.session_state.mapa_foco = (seleccion[0]['latitud'], seleccion[0]['longitud'],
+                                          min(vista.zoom + 2, ZOOM_MAXIMO))
+            st.rerun()
+        
+        col1, col2, col3 = st.columns([2, 1, 1])
+        with col1:
+            st.caption(f"📍 {vista.salas:,} salas en la vista · {len(vista.puntos):,} puntos en el mapa · "
+                       f"🟢 con visitas planificadas · 🟠 sin visitas")
+        with col2:
+            if st.button("➖ Alejar", width="stretch", disabled=vista.zoom <= ZOOM_MINIMO, key="mapa_alejar"):
+                st.session_state.mapa_foco = (vista.latitud, vista.longitud, max(vista.zoom - 2, ZOOM_MINIMO))
+                st.rerun()
+        with col3:
+            if st.button("🌎 Toda la región", width="stretch", key="mapa_reiniciar",
+                         disabled=st.session_state.get('mapa_foco') is None):
+                del st.session_state['mapa_foco']
+                st.rerun()
+
+def mostrar_explorador_organizacion():
+    """Zonal → supervisor → sala de toda la empresa; cada nivel es un corte del árbol en memoria."""
+    arbol = get_organizacion()
+    zonal = st.session_state.get('explorador_zonal')
+    supervisor = st.session_state.get('explorador_supervisor')
+    
+    with st.expander("🏢 Organización", expanded=True):
+        totales = arbol.totales()
+        col1, col2, col3, col4, col5 = st.columns(5)
+        col1.metric("👔 Zonales", f"{totales['zonales']:,}")
+        col2.metric("👥 Supervisores", f"{totales['supervisores']:,}")
+        col3.metric("🏪 Salas", f"{totales['salas']:,}")
+        col4.metric("📍 Visitas/semana", f"{totales['visitas']:,}")
+        col5.metric("💰 Gasto", f"${totales['gasto']:,.0f}", help=f"Últimas {ORGANIZACION_SEMANAS_GASTO} semanas")
+        
+        # Migas: cada nivel vuelve al anterior
+        col1, col2, col3 = st.columns(3)
+        with col1:
+            if st.button("🇨🇱 Todo el país", width="stretch", disabled=zonal is None, key="explorador_pais"):
+                st.session_state.explorador_zonal = st.session_state.explorador_supervisor = None
+                st.rerun()
+        if zonal is not None:
+            with col2:
+                if st.button(f"👔 {zonal['nombre']}", width="stretch", disabled=supervisor is None,
+                             key="explorador_volver_zonal"):
+                    st.session_state.explorador_supervisor = None
+                    st.rerun()
+        if supervisor is not None:
+            with col3:
+                if st.button(f"📝 Ver Rutas de {supervisor['nombre']}", width="stretch",
+                             key="explorador_ver_rutas"):
+                    st.session_state.supervisor_seleccionado = supervisor
+                    st.rerun()
+        
+        formato = {'visitas': st.column_config.NumberColumn("Visitas/semana"),
+                   'gasto': st.column_config.NumberColumn("Gasto", format="$%d"),
+                   'supervisores': "Supervisores", 'salas': "Salas"}
+        if zonal is None:
+            tabla, columnas, nivel = arbol.zonales(), ['zonal_nombre', 'supervisores', 'salas', 'visitas', 'gasto'], 'zonal'
+            formato['zonal_nombre'] = "Zonal"
+        elif supervisor is None:
+            tabla = arbol.supervisores(zonal['id'])
+            columnas, nivel = ['supervisor_nombre', 'salas', 'visitas', 'gasto'], 'supervisor'
+            formato['supervisor_nombre'] = "Supervisor"
+        else:
+            tabla, columnas, nivel = arbol.salas(supervisor['id']), ['sala_nombre', 'visitas'], None
+            formato['sala_nombre'] = "Sala"
+        
+        if tabla.empty:
+            st.caption("Sin datos en este nivel.")
+            return
+        # La clave cambia con el nivel: la fila elegida no se arrastra al bajar
+        evento = st.dataframe(
+            tabla[columnas], width="stretch", hide_index=True, column_config=formato,
+            on_select="rerun" if nivel else "ignore", selection_mode="single-row",
+            key=f"explorador_tabla_{(supervisor or zonal or {}).get('id', 'pais')}",
+        )
+        filas = evento.selection.rows if nivel else []
+        if filas:
+            fila = tabla.iloc[filas[0]]
+            st.session_state[f"explorador_{nivel}"] = {'id': fila[f"{nivel}_id"], 'nombre': fila[f"{nivel}_nombre"]}
+            st.rerun()
+        ayuda = "Clic en una fila para bajar de nivel" if nivel else f"🏪 {len(tabla)} salas en el plan"
+        st.caption(f"{ayuda} · 🕒 Actualizado a las {arbol.actualizado_en:%H:%M}")
+
 def pagina_gestionar_rutas():
     """Página para que Zonales gestionen rutas de su equipo."""
     
@@ -790,17 +1712,58 @@ def pagina_gestionar_rutas():
     
     # Obtener supervisores del zonal
     df_supervisores = obtener_supervisores_del_zonal(zonal_id)
+    if usuario['rol'] != 'admin':  # El explorador del administrador se actualiza solo
+        vigilar_cambios([(PLAN, s) for s in df_supervisores['id']])
+    
+    if usuario['rol'] == 'admin':
+        mostrar_alertas_rendiciones('*', None)
+        mostrar_cumplimiento(None)
+        mostrar_mapa_salas('*', None)
+        mostrar_exportaciones(None, "todos")
+        mostrar_explorador_organizacion()
+    elif not df_supervisores.empty:
+        mostrar_alertas_rendiciones(zonal_id, df_supervisores['id'].tolist())
+        mostrar_cumplimiento(df_supervisores['id'].tolist())
+        mostrar_mapa_salas(zonal_id, df_supervisores['id'].tolist())
+        mostrar_exportaciones(df_supervisores['id'].tolist(), usuario['username'])
     
     if df_supervisores.empty:
-        st.warning("No tienes supervisores asignados.")
+        if usuario['rol'] != 'admin':  # El administrador recorre la empresa en el explorador
+            st.warning("No tienes supervisores asignados.")
         return
     
+    mostrar_importacion_plan(df_supervisores)
+    
     st.markdown(f"### 👥 Tu equipo ({len(df_supervisores)} supervisores)")
     st.markdown("")
     
+    # Días sobre la jornada por supervisor, del itinerario de todo el equipo
+    dias = obtener_resumen_dias(zonal_id, df_supervisores['id'].tolist())
+    excedidos = dias[~dias['factible']].groupby('supervisor_id')['fin'].agg(['size', 'max'])
+    
+    mostrar_tarjetas_equipo(zonal_id, df_supervisores, excedidos)
+
+@st.fragment
+def mostrar_tarjetas_equipo(zonal_id: str, df_supervisores: pd.DataFrame, excedidos: pd.DataFrame):
+    """Tarjetas de los supervisores con búsqueda; al escribir sólo se vuelve a dibujar este bloque."""
+    consulta = st.text_input("🔎 Buscar supervisor", type="search", live=BUSQUEDA_ESPERA,
+                             placeholder="Nombre o email", key="buscar_supervisor")
+    mostrados = filtrar_busqueda(df_supervisores, 'equipo', zonal_id, consulta)
+    if len(mostrados) < len(df_supervisores):
+        st.caption(f"Mostrando {len(mostrados)} de {len(df_supervisores)} supervisores")
+    if mostrados.empty:
+        st.info("Ningún supervisor coincide con la búsqueda.")
+        return
+    
     # Mostrar tarjetas de supervisores
     cols = st.columns(2)
-    for idx, row in df_supervisores.iterrows():
+    for idx, row in enumerate(mostrados.to_dict('records')):
+        if row['id'] in excedidos.index:
+            n, fin = int(excedidos.at[row['id'], 'size']), excedidos.at[row['id'], 'max']
+            jornada = f"⏰ {n} día{'s' if n > 1 else ''} fuera de jornada u horario (hasta {formato_hora(fin)})"
+            color_jornada = "#d35400"
+        else:
+            jornada, color_jornada = "🕘 Semana dentro de la jornada", "#2e7d32"
         with cols[idx % 2]:
             with st.container():
                 st.markdown(f"""
@@ -814,6 +1777,7 @@ def pagina_gestionar_rutas():
                     <h4 style="margin:0; color:#333;">👤 {row['nombre']}</h4>
                     <p style="margin:5px 0; color:#666; font-size:14px;">📧 {row['email']}</p>
                     <p style="margin:5px 0; color:#667eea; font-size:14px;">📍 {row.get('total_visitas', 0)} visitas planificadas</p>
+                    <p style="margin:5px 0; color:{color_jornada}; font-size:14px;">{jornada}</p>
                 </div>
                 """, unsafe_allow_html=True)
                 
@@ -822,12 +1786,13 @@ def pagina_gestionar_rutas():
                         'id': row['id'],
                         'nombre': row['nombre']
                     }
-                    st.rerun()
+                    st.rerun(scope="app")
 
 def mostrar_detalle_supervisor():
     """Muestra el detalle de rutas de un supervisor con checkboxes."""
     
     sup = st.session_state.supervisor_seleccionado
+    vigilar_cambios([(PLAN, sup['id']), (EXCEPCIONES, sup['id'])])
     
     # Botón volver
     col1, col2 = st.columns([1, 4])
@@ -856,68 +1821,219 @@ def mostrar_detalle_supervisor():
     # Instrucciones simples
     st.info("✅ Marca los días en que el supervisor debe visitar cada sala. Los cambios se guardan automáticamente.")
     
-    # Días de la semana
+    mostrar_matriz_rutas(sup)
+    
+    # Agregar nueva sala
+    st.markdown("---")
+    st.markdown("### ➕ Agregar Sala")
+    with st.expander("Agregar nueva sala a la ruta"):
+        mostrar_agregar_sala(sup)
+    
+    mostrar_excepciones_agenda(sup)
+
+@st.fragment
+def mostrar_matriz_rutas(sup: dict):
+    """Matriz de días por sala con término estimado, búsqueda, avisos y guardado; marcar o buscar no recarga la página."""
     DIAS = ['LUNES', 'MARTES', 'MIERCOLES', 'JUEVES', 'VIERNES', 'SABADO']
     DIAS_CORTOS = ['L', 'M', 'X', 'J', 'V', 'S']
+    df_rutas = obtener_rutas_supervisor_editable(sup['id'])
     
-    # Encabezado visual
+    # Encabezado visual; el término de cada día se completa al final, con el plan ya guardado
     header_cols = st.columns([3] + [1]*6)
     with header_cols[0]:
         st.markdown("**📍 SALA**")
+        st.caption("🕘 término estimado")
+    terminos = []
     for i, dia in enumerate(DIAS_CORTOS):
         with header_cols[i+1]:
             st.markdown(f"**{dia}**")
+            terminos.append(st.empty())
     
     st.markdown("---")
     
+    # Marcas sin guardar por sala: sobreviven a la búsqueda aunque la sala quede oculta
+    cambios = st.session_state.setdefault(f"cambios_rutas_{sup['id']}", {})
+    
+    consulta = st.text_input("🔎 Buscar sala", type="search", live=BUSQUEDA_ESPERA,
+                             placeholder="Nombre o código", key=f"buscar_sala_{sup['id']}")
+    mostradas = filtrar_busqueda(df_rutas, 'rutas_editables', sup['id'], consulta)
+    if len(mostradas) < len(df_rutas):
+        st.caption(f"Mostrando {len(mostradas)} de {len(df_rutas)} salas")
+    if mostradas.empty:
+        st.info("Ninguna sala de la ruta coincide con la búsqueda.")
+    
     # Matriz de checkboxes para cada sala
-    cambios = {}
-    for idx, row in df_rutas.iterrows():
+    for idx, row in mostradas.iterrows():
         cols = st.columns([3] + [1]*6)
         
         with cols[0]:
             st.markdown(f"**{row['sala_nombre'][:40]}**")
         
+        pendiente = cambios.get(row['sala_id'], {})
         dias_seleccionados = {}
         for i, dia in enumerate(DIAS):
             with cols[i+1]:
-                valor_actual = row.get(dia, False)
-                nuevo_valor = st.checkbox(
+                dias_seleccionados[dia] = st.checkbox(
                     dia, 
-                    value=valor_actual, 
+                    value=pendiente.get(dia, row.get(dia, False)), 
                     key=f"chk_{row['sala_id']}_{dia}",
                     label_visibility="collapsed"
                 )
-                dias_seleccionados[dia] = nuevo_valor
-                
-                if nuevo_valor != valor_actual:
-                    cambios[row['sala_id']] = dias_seleccionados
+        
+        if any(dias_seleccionados[dia] != row.get(dia, False) for dia in DIAS):
+            cambios[row['sala_id']] = dias_seleccionados
+        else:
+            cambios.pop(row['sala_id'], None)
+    
+    if len(cambios) > len(set(cambios) & set(mostradas['sala_id'])):
+        st.caption(f"✏️ {len(cambios)} sala(s) con cambios sin guardar, también entre las que no se muestran")
     
+    avisos_jornada = st.container()
     st.markdown("---")
     
     # Botón guardar grande y visible
     col1, col2, col3 = st.columns([1, 2, 1])
     with col2:
-        if st.button("💾 GUARDAR CAMBIOS", use_container_width=True, type="primary"):
+        if st.button("💾 GUARDAR CAMBIOS", width="stretch", type="primary"):
             if cambios:
-                for sala_id, dias in cambios.items():
-                    guardar_cambios_rutas(sup['id'], sala_id, dias)
-                st.success("✅ ¡Cambios guardados exitosamente!")
-                mostrar_exito_castano()
+                for sala_id, dias in list(cambios.items()):
+                    if guardar_cambios_rutas(sup['id'], sala_id, dias):
+                        del cambios[sala_id]
+                if not cambios:
+                    st.success("✅ ¡Cambios guardados exitosamente!")
+                    mostrar_exito_castano()
             else:
                 st.info("No hay cambios para guardar.")
     
-    # Agregar nueva sala
+    # Término estimado de cada día según el itinerario del supervisor, leído después de guardar
+    itinerario = obtener_itinerario_supervisor(sup['id'])
+    resumen = resumen_dias(itinerario, ITINERARIO_FIN_JORNADA).set_index('dia_semana')
+    for dia, termino in zip(DIAS, terminos):
+        if dia in resumen.index:
+            d = resumen.loc[dia]
+            termino.caption(f"{'' if d['factible'] else '⚠️ '}{formato_hora(d['fin'])}")
+    
+    # Días que no caben: horas extra, orden sugerido y visitas para mover
+    mover = {}
+    for dia, sala, sugerencia in zip(itinerario['dia_semana'], itinerario['sala_nombre'], itinerario['sugerencia']):
+        if pd.notna(sugerencia):
+            mover.setdefault(dia, []).append(f"{sala}: {sugerencia}")
+    for dia, d in resumen[~resumen['factible']].iterrows():
+        avisos = []
+        if d['horas_extra_min'] > 0:
+            avisos.append(f"termina a las {formato_hora(d['fin'])} ({int(d['horas_extra_min'])} min sobre la jornada)")
+        if d['fuera_horario']:
+            avisos.append(f"{int(d['fuera_horario'])} visita(s) después del cierre de la sala")
+        if d['reordenado']:
+            avisos.append("conviene cambiar el orden")
+        avisos += mover.get(dia, [])
+        avisos_jornada.warning(f"⏰ **{dia.capitalize()}**: " + " · ".join(avisos))
+
+@st.fragment
+def mostrar_agregar_sala(sup: dict):
+    """Búsqueda en el catálogo de salas que aún no están en la ruta del supervisor."""
+    df_rutas = obtener_rutas_supervisor_editable(sup['id'])
+    catalogo = obtener_catalogo_salas()
+    consulta = st.text_input("🔎 Buscar en el catálogo", type="search", live=BUSQUEDA_ESPERA,
+                             placeholder="Nombre o código", key=f"buscar_catalogo_{sup['id']}")
+    encontradas = filtrar_busqueda(catalogo, 'salas', '*', consulta)
+    disponibles = encontradas[~encontradas['id'].isin(df_rutas['sala_id'])]
+    if len(disponibles) > BUSQUEDA_MAX_OPCIONES:
+        st.caption(f"{len(disponibles)} salas {'coinciden' if consulta else 'disponibles'}; se muestran las "
+                   f"primeras {BUSQUEDA_MAX_OPCIONES}, escribe para acotar")
+    disponibles = disponibles.head(BUSQUEDA_MAX_OPCIONES)
+    nombres = dict(zip(disponibles['id'], disponibles['nombre']))
+    col1, col2 = st.columns(2)
+    with col1:
+        nueva_sala = st.selectbox("Seleccionar sala", list(nombres), format_func=nombres.get)
+    with col2:
+        if st.button("➕ Agregar", width="stretch") and nueva_sala:
+            if guardar_cambios_rutas(sup['id'], nueva_sala, {'LUNES': True}):
+                st.toast(f"✅ Sala '{nombres[nueva_sala]}' agregada a la ruta (LUNES)")
+                st.rerun(scope="app")
+
+# Cambios de una fecha: (etiqueta, supervisor afectado, requiere sala, tipo)
+CAMBIOS_AGENDA = {
+    'libre': ("🏖️ Día libre (licencia, vacaciones)", 'supervisor', False, QUITAR),
+    'quitar': ("➖ Quitar una sala", 'supervisor', True, QUITAR),
+    'agregar': ("➕ Agregar una sala", 'supervisor', True, AGREGAR),
+    'feriado': ("🎉 Feriado para todos", TODOS, False, QUITAR),
+}
+
+def descripcion_excepcion(e, nombres: pd.Series) -> str:
+    """Texto corto de un feriado o excepción (fila con COLUMNAS_EXCEPCION)."""
+    if e.sala_id == TODOS:
+        return "🎉 Feriado" if e.supervisor_id == TODOS else "🏖️ Día libre"
+    signo = "➕" if e.tipo == AGREGAR else "➖"
+    return f"{signo} {nombres.get(e.sala_id, e.sala_id)}" + (" (todos)" if e.supervisor_id == TODOS else "")
+
+def mostrar_excepciones_agenda(sup: dict):
+    """Feriados y cambios de fechas puntuales en la agenda del supervisor (sin tocar el plan semanal)."""
     st.markdown("---")
-    st.markdown("### ➕ Agregar Sala")
-    with st.expander("Agregar nueva sala a la ruta"):
+    st.markdown("### 📅 Feriados y excepciones")
+    excepciones = obtener_excepciones_agenda()
+    propias = excepciones[excepciones['supervisor_id'].isin([sup['id'], TODOS])].reset_index(drop=True)
+    catalogo = obtener_catalogo_salas()
+    nombres = catalogo.set_index('id')['nombre']
+    es_admin = st.session_state.usuario['rol'] == 'admin'
+    
+    if propias.empty:
+        st.caption(f"Sin feriados ni excepciones en las próximas {AGENDA_SEMANAS} semanas.")
+    else:
+        descripciones = [descripcion_excepcion(e, nombres) for e in propias.itertuples()]
+        st.dataframe(pd.DataFrame({'Fecha': propias['fecha'], 'Cambio': descripciones, 'Motivo': propias['motivo']}),
+                     width="stretch", hide_index=True)
+        # Los feriados para todos sólo los elimina el administrador
+        eliminables = [i for i in propias.index if es_admin or propias.at[i, 'supervisor_id'] != TODOS]
+        if eliminables:
+            col1, col2 = st.columns([3, 1])
+            with col1:
+                quitar = st.selectbox(
+                    "Eliminar excepción", eliminables, key=f"quitar_excepcion_{sup['id']}", label_visibility="collapsed",
+                    format_func=lambda i: f"{formato_fecha(propias.at[i, 'fecha'])} · {descripciones[i]}",
+                )
+            with col2:
+                if st.button("🗑️ Eliminar", width="stretch", key=f"eliminar_excepcion_{sup['id']}"):
+                    if eliminar_excepcion(propias.loc[quitar]):
+                        st.rerun()
+    
+    with st.expander("➕ Agregar feriado o excepción", key=f"expander_excepcion_{sup['id']}", on_change="rerun") as seccion:
+        if not seccion.open:
+            return
+        mostrar_agregar_excepcion(sup, es_admin)
+
+@st.fragment
+def mostrar_agregar_excepcion(sup: dict, es_admin: bool):
+    """Formulario de una excepción; la sala se busca en el catálogo, como al agregarla a la ruta."""
+    hoy = date.today()
+    catalogo = obtener_catalogo_salas()
+    consulta = st.text_input("🔎 Buscar sala (para quitar o agregar)", type="search", live=BUSQUEDA_ESPERA,
+                             placeholder="Nombre o código", key=f"buscar_sala_excepcion_{sup['id']}")
+    encontradas = filtrar_busqueda(catalogo, 'salas', '*', consulta)
+    if len(encontradas) > BUSQUEDA_MAX_OPCIONES:
+        st.caption(f"{len(encontradas)} salas {'coinciden' if consulta else 'en el catálogo'}; se muestran las "
+                   f"primeras {BUSQUEDA_MAX_OPCIONES}, escribe para acotar")
+    encontradas = encontradas.head(BUSQUEDA_MAX_OPCIONES)
+    nombres = dict(zip(encontradas['id'], encontradas['nombre']))
+    cambios = [c for c in CAMBIOS_AGENDA if es_admin or CAMBIOS_AGENDA[c][1] != TODOS]
+    with st.form(f"excepcion_{sup['id']}", clear_on_submit=True):
         col1, col2 = st.columns(2)
         with col1:
-            nueva_sala = st.selectbox("Seleccionar sala", 
-                ["JUMBO PARQUE ARAUCO", "LIDER MAIPU", "UNIMARC PROVIDENCIA", "TOTTUS LA FLORIDA"])
+            fecha = st.date_input("Fecha", min_value=hoy, max_value=hoy + timedelta(weeks=AGENDA_SEMANAS, days=-1))
+            cambio = st.selectbox("Cambio", cambios, format_func=lambda c: CAMBIOS_AGENDA[c][0])
         with col2:
-            if st.button("➕ Agregar", use_container_width=True):
-                st.success(f"Sala '{nueva_sala}' agregada a la ruta (demo)")
+            sala_id = st.selectbox("Sala (para quitar o agregar)", list(nombres), format_func=nombres.get)
+            motivo = st.text_input("Motivo", placeholder="Ej: inventario, capacitación, Fiestas Patrias")
+        if st.form_submit_button("💾 Guardar excepción", width="stretch"):
+            _, afectado, con_sala, tipo = CAMBIOS_AGENDA[cambio]
+            if fecha.weekday() >= len(DIAS_SEMANA):
+                st.error("❌ Los domingos no hay visitas.")
+            elif con_sala and sala_id is None:
+                st.error("❌ Busca y elige la sala.")
+            elif guardar_excepcion(fecha, sup['id'] if afectado == 'supervisor' else TODOS,
+                                   sala_id if con_sala else TODOS, tipo, motivo.strip()):
+                st.toast(f"✅ {CAMBIOS_AGENDA[cambio][0]} el {formato_fecha(fecha)}")
+                st.rerun(scope="app")
 
 # ================================================================
 # SIDEBAR Y NAVEGACIÓN
@@ -1083,6 +2199,21 @@ def mostrar_sidebar():
         </div>
         """, unsafe_allow_html=True)
         
+        if rol == 'admin':
+            stats = get_almacen_frames().estadisticas()
+            st.caption(
+                f"🧠 Caché de datos: {stats['bytes'] / 2**20:.1f} / {stats['max_bytes'] / 2**20:.0f} MB · "
+                f"{stats['claves']} claves · {stats['frames_unicos']} frames únicos"
+            )
+            bus = get_bus_cambios()
+            st.caption(f"📡 Cambios de otras réplicas: {bus.remotos}" +
+                       (f" · ⚠️ {bus.ultimo_error}" if bus.ultimo_error else ""))
+            perfil = arranque.perfil_proceso()
+            if perfil is not None:
+                errores = perfil.errores()
+                st.caption(f"🚀 Arranque: {sum(f[1] for f in perfil.fases):.1f} s en {len(perfil.fases)} fases" +
+                           (f" · ⚠️ falló: {', '.join(n for n, _ in errores)}" if errores else ""))
+        
         st.markdown("### 📍 Menú")
         st.markdown("")
         
@@ -1129,11 +2260,19 @@ def mostrar_sidebar():
 
 def main():
     """Función principal de la aplicación."""
+    try:
+        get_repositorio()
+    except ConnectionError as e:
+        st.error(f"❌ {e}")  # Sin repositorio no hay login ni páginas; el próximo rerun reintenta
+        return
+    
     inicializar_sesion()
     
     if not st.session_state.autenticado:
         mostrar_login()
-    else:
+        return
+    
+    try:
         mostrar_sidebar()
         
         # Renderizar página según selección
@@ -1143,6 +2282,9 @@ def main():
             pagina_rendir_gastos()
         elif st.session_state.pagina == 'Gestionar Rutas':
             pagina_gestionar_rutas()
+    finally:
+        # También al salir por st.rerun(), que se lanza como excepción
+        persistir_sesion()
 
 if __name__ == "__main__":
     main()
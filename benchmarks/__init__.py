@@ -0,0 +1,9 @@
+"""
+Benchmarks de Castaño Logistics
+===============================
+Suite reproducible que ejecuta las páginas de la app sin navegador
+(Streamlit AppTest) sobre datos sintéticos y backends falsos.
+
+Uso:
+    python -m benchmarks.bench_paginas --help
+"""
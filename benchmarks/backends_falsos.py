@@ -0,0 +1,333 @@
+"""
+Backends falsos para benchmarks.
+Implementaciones de castano.repositorio.Repositorio sobre datos sintéticos
+(en memoria o en SQLite indexado), envueltas en un proxy que inyecta latencia
+por sistema y cuenta las llamadas que hace cada página, sin conexión a GCP.
+"""
+
+import os
+import tempfile
+import threading
+import time
+from collections import Counter
+
+import pandas as pd
+from streamlit.runtime.scriptrunner import get_script_run_ctx
+
+from benchmarks.datos_sinteticos import DIAS, DatasetSintetico, TamanoDataset, generar_dataset
+from castano.repositorio import (COLUMNAS_ALERTA, COLUMNAS_CHECKIN, COLUMNAS_CUENTA, COLUMNAS_EXCEPCION,
+                                 COLUMNAS_EXPORT_PLAN, COLUMNAS_EXPORT_RENDICION, COLUMNAS_JERARQUIA,
+                                 COLUMNAS_ORGANIZACION, COLUMNAS_PLAN, COLUMNAS_RENDICION, COLUMNAS_SALA, Repositorio,
+                                 RepositorioSQLite)
+from castano.usuarios import hashear_password
+
+# Métodos del repositorio servidos por BigQuery; el resto van a Spanner
+METODOS_BIGQUERY = {'insertar_rendicion', 'cargar_rendiciones', 'rendiciones_supervisor', 'iterar_rendiciones',
+                    'registrar_checkins', 'checkins_supervisor', 'iterar_checkins'}
+
+_backend_activo = None
+
+# Contraseña de los usuarios sintéticos 'cargaN' del servidor de carga
+PASSWORD_CARGA = 'carga123'
+
+
+class RepositorioMemoria(Repositorio):
+    """Repositorio con índices precalculados por supervisor y zonal, para aislar el costo de la página."""
+
+    def __init__(self, dataset: DatasetSintetico):
+        self.dataset = dataset
+        ds = dataset
+        orden_dia = {dia: i for i, dia in enumerate(DIAS)}
+        rutas = ds.visitas.merge(ds.salas, left_on='sala_id', right_on='id')
+        rutas = rutas.rename(columns={'nombre': 'sala_nombre'})
+        rutas['_dia'] = rutas['dia_semana'].map(orden_dia)
+        rutas = rutas.sort_values(['supervisor_id', '_dia', 'orden'])
+        columnas = ['dia_semana', 'orden', 'sala_id', 'sala_nombre', 'quintil', 'latitud', 'longitud']
+        self._rutas = {k: g[columnas].reset_index(drop=True) for k, g in rutas.groupby('supervisor_id')}
+        self._rutas_export = {
+            k: g[COLUMNAS_EXPORT_PLAN] for k, g in rutas.groupby('supervisor_id')
+        }
+
+        pivot = rutas.assign(valor=True).pivot_table(
+            index=['supervisor_id', 'sala_id', 'sala_nombre'], columns='dia_semana',
+            values='valor', aggfunc='any', fill_value=False
+        ).reindex(columns=DIAS, fill_value=False).reset_index()
+        pivot.columns.name = None
+        self._editables = {
+            k: g.drop(columns='supervisor_id').reset_index(drop=True)
+            for k, g in pivot.groupby('supervisor_id')
+        }
+
+        zonal_nombre = ds.zonales.set_index('id')['nombre']
+        self._zonal_de = ds.reporta_a.set_index('supervisor_id')['zonal_id'].map(zonal_nombre).to_dict()
+
+        visitas_por_sup = ds.visitas.groupby('supervisor_id').size()
+        equipo = ds.reporta_a.merge(ds.supervisores, left_on='supervisor_id', right_on='id')
+        equipo['total_visitas'] = equipo['id'].map(visitas_por_sup).fillna(0).astype(int)
+        self._equipos = {
+            k: g[['id', 'nombre', 'email', 'total_visitas']].reset_index(drop=True)
+            for k, g in equipo.groupby('zonal_id')
+        }
+
+        rendiciones = ds.rendiciones.sort_values('fecha', ascending=False)
+        self._rendiciones = {
+            k: g.reindex(columns=COLUMNAS_RENDICION).reset_index(drop=True)
+            for k, g in rendiciones.groupby('id_supervisor')
+        }
+        self.rendiciones_insertadas = []
+        self._cuentas = {}
+        self._alertas = {}
+        self.checkins = []
+        self._excepciones = {}
+        self._lock = threading.Lock()
+
+    def rutas_supervisor(self, supervisor_id: str) -> pd.DataFrame:
+        return self._rutas.get(supervisor_id, pd.DataFrame()).copy()
+
+    def rutas_editables(self, supervisor_id: str) -> pd.DataFrame:
+        return self._editables.get(supervisor_id, pd.DataFrame()).copy()
+
+    def guardar_dias_sala(self, supervisor_id: str, sala_id: str, dias: dict) -> None:
+        pass
+
+    def plan_vigente(self, supervisor_ids: list) -> pd.DataFrame:
+        visitas = self.dataset.visitas
+        return visitas[visitas['supervisor_id'].isin(supervisor_ids)][COLUMNAS_PLAN].reset_index(drop=True)
+
+    def aplicar_plan(self, altas: pd.DataFrame, bajas: pd.DataFrame) -> int:
+        return 0
+
+    def zonal_de_supervisor(self, supervisor_id: str) -> str:
+        return self._zonal_de.get(supervisor_id)
+
+    def supervisores_de_zonal(self, zonal_id: str) -> pd.DataFrame:
+        return self._equipos.get(zonal_id, pd.DataFrame()).copy()
+
+    def jerarquia(self) -> pd.DataFrame:
+        ds = self.dataset
+        df = ds.reporta_a.merge(ds.zonales, left_on='zonal_id', right_on='id') \
+            .merge(ds.supervisores, left_on='supervisor_id', right_on='id', suffixes=('_z', '_s'))
+        return df.rename(columns={'nombre_z': 'zonal_nombre', 'nombre_s': 'supervisor_nombre',
+                                  'email': 'supervisor_email'})[COLUMNAS_JERARQUIA]
+
+    def organizacion(self) -> pd.DataFrame:
+        ds = self.dataset
+        visitas = ds.visitas.groupby(['supervisor_id', 'sala_id']).size().rename('visitas').reset_index()
+        visitas['sala_nombre'] = visitas['sala_id'].map(ds.salas.set_index('id')['nombre'])
+        df = self.jerarquia().merge(visitas, on='supervisor_id', how='left')
+        return df.assign(visitas=df['visitas'].fillna(0).astype(int))[COLUMNAS_ORGANIZACION]
+
+    def catalogo_salas(self) -> pd.DataFrame:
+        return self.dataset.salas[COLUMNAS_SALA].copy()
+
+    def cuentas(self) -> pd.DataFrame:
+        with self._lock:
+            return pd.DataFrame(list(self._cuentas.values()), columns=COLUMNAS_CUENTA)
+
+    def guardar_cuentas(self, cuentas: list) -> None:
+        with self._lock:
+            self._cuentas.update({c['usuario']: c for c in cuentas})
+
+    def insertar_rendicion(self, fila: dict) -> None:
+        with self._lock:
+            self.rendiciones_insertadas.append(fila)
+
+    def cargar_rendiciones(self, df: pd.DataFrame) -> int:
+        with self._lock:
+            self.rendiciones_insertadas.extend(df.to_dict('records'))
+        return 1
+
+    def rendiciones_supervisor(self, supervisor_id: str, limite: int = 20) -> pd.DataFrame:
+        return self._rendiciones.get(supervisor_id, pd.DataFrame()).head(limite).copy()
+
+    def guardar_alertas(self, df: pd.DataFrame) -> None:
+        with self._lock:
+            self._alertas.update({a['id_rendicion']: a for a in df[COLUMNAS_ALERTA].to_dict('records')})
+
+    def alertas_rendiciones(self, supervisor_ids: list, estado: str = 'pendiente') -> pd.DataFrame:
+        with self._lock:
+            df = pd.DataFrame(list(self._alertas.values()), columns=COLUMNAS_ALERTA)
+        df = df[df['estado'] == estado]
+        if supervisor_ids is not None:
+            df = df[df['id_supervisor'].isin(supervisor_ids)]
+        return df.sort_values('fecha', ascending=False).reset_index(drop=True)
+
+    def resolver_alertas(self, ids_rendicion: list, estado: str) -> None:
+        with self._lock:
+            for id_ in ids_rendicion:
+                if id_ in self._alertas:
+                    self._alertas[id_]['estado'] = estado
+
+    def registrar_checkins(self, df: pd.DataFrame) -> int:
+        with self._lock:
+            self.checkins.extend(df[COLUMNAS_CHECKIN].to_dict('records'))
+        return 1
+
+    def checkins_supervisor(self, supervisor_id: str, fecha) -> pd.DataFrame:
+        with self._lock:
+            eventos = [e for e in self.checkins if e['id_supervisor'] == supervisor_id and e['fecha'] == fecha]
+        return pd.DataFrame(eventos, columns=COLUMNAS_CHECKIN)
+
+    def excepciones_agenda(self, desde, hasta) -> pd.DataFrame:
+        with self._lock:
+            df = pd.DataFrame(list(self._excepciones.values()), columns=COLUMNAS_EXCEPCION)
+        return df[(df['fecha'] >= desde) & (df['fecha'] <= hasta)].sort_values('fecha', ignore_index=True)
+
+    def guardar_excepciones(self, df: pd.DataFrame) -> None:
+        with self._lock:
+            self._excepciones.update({(e['fecha'], e['supervisor_id'], e['sala_id']): e
+                                      for e in df[COLUMNAS_EXCEPCION].to_dict('records')})
+
+    def eliminar_excepciones(self, df: pd.DataFrame) -> None:
+        with self._lock:
+            for clave in df[['fecha', 'supervisor_id', 'sala_id']].itertuples(index=False, name=None):
+                self._excepciones.pop(clave, None)
+
+    def iterar_plan(self, supervisor_ids: list, tamano_bloque: int):
+        plan = pd.concat([self._rutas_export.get(k) for k in supervisor_ids if k in self._rutas_export] or
+                         [pd.DataFrame(columns=COLUMNAS_EXPORT_PLAN)])
+        for inicio in range(0, len(plan), tamano_bloque):
+            yield plan.iloc[inicio:inicio + tamano_bloque]
+
+    def iterar_rendiciones(self, supervisor_ids: list, desde, hasta, tamano_bloque: int):
+        r = self.dataset.rendiciones
+        r = r[(r['fecha'] >= desde) & (r['fecha'] <= hasta)]
+        if supervisor_ids is not None:
+            r = r[r['id_supervisor'].isin(supervisor_ids)]
+        r = r.sort_values(['fecha', 'id_supervisor'])[COLUMNAS_EXPORT_RENDICION]
+        for inicio in range(0, len(r), tamano_bloque):
+            yield r.iloc[inicio:inicio + tamano_bloque]
+
+    def iterar_checkins(self, supervisor_ids: list, desde, hasta, tamano_bloque: int):
+        with self._lock:
+            c = pd.DataFrame(self.checkins, columns=COLUMNAS_CHECKIN)
+        c = c[(c['fecha'] >= desde) & (c['fecha'] <= hasta)]
+        if supervisor_ids is not None:
+            c = c[c['id_supervisor'].isin(supervisor_ids)]
+        c = c.sort_values(['fecha', 'id_supervisor'])
+        for inicio in range(0, len(c), tamano_bloque):
+            yield c.iloc[inicio:inicio + tamano_bloque]
+
+
+def repositorio_sqlite(dataset: DatasetSintetico, ruta: str = None) -> RepositorioSQLite:
+    """Carga el dataset sintético en un SQLite indexado (archivo temporal por defecto)."""
+    if ruta is None:
+        ruta = os.path.join(tempfile.mkdtemp(prefix="castano_bench_"), "bench.db")
+    repo = RepositorioSQLite(ruta)
+    repo.cargar_dataframe('Zonal', dataset.zonales)
+    repo.cargar_dataframe('Supervisor', dataset.supervisores)
+    repo.cargar_dataframe('Reporta_A', dataset.reporta_a)
+    repo.cargar_dataframe('Sala', dataset.salas)
+    repo.cargar_dataframe('Visita_Planificada', dataset.visitas)
+    rendiciones = dataset.rendiciones.assign(fecha=dataset.rendiciones['fecha'].map(lambda f: f.isoformat()))
+    repo.cargar_dataframe('Fact_Rendicion', rendiciones)
+    repo.analizar()
+    return repo
+
+
+class RepositorioInstrumentado:
+    """Proxy de un Repositorio que agrega latencia por sistema y cuenta llamadas por método.
+
+    `llamadas` son las del hilo del script (las que hace la página y espera el
+    usuario); `llamadas_fondo` las de hilos de refresco (agenda, cumplimiento,
+    exportaciones), que dependen del momento y no sirven para comparar.
+    """
+
+    def __init__(self, repo: Repositorio, dataset: DatasetSintetico,
+                 latencia_spanner: float = 0.0, latencia_bigquery: float = 0.0):
+        self.repo = repo
+        self.dataset = dataset
+        self.latencia_spanner = latencia_spanner
+        self.latencia_bigquery = latencia_bigquery
+        self.llamadas = Counter()
+        self.llamadas_fondo = Counter()
+        self._lock = threading.Lock()
+        # La agenda en disco es del dataset que la generó: el benchmark no lee la de la demo
+        self.directorio_agenda = tempfile.mkdtemp(prefix="castano_agenda_bench_")
+
+    def __getattr__(self, nombre):
+        metodo = getattr(self.repo, nombre)
+        if not callable(metodo):
+            return metodo
+        latencia = self.latencia_bigquery if nombre in METODOS_BIGQUERY else self.latencia_spanner
+
+        def instrumentado(*args, **kwargs):
+            contador = self.llamadas if get_script_run_ctx(suppress_warning=True) else self.llamadas_fondo
+            with self._lock:
+                contador[nombre] += 1
+            if latencia > 0:
+                time.sleep(latencia)
+            return metodo(*args, **kwargs)
+        return instrumentado
+
+    def reiniciar_contadores(self):
+        """Pone a cero los contadores de llamadas."""
+        with self._lock:
+            self.llamadas.clear()
+            self.llamadas_fondo.clear()
+
+
+def crear_backend(dataset: DatasetSintetico, tipo: str = 'memoria', latencia_spanner: float = 0.0,
+                  latencia_bigquery: float = 0.0) -> RepositorioInstrumentado:
+    """Crea el backend instrumentado: 'memoria' (índices precalculados) o 'sqlite' (consultas reales)."""
+    repo = repositorio_sqlite(dataset) if tipo == 'sqlite' else RepositorioMemoria(dataset)
+    return RepositorioInstrumentado(repo, dataset, latencia_spanner, latencia_bigquery)
+
+
+def activar(backend: RepositorioInstrumentado):
+    """Registra el backend que usarán los scripts de benchmark de este proceso."""
+    global _backend_activo
+    _backend_activo = backend
+
+
+def backend_activo() -> RepositorioInstrumentado:
+    """Retorna el backend registrado con activar()."""
+    if _backend_activo is None:
+        raise RuntimeError("No hay backend falso activo; llama a activar() primero")
+    return _backend_activo
+
+
+def instalar(modulo_app, backend: RepositorioInstrumentado = None):
+    """Hace que app_logistics.get_repositorio() retorne el backend falso, con la agenda en su propio directorio."""
+    backend = backend or backend_activo()
+    modulo_app.get_repositorio = lambda: backend
+    modulo_app.AGENDA_DIR = backend.directorio_agenda
+
+
+# ================================================================
+# CONFIGURACIÓN DESDE VARIABLES DE ENTORNO (SERVIDOR DE CARGA)
+# ================================================================
+
+_lock_entorno = threading.Lock()
+
+
+def activar_desde_entorno() -> RepositorioInstrumentado:
+    """Crea y activa una única vez por proceso un backend configurado con CASTANO_BENCH_*."""
+    with _lock_entorno:
+        if _backend_activo is None:
+            entero = lambda nombre, defecto: int(os.environ.get(f"CASTANO_BENCH_{nombre}", defecto))
+            tamano = TamanoDataset(
+                zonales=entero('ZONALES', 3),
+                supervisores=entero('SUPERVISORES', 24),
+                salas=entero('SALAS', 500),
+                visitas=entero('VISITAS', 2000),
+                rendiciones=entero('RENDICIONES', 5000),
+            )
+            activar(crear_backend(
+                generar_dataset(tamano),
+                tipo=os.environ.get('CASTANO_BENCH_BACKEND', 'memoria'),
+                latencia_spanner=float(os.environ.get('CASTANO_BENCH_LATENCIA_SPANNER_MS', 0)) / 1000,
+                latencia_bigquery=float(os.environ.get('CASTANO_BENCH_LATENCIA_BIGQUERY_MS', 0)) / 1000,
+            ))
+            registrar_usuarios_carga(_backend_activo)
+    return _backend_activo
+
+
+def registrar_usuarios_carga(backend: RepositorioInstrumentado, password: str = PASSWORD_CARGA):
+    """Da de alta una cuenta 'cargaN' por cada supervisor sintético."""
+    # Un solo hash para todas: el login sigue pagando el KDF completo y el alta no tarda minutos
+    password_hash = hashear_password(password)
+    backend.repo.guardar_cuentas([
+        {'usuario': f"carga{i}", 'id': sup.id, 'nombre': sup.nombre, 'rol': 'supervisor', 'password_hash': password_hash}
+        for i, sup in enumerate(backend.dataset.supervisores.itertuples())
+    ])
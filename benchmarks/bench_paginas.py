@@ -0,0 +1,335 @@
+"""
+Benchmark de páginas
+====================
+Ejecuta pagina_mi_ruta, pagina_rendir_gastos, pagina_gestionar_rutas (como
+zonal y como administrador, en el explorador de la organización) y
+mostrar_detalle_supervisor con Streamlit AppTest sobre un repositorio falso
+(en memoria o SQLite indexado),
+mide latencia de rerun, memoria y número de llamadas al backend, y compara
+contra un baseline guardado.
+
+Uso:
+    python -m benchmarks.bench_paginas
+    python -m benchmarks.bench_paginas --salas 5000 --visitas 40000 --latencia-spanner-ms 15
+    python -m benchmarks.bench_paginas --backend sqlite --visitas 200000
+    python -m benchmarks.bench_paginas --guardar-baseline
+
+Retorna código de salida 1 si hay regresión respecto al baseline.
+"""
+
+import argparse
+import gc
+import json
+import statistics
+import sys
+import time
+import tracemalloc
+from dataclasses import asdict
+from pathlib import Path
+
+from streamlit.testing.v1 import AppTest
+
+from benchmarks import backends_falsos
+from benchmarks.datos_sinteticos import TamanoDataset, generar_dataset
+
+RAIZ = Path(__file__).resolve().parent.parent
+BASELINE_DEFECTO = Path(__file__).resolve().parent / "baseline.json"
+MEDICIONES_MEMORIA = 3  # Reruns con tracemalloc por escenario; se reporta la mediana del pico
+
+# Script mínimo que AppTest ejecuta en cada rerun: instala el backend falso y dibuja la página
+SCRIPT_PAGINA = """
+import sys
+sys.path.insert(0, {raiz!r})
+import app_logistics
+from benchmarks import backends_falsos
+backends_falsos.instalar(app_logistics)
+app_logistics.{pagina}()
+"""
+
+
+# ================================================================
+# ESCENARIOS
+# ================================================================
+
+class Escenario:
+    """Página a medir, estado de sesión inicial e interacción de cada rerun."""
+
+    nombre = ""
+    pagina = ""
+
+    def __init__(self, backend: backends_falsos.RepositorioInstrumentado):
+        self.backend = backend
+
+    def estado_inicial(self) -> dict:
+        raise NotImplementedError
+
+    def interactuar(self, at: AppTest, i: int):
+        """Aplica la interacción i-ésima y ejecuta el rerun."""
+        at.run()
+
+
+def _supervisor_con_mas_visitas(backend) -> str:
+    return backend.dataset.visitas['supervisor_id'].value_counts().idxmax()
+
+
+def _usuario_supervisor(backend) -> dict:
+    sup_id = _supervisor_con_mas_visitas(backend)
+    nombre = backend.dataset.supervisores.set_index('id').loc[sup_id, 'nombre']
+    return {'username': 'bench', 'nombre': nombre, 'id': sup_id, 'rol': 'supervisor'}
+
+
+class EscenarioMiRuta(Escenario):
+    nombre = "mi_ruta"
+    pagina = "pagina_mi_ruta"
+
+    def estado_inicial(self) -> dict:
+        return {'usuario': _usuario_supervisor(self.backend)}
+
+    def interactuar(self, at: AppTest, i: int):
+        selector = at.selectbox[0]
+        selector.select(selector.options[i % len(selector.options)]).run()
+
+
+class EscenarioRendirGastos(Escenario):
+    nombre = "rendir_gastos"
+    pagina = "pagina_rendir_gastos"
+
+    def estado_inicial(self) -> dict:
+        return {'usuario': _usuario_supervisor(self.backend)}
+
+    def interactuar(self, at: AppTest, i: int):
+        at.number_input[0].set_value(1000 + 500 * i)
+        at.button[0].click().run()
+
+
+class EscenarioGestionarRutas(Escenario):
+    nombre = "gestionar_rutas"
+    pagina = "pagina_gestionar_rutas"
+
+    def estado_inicial(self) -> dict:
+        zonal_id = self.backend.dataset.reporta_a['zonal_id'].value_counts().idxmax()
+        return {
+            'usuario': {'username': 'bench', 'nombre': 'Zonal Bench', 'id': zonal_id, 'rol': 'zonal'},
+            'supervisor_seleccionado': None,
+        }
+
+
+class EscenarioDetalleSupervisor(Escenario):
+    nombre = "detalle_supervisor"
+    pagina = "mostrar_detalle_supervisor"
+
+    def estado_inicial(self) -> dict:
+        sup = _usuario_supervisor(self.backend)
+        return {
+            'usuario': {'username': 'bench', 'nombre': 'Zonal Bench', 'id': 'z00000', 'rol': 'zonal'},
+            'supervisor_seleccionado': {'id': sup['id'], 'nombre': sup['nombre']},
+        }
+
+    def interactuar(self, at: AppTest, i: int):
+        casilla = at.checkbox[i % len(at.checkbox)]
+        casilla.set_value(not casilla.value)
+        boton_guardar = next(b for b in at.button if 'GUARDAR' in b.label)
+        boton_guardar.click().run()
+
+
+class EscenarioExplorador(Escenario):
+    nombre = "explorador"
+    pagina = "pagina_gestionar_rutas"
+
+    def estado_inicial(self) -> dict:
+        return {
+            'usuario': {'username': 'bench', 'nombre': 'Admin Bench', 'id': 'admin000', 'rol': 'admin'},
+            'supervisor_seleccionado': None,
+        }
+
+    def interactuar(self, at: AppTest, i: int):
+        # País → zonal → supervisor, recorriendo distintos supervisores
+        fila = self.backend.dataset.reporta_a.iloc[(i // 3) % len(self.backend.dataset.reporta_a)]
+        nivel = i % 3
+        at.session_state['explorador_zonal'] = {'id': fila['zonal_id'], 'nombre': "Zonal"} if nivel else None
+        at.session_state['explorador_supervisor'] = (
+            {'id': fila['supervisor_id'], 'nombre': "Supervisor"} if nivel == 2 else None
+        )
+        at.run()
+
+
+ESCENARIOS = {e.nombre: e for e in [
+    EscenarioMiRuta, EscenarioRendirGastos, EscenarioGestionarRutas, EscenarioDetalleSupervisor, EscenarioExplorador
+]}
+
+
+# ================================================================
+# MEDICIÓN
+# ================================================================
+
+def _percentil(valores: list, p: float) -> float:
+    ordenados = sorted(valores)
+    idx = min(len(ordenados) - 1, max(0, round(p / 100 * (len(ordenados) - 1))))
+    return ordenados[idx]
+
+
+def medir_escenario(escenario: Escenario, repeticiones: int, timeout: float) -> dict:
+    """Mide la primera ejecución, los reruns y el pico de memoria de un escenario."""
+    at = AppTest.from_string(SCRIPT_PAGINA.format(raiz=str(RAIZ), pagina=escenario.pagina), default_timeout=timeout)
+    for clave, valor in escenario.estado_inicial().items():
+        at.session_state[clave] = valor
+
+    backend = escenario.backend
+    backend.reiniciar_contadores()
+    inicio = time.perf_counter()
+    at.run()
+    primera_ms = (time.perf_counter() - inicio) * 1000
+    if at.exception:
+        raise RuntimeError(f"{escenario.nombre}: la página lanzó una excepción: {at.exception[0].message}")
+    llamadas_primera = dict(backend.llamadas)
+
+    backend.reiniciar_contadores()
+    tiempos = []
+    for i in range(repeticiones):
+        inicio = time.perf_counter()
+        escenario.interactuar(at, i)
+        tiempos.append((time.perf_counter() - inicio) * 1000)
+    llamadas_rerun = {k: v / repeticiones for k, v in backend.llamadas.items()}
+    llamadas_fondo = {k: v / repeticiones for k, v in backend.llamadas_fondo.items()}
+
+    # tracemalloc también cuenta lo que asignan los hilos de refresco: la mediana de
+    # varios reruns descarta el que coincide con uno de ellos
+    picos = []
+    for i in range(MEDICIONES_MEMORIA):
+        gc.collect()
+        tracemalloc.start()
+        try:
+            escenario.interactuar(at, repeticiones + i)
+            picos.append(tracemalloc.get_traced_memory()[1])
+        finally:
+            tracemalloc.stop()
+
+    return {
+        'primera_ejecucion_ms': round(primera_ms, 2),
+        'mediana_ms': round(statistics.median(tiempos), 2),
+        'p95_ms': round(_percentil(tiempos, 95), 2),
+        'memoria_pico_kb': round(statistics.median(picos) / 1024, 1),
+        'llamadas_primera_ejecucion': llamadas_primera,
+        'llamadas_por_rerun': llamadas_rerun,
+        'llamadas_fondo_por_rerun': llamadas_fondo,  # Sólo informativo: depende de los hilos de refresco
+    }
+
+
+def comparar_con_baseline(resultados: dict, baseline: dict, tolerancia: float, margen_ms: float) -> list:
+    """Retorna la lista de regresiones encontradas respecto al baseline.
+
+    La latencia se compara por mediana con un margen absoluto para absorber el ruido
+    de reruns de pocos milisegundos; el p95 se reporta pero no se evalúa. Las
+    llamadas se comparan exactas, pero sólo las del hilo del script: las de los
+    hilos de refresco dependen del momento en que corren.
+    """
+    regresiones = []
+    for nombre, actual in resultados['escenarios'].items():
+        base = baseline.get('escenarios', {}).get(nombre)
+        if base is None:
+            continue
+        for metrica, margen in (('mediana_ms', margen_ms), ('memoria_pico_kb', 0)):
+            limite = base[metrica] * (1 + tolerancia) + margen
+            if actual[metrica] > limite:
+                regresiones.append(f"{nombre}.{metrica}: {actual[metrica]} > {limite:.1f} (baseline {base[metrica]})")
+        for tipo in ('llamadas_primera_ejecucion', 'llamadas_por_rerun'):
+            for funcion, n in actual[tipo].items():
+                n_base = base[tipo].get(funcion, 0)
+                if n > n_base:
+                    regresiones.append(f"{nombre}.{tipo}.{funcion}: {n} llamadas > {n_base} (baseline)")
+    return regresiones
+
+
+def ejecutar(args) -> dict:
+    tamano = TamanoDataset(
+        zonales=args.zonales, supervisores=args.supervisores, salas=args.salas,
+        visitas=args.visitas, rendiciones=args.rendiciones, semilla=args.semilla,
+    )
+    backend = backends_falsos.crear_backend(
+        generar_dataset(tamano),
+        tipo=args.backend,
+        latencia_spanner=args.latencia_spanner_ms / 1000,
+        latencia_bigquery=args.latencia_bigquery_ms / 1000,
+    )
+    backends_falsos.activar(backend)
+
+    resultados = {
+        'configuracion': {
+            'dataset': asdict(tamano),
+            'backend': args.backend,
+            'latencia_spanner_ms': args.latencia_spanner_ms,
+            'latencia_bigquery_ms': args.latencia_bigquery_ms,
+            'repeticiones': args.repeticiones,
+        },
+        'escenarios': {},
+    }
+    for nombre in args.escenarios:
+        escenario = ESCENARIOS[nombre](backend)
+        resultados['escenarios'][nombre] = medir_escenario(escenario, args.repeticiones, args.timeout)
+    return resultados
+
+
+def imprimir_resultados(resultados: dict):
+    print(f"{'Escenario':<22}{'1ª ejec (ms)':>14}{'mediana (ms)':>14}{'p95 (ms)':>10}{'mem (KB)':>11}  llamadas/rerun")
+    for nombre, r in resultados['escenarios'].items():
+        llamadas = ", ".join(f"{k}={v:g}" for k, v in sorted(r['llamadas_por_rerun'].items()))
+        fondo = ", ".join(f"{k}={v:g}" for k, v in sorted(r.get('llamadas_fondo_por_rerun', {}).items()))
+        if fondo:
+            llamadas += f" (fondo: {fondo})"
+        print(f"{nombre:<22}{r['primera_ejecucion_ms']:>14.1f}{r['mediana_ms']:>14.1f}{r['p95_ms']:>10.1f}"
+              f"{r['memoria_pico_kb']:>11.0f}  {llamadas}")
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark headless de las páginas de Castaño Logistics")
+    parser.add_argument('--zonales', type=int, default=3)
+    parser.add_argument('--supervisores', type=int, default=24)
+    parser.add_argument('--salas', type=int, default=500)
+    parser.add_argument('--visitas', type=int, default=2000)
+    parser.add_argument('--rendiciones', type=int, default=5000)
+    parser.add_argument('--semilla', type=int, default=42)
+    parser.add_argument('--backend', choices=['memoria', 'sqlite'], default='memoria',
+                        help="memoria: índices precalculados; sqlite: consultas reales sobre SQLite indexado")
+    parser.add_argument('--latencia-spanner-ms', type=float, default=0.0)
+    parser.add_argument('--latencia-bigquery-ms', type=float, default=0.0)
+    parser.add_argument('--repeticiones', type=int, default=20)
+    parser.add_argument('--timeout', type=float, default=60.0, help="Timeout por rerun en segundos")
+    parser.add_argument('--escenarios', nargs='+', choices=list(ESCENARIOS), default=list(ESCENARIOS))
+    parser.add_argument('--baseline', type=Path, default=BASELINE_DEFECTO)
+    parser.add_argument('--guardar-baseline', action='store_true', help="Sobrescribe el baseline con esta ejecución")
+    parser.add_argument('--tolerancia', type=float, default=0.50, help="Regresión tolerada en latencia y memoria (0.50 = 50%%)")
+    parser.add_argument('--margen-ms', type=float, default=10.0, help="Margen absoluto de latencia antes de declarar regresión")
+    parser.add_argument('--json', type=Path, help="Guarda los resultados en este archivo")
+    args = parser.parse_args(argv)
+
+    resultados = ejecutar(args)
+    imprimir_resultados(resultados)
+
+    if args.json:
+        args.json.write_text(json.dumps(resultados, indent=2, ensure_ascii=False))
+
+    if args.guardar_baseline:
+        args.baseline.write_text(json.dumps(resultados, indent=2, ensure_ascii=False) + "\n")
+        print(f"\nBaseline guardado en {args.baseline}")
+        return 0
+
+    if not args.baseline.exists():
+        print(f"\nSin baseline en {args.baseline}; ejecuta con --guardar-baseline para crearlo.")
+        return 0
+
+    baseline = json.loads(args.baseline.read_text())
+    if baseline.get('configuracion') != resultados['configuracion']:
+        print("\n⚠️ La configuración difiere del baseline; la comparación puede no ser válida.")
+
+    regresiones = comparar_con_baseline(resultados, baseline, args.tolerancia, args.margen_ms)
+    if regresiones:
+        print("\n❌ Regresiones respecto al baseline:")
+        for r in regresiones:
+            print(f"  - {r}")
+        return 1
+    print("\n✅ Sin regresiones respecto al baseline")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,354 @@
+"""
+Prueba de carga
+===============
+Simula N supervisores concurrentes contra un servidor Streamlit local que
+ejecuta app_logistics.py con Spanner/BigQuery falsos (benchmarks/servidor_stub.py).
+
+Cada usuario habla el protocolo websocket de Streamlit (/_stcore/stream) igual
+que un navegador y sigue el guion: login → ver ruta → cambiar día → rendir
+2 gastos → ver historial. Se reporta throughput, percentiles de latencia por
+acción y CPU/memoria del servidor por usuario, para dimensionar cada réplica.
+
+Uso:
+    python -m benchmarks.carga --usuarios 1 5 10 25 50
+    python -m benchmarks.carga --url ws://127.0.0.1:8501 --pid 1234 --usuarios 20
+
+Requiere el paquete `websockets`.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import subprocess
+import sys
+import time
+import urllib.request
+from collections import defaultdict
+from pathlib import Path
+
+from streamlit.proto.BackMsg_pb2 import BackMsg
+from streamlit.proto.ForwardMsg_pb2 import ForwardMsg
+from streamlit.proto.Selectbox_pb2 import Selectbox
+from streamlit.proto.WidgetStates_pb2 import WidgetState
+
+from benchmarks.backends_falsos import PASSWORD_CARGA
+
+RAIZ = Path(__file__).resolve().parent.parent
+SCRIPT_SERVIDOR = Path(__file__).resolve().parent / "servidor_stub.py"
+
+# Las versiones recientes de Streamlit envían el valor del selectbox como texto
+SELECTBOX_POR_VALOR = 'raw_value' in Selectbox.DESCRIPTOR.fields_by_name
+
+
+# ================================================================
+# CLIENTE DEL PROTOCOLO STREAMLIT
+# ================================================================
+
+class ClienteStreamlit:
+    """Sesión de navegador simulada sobre el websocket de Streamlit."""
+
+    def __init__(self, url: str, timeout: float):
+        self.url = url.rstrip('/') + '/_stcore/stream'
+        self.timeout = timeout
+        self.ws = None
+        self.widgets = {}   # (tipo, label) -> proto del widget del último rerun
+        self.estados = {}   # id -> WidgetState persistente (no triggers)
+
+    async def conectar(self):
+        import websockets
+        self.ws = await websockets.connect(self.url, subprotocols=['streamlit'], max_size=None)
+
+    async def cerrar(self):
+        if self.ws is not None:
+            await self.ws.close()
+
+    def widget(self, tipo: str, texto: str):
+        """Busca un widget del último rerun por tipo y parte de su label."""
+        for (t, label), proto in self.widgets.items():
+            if t == tipo and texto in label:
+                return proto
+        raise LookupError(f"No se encontró {tipo} con label '{texto}'")
+
+    def fijar(self, proto, **valor):
+        """Fija el valor persistente de un widget (p. ej. string_value='x')."""
+        estado = WidgetState(id=proto.id, **valor)
+        self.estados[proto.id] = estado
+
+    async def rerun(self, triggers=()) -> float:
+        """Envía un rerun con los estados actuales y espera a que el script termine."""
+        msg = BackMsg()
+        estados = list(self.estados.values()) + [WidgetState(id=t.id, trigger_value=True) for t in triggers]
+        msg.rerun_script.widget_states.widgets.extend(estados)
+        inicio = time.perf_counter()
+        await self.ws.send(msg.SerializeToString())
+        await asyncio.wait_for(self._esperar_fin(), self.timeout)
+        return time.perf_counter() - inicio
+
+    async def _esperar_fin(self):
+        while True:
+            fwd = ForwardMsg()
+            fwd.ParseFromString(await self.ws.recv())
+            tipo = fwd.WhichOneof('type')
+            if tipo == 'new_session':
+                self.widgets = {}
+            elif tipo == 'delta' and fwd.delta.WhichOneof('type') == 'new_element':
+                elemento = fwd.delta.new_element
+                clase = elemento.WhichOneof('type')
+                proto = getattr(elemento, clase)
+                if getattr(proto, 'id', '') and hasattr(proto, 'label'):
+                    self.widgets[(clase, proto.label)] = proto
+                elif clase == 'exception':
+                    raise RuntimeError(f"Excepción en el servidor: {proto.message}")
+            elif tipo == 'script_finished':
+                if fwd.script_finished == ForwardMsg.FINISHED_SUCCESSFULLY:
+                    return
+                if fwd.script_finished == ForwardMsg.FINISHED_WITH_COMPILE_ERROR:
+                    raise RuntimeError("Error de compilación en el script del servidor")
+
+
+# ================================================================
+# GUION DE UN SUPERVISOR
+# ================================================================
+
+async def guion_supervisor(cliente: ClienteStreamlit, usuario: str, pausa: float, registrar):
+    """Login, ver ruta, cambiar día, rendir 2 gastos y ver historial."""
+
+    async def paso(accion: str, triggers=()):
+        registrar(accion, await cliente.rerun(triggers))
+        if pausa > 0:
+            await asyncio.sleep(random.uniform(0.5, 1.5) * pausa)
+
+    await paso('carga_inicial')
+
+    cliente.fijar(cliente.widget('text_input', 'Usuario'), string_value=usuario)
+    cliente.fijar(cliente.widget('text_input', 'Contraseña'), string_value=PASSWORD_CARGA)
+    await paso('login', [cliente.widget('button', 'INGRESAR')])
+    cliente.estados.clear()
+
+    await paso('ver_ruta', [cliente.widget('button', 'Ver Mi Ruta')])
+
+    selector = cliente.widget('selectbox', 'Seleccionar día')
+    if len(selector.options) > 1:
+        if SELECTBOX_POR_VALOR:
+            cliente.fijar(selector, string_value=selector.options[1])
+        else:
+            cliente.fijar(selector, int_value=1)
+    await paso('cambiar_dia')
+
+    await paso('abrir_rendiciones', [cliente.widget('button', 'Rendir Gastos')])
+    for monto in (12000, 8500):
+        cliente.fijar(cliente.widget('number_input', 'Monto'), double_value=monto)
+        await paso('rendicion', [cliente.widget('button', 'Registrar Rendición')])
+
+    await paso('ver_historial', [cliente.widget('button', 'Rendir Gastos')])
+
+
+# ================================================================
+# SERVIDOR Y MÉTRICAS DE PROCESO
+# ================================================================
+
+class ServidorLocal:
+    """Lanza benchmarks/servidor_stub.py con `streamlit run` y espera el health check."""
+
+    def __init__(self, puerto: int, entorno: dict):
+        self.puerto = puerto
+        self.entorno = entorno
+        self.proceso = None
+
+    @property
+    def url(self) -> str:
+        return f"ws://127.0.0.1:{self.puerto}"
+
+    def __enter__(self):
+        env = dict(os.environ, **self.entorno)
+        self.proceso = subprocess.Popen(
+            [sys.executable, '-m', 'streamlit', 'run', str(SCRIPT_SERVIDOR),
+             '--server.port', str(self.puerto), '--server.headless', 'true',
+             '--browser.gatherUsageStats', 'false'],
+            cwd=RAIZ, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+        )
+        limite = time.time() + 60
+        while time.time() < limite:
+            try:
+                with urllib.request.urlopen(f"http://127.0.0.1:{self.puerto}/_stcore/health", timeout=1) as r:
+                    if r.status == 200:
+                        return self
+            except OSError:
+                time.sleep(0.2)
+        self.__exit__(None, None, None)
+        raise RuntimeError("El servidor Streamlit no respondió al health check")
+
+    def __exit__(self, *exc):
+        if self.proceso is not None:
+            self.proceso.terminate()
+            self.proceso.wait(timeout=10)
+
+
+def uso_proceso(pid: int) -> dict:
+    """CPU acumulada (s) y memoria residente (MB) de un proceso, leídas de /proc."""
+    with open(f"/proc/{pid}/stat") as f:
+        campos = f.read().rsplit(')', 1)[1].split()
+    ticks = os.sysconf('SC_CLK_TCK')
+    cpu = (int(campos[11]) + int(campos[12])) / ticks
+    rss_mb = 0.0
+    with open(f"/proc/{pid}/status") as f:
+        for linea in f:
+            if linea.startswith('VmRSS:'):
+                rss_mb = int(linea.split()[1]) / 1024
+    return {'cpu_s': cpu, 'rss_mb': rss_mb}
+
+
+# ================================================================
+# EJECUCIÓN DE UN NIVEL DE CARGA
+# ================================================================
+
+def _percentil(valores: list, p: float) -> float:
+    ordenados = sorted(valores)
+    idx = min(len(ordenados) - 1, max(0, round(p / 100 * (len(ordenados) - 1))))
+    return ordenados[idx]
+
+
+async def ejecutar_nivel(url: str, usuarios: int, total_usuarios_carga: int, args, pid=None) -> dict:
+    """Ejecuta `usuarios` guiones concurrentes y resume latencias y uso del servidor."""
+    latencias = defaultdict(list)
+    errores = []
+
+    def registrar(accion, segundos):
+        latencias[accion].append(segundos * 1000)
+
+    async def usuario(i: int):
+        await asyncio.sleep(args.rampa_s * i / max(usuarios, 1))
+        cliente = ClienteStreamlit(url, args.timeout)
+        try:
+            await cliente.conectar()
+            for _ in range(args.iteraciones):
+                await guion_supervisor(cliente, f"carga{i % total_usuarios_carga}", args.pausa_s, registrar)
+        except Exception as e:
+            errores.append(f"usuario {i}: {type(e).__name__}: {e}")
+        finally:
+            await cliente.cerrar()
+
+    uso_antes = uso_proceso(pid) if pid else None
+    inicio = time.perf_counter()
+    await asyncio.gather(*(usuario(i) for i in range(usuarios)))
+    duracion = time.perf_counter() - inicio
+    uso_despues = uso_proceso(pid) if pid else None
+
+    acciones = sum(len(v) for v in latencias.values())
+    todas = [x for v in latencias.values() for x in v]
+    resultado = {
+        'usuarios': usuarios,
+        'duracion_s': round(duracion, 2),
+        'acciones': acciones,
+        'throughput_acciones_s': round(acciones / duracion, 2) if duracion else 0.0,
+        'errores': errores,
+        'latencia_ms': {
+            accion: {
+                'n': len(v),
+                'p50': round(_percentil(v, 50), 1),
+                'p95': round(_percentil(v, 95), 1),
+                'p99': round(_percentil(v, 99), 1),
+            }
+            for accion, v in sorted(latencias.items())
+        },
+    }
+    if todas:
+        resultado['p95_global_ms'] = round(_percentil(todas, 95), 1)
+    if uso_antes and uso_despues:
+        cpu = uso_despues['cpu_s'] - uso_antes['cpu_s']
+        resultado['servidor'] = {
+            'cpu_s': round(cpu, 2),
+            'cpu_s_por_usuario': round(cpu / usuarios, 3),
+            'cpu_utilizacion': round(cpu / duracion, 2) if duracion else 0.0,
+            'rss_mb': round(uso_despues['rss_mb'], 1),
+            'rss_mb_por_usuario': round((uso_despues['rss_mb'] - uso_antes['rss_mb']) / usuarios, 2),
+        }
+    return resultado
+
+
+def imprimir_nivel(r: dict):
+    print(f"\n👥 {r['usuarios']} usuarios — {r['acciones']} acciones en {r['duracion_s']} s "
+          f"({r['throughput_acciones_s']} acciones/s)")
+    print(f"   {'acción':<20}{'n':>6}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+    for accion, m in r['latencia_ms'].items():
+        print(f"   {accion:<20}{m['n']:>6}{m['p50']:>10.1f}{m['p95']:>10.1f}{m['p99']:>10.1f}")
+    if 'servidor' in r:
+        s = r['servidor']
+        print(f"   servidor: CPU {s['cpu_s']} s ({s['cpu_s_por_usuario']} s/usuario, utilización {s['cpu_utilizacion']}), "
+              f"RSS {s['rss_mb']} MB ({s['rss_mb_por_usuario']:+} MB/usuario)")
+    if r['errores']:
+        print(f"   ❌ {len(r['errores'])} errores, p. ej.: {r['errores'][0]}")
+
+
+def capacidad_por_replica(niveles: list, slo_p95_ms: float):
+    """Mayor nivel de usuarios que cumple el SLO de p95 sin errores."""
+    validos = [r['usuarios'] for r in niveles
+               if not r['errores'] and r.get('p95_global_ms', float('inf')) <= slo_p95_ms]
+    return max(validos) if validos else None
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Prueba de carga de Castaño Logistics con usuarios concurrentes")
+    parser.add_argument('--usuarios', type=int, nargs='+', default=[1, 5, 10, 25],
+                        help="Niveles de concurrencia a ejecutar en orden")
+    parser.add_argument('--iteraciones', type=int, default=1, help="Veces que cada usuario repite el guion")
+    parser.add_argument('--pausa-s', type=float, default=1.0, help="Tiempo de reflexión medio entre acciones")
+    parser.add_argument('--rampa-s', type=float, default=5.0, help="Tiempo en que se conectan todos los usuarios")
+    parser.add_argument('--timeout', type=float, default=60.0, help="Timeout por acción en segundos")
+    parser.add_argument('--slo-p95-ms', type=float, default=1000.0, help="SLO de p95 para estimar capacidad")
+    parser.add_argument('--url', help="Servidor ya levantado (ws://host:puerto); por defecto se lanza uno local")
+    parser.add_argument('--pid', type=int, help="PID del servidor externo para medir CPU/memoria")
+    parser.add_argument('--puerto', type=int, default=8765)
+    parser.add_argument('--supervisores', type=int, default=200)
+    parser.add_argument('--salas', type=int, default=3000)
+    parser.add_argument('--visitas', type=int, default=12000)
+    parser.add_argument('--rendiciones', type=int, default=50000)
+    parser.add_argument('--backend', choices=['memoria', 'sqlite'], default='memoria')
+    parser.add_argument('--latencia-spanner-ms', type=float, default=20.0)
+    parser.add_argument('--latencia-bigquery-ms', type=float, default=150.0)
+    parser.add_argument('--sin-calentamiento', action='store_true', help="No ejecutar el guion de calentamiento")
+    parser.add_argument('--json', type=Path, help="Guarda los resultados en este archivo")
+    args = parser.parse_args(argv)
+
+    def correr(url, pid):
+        if not args.sin_calentamiento:
+            # Un guion descartado para que la carga del dataset y las importaciones no cuenten
+            asyncio.run(ejecutar_nivel(url, 1, args.supervisores, args))
+        niveles = []
+        for n in args.usuarios:
+            resultado = asyncio.run(ejecutar_nivel(url, n, args.supervisores, args, pid))
+            imprimir_nivel(resultado)
+            niveles.append(resultado)
+        return niveles
+
+    if args.url:
+        niveles = correr(args.url, args.pid)
+    else:
+        entorno = {
+            'CASTANO_BENCH_SUPERVISORES': str(args.supervisores),
+            'CASTANO_BENCH_SALAS': str(args.salas),
+            'CASTANO_BENCH_VISITAS': str(args.visitas),
+            'CASTANO_BENCH_RENDICIONES': str(args.rendiciones),
+            'CASTANO_BENCH_BACKEND': args.backend,
+            'CASTANO_BENCH_LATENCIA_SPANNER_MS': str(args.latencia_spanner_ms),
+            'CASTANO_BENCH_LATENCIA_BIGQUERY_MS': str(args.latencia_bigquery_ms),
+        }
+        with ServidorLocal(args.puerto, entorno) as servidor:
+            niveles = correr(servidor.url, servidor.proceso.pid)
+
+    capacidad = capacidad_por_replica(niveles, args.slo_p95_ms)
+    if capacidad is None:
+        print(f"\n⚠️ Ningún nivel cumple p95 ≤ {args.slo_p95_ms:.0f} ms sin errores")
+    else:
+        print(f"\n📈 Capacidad estimada por réplica: {capacidad} usuarios concurrentes (p95 ≤ {args.slo_p95_ms:.0f} ms)")
+
+    if args.json:
+        args.json.write_text(json.dumps({'niveles': niveles, 'capacidad_por_replica': capacidad},
+                                        indent=2, ensure_ascii=False))
+    return 0 if all(not r['errores'] for r in niveles) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
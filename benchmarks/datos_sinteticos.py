@@ -0,0 +1,96 @@
+"""
+Generador de datasets sintéticos para benchmarks.
+Produce zonales, supervisores, salas, visitas planificadas y rendiciones
+con la misma forma que las tablas de Spanner/BigQuery.
+"""
+
+from dataclasses import dataclass
+from datetime import date, timedelta
+
+import numpy as np
+import pandas as pd
+
+DIAS = ['LUNES', 'MARTES', 'MIERCOLES', 'JUEVES', 'VIERNES', 'SABADO']
+CATEGORIAS = ['TRANSPORTE', 'ALIMENTACION', 'MATERIALES', 'OTROS']
+CADENAS = ['TOT', 'S10', 'UNI', 'JUMBO', 'LIDER', 'ACUENTA', 'SANTA ISABEL']
+HORARIOS = {'ACUENTA': ('10:00', '20:00'), 'SANTA ISABEL': ('08:30', '21:30')}  # El resto sin horario informado
+CALLES = ['WALKER MARTINEZ', 'ROJAS MAGALLANES', 'KENNEDY', 'PAJARITOS', 'VICUÑA MACKENNA', 'GRAN AVENIDA']
+
+
+@dataclass
+class TamanoDataset:
+    """Tamaño del dataset sintético."""
+    zonales: int = 3
+    supervisores: int = 24
+    salas: int = 500
+    visitas: int = 2000
+    rendiciones: int = 5000
+    semilla: int = 42
+
+
+@dataclass
+class DatasetSintetico:
+    """Tablas sintéticas con el esquema de la base de datos."""
+    zonales: pd.DataFrame
+    supervisores: pd.DataFrame
+    reporta_a: pd.DataFrame
+    salas: pd.DataFrame
+    visitas: pd.DataFrame
+    rendiciones: pd.DataFrame
+
+
+def generar_dataset(tamano: TamanoDataset) -> DatasetSintetico:
+    """Genera un dataset sintético reproducible del tamaño indicado."""
+    rng = np.random.default_rng(tamano.semilla)
+
+    zonales = pd.DataFrame({
+        'id': [f"z{i:05d}" for i in range(tamano.zonales)],
+        'nombre': [f"Zonal {i}" for i in range(tamano.zonales)],
+    })
+
+    supervisores = pd.DataFrame({
+        'id': [f"s{i:07d}" for i in range(tamano.supervisores)],
+        'nombre': [f"Supervisor {i}" for i in range(tamano.supervisores)],
+        'email': [f"supervisor{i}@castano.cl" for i in range(tamano.supervisores)],
+    })
+
+    reporta_a = pd.DataFrame({
+        'supervisor_id': supervisores['id'],
+        'zonal_id': zonales['id'].to_numpy()[np.arange(tamano.supervisores) % tamano.zonales],
+    })
+
+    cadenas = rng.choice(CADENAS, tamano.salas)
+    calles = rng.choice(CALLES, tamano.salas)
+    numeros = rng.integers(1, 999, tamano.salas)
+    salas = pd.DataFrame({
+        'id': [f"sala{i:07d}" for i in range(tamano.salas)],
+        'nombre': [f"{c} {ca} / {n}" for c, ca, n in zip(cadenas, calles, numeros)],
+        'quintil': rng.integers(1, 6, tamano.salas),
+        'latitud': rng.uniform(-33.65, -33.30, tamano.salas).round(5),
+        'longitud': rng.uniform(-70.85, -70.50, tamano.salas).round(5),
+        'hora_apertura': [HORARIOS.get(c, (None, None))[0] for c in cadenas],
+        'hora_cierre': [HORARIOS.get(c, (None, None))[1] for c in cadenas],
+    })
+
+    # Visitas únicas por (supervisor, sala, día)
+    sup_idx = rng.integers(0, tamano.supervisores, tamano.visitas)
+    sala_idx = rng.integers(0, tamano.salas, tamano.visitas)
+    dia_idx = rng.integers(0, len(DIAS), tamano.visitas)
+    visitas = pd.DataFrame({
+        'supervisor_id': supervisores['id'].to_numpy()[sup_idx],
+        'sala_id': salas['id'].to_numpy()[sala_idx],
+        'dia_semana': np.array(DIAS)[dia_idx],
+    }).drop_duplicates(['supervisor_id', 'sala_id', 'dia_semana'], ignore_index=True)
+    visitas['orden'] = visitas.groupby(['supervisor_id', 'dia_semana']).cumcount() + 1
+
+    inicio = date(2026, 1, 1)
+    rendiciones = pd.DataFrame({
+        'id_rendicion': [f"r{i:09d}" for i in range(tamano.rendiciones)],
+        'id_supervisor': supervisores['id'].to_numpy()[rng.integers(0, tamano.supervisores, tamano.rendiciones)],
+        'fecha': [inicio + timedelta(days=int(d)) for d in rng.integers(0, 180, tamano.rendiciones)],
+        'monto': (rng.integers(1, 100, tamano.rendiciones) * 500).astype('int64'),
+        'categoria': rng.choice(CATEGORIAS, tamano.rendiciones),
+        'comentario': 'Gasto sintético',
+    })
+
+    return DatasetSintetico(zonales, supervisores, reporta_a, salas, visitas, rendiciones)
@@ -0,0 +1,22 @@
+"""
+Servidor de carga
+=================
+Punto de entrada Streamlit que ejecuta app_logistics.main() con backends
+falsos de Spanner/BigQuery y cuentas sintéticas 'cargaN'.
+
+Uso:
+    CASTANO_BENCH_SUPERVISORES=200 streamlit run benchmarks/servidor_stub.py
+"""
+
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import app_logistics
+from benchmarks import backends_falsos
+
+backend = backends_falsos.activar_desde_entorno()
+backends_falsos.instalar(app_logistics, backend)
+
+app_logistics.main()
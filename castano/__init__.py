@@ -0,0 +1,24 @@
+"""
+Castaño Logistics - núcleo de datos
+===================================
+Módulos sin dependencia de la interfaz Streamlit:
+- repositorio: Acceso a datos de rutas, jerarquía y rendiciones (Spanner/BigQuery o SQLite)
+- importacion: Lectura, validación y diferencia de planes de ruta cargados desde CSV/XLSX
+- rendiciones: Validación y deduplicación vectorizada de planillas de gastos
+- anomalias: Detección de duplicados y montos atípicos en rendiciones con estadísticas móviles
+- checkin: Geocerca de llegada a salas y cola de eventos vaciada por lotes al backend
+- cumplimiento: Caché semanal en Parquet del cruce plan / check-ins / rendiciones, actualizada en segundo plano
+- mapas: Agrupación de salas por celdas según el zoom y capas pydeck de rutas y regiones
+- itinerarios: Horas de llegada por visita con atención, horarios de sala y viajes, y reparación de días excedidos
+- agenda: Itinerarios fechados de las próximas semanas con feriados y excepciones, precalculados en Parquet
+- organizacion: Árbol zonal → supervisor → sala con agregados por nodo, cargado con un recorrido del grafo
+- busqueda: Índice de trigramas en memoria para filtrar supervisores y salas mientras se escribe
+- comprobantes: Fotos de boletas reducidas en un pool de procesos y subidas a un almacén de objetos
+- exportacion: Archivos CSV/XLSX/Parquet generados por bloques en segundo plano
+- semilla: Datos demo y generación de volúmenes sintéticos para SQLite
+- usuarios: Directorio de cuentas con contraseñas PBKDF2 y bloqueo por intentos fallidos
+- sesiones: Almacén de sesiones externo con tokens firmados
+- notificaciones: Bus de cambios del proceso y canales entre réplicas (SQLite o change stream de Spanner)
+- almacen_frames: Caché de DataFrames compartida entre sesiones, acotada en bytes
+- arranque: Lanzador con calentamiento, registro de recursos de proceso y perfil de arranque
+"""
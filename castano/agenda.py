@@ -0,0 +1,387 @@
+"""
+Agenda fechada
+==============
+Expande el plan semanal (por dia_semana) en el itinerario de cada supervisor
+para cada fecha de las próximas semanas, con feriados y excepciones:
+- El itinerario de la semana (programar_semana) es la plantilla: las fechas sin
+  excepciones apuntan al tramo de su día de semana, sin copiar filas
+- Excepcion_Agenda quita el día completo (feriados con supervisor '*',
+  licencias), quita una sala o agrega una visita en una fecha; sólo esos días
+  se vuelven a calcular y guardan filas propias
+- AgendaFechada: filas compactas más un índice (supervisor, fecha) → tramo, en
+  memoria y en Parquet; un hilo la regenera cada noche y recalcula aparte los
+  supervisores cuyo plan o excepciones cambiaron, cuando alguien lee su ruta
+
+Mi Ruta lee el día con una sola búsqueda por clave.
+"""
+
+import os
+import threading
+import uuid
+from dataclasses import dataclass
+from datetime import date, datetime, time, timedelta
+
+import numpy as np
+import pandas as pd
+
+from castano.itinerarios import (COLUMNAS_ITINERARIO, FIN_JORNADA, HORARIO_SALA, INICIO_JORNADA, _primeras_del_dia,
+                                 calcular_horas, preparar_visitas, programar_semana)
+from castano.repositorio import COLUMNAS_EXCEPCION, COLUMNAS_PLAN, DIAS_SEMANA, TODOS
+
+SEMANAS_AGENDA = 4
+HORA_GENERACION = "03:00"   # Regeneración nocturna, con el plan del día ya cargado
+ESPERA_MAXIMA = 30          # Segundos que una lectura espera la primera carga o un recálculo pendiente
+AGRUPAR_CAMBIOS = 1.0       # Segundos que se juntan los pedidos de agenda completa antes de recalcularla
+
+# Tipos de excepción
+QUITAR = 'quitar'
+AGREGAR = 'agregar'
+
+COLUMNAS_AGENDA = COLUMNAS_ITINERARIO + ['latitud', 'longitud']
+COLUMNAS_INDICE = ['supervisor_id', 'fecha', 'desde', 'hasta', 'motivo']
+
+CATEGORICAS = ['supervisor_id', 'dia_semana', 'sala_id', 'sala_nombre']
+ENTERAS = ['orden', 'orden_plan', 'llegada', 'inicio', 'salida', 'viaje_min', 'espera_min', 'atencion_min']
+
+
+def fechas_horizonte(desde: date, semanas: int = SEMANAS_AGENDA) -> list:
+    """Días de lunes a sábado de las `semanas` que empiezan en `desde` (inclusive)."""
+    dias = (desde + timedelta(days=i) for i in range(7 * semanas))
+    return [f for f in dias if f.weekday() < len(DIAS_SEMANA)]
+
+
+def _compactar(filas: pd.DataFrame) -> pd.DataFrame:
+    """Categorías para los textos repetidos y enteros de 16 bits para minutos y órdenes."""
+    filas = filas[COLUMNAS_AGENDA].astype({c: 'category' for c in CATEGORICAS} | {c: 'int16' for c in ENTERAS})
+    filas['quintil'] = filas['quintil'].astype('Int8')
+    filas['sugerencia'] = filas['sugerencia'].astype('string')
+    return filas.reset_index(drop=True)
+
+
+def _unir(a: pd.DataFrame, b: pd.DataFrame) -> pd.DataFrame:
+    """Concatena filas compactas igualando las categorías (sin volver a texto)."""
+    a, b = a.copy(), b.copy()
+    for c in CATEGORICAS:
+        categorias = a[c].cat.categories.union(b[c].cat.categories)
+        a[c], b[c] = a[c].cat.set_categories(categorias), b[c].cat.set_categories(categorias)
+    return pd.concat([a, b], ignore_index=True)
+
+
+def _tramos(filas: pd.DataFrame, claves: list) -> pd.DataFrame:
+    """Un registro por tramo contiguo de `filas` con sus `claves`, desde y hasta."""
+    inicios = np.flatnonzero(_primeras_del_dia(filas)) if len(filas) else np.empty(0, dtype=int)
+    tramos = filas[claves].iloc[inicios].reset_index(drop=True)
+    tramos['desde'] = inicios
+    tramos['hasta'] = np.append(inicios[1:], len(filas)).astype(int)
+    return tramos
+
+
+def _excepciones_por_supervisor(excepciones: pd.DataFrame, semana: pd.DataFrame, supervisores) -> pd.DataFrame:
+    """Excepciones con el comodín de supervisor abierto en cada supervisor afectado."""
+    e = excepciones.assign(dia_semana=[DIAS_SEMANA[f.weekday()] for f in excepciones['fecha']])
+    propias = e[e['supervisor_id'] != TODOS]
+    todos = e[(e['supervisor_id'] == TODOS) & (e['tipo'] == QUITAR)].drop(columns='supervisor_id')
+    # Un feriado alcanza a todos; una sala cerrada para todos, sólo a quienes la visitan ese día
+    dias = todos[todos['sala_id'] == TODOS].merge(pd.DataFrame({'supervisor_id': supervisores}), how='cross')
+    salas = todos[todos['sala_id'] != TODOS].merge(semana[['supervisor_id', 'dia_semana', 'sala_id']],
+                                                 on=['dia_semana', 'sala_id'])
+    return pd.concat([propias, dias, salas], ignore_index=True)
+
+
+def expandir_agenda(plan: pd.DataFrame, salas: pd.DataFrame, excepciones: pd.DataFrame, fechas: list,
+                    inicio: str = INICIO_JORNADA, fin: str = FIN_JORNADA, atencion: dict = None,
+                    horario: tuple = HORARIO_SALA) -> tuple:
+    """(filas COLUMNAS_AGENDA, índice COLUMNAS_INDICE) de los supervisores del plan en las fechas.
+
+    El índice tiene un registro por supervisor y fecha con visitas o con un
+    motivo (feriado, licencia o cambio del día); sus filas son filas[desde:hasta].
+    """
+    semana = programar_semana(plan, salas, inicio, fin, atencion, horario)
+    catalogo = salas.set_index('id')
+    semana['latitud'] = semana['sala_id'].map(catalogo['latitud']).astype(float)
+    semana['longitud'] = semana['sala_id'].map(catalogo['longitud']).astype(float)
+
+    fechas = pd.DataFrame({'fecha': fechas, 'dia_semana': [DIAS_SEMANA[f.weekday()] for f in fechas]})
+    excepciones = excepciones[excepciones['fecha'].isin(set(fechas['fecha']))]
+    excepciones = _excepciones_por_supervisor(excepciones, semana, plan['supervisor_id'].unique())
+    supervisores = pd.unique(pd.concat([plan['supervisor_id'], excepciones['supervisor_id']]))
+
+    # Todas las fechas de todos los supervisores, apuntando al tramo de su día de semana
+    indice = pd.DataFrame({'supervisor_id': supervisores}).merge(fechas, how='cross')
+    indice = indice.merge(_tramos(semana, ['supervisor_id', 'dia_semana']), how='left',
+                          on=['supervisor_id', 'dia_semana'])
+    indice[['desde', 'hasta']] = indice[['desde', 'hasta']].fillna(0).astype(int)
+    motivos = excepciones.groupby(['supervisor_id', 'fecha'])['motivo'].first()
+    indice['motivo'] = motivos.reindex(pd.MultiIndex.from_frame(indice[['supervisor_id', 'fecha']])).to_numpy()
+    clave = list(zip(indice['supervisor_id'], indice['fecha']))
+
+    libres = excepciones[(excepciones['tipo'] == QUITAR) & (excepciones['sala_id'] == TODOS)]
+    libre = pd.Series(clave).isin(set(zip(libres['supervisor_id'], libres['fecha']))).to_numpy()
+    indice.loc[libre, ['desde', 'hasta']] = 0
+
+    # Días con salas quitadas o agregadas: filas propias, recalculadas
+    cambios = excepciones[excepciones['sala_id'] != TODOS]
+    cambiados = set(zip(cambios['supervisor_id'], cambios['fecha'])) - set(zip(libres['supervisor_id'], libres['fecha']))
+    extra = pd.DataFrame(columns=COLUMNAS_AGENDA)
+    if cambiados:
+        modificar = indice[pd.Series(clave).isin(cambiados).to_numpy()]
+        posiciones = np.concatenate([np.arange(a, b) for a, b in zip(modificar['desde'], modificar['hasta'])] or [[]])
+        visitas = semana.iloc[posiciones.astype(int)][['supervisor_id', 'sala_id', 'dia_semana', 'orden']]
+        visitas['fecha'] = np.repeat(modificar['fecha'].to_numpy(), modificar['hasta'] - modificar['desde'])
+        quitadas = cambios[cambios['tipo'] == QUITAR][['supervisor_id', 'fecha', 'sala_id']].assign(_quitar=True)
+        visitas = visitas.merge(quitadas, how='left', on=['supervisor_id', 'fecha', 'sala_id'])
+        agregadas = cambios[(cambios['tipo'] == AGREGAR) & cambios['sala_id'].isin(catalogo.index)]
+        agregadas = agregadas[['supervisor_id', 'fecha', 'sala_id', 'dia_semana']].assign(orden=len(catalogo) + 1)
+        visitas = pd.concat([visitas[visitas['_quitar'].isna()].drop(columns='_quitar'), agregadas],
+                            ignore_index=True).drop_duplicates(['supervisor_id', 'fecha', 'sala_id'])
+        if len(visitas):
+            v = preparar_visitas(visitas[['supervisor_id', 'fecha', 'sala_id', 'dia_semana', 'orden']], salas,
+                                 atencion, horario)
+            extra = calcular_horas(v, inicio, fin)
+            extra['orden'] = extra.groupby(['supervisor_id', 'fecha'], sort=False).cumcount() + 1
+            # Las visitas de la plantilla conservan su sugerencia y su orden relativo; las agregadas, al final
+            plantilla = semana.set_index(['supervisor_id', 'dia_semana', 'sala_id'])
+            origen = pd.MultiIndex.from_frame(extra[['supervisor_id', 'dia_semana', 'sala_id']])
+            orden_plan = plantilla['orden_plan'].reindex(origen).to_numpy(dtype=float)
+            orden_plan = pd.Series(np.where(np.isnan(orden_plan), len(catalogo) + extra['orden'], orden_plan))
+            extra['orden_plan'] = orden_plan.groupby([extra['supervisor_id'], extra['fecha']]).rank(method='first')
+            extra['sugerencia'] = plantilla['sugerencia'].reindex(origen).to_numpy()
+        tramos = _tramos(extra, ['supervisor_id', 'fecha']) if len(extra) else pd.DataFrame(
+            columns=['supervisor_id', 'fecha', 'desde', 'hasta'])
+        tramos[['desde', 'hasta']] = tramos[['desde', 'hasta']].astype(int) + len(semana)
+        tramos = tramos.set_index(['supervisor_id', 'fecha']).reindex(list(cambiados), fill_value=0)
+        modificados = pd.MultiIndex.from_tuples(clave).get_indexer(tramos.index)
+        indice.loc[modificados, ['desde', 'hasta']] = tramos[['desde', 'hasta']].to_numpy()
+
+    filas = _compactar(pd.concat([semana[COLUMNAS_AGENDA], extra.reindex(columns=COLUMNAS_AGENDA)],
+                                 ignore_index=True))
+    indice = indice[(indice['hasta'] > indice['desde']) | indice['motivo'].notna()]
+    return filas, indice[COLUMNAS_INDICE].reset_index(drop=True)
+
+
+# ================================================================
+# AGENDA EN MEMORIA
+# ================================================================
+
+@dataclass
+class RutaDia:
+    """Itinerario de un supervisor en una fecha."""
+    fecha: date
+    paradas: pd.DataFrame   # COLUMNAS_AGENDA en orden de visita
+    motivo: str = None      # Feriado o excepción que cambió el día
+
+
+class AgendaFechada:
+    """Agenda de las próximas semanas de todos los supervisores, regenerada cada noche desde un hilo.
+
+    `cargar_plan(supervisor_ids)` entrega el plan (COLUMNAS_PLAN; None son todos
+    los supervisores), `cargar_salas()` el catálogo y `cargar_excepciones(desde, hasta)`
+    las excepciones (COLUMNAS_EXCEPCION). Requiere `pyarrow`.
+    """
+
+    def __init__(self, directorio: str, cargar_plan, cargar_salas, cargar_excepciones,
+                 inicio: str = INICIO_JORNADA, fin: str = FIN_JORNADA, semanas: int = SEMANAS_AGENDA,
+                 hora_generacion: str = HORA_GENERACION, espera: float = ESPERA_MAXIMA,
+                 agrupar: float = AGRUPAR_CAMBIOS):
+        self.directorio = directorio
+        os.makedirs(directorio, exist_ok=True)
+        self._cargar_plan = cargar_plan
+        self._cargar_salas = cargar_salas
+        self._cargar_excepciones = cargar_excepciones
+        self.inicio, self.fin = inicio, fin
+        self.semanas = semanas
+        self.hora_generacion = time.fromisoformat(hora_generacion)
+        self.espera = espera
+        self.agrupar = agrupar
+        self._cambio = threading.Condition()  # Protege los datos y los recálculos pendientes
+        self._pendientes = set()
+        self._leyendo = False  # Una lectura espera un recálculo pendiente: sin agrupar
+        self._regenerar = False
+        self._completas_pedidas = self._completas_hechas = 0  # recalcular(None): las lecturas esperan
+        self._despertar = threading.Event()
+        self._detener = threading.Event()
+        self.generada = None        # Fecha de inicio de la agenda vigente
+        self._filas = self._indice = None
+        self._claves, self._fechas = {}, {}
+        self.actualizado_en = None
+        self.ultimo_error = None
+        self._publicar(*self._leer_disco())
+        # La copia del disco sirve mientras se regenera: el plan pudo cambiar con la réplica abajo
+        self._regenerar = self.generada is not None
+        self._hilo = threading.Thread(target=self._bucle, name="castano-agenda", daemon=True)
+        self._hilo.start()
+
+    # ---------------- Disco ----------------
+
+    def _ruta(self, generada: date, parte: str) -> str:
+        return os.path.join(self.directorio, f"agenda={generada.isoformat()}.{parte}.parquet")
+
+    def _leer_disco(self) -> tuple:
+        generadas = sorted(nombre[len('agenda='):-len('.indice.parquet')] for nombre in os.listdir(self.directorio)
+                           if nombre.startswith('agenda=') and nombre.endswith('.indice.parquet'))
+        for generada in reversed(generadas):
+            try:
+                generada = date.fromisoformat(generada)
+                return (generada, pd.read_parquet(self._ruta(generada, 'filas')),
+                        pd.read_parquet(self._ruta(generada, 'indice')))
+            except (ValueError, OSError):
+                continue  # Archivo ajeno o incompleto: se prueba la anterior
+        return None, None, None
+
+    def _escribir_disco(self, generada: date, filas: pd.DataFrame, indice: pd.DataFrame) -> None:
+        # El índice se escribe al final: una agenda sin índice no se lee
+        for parte, df in (('filas', filas), ('indice', indice)):
+            ruta = self._ruta(generada, parte)
+            parcial = f"{ruta}.{uuid.uuid4().hex}.parcial"
+            df.to_parquet(parcial, index=False)
+            os.replace(parcial, ruta)
+        for nombre in os.listdir(self.directorio):
+            if nombre.startswith('agenda=') and not nombre.startswith(f"agenda={generada.isoformat()}."):
+                try:
+                    os.remove(os.path.join(self.directorio, nombre))
+                except FileNotFoundError:
+                    pass
+
+    # ---------------- Cálculo ----------------
+
+    def _expandir(self, desde: date, supervisor_ids: list = None) -> tuple:
+        fechas = fechas_horizonte(desde, self.semanas)
+        plan = self._cargar_plan(supervisor_ids)
+        excepciones = self._cargar_excepciones(fechas[0], fechas[-1])
+        if supervisor_ids is not None:
+            excepciones = excepciones[excepciones['supervisor_id'].isin([*supervisor_ids, TODOS])]
+        return expandir_agenda(plan.reindex(columns=COLUMNAS_PLAN), self._cargar_salas(),
+                               excepciones.reindex(columns=COLUMNAS_EXCEPCION), fechas, self.inicio, self.fin)
+
+    def _publicar(self, generada: date, filas: pd.DataFrame, indice: pd.DataFrame) -> None:
+        if generada is None:
+            return
+        claves = dict(zip(zip(indice['supervisor_id'], indice['fecha']),
+                          zip(indice['desde'], indice['hasta'], indice['motivo'])))
+        fechas = indice.groupby('supervisor_id', sort=False)['fecha'].agg(list).to_dict()  # Ya vienen por fecha
+        with self._cambio:
+            self.generada, self._filas, self._indice, self._claves, self._fechas = generada, filas, indice, claves, fechas
+            self.actualizado_en = datetime.now()
+            self._cambio.notify_all()
+
+    def _objetivo(self, ahora: datetime = None) -> date:
+        """Fecha de inicio que debería tener la agenda: hoy, o ayer antes de la hora de generación."""
+        ahora = ahora or datetime.now()
+        return ahora.date() - timedelta(days=ahora.time() < self.hora_generacion)
+
+    def generar(self, desde: date = None) -> date:
+        """Expande la agenda completa desde `desde` (por defecto, la fecha objetivo), la guarda y la publica."""
+        desde = desde or self._objetivo()
+        with self._cambio:
+            self._regenerar = False
+            pendientes = set(self._pendientes)  # Quedan al día con el plan leído ahora
+            pedidas = self._completas_pedidas
+        try:
+            filas, indice = self._expandir(desde)
+            self._escribir_disco(desde, filas, indice)
+            self._publicar(desde, filas, indice)
+            with self._cambio:
+                self._pendientes -= pendientes
+        finally:
+            # También si falla: las lecturas no esperan el reintento
+            with self._cambio:
+                self._completas_hechas = max(self._completas_hechas, pedidas)
+                self._cambio.notify_all()
+        return desde
+
+    def _recalcular_pendientes(self) -> None:
+        with self._cambio:
+            pendientes = list(self._pendientes)
+        if not pendientes:
+            return
+        try:
+            filas, indice = self._expandir(self.generada, pendientes)
+            quedan = ~self._filas['supervisor_id'].isin(pendientes).to_numpy()
+            antes = np.concatenate([[0], np.cumsum(quedan)])  # Filas que quedan antes de cada posición
+            otros = self._indice[~self._indice['supervisor_id'].isin(pendientes)]
+            otros = otros.assign(desde=antes[otros['desde']], hasta=antes[otros['hasta']])
+            base = int(quedan.sum())
+            indice = pd.concat([otros, indice.assign(desde=indice['desde'] + base, hasta=indice['hasta'] + base)],
+                               ignore_index=True)
+            # Sólo en memoria: al arrancar se regenera completa, la copia del disco es para servir mientras tanto
+            self._publicar(self.generada, _unir(self._filas[quedan], filas), indice)
+        except Exception:
+            self._regenerar = True  # Las lecturas no esperan el reintento: siguen con la agenda anterior
+            raise
+        finally:
+            with self._cambio:
+                self._pendientes.difference_update(pendientes)
+                self._cambio.notify_all()
+
+    def recalcular(self, supervisor_ids: list = None) -> None:
+        """Pide recalcular la agenda de esos supervisores (None: completa) tras un cambio de plan o excepciones.
+
+        No bloquea. La completa la recalcula el hilo de la agenda; la de unos
+        supervisores, recién cuando `ruta()` de alguno la pide: guardar varias
+        veces al editar una ruta no recalcula en cada guardado, ni una réplica
+        en la que nadie la lee. `ruta()` espera el resultado.
+        """
+        with self._cambio:
+            if supervisor_ids is None:
+                self._regenerar = True
+                self._completas_pedidas += 1
+            else:
+                self._pendientes.update(supervisor_ids)
+                return
+        self._despertar.set()
+
+    # ---------------- Lectura ----------------
+
+    def ruta(self, supervisor_id: str, fecha: date) -> RutaDia:
+        """Itinerario del supervisor en la fecha; None si la fecha está fuera de la agenda."""
+        with self._cambio:
+            if supervisor_id in self._pendientes:
+                self._leyendo = True
+                self._despertar.set()
+            self._cambio.wait_for(lambda: self.generada is not None and supervisor_id not in self._pendientes
+                                  and self._completas_hechas >= self._completas_pedidas, timeout=self.espera)
+            if self.generada is None:
+                raise TimeoutError("La agenda aún no está disponible")
+            filas, claves, generada = self._filas, self._claves, self.generada
+        if not generada <= fecha < generada + timedelta(weeks=self.semanas):
+            return None
+        desde, hasta, motivo = claves.get((supervisor_id, fecha), (0, 0, None))
+        return RutaDia(fecha, filas.iloc[desde:hasta].reset_index(drop=True), None if pd.isna(motivo) else motivo)
+
+    def fechas(self, supervisor_id: str) -> list:
+        """Fechas de la agenda del supervisor con visitas o con un motivo."""
+        return list(self._fechas.get(supervisor_id, [])) if self.generada else []
+
+    # ---------------- Hilo ----------------
+
+    def _segundos_hasta_generacion(self) -> float:
+        ahora = datetime.now()
+        proxima = datetime.combine(ahora.date(), self.hora_generacion)
+        if proxima <= ahora:
+            proxima += timedelta(days=1)
+        return (proxima - ahora).total_seconds()
+
+    def _bucle(self) -> None:
+        while True:
+            try:
+                if self._regenerar or self.generada is None or self.generada < self._objetivo():
+                    self.generar()
+                self._recalcular_pendientes()
+                self.ultimo_error = None
+            except Exception as e:
+                self.ultimo_error = f"{type(e).__name__}: {e}"  # Se reintenta en el próximo ciclo
+            # Despierta a la hora de generación, con un pedido de recálculo o, si falló, en un minuto
+            pedido = self._despertar.wait(60 if self.ultimo_error else min(self._segundos_hasta_generacion() + 1, 3600))
+            if pedido and not self._leyendo:
+                # Un feriado para todos puede llegar junto a otros cambios: se recalcula una vez por ráfaga
+                self._detener.wait(self.agrupar)
+            self._leyendo = False
+            self._despertar.clear()
+            if self._detener.is_set():
+                return
+
+    def cerrar(self) -> None:
+        """Detiene las actualizaciones programadas."""
+        self._detener.set()
+        self._despertar.set()
+        self._hilo.join(timeout=5)
@@ -0,0 +1,197 @@
+"""
+Almacén compartido de DataFrames
+================================
+Caché de proceso para los datos que leen las páginas, compartida por todas
+las sesiones Streamlit:
+- Claves (entidad, id, versión): una escritura sube la versión y las
+  sesiones dejan de ver la copia vieja. Las versiones salen de un contador
+  único, así que se pueden olvidar las de ids sin frames sin que se repitan
+- Deduplicación por contenido: dos claves con el mismo frame ocupan memoria una vez
+- Límite en bytes con expulsión LRU, no por número de entradas
+- Carga única: N sesiones pidiendo la misma clave disparan una sola consulta
+
+Los frames almacenados no deben modificarse; obtener() entrega copias
+superficiales, que con copy-on-write de pandas no comparten escrituras.
+"""
+
+import hashlib
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future
+
+import pandas as pd
+
+COMPACTAR_DESDE = 64  # Versiones propias de ids sin frames que se toleran por entidad
+
+
+def huella_frame(df: pd.DataFrame) -> str:
+    """Hash de contenido (datos, índice, columnas y tipos) de un DataFrame."""
+    h = hashlib.blake2b(digest_size=16)
+    h.update(repr(list(df.columns)).encode())
+    h.update(repr([str(t) for t in df.dtypes]).encode())
+    if len(df):
+        h.update(pd.util.hash_pandas_object(df, index=True).to_numpy().tobytes())
+    return h.hexdigest()
+
+
+class _FrameUnico:
+    __slots__ = ('df', 'bytes', 'referencias')
+
+    def __init__(self, df: pd.DataFrame):
+        self.df = df
+        self.bytes = int(df.memory_usage(deep=True, index=True).sum())
+        self.referencias = 0
+
+
+class AlmacenFrames:
+    """Caché LRU de DataFrames inmutables acotada en bytes y deduplicada por contenido."""
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._contador = 0
+        self._versiones = {}             # entidad -> {id: versión propia}, de invalidar() o fijada al compactar
+        self._versiones_entidad = {}     # entidad -> versión de los ids sin versión propia
+        self._claves = OrderedDict()     # (entidad, id, versión) -> huella, en orden LRU
+        self._vivas = {}                 # entidad -> claves guardadas de esa entidad
+        self._frames = {}                # huella -> _FrameUnico
+        self._cargando = {}              # clave -> Future de la carga en curso
+        self._bytes = 0
+        self._aciertos = 0
+        self._fallos = 0
+        self._expulsiones = 0
+        self._deduplicados = 0
+
+    # ---------------- Versiones ----------------
+
+    def clave(self, entidad: str, id_: str) -> tuple:
+        """Clave vigente (entidad, id, versión)."""
+        with self._lock:
+            return (entidad, id_, self._version(entidad, id_))
+
+    def _version(self, entidad: str, id_: str) -> int:
+        version = self._versiones.get(entidad, {}).get(id_)
+        return self._versiones_entidad.get(entidad, 0) if version is None else version
+
+    def _nueva_version(self) -> int:
+        self._contador += 1
+        return self._contador
+
+    def invalidar(self, entidad: str, id_: str) -> None:
+        """Sube la versión de (entidad, id) y libera sus frames anteriores."""
+        with self._lock:
+            propias = self._versiones.setdefault(entidad, {})
+            propias[id_] = self._nueva_version()
+            vivas = self._vivas.get(entidad, set())
+            for clave in [c for c in vivas if c[1] == id_]:
+                self._quitar(clave)
+            if len(propias) > 2 * len(vivas) + COMPACTAR_DESDE:
+                self._compactar(entidad)
+
+    def _compactar(self, entidad: str) -> None:
+        # Los ids con frames conservan su versión; los demás (p. ej. checkins de días
+        # pasados) se olvidan y pasan a la nueva versión de la entidad, mayor que todas las que tuvieron
+        vigentes = {c[1]: c[2] for c in self._vivas.get(entidad, ())}
+        self._versiones[entidad] = vigentes
+        self._versiones_entidad[entidad] = self._nueva_version()
+
+    def invalidar_entidad(self, entidad: str) -> None:
+        """Invalida todos los ids de una entidad."""
+        with self._lock:
+            self._versiones.pop(entidad, None)
+            self._versiones_entidad[entidad] = self._nueva_version()
+            for clave in list(self._vivas.get(entidad, ())):
+                self._quitar(clave)
+
+    # ---------------- Lectura y carga ----------------
+
+    def obtener(self, clave: tuple) -> pd.DataFrame:
+        """Frame de la clave (copia superficial), o None si no está."""
+        with self._lock:
+            huella = self._claves.get(clave)
+            if huella is None:
+                return None
+            self._claves.move_to_end(clave)
+            self._aciertos += 1
+            return self._frames[huella].df.copy(deep=False)
+
+    def obtener_o_cargar(self, entidad: str, id_: str, cargador) -> tuple:
+        """Retorna (clave, frame), ejecutando cargador() una sola vez si falta."""
+        clave = self.clave(entidad, id_)
+        df = self.obtener(clave)
+        if df is not None:
+            return clave, df
+
+        with self._lock:
+            futuro = self._cargando.get(clave)
+            propio = futuro is None
+            if propio:
+                futuro = self._cargando[clave] = Future()
+                self._fallos += 1
+
+        if not propio:
+            return clave, futuro.result().copy(deep=False)
+
+        try:
+            df = cargador()
+            self.guardar(clave, df)
+            futuro.set_result(df)
+        except BaseException as e:
+            futuro.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                self._cargando.pop(clave, None)
+        return clave, df.copy(deep=False)
+
+    def guardar(self, clave: tuple, df: pd.DataFrame) -> None:
+        """Guarda el frame bajo la clave, reutilizando uno idéntico si ya existe."""
+        huella = huella_frame(df)
+        with self._lock:
+            if clave[2] != self._version(clave[0], clave[1]):
+                return  # Se invalidó mientras se cargaba
+            if clave in self._claves:
+                self._quitar(clave)
+            frame = self._frames.get(huella)
+            if frame is None:
+                frame = _FrameUnico(df)
+                if frame.bytes > self.max_bytes:
+                    return
+                self._frames[huella] = frame
+                self._bytes += frame.bytes
+            else:
+                self._deduplicados += 1
+            frame.referencias += 1
+            self._claves[clave] = huella
+            self._vivas.setdefault(clave[0], set()).add(clave)
+            while self._bytes > self.max_bytes and self._claves:
+                self._quitar(next(iter(self._claves)))
+                self._expulsiones += 1
+
+    def _quitar(self, clave: tuple) -> None:
+        huella = self._claves.pop(clave)
+        vivas = self._vivas[clave[0]]
+        vivas.discard(clave)
+        if not vivas:
+            del self._vivas[clave[0]]
+        frame = self._frames[huella]
+        frame.referencias -= 1
+        if frame.referencias == 0:
+            del self._frames[huella]
+            self._bytes -= frame.bytes
+
+    # ---------------- Métricas ----------------
+
+    def estadisticas(self) -> dict:
+        """Uso de memoria y efectividad de la caché."""
+        with self._lock:
+            return {
+                'bytes': self._bytes,
+                'max_bytes': self.max_bytes,
+                'claves': len(self._claves),
+                'frames_unicos': len(self._frames),
+                'aciertos': self._aciertos,
+                'fallos': self._fallos,
+                'expulsiones': self._expulsiones,
+                'deduplicados': self._deduplicados,
+            }
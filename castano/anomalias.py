@@ -0,0 +1,248 @@
+"""
+Detección de anomalías en rendiciones
+=====================================
+Revisa cada lote de rendiciones que entra (formulario o planilla) contra
+estadísticas móviles en memoria, en vez de auditar Fact_Rendicion completa a
+fin de mes:
+- Posible duplicado: mismo supervisor, fecha, monto y categoría que otra
+  rendición de la ventana (aunque cambie el comentario) o repetida en el lote
+- Monto atípico: z-score del logaritmo del monto contra el historial del
+  supervisor en la categoría, o de la categoría completa si tiene pocos datos
+
+Las estadísticas son (n, media, m2) por grupo, combinadas con la fórmula de
+Chan, y las claves de duplicado son hashes de 64 bits; la ventana se recalcula
+desde el repositorio cada cierto tiempo. Las filas marcadas quedan como
+alertas pendientes para la revisión del zonal.
+"""
+
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from datetime import date, timedelta
+
+import numpy as np
+import pandas as pd
+
+from castano.repositorio import COLUMNAS_ALERTA
+
+VENTANA_DIAS = 90
+UMBRAL_Z = 3.5
+MINIMO_OBSERVACIONES = 8     # Bajo esto se usa la estadística de la categoría completa
+DESVIACION_MINIMA = 0.25     # En escala log (~28 %): evita alertas con historiales de montos iguales
+
+# Estados de revisión de una alerta
+PENDIENTE = 'pendiente'
+APROBADA = 'aprobada'
+OBSERVADA = 'observada'
+
+MOTIVO_DUPLICADO = "posible duplicado"
+
+CLAVE_DUPLICADO = ['id_supervisor', 'fecha', 'monto', 'categoria']
+
+ESPERA_LOTE = 0.5    # Segundos que se juntan envíos antes de evaluarlos en un solo lote
+TAMANO_BUFER = 4096  # Altas recientes que se ordenan aparte antes de fundirse con la base
+
+
+def _normalizar(df: pd.DataFrame) -> pd.DataFrame:
+    """Tipos estables para hashear y agrupar (fecha como date, monto entero)."""
+    return pd.DataFrame({
+        'id_rendicion': df['id_rendicion'].astype(str).to_numpy(),
+        'id_supervisor': df['id_supervisor'].astype(str).to_numpy(),
+        'fecha': pd.to_datetime(df['fecha']).dt.date.to_numpy(),
+        'monto': pd.to_numeric(df['monto']).astype('int64').to_numpy(),
+        'categoria': df['categoria'].astype(str).to_numpy(),
+    })
+
+
+def _hash(df: pd.DataFrame) -> np.ndarray:
+    claves = df.assign(fecha=[f.isoformat() for f in df['fecha']])
+    return pd.util.hash_pandas_object(claves, index=False).to_numpy()
+
+
+def _momentos(x: pd.Series, grupos) -> pd.DataFrame:
+    """(n, media, m2) de x por grupo."""
+    g = x.groupby(grupos)
+    return pd.DataFrame({'n': g.size(), 'media': g.mean(), 'm2': g.var(ddof=0) * g.size()})
+
+
+def _combinar(a: pd.DataFrame, b: pd.DataFrame) -> pd.DataFrame:
+    """Combina momentos de dos muestras disjuntas (Chan et al.)."""
+    if a.empty:
+        return b
+    indice = a.index.union(b.index)
+    a, b = a.reindex(indice, fill_value=0.0), b.reindex(indice, fill_value=0.0)
+    n = a['n'] + b['n']
+    delta = b['media'] - a['media']
+    return pd.DataFrame({
+        'n': n,
+        'media': a['media'] + delta * b['n'] / n,
+        'm2': a['m2'] + b['m2'] + delta ** 2 * a['n'] * b['n'] / n,
+    })
+
+
+class _HashesOrdenados:
+    """Multiconjunto de hashes de 64 bits: arreglo ordenado (búsqueda binaria) más un búfer chico."""
+
+    def __init__(self):
+        self._base = np.empty(0, dtype=np.uint64)
+        self._bufer = np.empty(0, dtype=np.uint64)
+
+    def __len__(self):
+        return len(self._base) + len(self._bufer)
+
+    def agregar(self, hashes: np.ndarray) -> None:
+        self._bufer = np.sort(np.concatenate([self._bufer, hashes]))
+        if len(self._bufer) > TAMANO_BUFER:
+            self._base = np.sort(np.concatenate([self._base, self._bufer]))
+            self._bufer = np.empty(0, dtype=np.uint64)
+
+    def contar(self, hashes: np.ndarray) -> np.ndarray:
+        """Ocurrencias de cada hash."""
+        return sum(np.searchsorted(a, hashes, 'right') - np.searchsorted(a, hashes, 'left')
+                   for a in (self._base, self._bufer))
+
+
+class EstadisticasGasto:
+    """Momentos del log(monto) por supervisor y categoría, y claves recientes para duplicados."""
+
+    def __init__(self):
+        self.por_supervisor = pd.DataFrame(columns=['n', 'media', 'm2'], dtype=float)
+        self.por_categoria = pd.DataFrame(columns=['n', 'media', 'm2'], dtype=float)
+        self._claves = _HashesOrdenados()  # hash de CLAVE_DUPLICADO
+        self._ids = _HashesOrdenados()     # hash de id_rendicion
+
+    def __len__(self):
+        return len(self._ids)
+
+    def agregar(self, df: pd.DataFrame) -> None:
+        """Suma un lote normalizado a la ventana; ignora ids ya vistos."""
+        ids = pd.util.hash_array(df['id_rendicion'].to_numpy(dtype=object))
+        nuevas = self._ids.contar(ids) == 0
+        df, ids = df[nuevas], ids[nuevas]
+        if df.empty:
+            return
+        x = np.log(df['monto'].clip(lower=1))
+        self.por_supervisor = _combinar(self.por_supervisor, _momentos(x, [df['id_supervisor'], df['categoria']]))
+        self.por_categoria = _combinar(self.por_categoria, _momentos(x, df['categoria']))
+        self._claves.agregar(_hash(df[CLAVE_DUPLICADO]))
+        self._ids.agregar(ids)
+
+    def puntuar(self, df: pd.DataFrame, umbral_z: float = UMBRAL_Z,
+                minimo: int = MINIMO_OBSERVACIONES) -> pd.DataFrame:
+        """COLUMNAS_ALERTA para cada fila del lote normalizado; motivo es NA si no es sospechosa."""
+        r = df.copy()
+        ids = pd.util.hash_array(df['id_rendicion'].to_numpy(dtype=object))
+        claves = _hash(df[CLAVE_DUPLICADO])
+        # Las filas del lote que ya están en la ventana no cuentan como duplicado de sí mismas
+        en_lote = pd.Series(self._ids.contar(ids) > 0).groupby(claves).transform('sum').to_numpy()
+        otras = self._claves.contar(claves) - en_lote
+        duplicada = (otras > 0) | pd.Series(claves).duplicated(keep='first').to_numpy()
+
+        propio = self.por_supervisor.reindex(pd.MultiIndex.from_arrays([df['id_supervisor'], df['categoria']]))
+        categoria = self.por_categoria.reindex(df['categoria'])
+        usa_propio = (propio['n'] >= minimo).to_numpy()
+        n = np.where(usa_propio, propio['n'], categoria['n'])
+        media = np.where(usa_propio, propio['media'], categoria['media'])
+        m2 = np.where(usa_propio, propio['m2'], categoria['m2'])
+        with np.errstate(invalid='ignore', divide='ignore'):
+            desviacion = np.maximum(np.sqrt(m2 / (n - 1)), DESVIACION_MINIMA)
+            z = (np.log(df['monto'].clip(lower=1)).to_numpy() - media) / desviacion
+        z = np.where(n >= minimo, z, np.nan)
+        atipica = z > umbral_z
+        veces = df['monto'].to_numpy() / np.exp(media)
+
+        r['puntaje'] = np.round(z, 2)
+        r['motivo'] = pd.Series(pd.NA, index=r.index, dtype="string")
+        r.loc[atipica, 'motivo'] = [f"monto atípico ({v:.1f}× lo habitual)" for v in veces[atipica]]
+        r.loc[duplicada, 'motivo'] = MOTIVO_DUPLICADO
+        r['estado'] = PENDIENTE
+        return r[COLUMNAS_ALERTA]
+
+
+class DetectorAnomalias:
+    """Evalúa lotes de rendiciones en un hilo propio y guarda las alertas.
+
+    `cargador(desde, hasta)` entrega bloques de rendiciones (COLUMNAS_EXPORT_RENDICION)
+    para reconstruir la ventana; `guardar(df)` persiste las alertas (COLUMNAS_ALERTA).
+    """
+
+    def __init__(self, cargador, guardar, ventana_dias: int = VENTANA_DIAS, refresco: float = 6 * 3600,
+                 umbral_z: float = UMBRAL_Z, minimo: int = MINIMO_OBSERVACIONES, espera: float = ESPERA_LOTE):
+        self._cargador = cargador
+        self._guardar = guardar
+        self.ventana_dias = ventana_dias
+        self.refresco = refresco
+        self.umbral_z = umbral_z
+        self.minimo = minimo
+        self.espera = espera
+        self.estadisticas = EstadisticasGasto()
+        self._reconstruida_en = None
+        # Un solo hilo: los lotes se evalúan en orden y sin bloquear el envío del formulario
+        self._pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="castano-anomalias")
+        self._lock = threading.Lock()
+        self._pendientes = []
+        self._tanda = None
+        self.alertas_generadas = 0
+        self.ultimo_error = None
+
+    def reconstruir(self, hoy: date = None) -> None:
+        """Recalcula la ventana desde el repositorio, bloque a bloque."""
+        hoy = hoy or date.today()
+        nuevas = EstadisticasGasto()
+        for bloque in self._cargador(hoy - timedelta(days=self.ventana_dias), hoy):
+            if len(bloque):
+                nuevas.agregar(_normalizar(bloque))
+        with self._lock:
+            self.estadisticas = nuevas
+            self._reconstruida_en = time.monotonic()
+
+    def _vigente(self) -> None:
+        if self._reconstruida_en is None or time.monotonic() - self._reconstruida_en > self.refresco:
+            self.reconstruir()
+
+    def preparar(self) -> Future:
+        """Construye la ventana en segundo plano (calentamiento)."""
+        return self._pool.submit(self._vigente)
+
+    def evaluar(self, df: pd.DataFrame) -> pd.DataFrame:
+        """Puntúa un lote (COLUMNAS_EXPORT_RENDICION) y lo suma a la ventana; retorna sólo las filas marcadas."""
+        self._vigente()
+        lote = _normalizar(df)
+        with self._lock:
+            resultado = self.estadisticas.puntuar(lote, self.umbral_z, self.minimo)
+            marcadas = resultado['motivo'].notna()
+            # Los montos atípicos no entran a la estadística para no ir corriendo la media
+            atipicas = marcadas & (resultado['motivo'] != MOTIVO_DUPLICADO)
+            self.estadisticas.agregar(lote[~atipicas.to_numpy()])
+        return resultado[marcadas].reset_index(drop=True)
+
+    def registrar(self, df: pd.DataFrame) -> Future:
+        """Encola filas recién insertadas; se evalúan junto con las que lleguen en los próximos `espera` s.
+
+        Las alertas se guardan desde el hilo del detector; el Future entrega cuántas hubo en la tanda.
+        """
+        with self._lock:
+            self._pendientes.append(df.copy())
+            if self._tanda is None:
+                self._tanda = self._pool.submit(self._procesar_pendientes)
+            return self._tanda
+
+    def _procesar_pendientes(self) -> int:
+        time.sleep(self.espera)
+        with self._lock:
+            pendientes, self._pendientes, self._tanda = self._pendientes, [], None
+        return self._procesar(pd.concat(pendientes, ignore_index=True))
+
+    def _procesar(self, df: pd.DataFrame) -> int:
+        try:
+            alertas = self.evaluar(df)
+            if len(alertas):
+                self._guardar(alertas)
+                self.alertas_generadas += len(alertas)
+        except Exception as e:
+            self.ultimo_error = f"{type(e).__name__}: {e}"  # Nadie espera el Future: queda para diagnóstico
+            raise
+        return len(alertas)
+
+    def cerrar(self) -> None:
+        self._pool.shutdown(wait=True, cancel_futures=True)
@@ -0,0 +1,219 @@
+"""
+Arranque en frío
+================
+Para que una réplica nueva atienda su primer request con latencia de régimen:
+- Registro de recursos de proceso (clientes, repositorio, cachés) compartido
+  entre el lanzador y los reruns del script Streamlit
+- Importaciones diferidas para módulos pesados que sólo usan algunas páginas
+- Calentamiento antes de levantar el servidor (el health check responde
+  recién cuando los clientes y los datos de referencia están listos)
+- Perfil de arranque con el tiempo de cada fase
+
+Uso:
+    python -m castano.arranque                       # calienta y levanta app_logistics.py
+    python -m castano.arranque --perfil-json arranque.json -- --server.port 8080
+"""
+
+import argparse
+import importlib
+import importlib.util
+import json
+import sys
+import threading
+import time
+import traceback
+from concurrent.futures import Future
+from contextlib import contextmanager
+from pathlib import Path
+
+APP_DEFECTO = Path(__file__).resolve().parent.parent / "app_logistics.py"
+
+
+# ================================================================
+# RECURSOS DE PROCESO
+# ================================================================
+
+_recursos = {}
+_creando = {}  # nombre -> (Future, hilo que lo crea)
+_lock_recursos = threading.Lock()
+
+
+def recurso(nombre: str, fabrica):
+    """Retorna el recurso `nombre` del proceso, creándolo una sola vez con fabrica().
+
+    A diferencia de st.cache_resource, el registro vive en este módulo y no en el
+    script, así que el lanzador puede crearlos antes de que exista una sesión.
+    fabrica() corre fuera del lock: un recurso lento no frena la creación de los
+    demás y puede pedir otros recursos; quien pide el mismo espera su resultado.
+    """
+    valor = _recursos.get(nombre)
+    if valor is not None:
+        return valor
+
+    with _lock_recursos:
+        valor = _recursos.get(nombre)
+        if valor is not None:
+            return valor
+        futuro, hilo = _creando.get(nombre, (None, None))
+        propio = futuro is None
+        if propio:
+            futuro = Future()
+            _creando[nombre] = (futuro, threading.get_ident())
+        elif hilo == threading.get_ident():
+            raise RuntimeError(f"El recurso '{nombre}' se pide a sí mismo al crearse")
+
+    if not propio:
+        return futuro.result()
+
+    try:
+        valor = fabrica()
+        with _lock_recursos:
+            _recursos[nombre] = valor
+        futuro.set_result(valor)
+    except BaseException as e:
+        futuro.set_exception(e)  # Quien esperaba lo recibe; no queda registrado y el próximo pedido reintenta
+        raise
+    finally:
+        with _lock_recursos:
+            _creando.pop(nombre, None)
+    return valor
+
+
+def recursos_creados() -> list:
+    """Nombres de los recursos ya creados en este proceso."""
+    return sorted(_recursos)
+
+
+# ================================================================
+# IMPORTACIONES DIFERIDAS
+# ================================================================
+
+class ModuloDiferido:
+    """Proxy de un módulo que se importa en el primer acceso a un atributo."""
+
+    def __init__(self, nombre: str):
+        self._nombre = nombre
+        self._modulo = None
+
+    def cargar(self):
+        """Importa el módulo (si falta) y lo retorna."""
+        if self._modulo is None:
+            self._modulo = importlib.import_module(self._nombre)
+        return self._modulo
+
+    def __getattr__(self, atributo):
+        return getattr(self.cargar(), atributo)
+
+    def __repr__(self):
+        estado = "cargado" if self._modulo is not None else "diferido"
+        return f"<ModuloDiferido {self._nombre} ({estado})>"
+
+
+def importar_diferido(nombre: str) -> ModuloDiferido:
+    """Retorna un proxy que importa `nombre` al usarse por primera vez."""
+    return ModuloDiferido(nombre)
+
+
+# ================================================================
+# PERFIL DE ARRANQUE
+# ================================================================
+
+class PerfilArranque:
+    """Duración de cada fase del arranque."""
+
+    def __init__(self):
+        self.inicio = time.perf_counter()
+        self.fases = []  # (nombre, segundos, error)
+
+    @contextmanager
+    def fase(self, nombre: str):
+        """Mide una fase; un error se registra con su traza en stderr y no detiene el arranque."""
+        t0 = time.perf_counter()
+        error = None
+        try:
+            yield
+        except Exception as e:
+            error = f"{type(e).__name__}: {e}"
+            print(f"❌ Falló la fase de arranque '{nombre}':", file=sys.stderr)
+            traceback.print_exc()
+        finally:
+            self.fases.append((nombre, time.perf_counter() - t0, error))
+
+    def errores(self) -> list:
+        """(fase, error) de las fases que fallaron."""
+        return [(n, e) for n, _, e in self.fases if e]
+
+    def como_dict(self) -> dict:
+        return {
+            'total_s': round(time.perf_counter() - self.inicio, 3),
+            'fases': [{'fase': n, 'segundos': round(s, 3), 'error': e} for n, s, e in self.fases],
+            'recursos': recursos_creados(),
+        }
+
+    def reporte(self) -> str:
+        lineas = ["⏱️  Perfil de arranque", f"   {'fase':<40}{'ms':>10}"]
+        for nombre, segundos, error in self.fases:
+            lineas.append(f"   {nombre:<40}{segundos * 1000:>10.1f}" + (f"  ❌ {error}" if error else ""))
+        lineas.append(f"   {'TOTAL':<40}{(time.perf_counter() - self.inicio) * 1000:>10.1f}")
+        if self.errores():
+            lineas.append(f"   ⚠️  {len(self.errores())} fase(s) con error: la réplica atiende, pero sin esas precargas")
+        return "\n".join(lineas)
+
+
+_perfil_proceso = None
+
+
+def perfil_proceso() -> PerfilArranque:
+    """Perfil del último arranque de este proceso, o None si no se usó el lanzador."""
+    return _perfil_proceso
+
+
+# ================================================================
+# LANZADOR
+# ================================================================
+
+def cargar_app(ruta: Path):
+    """Importa el script de la app como módulo para poder invocar su calentamiento."""
+    spec = importlib.util.spec_from_file_location(ruta.stem, ruta)
+    modulo = importlib.util.module_from_spec(spec)
+    sys.modules[ruta.stem] = modulo
+    spec.loader.exec_module(modulo)
+    return modulo
+
+
+def main(argv=None):
+    global _perfil_proceso
+    parser = argparse.ArgumentParser(description="Calienta la app y levanta el servidor Streamlit")
+    parser.add_argument('--app', type=Path, default=APP_DEFECTO, help="Script Streamlit a servir")
+    parser.add_argument('--perfil-json', type=Path, help="Guarda el perfil de arranque en este archivo")
+    parser.add_argument('--solo-calentar', action='store_true',
+                        help="Calienta, reporta y termina sin servir (código 1 si falló alguna fase)")
+    args, opciones_streamlit = parser.parse_known_args(argv)
+    if opciones_streamlit[:1] == ['--']:
+        opciones_streamlit = opciones_streamlit[1:]
+
+    perfil = _perfil_proceso = PerfilArranque()
+    sys.path.insert(0, str(args.app.parent))
+    with perfil.fase("import streamlit"):
+        import streamlit  # noqa: F401
+    with perfil.fase("import pandas"):
+        import pandas  # noqa: F401
+    with perfil.fase(f"import {args.app.name}"):
+        app = cargar_app(args.app)
+    if hasattr(app, 'calentar_aplicacion'):
+        app.calentar_aplicacion(perfil)
+
+    print(perfil.reporte(), flush=True)
+    if args.perfil_json:
+        args.perfil_json.write_text(json.dumps(perfil.como_dict(), indent=2, ensure_ascii=False))
+    if args.solo_calentar:
+        sys.exit(1 if perfil.errores() else 0)  # Para detectar en el despliegue un calentamiento fallido
+
+    from streamlit.web import cli
+    cli.main(prog_name="streamlit", args=['run', str(args.app), *opciones_streamlit])
+
+
+if __name__ == "__main__":
+    # Ejecutar sobre castano.arranque y no sobre __main__, para que la app vea el mismo registro
+    from castano.arranque import main as _main
+    _main()
@@ -0,0 +1,124 @@
+"""
+Búsqueda
+========
+Índice en memoria para filtrar mientras se escribe (supervisores, salas del
+plan, catálogo de salas), sin recorrer el frame en cada tecla:
+- normalizar: minúsculas sin tildes ni signos ("Nuñez" → "nunez",
+  "TOT FLO WALKER MARTINEZ / 55" → "tot flo walker martinez 55")
+- IndiceBusqueda: índice invertido de trigramas de cada palabra más los
+  prefijos de 1 y 2 letras; una consulta intersecta listas de posiciones y
+  sólo verifica los candidatos
+- CacheIndices: índices por clave (la del almacén de frames, que cambia con
+  cada versión), acotados con expulsión LRU
+
+Cada término de la consulta debe aparecer en alguna palabra de la fila: los de
+1 o 2 letras al inicio de una palabra, los demás en cualquier posición.
+"""
+
+import re
+import threading
+import unicodedata
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+INDICES_MAXIMOS = 64        # Índices en caché por proceso
+LARGO_GRAMA = 3
+
+_NO_ALFANUMERICO = re.compile(r'[^0-9a-z]+')
+_VACIO = np.empty(0, dtype=np.int32)
+
+
+def normalizar(texto) -> str:
+    """Minúsculas, sin tildes y con los signos como espacios."""
+    texto = unicodedata.normalize('NFKD', str(texto)).encode('ascii', 'ignore').decode()
+    return _NO_ALFANUMERICO.sub(' ', texto.casefold()).strip()
+
+
+def _gramas(palabra: str) -> set:
+    """Prefijos de 1 y 2 letras y trigramas de una palabra."""
+    return {palabra[:1], palabra[:2]} | {palabra[i:i + LARGO_GRAMA] for i in range(len(palabra) - LARGO_GRAMA + 1)}
+
+
+def textos_de(df: pd.DataFrame, columnas) -> list:
+    """Texto normalizado de cada fila con las columnas indicadas."""
+    partes = [df[c].fillna('').astype(str) for c in columnas]
+    return [normalizar(' '.join(fila)) for fila in zip(*partes)]
+
+
+class IndiceBusqueda:
+    """Índice invertido de las filas de un frame; `buscar` retorna posiciones (iloc) en orden."""
+
+    def __init__(self, textos: list):
+        self.textos = textos
+        gramas, filas = [], []
+        por_palabra = {}  # Marcas, calles y comunas se repiten en miles de salas
+        for i, texto in enumerate(textos):
+            unicos = set()
+            for palabra in texto.split():
+                g = por_palabra.get(palabra)
+                if g is None:
+                    g = por_palabra[palabra] = _gramas(palabra)
+                unicos |= g
+            gramas += unicos
+            filas += [i] * len(unicos)
+        codigos, claves = pd.factorize(pd.Series(gramas, dtype=object))
+        filas = np.asarray(filas, dtype=np.int32)
+        orden = np.lexsort((filas, codigos))  # Por grama y, dentro de cada una, por fila
+        cortes = np.flatnonzero(np.diff(codigos[orden])) + 1
+        self._listas = dict(zip(claves, np.split(filas[orden], cortes))) if len(orden) else {}
+
+    def __len__(self):
+        return len(self.textos)
+
+    @classmethod
+    def de_frame(cls, df: pd.DataFrame, columnas) -> 'IndiceBusqueda':
+        return cls(textos_de(df, columnas))
+
+    def buscar(self, consulta: str) -> np.ndarray:
+        """Posiciones de las filas que calzan con todos los términos de la consulta (todas si está vacía)."""
+        terminos = normalizar(consulta).split()
+        if not terminos:
+            return np.arange(len(self.textos))
+        listas = []
+        for termino in terminos:
+            claves = [termino] if len(termino) < LARGO_GRAMA else _gramas(termino) - {termino[:1], termino[:2]}
+            listas += [self._listas.get(c, _VACIO) for c in claves]
+        listas.sort(key=len)
+        posiciones = listas[0]
+        for lista in listas[1:]:
+            if not len(posiciones):
+                break
+            posiciones = np.intersect1d(posiciones, lista, assume_unique=True)
+        # Los trigramas pueden estar en palabras distintas: se verifica el término completo
+        largos = [t for t in terminos if len(t) > LARGO_GRAMA]
+        if largos and len(posiciones):
+            textos, candidatas = self.textos, posiciones.tolist()
+            for termino in largos:
+                candidatas = [i for i in candidatas if termino in textos[i]]
+            posiciones = np.asarray(candidatas, dtype=np.int32)
+        return posiciones
+
+
+class CacheIndices:
+    """Índices de búsqueda por clave, construidos una vez y compartidos por las sesiones del proceso."""
+
+    def __init__(self, maximo: int = INDICES_MAXIMOS):
+        self.maximo = maximo
+        self._lock = threading.Lock()
+        self._indices = OrderedDict()
+
+    def obtener(self, clave, df: pd.DataFrame, columnas) -> IndiceBusqueda:
+        """Índice de `df` para la clave; se reconstruye si el frame cambió de largo."""
+        with self._lock:
+            indice = self._indices.get(clave)
+            if indice is not None:
+                self._indices.move_to_end(clave)
+        if indice is None or len(indice) != len(df):
+            indice = IndiceBusqueda.de_frame(df, columnas)  # Fuera del lock: no bloquea otras búsquedas
+            with self._lock:
+                self._indices[clave] = indice
+                while len(self._indices) > self.maximo:
+                    self._indices.popitem(last=False)
+        return indice
@@ -0,0 +1,177 @@
+"""
+Check-in de visitas
+===================
+Registro de llegada del supervisor a una sala con el GPS del dispositivo:
+- Geocerca: distancia haversine vectorizada contra las salas del día, con un
+  prefiltro por caja de coordenadas; se elige la sala planificada más cercana
+- ColaEventos: buffer append-only en memoria que un hilo vacía por lotes al
+  backend (streaming por lotes a BigQuery), así el rerun sólo encola el evento
+  y nunca espera un round trip
+
+Todos los intentos se registran, también los fuera de radio (`valido` = False),
+para que el cumplimiento y las auditorías vean el intento.
+"""
+
+import threading
+import uuid
+from collections import deque
+from datetime import datetime, timezone
+
+import numpy as np
+import pandas as pd
+
+from castano.repositorio import COLUMNAS_CHECKIN
+
+RADIO_METROS = 150             # Distancia máxima a la sala para validar la llegada
+PRECISION_MAXIMA_METROS = 100  # Sobre esto la lectura de GPS no sirve para validar
+RADIO_TIERRA_METROS = 6_371_000
+METROS_POR_GRADO = 111_320
+
+EVENTOS_POR_LOTE = 500         # Filas por escritura al backend
+INTERVALO_VACIADO = 2.0        # Segundos entre vaciados si no se llena un lote
+MAX_PENDIENTES = 100_000       # Tope del buffer si el backend no responde; se descartan los más antiguos
+
+
+# ================================================================
+# GEOCERCA
+# ================================================================
+
+def distancia_metros(lat: float, lon: float, lats, lons) -> np.ndarray:
+    """Distancia haversine de un punto a varios puntos, en metros."""
+    lat1, lon1 = np.radians(lat), np.radians(lon)
+    lat2, lon2 = np.radians(np.asarray(lats, dtype=float)), np.radians(np.asarray(lons, dtype=float))
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * RADIO_TIERRA_METROS * np.arcsin(np.sqrt(a))
+
+
+def salas_en_radio(lat: float, lon: float, salas: pd.DataFrame, radio: float = RADIO_METROS) -> pd.DataFrame:
+    """Salas (con latitud/longitud) a menos de `radio` metros, la más cercana primero, con columna distancia_m."""
+    # Caja de coordenadas: descarta casi todo el catálogo sin trigonometría
+    dlat = radio / METROS_POR_GRADO
+    dlon = dlat / max(np.cos(np.radians(lat)), 1e-6)
+    caja = salas['latitud'].between(lat - dlat, lat + dlat) & salas['longitud'].between(lon - dlon, lon + dlon)
+    cerca = salas[caja]
+    cerca = cerca.assign(distancia_m=distancia_metros(lat, lon, cerca['latitud'], cerca['longitud']))
+    return cerca[cerca['distancia_m'] <= radio].sort_values('distancia_m')
+
+
+def evaluar_checkin(supervisor_id: str, lat: float, lon: float, precision: float, salas_dia: pd.DataFrame,
+                    radio: float = RADIO_METROS, ahora: datetime = None) -> dict:
+    """Evento de check-in (COLUMNAS_CHECKIN) contra la sala del día más cercana.
+
+    `salas_dia` son las salas planificadas hoy (sala_id, latitud, longitud).
+    """
+    ahora = ahora or datetime.now(timezone.utc)
+    salas = salas_dia.dropna(subset=['latitud', 'longitud'])
+    evento = {
+        'id_evento': str(uuid.uuid4()), 'id_supervisor': supervisor_id, 'sala_id': None,
+        'fecha': ahora.astimezone().date(), 'ts': ahora, 'latitud': float(lat), 'longitud': float(lon),
+        'precision_m': float(precision), 'distancia_m': None, 'valido': False,
+    }
+    if salas.empty:
+        return evento
+    distancias = distancia_metros(lat, lon, salas['latitud'], salas['longitud'])
+    cercana = int(np.argmin(distancias))
+    evento['sala_id'] = salas['sala_id'].iloc[cercana]
+    evento['distancia_m'] = round(float(distancias[cercana]), 1)
+    evento['valido'] = bool(distancias[cercana] <= radio and precision <= PRECISION_MAXIMA_METROS)
+    return evento
+
+
+# ================================================================
+# PIPELINE DE EVENTOS
+# ================================================================
+
+class ColaEventos:
+    """Eventos append-only en memoria, vaciados por lotes desde un hilo propio.
+
+    `escribir(df)` recibe un DataFrame con COLUMNAS_CHECKIN; si falla, el lote
+    vuelve al inicio del buffer y se reintenta con espera exponencial (los
+    id_evento permiten deduplicar en el destino). `al_escribir(df)` se llama
+    tras cada lote escrito, para invalidar cachés.
+    """
+
+    def __init__(self, escribir, al_escribir=None, eventos_por_lote: int = EVENTOS_POR_LOTE,
+                 intervalo: float = INTERVALO_VACIADO, max_pendientes: int = MAX_PENDIENTES):
+        self._escribir = escribir
+        self._al_escribir = al_escribir
+        self.eventos_por_lote = eventos_por_lote
+        self.intervalo = intervalo
+        self.max_pendientes = max_pendientes
+        self._buffer = deque()
+        self._en_vuelo = []  # Lote que se está escribiendo
+        self._lock = threading.Lock()
+        self._hay_lote = threading.Event()
+        self._cerrada = False
+        self.escritos = 0
+        self.lotes = 0
+        self.reintentos = 0
+        self.descartados = 0
+        self.ultimo_error = None
+        self._hilo = threading.Thread(target=self._bucle, name="castano-eventos", daemon=True)
+        self._hilo.start()
+
+    def agregar(self, evento: dict) -> None:
+        """Encola un evento; no hace I/O."""
+        with self._lock:
+            if len(self._buffer) >= self.max_pendientes:
+                self._buffer.popleft()
+                self.descartados += 1
+            self._buffer.append(evento)
+            lleno = len(self._buffer) >= self.eventos_por_lote
+        if lleno:
+            self._hay_lote.set()
+
+    def pendientes(self, supervisor_id: str = None) -> list:
+        """Eventos aún no escritos (de un supervisor, si se indica)."""
+        with self._lock:
+            return [e for e in (*self._en_vuelo, *self._buffer)
+                    if supervisor_id is None or e['id_supervisor'] == supervisor_id]
+
+    def __len__(self):
+        return len(self._buffer)
+
+    def vaciar(self) -> int:
+        """Escribe todo lo pendiente en lotes; retorna los eventos escritos. Lanza la excepción del backend."""
+        escritos = 0
+        while True:
+            with self._lock:
+                lote = [self._buffer.popleft() for _ in range(min(self.eventos_por_lote, len(self._buffer)))]
+                self._en_vuelo = lote
+            if not lote:
+                return escritos
+            df = pd.DataFrame(lote, columns=COLUMNAS_CHECKIN)
+            try:
+                self._escribir(df)
+            except Exception:
+                with self._lock:
+                    self._buffer.extendleft(reversed(lote))  # Vuelve al inicio, en orden
+                    self._en_vuelo = []
+                raise
+            if self._al_escribir:
+                self._al_escribir(df)
+            with self._lock:
+                self._en_vuelo = []
+            self.escritos += len(lote)
+            self.lotes += 1
+            escritos += len(lote)
+
+    def _bucle(self) -> None:
+        espera = self.intervalo
+        while not self._cerrada:
+            self._hay_lote.wait(espera)
+            self._hay_lote.clear()
+            try:
+                self.vaciar()
+                espera = self.intervalo
+            except Exception as e:
+                self.ultimo_error = f"{type(e).__name__}: {e}"
+                self.reintentos += 1
+                espera = min(espera * 2, 60)
+
+    def cerrar(self) -> None:
+        """Detiene el hilo y escribe lo pendiente."""
+        self._cerrada = True
+        self._hay_lote.set()
+        self._hilo.join(timeout=5)
+        self.vaciar()
@@ -0,0 +1,171 @@
+"""
+Comprobantes de rendiciones
+===========================
+Fotos de boletas adjuntas a Fact_Rendicion (columna `comprobante` con la clave
+del objeto):
+- procesar_imagen: corrige la orientación, quita EXIF, reduce y recomprime a
+  JPEG, y genera una miniatura. Corre en un pool de procesos para que una foto
+  de 8 MB no retenga el GIL del servidor Streamlit
+- AlmacenObjetos: subida por bloques a un almacén de objetos (directorio local
+  o Google Cloud Storage)
+
+Requiere Pillow.
+"""
+
+import io
+import multiprocessing
+import os
+import uuid
+from abc import ABC, abstractmethod
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date
+from urllib.parse import urlparse
+
+from castano.arranque import importar_diferido
+
+# Pillow se importa en el primer uso, dentro del proceso hijo que procesa la foto
+Image = importar_diferido('PIL.Image')
+ImageOps = importar_diferido('PIL.ImageOps')
+
+LADO_MAXIMO = 1600          # px del lado mayor de la imagen guardada
+LADO_MINIATURA = 160
+CALIDAD_JPEG = 80
+BYTES_POR_BLOQUE = 256 * 1024
+TIPOS_ACEPTADOS = ['jpg', 'jpeg', 'png', 'webp']
+
+
+# ================================================================
+# PROCESAMIENTO (en procesos hijos)
+# ================================================================
+
+def procesar_imagen(datos: bytes, lado_maximo: int = LADO_MAXIMO, lado_miniatura: int = LADO_MINIATURA,
+                    calidad: int = CALIDAD_JPEG) -> tuple:
+    """Retorna (jpeg, miniatura_jpeg) sin metadatos. Lanza ValueError si no es una imagen."""
+    try:
+        imagen = Image.open(io.BytesIO(datos))
+        imagen.draft('RGB', (lado_maximo, lado_maximo))  # JPEG: decodifica ya reducido
+        imagen = ImageOps.exif_transpose(imagen)          # aplica la orientación antes de perder el EXIF
+    except (Image.UnidentifiedImageError, OSError) as e:
+        raise ValueError("El archivo no es una imagen válida") from e
+    imagen = imagen.convert('RGB')
+
+    def jpeg(img, lado, q):
+        img = img.copy()
+        img.thumbnail((lado, lado), Image.Resampling.LANCZOS)
+        salida = io.BytesIO()
+        # Sin exif= ni icc_profile=: la imagen se guarda sin metadatos (GPS, cámara, fecha)
+        img.save(salida, 'JPEG', quality=q, optimize=True, progressive=True)
+        return salida.getvalue()
+
+    return jpeg(imagen, lado_maximo, calidad), jpeg(imagen, lado_miniatura, 70)
+
+
+# ================================================================
+# ALMACÉN DE OBJETOS
+# ================================================================
+
+class AlmacenObjetos(ABC):
+    """Almacén clave → bytes con subida por bloques."""
+
+    @abstractmethod
+    def subir(self, clave: str, flujo, tipo: str = 'image/jpeg') -> None:
+        """Sube el contenido de un objeto tipo archivo, bloque a bloque."""
+
+    @abstractmethod
+    def leer(self, clave: str) -> bytes:
+        """Contenido del objeto. Lanza KeyError si no existe."""
+
+
+class AlmacenObjetosLocal(AlmacenObjetos):
+    """Objetos como archivos bajo un directorio (sustituto local de un bucket)."""
+
+    def __init__(self, directorio: str):
+        self.directorio = os.path.abspath(directorio)
+        os.makedirs(self.directorio, exist_ok=True)
+
+    def _ruta(self, clave: str) -> str:
+        ruta = os.path.abspath(os.path.join(self.directorio, clave))
+        if not ruta.startswith(self.directorio + os.sep):
+            raise KeyError(clave)
+        return ruta
+
+    def subir(self, clave: str, flujo, tipo: str = 'image/jpeg') -> None:
+        ruta = self._ruta(clave)
+        os.makedirs(os.path.dirname(ruta), exist_ok=True)
+        parcial = f"{ruta}.{uuid.uuid4().hex}.parcial"
+        with open(parcial, 'wb') as f:
+            while bloque := flujo.read(BYTES_POR_BLOQUE):
+                f.write(bloque)
+        os.replace(parcial, ruta)  # El objeto aparece completo o no aparece
+
+    def leer(self, clave: str) -> bytes:
+        try:
+            with open(self._ruta(clave), 'rb') as f:
+                return f.read()
+        except FileNotFoundError:
+            raise KeyError(clave) from None
+
+
+class AlmacenObjetosGCS(AlmacenObjetos):
+    """Objetos en un bucket de Google Cloud Storage (subida reanudable por bloques). Requiere `google-cloud-storage`."""
+
+    def __init__(self, bucket: str, prefijo: str = ""):
+        from google.cloud import storage
+        self.bucket = storage.Client().bucket(bucket)
+        self.prefijo = prefijo.strip('/')
+
+    def _blob(self, clave: str):
+        blob = self.bucket.blob(f"{self.prefijo}/{clave}" if self.prefijo else clave)
+        blob.chunk_size = 4 * BYTES_POR_BLOQUE  # Múltiplo de 256 KB, como exige la API
+        return blob
+
+    def subir(self, clave: str, flujo, tipo: str = 'image/jpeg') -> None:
+        self._blob(clave).upload_from_file(flujo, content_type=tipo)
+
+    def leer(self, clave: str) -> bytes:
+        from google.api_core.exceptions import NotFound
+        try:
+            return self._blob(clave).download_as_bytes()
+        except NotFound:
+            raise KeyError(clave) from None
+
+
+def crear_almacen_objetos(url: str) -> AlmacenObjetos:
+    """Crea el almacén según la URL: file:///ruta/directorio o gs://bucket/prefijo."""
+    partes = urlparse(url)
+    if partes.scheme == 'file':
+        return AlmacenObjetosLocal(url[len('file://'):])
+    if partes.scheme == 'gs':
+        return AlmacenObjetosGCS(partes.netloc, partes.path)
+    raise ValueError(f"Almacén de objetos no soportado: {url}")
+
+
+# ================================================================
+# PIPELINE
+# ================================================================
+
+def clave_miniatura(clave: str) -> str:
+    """Clave de la miniatura asociada a un comprobante."""
+    raiz, extension = os.path.splitext(clave)
+    return f"{raiz}_min{extension}"
+
+
+class ProcesadorComprobantes:
+    """Procesa fotos en un pool de procesos y las sube al almacén de objetos."""
+
+    def __init__(self, almacen: AlmacenObjetos, workers: int = 2):
+        self.almacen = almacen
+        # spawn: los hijos no heredan los hilos ni sockets del servidor Streamlit
+        self._pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn'))
+
+    def guardar(self, supervisor_id: str, datos: bytes, fecha: date = None) -> str:
+        """Procesa y sube una foto; retorna la clave del comprobante."""
+        imagen, miniatura = self._pool.submit(procesar_imagen, datos).result()
+        fecha = fecha or date.today()
+        clave = f"comprobantes/{supervisor_id}/{fecha:%Y/%m}/{uuid.uuid4().hex}.jpg"
+        self.almacen.subir(clave_miniatura(clave), io.BytesIO(miniatura))
+        self.almacen.subir(clave, io.BytesIO(imagen))
+        return clave
+
+    def cerrar(self) -> None:
+        self._pool.shutdown(wait=True, cancel_futures=True)
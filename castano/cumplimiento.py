@@ -0,0 +1,241 @@
+"""
+Cumplimiento del plan
+=====================
+Cruza el plan de Visita_Planificada (Spanner) con los check-ins válidos y las
+rendiciones (BigQuery) por supervisor y semana, sin consultas cruzadas en
+cada vista:
+- CacheCumplimiento: tabla semanal en memoria, persistida como un Parquet por
+  semana en disco local, que un hilo propio actualiza cada cierto tiempo
+- Sólo se recalculan las semanas abiertas (la actual y la anterior, que aún
+  reciben check-ins y rendiciones atrasadas) y las que falten en disco; las
+  cerradas conservan el plan vigente cuando se calcularon
+
+Una visita se cumple si hay un check-in válido en la sala el día de la semana
+planificado. Los km son el recorrido en línea recta entre las salas del día,
+en el orden del plan.
+"""
+
+import os
+import threading
+import uuid
+from datetime import date, datetime, timedelta
+
+import numpy as np
+import pandas as pd
+
+from castano.checkin import distancia_metros
+from castano.repositorio import COLUMNAS_EXPORT_PLAN, DIAS_SEMANA
+
+COLUMNAS_CUMPLIMIENTO = ['semana', 'supervisor_id', 'visitas_planificadas', 'visitas_realizadas',
+                         'visitas_fuera_plan', 'km_planificados', 'rendiciones', 'gasto_total', 'gasto_transporte']
+
+SEMANAS_HISTORIA = 12
+SEMANAS_ABIERTAS = 2       # Se recalculan siempre: reciben check-ins y rendiciones atrasadas
+REFRESCO = 15 * 60         # Segundos entre actualizaciones
+
+CATEGORIA_TRANSPORTE = 'TRANSPORTE'
+CLAVE_SEMANA = ['semana', 'supervisor_id']
+
+
+def lunes(fecha: date) -> date:
+    """Lunes de la semana de la fecha."""
+    return fecha - timedelta(days=fecha.weekday())
+
+
+# ================================================================
+# CÁLCULO
+# ================================================================
+
+def resumen_plan(plan: pd.DataFrame, salas: pd.DataFrame) -> pd.DataFrame:
+    """Visitas y km del recorrido planificado por supervisor y día (supervisor_id, dia_semana, visitas, km)."""
+    p = plan[['supervisor_id', 'dia_semana', 'orden', 'sala_id']].merge(
+        salas[['id', 'latitud', 'longitud']].rename(columns={'id': 'sala_id'}), on='sala_id', how='left'
+    ).sort_values(['supervisor_id', 'dia_semana', 'orden'], kind='stable')
+    anterior = p.groupby(['supervisor_id', 'dia_semana'], sort=False)[['latitud', 'longitud']].shift()
+    # Tramo desde la sala anterior del mismo día; NaN en la primera sala o sin coordenadas
+    p['km'] = distancia_metros(anterior['latitud'], anterior['longitud'], p['latitud'], p['longitud']) / 1000
+    return p.groupby(['supervisor_id', 'dia_semana'], as_index=False).agg(
+        visitas=('sala_id', 'size'), km=('km', 'sum'),
+    )
+
+
+def visitas_realizadas(bloques) -> pd.DataFrame:
+    """Check-ins válidos sin repetir por supervisor, sala y fecha (supervisor_id, sala_id, fecha)."""
+    partes = [
+        b.loc[b['valido'].astype(bool) & b['sala_id'].notna(), ['id_supervisor', 'sala_id', 'fecha']].drop_duplicates()
+        for b in bloques
+    ]
+    visitas = pd.concat(partes, ignore_index=True) if partes else pd.DataFrame(columns=['id_supervisor', 'sala_id', 'fecha'])
+    return visitas.drop_duplicates().rename(columns={'id_supervisor': 'supervisor_id'})
+
+
+def gastos_por_semana(bloques) -> pd.DataFrame:
+    """Rendiciones, gasto total y de transporte por semana y supervisor, agregando bloque a bloque."""
+    partes = []
+    for b in bloques:
+        monto = pd.to_numeric(b['monto'])
+        partes.append(pd.DataFrame({
+            'semana': [lunes(f) for f in pd.to_datetime(b['fecha']).dt.date],
+            'supervisor_id': b['id_supervisor'].to_numpy(),
+            'rendiciones': 1,
+            'gasto_total': monto.to_numpy(),
+            'gasto_transporte': monto.where(b['categoria'] == CATEGORIA_TRANSPORTE, 0).to_numpy(),
+        }).groupby(CLAVE_SEMANA).sum())
+    if not partes:
+        return pd.DataFrame(columns=['rendiciones', 'gasto_total', 'gasto_transporte'],
+                            index=pd.MultiIndex.from_arrays([[], []], names=CLAVE_SEMANA))
+    return pd.concat(partes).groupby(level=CLAVE_SEMANA).sum()
+
+
+def calcular_semanas(semanas: list, plan: pd.DataFrame, salas: pd.DataFrame, visitas: pd.DataFrame,
+                     gastos: pd.DataFrame, hoy: date) -> pd.DataFrame:
+    """Filas COLUMNAS_CUMPLIMIENTO de las semanas pedidas; la semana en curso cuenta el plan hasta hoy."""
+    dias = pd.DataFrame(
+        [(s, s + timedelta(days=i), dia) for s in semanas for i, dia in enumerate(DIAS_SEMANA)
+         if s + timedelta(days=i) <= hoy],
+        columns=['semana', 'fecha', 'dia_semana'],
+    )
+    planificado = dias.merge(resumen_plan(plan, salas), on='dia_semana').groupby(CLAVE_SEMANA).agg(
+        visitas_planificadas=('visitas', 'sum'), km_planificados=('km', 'sum'),
+    )
+
+    claves_plan = plan[['supervisor_id', 'sala_id', 'dia_semana']].drop_duplicates()
+    v = visitas.merge(dias, on='fecha')  # Deja sólo las semanas pedidas y los días hábiles
+    v = v.merge(claves_plan, on=['supervisor_id', 'sala_id', 'dia_semana'], how='left', indicator=True)
+    en_plan = v['_merge'] == 'both'
+    realizado = pd.DataFrame({
+        'visitas_realizadas': en_plan.groupby([v['semana'], v['supervisor_id']]).sum(),
+        'visitas_fuera_plan': (~en_plan).groupby([v['semana'], v['supervisor_id']]).sum(),
+    })
+    realizado.index.names = CLAVE_SEMANA
+
+    gastos = gastos[gastos.index.get_level_values('semana').isin(semanas)]
+    r = pd.concat([planificado, realizado, gastos], axis=1).fillna(0).reset_index()
+    enteros = ['visitas_planificadas', 'visitas_realizadas', 'visitas_fuera_plan', 'rendiciones',
+               'gasto_total', 'gasto_transporte']
+    r = r.reindex(columns=COLUMNAS_CUMPLIMIENTO, fill_value=0).astype({c: 'int64' for c in enteros})
+    r['km_planificados'] = r['km_planificados'].astype(float).round(1)
+    return r.sort_values(CLAVE_SEMANA, ignore_index=True)
+
+
+def indicadores(df: pd.DataFrame) -> pd.DataFrame:
+    """Agrega cumplimiento (realizadas / planificadas) y gasto de transporte por km planificado."""
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return df.assign(
+            cumplimiento=(df['visitas_realizadas'] / df['visitas_planificadas']).where(df['visitas_planificadas'] > 0),
+            gasto_por_km=(df['gasto_transporte'] / df['km_planificados']).where(df['km_planificados'] > 0),
+        )
+
+
+def totales_por_semana(df: pd.DataFrame) -> pd.DataFrame:
+    """Suma del equipo por semana, con indicadores."""
+    return indicadores(df.drop(columns='supervisor_id').groupby('semana', as_index=False).sum())
+
+
+# ================================================================
+# CACHÉ LOCAL
+# ================================================================
+
+class CacheCumplimiento:
+    """Tabla semanal de cumplimiento en memoria y en disco (un Parquet por semana), actualizada desde un hilo.
+
+    `cargar_plan()` entrega bloques de plan (COLUMNAS_EXPORT_PLAN), `cargar_salas()`
+    el catálogo, y `cargar_checkins(desde, hasta)` / `cargar_rendiciones(desde, hasta)`
+    bloques de COLUMNAS_CHECKIN / COLUMNAS_EXPORT_RENDICION. Requiere `pyarrow`.
+    """
+
+    def __init__(self, directorio: str, cargar_plan, cargar_salas, cargar_checkins, cargar_rendiciones,
+                 semanas: int = SEMANAS_HISTORIA, semanas_abiertas: int = SEMANAS_ABIERTAS,
+                 refresco: float = REFRESCO):
+        self.directorio = directorio
+        os.makedirs(directorio, exist_ok=True)
+        self._cargar_plan = cargar_plan
+        self._cargar_salas = cargar_salas
+        self._cargar_checkins = cargar_checkins
+        self._cargar_rendiciones = cargar_rendiciones
+        self.semanas = semanas
+        self.semanas_abiertas = semanas_abiertas
+        self.refresco = refresco
+        self._lock = threading.Lock()
+        self._detener = threading.Event()
+        self._por_semana = self._leer_disco()
+        self._tabla = self._unir()
+        self.actualizado_en = None
+        self.ultimo_error = None
+        self._hilo = threading.Thread(target=self._bucle, name="castano-cumplimiento", daemon=True)
+        self._hilo.start()
+
+    def _ruta(self, semana: date) -> str:
+        return os.path.join(self.directorio, f"semana={semana.isoformat()}.parquet")
+
+    def _leer_disco(self) -> dict:
+        por_semana = {}
+        for nombre in os.listdir(self.directorio):
+            if not (nombre.startswith('semana=') and nombre.endswith('.parquet')):
+                continue
+            try:
+                semana = date.fromisoformat(nombre[len('semana='):-len('.parquet')])
+                por_semana[semana] = pd.read_parquet(os.path.join(self.directorio, nombre))
+            except (ValueError, OSError):
+                continue  # Archivo ajeno o a medio escribir: la semana se vuelve a calcular
+        return por_semana
+
+    def _unir(self) -> pd.DataFrame:
+        partes = [df for df in self._por_semana.values() if len(df)]
+        if not partes:
+            return pd.DataFrame(columns=COLUMNAS_CUMPLIMIENTO)
+        return pd.concat(partes, ignore_index=True)[COLUMNAS_CUMPLIMIENTO].sort_values(CLAVE_SEMANA, ignore_index=True)
+
+    def tabla(self, supervisor_ids: list = None) -> pd.DataFrame:
+        """Filas COLUMNAS_CUMPLIMIENTO en caché (de los supervisores indicados, o todas)."""
+        tabla = self._tabla
+        if supervisor_ids is not None:
+            tabla = tabla[tabla['supervisor_id'].isin(supervisor_ids)]
+        return tabla.reset_index(drop=True)
+
+    def actualizar(self, hoy: date = None) -> list:
+        """Recalcula las semanas abiertas y las que falten en disco; retorna las semanas calculadas."""
+        hoy = hoy or date.today()
+        with self._lock:
+            horizonte = [lunes(hoy) - timedelta(weeks=i) for i in range(self.semanas)]
+            pendientes = horizonte[:self.semanas_abiertas] + [
+                s for s in horizonte[self.semanas_abiertas:] if s not in self._por_semana
+            ]
+            desde, hasta = min(pendientes), max(pendientes) + timedelta(days=6)
+            plan = pd.concat(list(self._cargar_plan()) or [pd.DataFrame(columns=COLUMNAS_EXPORT_PLAN)], ignore_index=True)
+            nuevas = calcular_semanas(
+                pendientes, plan, self._cargar_salas(), visitas_realizadas(self._cargar_checkins(desde, hasta)),
+                gastos_por_semana(self._cargar_rendiciones(desde, hasta)), hoy,
+            )
+            por_semana = {s: df for s, df in self._por_semana.items() if s in horizonte}
+            for semana in pendientes:
+                df = nuevas[nuevas['semana'] == semana].reset_index(drop=True)
+                ruta = self._ruta(semana)
+                parcial = f"{ruta}.{uuid.uuid4().hex}.parcial"
+                df.to_parquet(parcial, index=False)
+                os.replace(parcial, ruta)  # Otra réplica o un reinicio nunca lee una semana a medias
+                por_semana[semana] = df
+            for semana in set(self._por_semana) - set(horizonte):
+                try:
+                    os.remove(self._ruta(semana))
+                except FileNotFoundError:
+                    pass
+            self._por_semana = por_semana
+            self._tabla = self._unir()
+            self.actualizado_en = datetime.now()
+        return pendientes
+
+    def _bucle(self) -> None:
+        while True:
+            try:
+                self.actualizar()
+                self.ultimo_error = None
+            except Exception as e:
+                self.ultimo_error = f"{type(e).__name__}: {e}"  # Se reintenta en el próximo ciclo
+            if self._detener.wait(self.refresco):
+                return
+
+    def cerrar(self) -> None:
+        """Detiene las actualizaciones programadas."""
+        self._detener.set()
+        self._hilo.join(timeout=5)
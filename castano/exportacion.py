@@ -0,0 +1,200 @@
+"""
+Exportaciones en segundo plano
+==============================
+Genera archivos CSV, XLSX o Parquet a partir de bloques de DataFrames que
+entrega el repositorio, sin materializar el resultado completo en memoria:
+- Cada bloque se escribe y se descarta antes de pedir el siguiente
+- Un pool pequeño de hilos produce los archivos fuera del script Streamlit
+- Los archivos quedan en disco hasta que expiran; la sesión sólo guarda el id
+"""
+
+import csv
+import os
+import re
+import secrets
+import shutil
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+
+import pandas as pd
+
+from castano.arranque import importar_diferido
+
+# Sólo se cargan al exportar en ese formato
+openpyxl = importar_diferido('openpyxl')
+pa = importar_diferido('pyarrow')
+pq = importar_diferido('pyarrow.parquet')
+
+FORMATOS = {
+    'CSV': ('.csv', 'text/csv'),
+    'XLSX': ('.xlsx', 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'),
+    'Parquet': ('.parquet', 'application/vnd.apache.parquet'),
+}
+
+FILAS_POR_BLOQUE = 50_000
+MAX_FILAS_HOJA_XLSX = 1_048_575  # Límite de Excel menos el encabezado
+
+
+# ================================================================
+# ESCRITORES
+# ================================================================
+
+def escribir_csv(bloques, ruta: str, progreso=None) -> int:
+    """Escribe los bloques como CSV UTF-8 con BOM (Excel lo abre con tildes)."""
+    filas = 0
+    with open(ruta, 'w', encoding='utf-8-sig', newline='') as f:
+        for i, bloque in enumerate(bloques):
+            bloque.to_csv(f, index=False, header=(i == 0), quoting=csv.QUOTE_MINIMAL)
+            filas += len(bloque)
+            if progreso:
+                progreso(filas)
+    return filas
+
+
+def escribir_xlsx(bloques, ruta: str, progreso=None) -> int:
+    """Escribe los bloques en modo write-only de openpyxl, abriendo hojas nuevas al llegar al límite."""
+    libro = openpyxl.Workbook(write_only=True)
+    hoja, filas_hoja, filas, columnas = None, 0, 0, None
+    for bloque in bloques:
+        columnas = columnas or list(bloque.columns)
+        for fila in bloque.astype(object).where(bloque.notna(), None).itertuples(index=False, name=None):
+            if hoja is None or filas_hoja >= MAX_FILAS_HOJA_XLSX:
+                hoja = libro.create_sheet(f"Hoja{len(libro.worksheets) + 1}")
+                hoja.append(columnas)
+                filas_hoja = 0
+            hoja.append(fila)
+            filas_hoja += 1
+        filas += len(bloque)
+        if progreso:
+            progreso(filas)
+    if hoja is None:
+        libro.create_sheet("Hoja1").append(columnas or [])
+    libro.save(ruta)
+    return filas
+
+
+def escribir_parquet(bloques, ruta: str, progreso=None) -> int:
+    """Escribe un row group por bloque. Requiere `pyarrow`."""
+    escritor, filas = None, 0
+    try:
+        for bloque in bloques:
+            # Columnas de texto como string: un primer bloque todo nulo no debe fijar el tipo null
+            texto = {c: 'string' for c in bloque.columns
+                     if pd.api.types.infer_dtype(bloque[c], skipna=True) in ('string', 'empty')}
+            tabla = pa.Table.from_pandas(bloque.astype(texto), preserve_index=False)
+            if escritor is None:
+                escritor = pq.ParquetWriter(ruta, tabla.schema, compression='zstd')
+            escritor.write_table(tabla.cast(escritor.schema))
+            filas += len(bloque)
+            if progreso:
+                progreso(filas)
+    finally:
+        if escritor is not None:
+            escritor.close()
+    if escritor is None:
+        pq.write_table(pa.table({}), ruta)
+    return filas
+
+
+ESCRITORES = {'CSV': escribir_csv, 'XLSX': escribir_xlsx, 'Parquet': escribir_parquet}
+
+
+# ================================================================
+# TRABAJOS
+# ================================================================
+
+@dataclass
+class Exportacion:
+    """Estado de un archivo en generación o listo para descargar."""
+    id: str
+    titulo: str
+    formato: str
+    nombre_archivo: str
+    ruta: str
+    estado: str = 'en cola'        # en cola | generando | lista | error
+    filas: int = 0
+    error: str = None
+    creada: float = field(default_factory=time.time)
+    segundos: float = None
+
+    @property
+    def mime(self) -> str:
+        return FORMATOS[self.formato][1]
+
+    def leer(self) -> bytes:
+        with open(self.ruta, 'rb') as f:
+            return f.read()
+
+
+class GestorExportaciones:
+    """Cola de exportaciones atendida por un pool de hilos; los archivos expiran tras `ttl` segundos."""
+
+    def __init__(self, directorio: str = None, workers: int = 2, ttl: float = 3600):
+        self.directorio = directorio or tempfile.mkdtemp(prefix="castano_export_")
+        os.makedirs(self.directorio, exist_ok=True)
+        self.ttl = ttl
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="castano-export")
+        self._lock = threading.Lock()
+        self._trabajos = {}
+
+    def solicitar(self, titulo: str, formato: str, generar_bloques) -> str:
+        """Encola la exportación; generar_bloques() debe retornar un iterable de DataFrames."""
+        if formato not in ESCRITORES:
+            raise ValueError(f"Formato no soportado: {formato}")
+        self.limpiar()
+        id_ = secrets.token_urlsafe(12)
+        base = re.sub(r'[^\w\-]+', '_', titulo).strip('_').lower() or 'exportacion'
+        extension = FORMATOS[formato][0]
+        trabajo = Exportacion(
+            id=id_, titulo=titulo, formato=formato,
+            nombre_archivo=f"{base}{extension}",
+            ruta=os.path.join(self.directorio, f"{id_}{extension}"),
+        )
+        with self._lock:
+            self._trabajos[id_] = trabajo
+        self._pool.submit(self._generar, trabajo, generar_bloques)
+        return id_
+
+    def _generar(self, trabajo: Exportacion, generar_bloques) -> None:
+        inicio = time.perf_counter()
+        trabajo.estado = 'generando'
+
+        def progreso(filas):
+            trabajo.filas = filas
+
+        try:
+            parcial = trabajo.ruta + '.parcial'
+            trabajo.filas = ESCRITORES[trabajo.formato](generar_bloques(), parcial, progreso)
+            os.replace(parcial, trabajo.ruta)
+            trabajo.estado = 'lista'
+        except Exception as e:
+            trabajo.estado, trabajo.error = 'error', f"{type(e).__name__}: {e}"
+            if os.path.exists(trabajo.ruta + '.parcial'):
+                os.remove(trabajo.ruta + '.parcial')
+        finally:
+            trabajo.segundos = time.perf_counter() - inicio
+
+    def obtener(self, id_: str) -> Exportacion:
+        """Trabajo por id, o None si no existe o expiró."""
+        with self._lock:
+            return self._trabajos.get(id_)
+
+    def limpiar(self) -> None:
+        """Elimina trabajos terminados con más de ttl segundos y sus archivos."""
+        limite = time.time() - self.ttl
+        with self._lock:
+            vencidos = [t for t in self._trabajos.values() if t.creada < limite and t.estado in ('lista', 'error')]
+            for trabajo in vencidos:
+                del self._trabajos[trabajo.id]
+        for trabajo in vencidos:
+            if os.path.exists(trabajo.ruta):
+                os.remove(trabajo.ruta)
+
+    def cerrar(self) -> None:
+        """Detiene el pool y borra el directorio de archivos."""
+        self._pool.shutdown(wait=True, cancel_futures=True)
+        shutil.rmtree(self.directorio, ignore_errors=True)
+
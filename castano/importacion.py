@@ -0,0 +1,197 @@
+"""
+Importación masiva de planes de ruta
+====================================
+Lee un CSV/XLSX con el plan de visitas, lo valida de forma vectorizada contra
+el catálogo de salas y el equipo del zonal, calcula la diferencia con el plan
+vigente y lo deja listo para aplicarlo en lotes de mutaciones.
+
+Formatos aceptados (una fila por sala del supervisor):
+- Ancho: supervisor_id, sala_id, LUNES, MARTES, ..., SABADO (1/x/si marca la visita)
+- Largo: supervisor_id, sala_id, dia_semana (una fila por visita)
+La columna `orden` es opcional; si falta, el orden del día es el del archivo. Si
+viene, es un entero positivo que no se repite en el mismo día del supervisor, y
+las filas que no lo traen toman los números libres en el orden del archivo.
+"""
+
+import unicodedata
+from dataclasses import dataclass
+from itertools import count, islice
+
+import pandas as pd
+
+from castano.arranque import importar_diferido
+from castano.repositorio import COLUMNAS_PLAN, DIAS_SEMANA
+
+openpyxl = importar_diferido('openpyxl')  # Sólo para archivos XLSX
+
+CLAVE_VISITA = ['supervisor_id', 'sala_id', 'dia_semana']
+
+FILAS_POR_BLOQUE = 50_000
+MARCAS_VERDADERAS = {'1', '1.0', 'X', 'SI', 'S', 'TRUE', 'VERDADERO'}
+
+# Abreviaturas que se aceptan como encabezado o valor de día
+ALIAS_DIAS = {d: d for d in DIAS_SEMANA}
+ALIAS_DIAS.update({'L': 'LUNES', 'M': 'MARTES', 'X': 'MIERCOLES', 'J': 'JUEVES', 'V': 'VIERNES', 'S': 'SABADO',
+                   'LUN': 'LUNES', 'MAR': 'MARTES', 'MIE': 'MIERCOLES', 'JUE': 'JUEVES', 'VIE': 'VIERNES',
+                   'SAB': 'SABADO'})
+
+
+class ErrorFormatoPlan(ValueError):
+    """El archivo no tiene las columnas esperadas."""
+
+
+def _normalizar_texto(serie: pd.Series) -> pd.Series:
+    """Mayúsculas, sin espacios en los extremos y sin tildes."""
+    s = serie.astype("string").str.strip().str.upper()
+    return s.str.normalize('NFKD').str.encode('ascii', 'ignore').str.decode('ascii')
+
+
+def _normalizar_encabezado(col) -> str:
+    texto = unicodedata.normalize('NFKD', str(col)).encode('ascii', 'ignore').decode().strip()
+    return ALIAS_DIAS.get(texto.upper(), texto.lower().replace(' ', '_'))
+
+
+# ================================================================
+# LECTURA
+# ================================================================
+
+def bloques_archivo(archivo, nombre: str, como_texto: bool = True):
+    """DataFrames del archivo por bloques, sin cargarlo completo como texto o celdas.
+
+    Con como_texto=False las celdas de un XLSX conservan su tipo (números y
+    fechas de la planilla); un CSV siempre se lee como texto.
+    """
+    if nombre.lower().endswith(('.xlsx', '.xlsm')):
+        # Modo sólo lectura: openpyxl recorre la hoja fila a fila
+        libro = openpyxl.load_workbook(archivo, read_only=True, data_only=True)
+        try:
+            filas = libro.active.iter_rows(values_only=True)
+            encabezado = next(filas, None)
+            if encabezado is None:
+                return
+            while lote := list(islice(filas, FILAS_POR_BLOQUE)):
+                bloque = pd.DataFrame(lote, columns=encabezado, dtype=object)
+                yield bloque.astype("string") if como_texto else bloque
+        finally:
+            libro.close()
+    else:
+        yield from pd.read_csv(archivo, dtype=str, sep=None, engine='python', chunksize=FILAS_POR_BLOQUE,
+                               encoding='utf-8-sig')
+
+
+def _a_formato_largo(bloque: pd.DataFrame, inicio: int) -> pd.DataFrame:
+    bloque = bloque.rename(columns=_normalizar_encabezado)
+    faltantes = {'supervisor_id', 'sala_id'} - set(bloque.columns)
+    if faltantes:
+        raise ErrorFormatoPlan(f"Faltan las columnas: {', '.join(sorted(faltantes))}")
+    bloque = bloque.assign(fila=range(inicio + 2, inicio + 2 + len(bloque)))  # +2: encabezado y base 1
+    base = ['fila', 'supervisor_id', 'sala_id'] + (['orden'] if 'orden' in bloque.columns else [])
+
+    if 'dia_semana' in bloque.columns:
+        largo = bloque[base + ['dia_semana']].copy()
+        largo['dia_semana'] = _normalizar_texto(largo['dia_semana']).map(lambda d: ALIAS_DIAS.get(d, d))
+    else:
+        dias = [d for d in DIAS_SEMANA if d in bloque.columns]
+        if not dias:
+            raise ErrorFormatoPlan("Se espera una columna dia_semana o una columna por día (LUNES ... SABADO)")
+        marcas = bloque[dias].apply(_normalizar_texto).isin(MARCAS_VERDADERAS)
+        largo = bloque[base].join(marcas).melt(id_vars=base, value_vars=dias, var_name='dia_semana', value_name='marcado')
+        largo = largo[largo['marcado']].drop(columns='marcado')
+
+    largo['supervisor_id'] = largo['supervisor_id'].astype("string").str.strip()
+    largo['sala_id'] = largo['sala_id'].astype("string").str.strip()
+    return largo
+
+
+def leer_plan(archivo, nombre: str) -> pd.DataFrame:
+    """Plan del archivo en formato largo: fila, supervisor_id, sala_id, dia_semana[, orden]."""
+    partes, inicio = [], 0
+    for bloque in bloques_archivo(archivo, nombre):
+        partes.append(_a_formato_largo(bloque, inicio))
+        inicio += len(bloque)
+    if not partes:
+        raise ErrorFormatoPlan("El archivo está vacío")
+    return pd.concat(partes, ignore_index=True).sort_values('fila', kind='stable', ignore_index=True)
+
+
+# ================================================================
+# VALIDACIÓN Y DIFERENCIA
+# ================================================================
+
+def validar_plan(plan: pd.DataFrame, salas_validas, supervisores_permitidos) -> tuple:
+    """Separa (validas, errores); errores tiene columnas fila y motivo."""
+    motivos = pd.Series(pd.NA, index=plan.index, dtype="string")
+
+    def marcar(condicion, motivo):
+        motivos[condicion & motivos.isna()] = motivo
+
+    marcar(plan['supervisor_id'].isna() | (plan['supervisor_id'] == ''), "supervisor_id vacío")
+    marcar(plan['sala_id'].isna() | (plan['sala_id'] == ''), "sala_id vacío")
+    marcar(~plan['supervisor_id'].isin(pd.Index(supervisores_permitidos)), "supervisor fuera de tu equipo")
+    marcar(~plan['sala_id'].isin(pd.Index(salas_validas)), "sala inexistente en el catálogo")
+    marcar(~plan['dia_semana'].isin(DIAS_SEMANA), "día de la semana inválido")
+    if 'orden' in plan.columns:
+        orden = pd.to_numeric(plan['orden'], errors='coerce')
+        entero = ((orden >= 1) & (orden % 1 == 0)).fillna(False)  # Un texto queda NA al convertirlo
+        marcar(plan['orden'].notna() & ~entero, "orden debe ser un entero positivo")
+    marcar(plan.duplicated(CLAVE_VISITA, keep='first'), "visita repetida en el archivo")
+    if 'orden' in plan.columns:
+        # Dos salas con el mismo orden el mismo día: no se sabe cuál va primero
+        explicito = orden.notna() & motivos.isna()
+        dias = plan.loc[explicito, ['supervisor_id', 'dia_semana']].assign(orden=orden[explicito])
+        marcar(dias.duplicated(keep='first').reindex(plan.index, fill_value=False), "orden repetido en el mismo día")
+
+    errores = plan.loc[motivos.notna(), ['fila']].assign(motivo=motivos[motivos.notna()])
+    validas = plan[motivos.isna()].copy()
+
+    # Orden dentro de cada día: los explícitos conservan su número y las filas sin
+    # orden toman, en el orden del archivo, los números que quedan libres
+    dia = ['supervisor_id', 'dia_semana']
+    orden = pd.to_numeric(validas['orden'], errors='coerce').astype(float) if 'orden' in validas.columns else \
+        pd.Series(float('nan'), index=validas.index)
+    explicitos = orden.dropna().groupby([validas[c] for c in dia]).agg(set).to_dict()
+    for clave, filas in validas[orden.isna()].groupby(dia, sort=False).groups.items():
+        ocupados = explicitos.get(clave, set())
+        orden[filas] = list(islice((n for n in count(1) if n not in ocupados), len(filas)))
+    validas['orden'] = orden.astype(int)
+    return validas[COLUMNAS_PLAN].reset_index(drop=True), errores.reset_index(drop=True)
+
+
+@dataclass
+class DiferenciaPlan:
+    """Cambios que produce aplicar un plan sobre el vigente."""
+    altas: pd.DataFrame       # visitas nuevas o con otro orden (COLUMNAS_PLAN)
+    bajas: pd.DataFrame       # visitas vigentes que el plan quita (CLAVE_VISITA)
+    sin_cambios: int
+
+    @property
+    def vacia(self) -> bool:
+        return self.altas.empty and self.bajas.empty
+
+    def resumen_por_supervisor(self) -> pd.DataFrame:
+        altas = self.altas.groupby('supervisor_id').size().rename('altas')
+        bajas = self.bajas.groupby('supervisor_id').size().rename('bajas')
+        return pd.concat([altas, bajas], axis=1).fillna(0).astype(int).reset_index()
+
+
+def diferencia_plan(nuevo: pd.DataFrame, actual: pd.DataFrame, reemplazar: bool = True) -> DiferenciaPlan:
+    """Compara el plan importado con el vigente de los mismos supervisores.
+
+    Con reemplazar=True el archivo es el plan completo de cada supervisor que
+    aparece en él, así que sus visitas vigentes ausentes del archivo se eliminan.
+    """
+    actual = actual[actual['supervisor_id'].isin(nuevo['supervisor_id'].unique())]
+    cruce = nuevo.merge(actual[COLUMNAS_PLAN], on=CLAVE_VISITA, how='outer', suffixes=('', '_actual'),
+                        indicator=True)
+    en_ambos = cruce['_merge'] == 'both'
+    cambia_orden = en_ambos & (cruce['orden'] != cruce['orden_actual'])
+    altas = cruce[(cruce['_merge'] == 'left_only') | cambia_orden][COLUMNAS_PLAN]
+    if reemplazar:
+        bajas = cruce[cruce['_merge'] == 'right_only'][CLAVE_VISITA]
+    else:
+        bajas = cruce.iloc[0:0][CLAVE_VISITA]
+    return DiferenciaPlan(
+        altas=altas.astype({'orden': int}).reset_index(drop=True),
+        bajas=bajas.reset_index(drop=True),
+        sin_cambios=int((en_ambos & ~cambia_orden).sum()),
+    )
@@ -0,0 +1,320 @@
+"""
+Itinerarios
+===========
+Convierte las visitas planificadas de cada día en un itinerario con horas:
+- Atención según el quintil de la sala, dentro del horario de apertura de la
+  sala (hora_apertura / hora_cierre, o HORARIO_SALA si no lo informa)
+- Viaje estimado desde las coordenadas: distancia haversine por un factor de
+  desvío urbano a velocidad media, más un tiempo fijo por tramo
+- calcular_horas: llegadas de todos los días de todos los supervisores en una
+  sola pasada vectorizada; la espera por apertura es un máximo acumulado por día
+- Los días que no caben en la jornada se reparan con heurísticas: reordenar
+  (vecino más cercano + 2-opt y por hora de cierre) y, si aún no caben,
+  sugerir mover las visitas de menor quintil al día con más holgura
+
+Las horas se manejan como minutos desde medianoche.
+"""
+
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+
+from castano.checkin import distancia_metros
+from castano.repositorio import DIAS_SEMANA
+
+INICIO_JORNADA = "09:00"
+FIN_JORNADA = "18:00"
+HORARIO_SALA = ("08:00", "22:00")   # Si la sala no informa su horario
+MINUTOS_ATENCION = {1: 20, 2: 25, 3: 30, 4: 40, 5: 50}  # Por quintil: las salas grandes toman más
+MINUTOS_ATENCION_DEFECTO = 30
+
+VELOCIDAD_KMH = 22          # Promedio urbano en horario laboral
+FACTOR_DESVIO = 1.35        # Calles vs. línea recta
+MINUTOS_POR_TRAMO = 5       # Estacionar y entrar a la sala
+MINUTOS_SIN_COORDENADAS = 20
+
+COLUMNAS_ITINERARIO = ['supervisor_id', 'dia_semana', 'orden', 'orden_plan', 'sala_id', 'sala_nombre', 'quintil',
+                       'llegada', 'inicio', 'salida', 'viaje_min', 'espera_min', 'atencion_min',
+                       'fuera_horario', 'fuera_jornada', 'sugerencia']
+COLUMNAS_DIA = ['supervisor_id', 'dia_semana', 'visitas', 'inicio', 'fin', 'viaje_min', 'espera_min',
+                'horas_extra_min', 'fuera_horario', 'reordenado', 'a_mover', 'factible']
+
+
+def a_minutos(horas) -> np.ndarray:
+    """'HH:MM' → minutos desde medianoche (NaN si falta o no es válida)."""
+    codigos, unicas = pd.factorize(pd.Series(horas, dtype=object))  # Pocas horas distintas: se convierte cada una una vez
+    s = pd.Series(unicas, dtype=object).astype('string')
+    minutos = (pd.to_timedelta(s + ':00', errors='coerce').dt.total_seconds() / 60).to_numpy(dtype=float)
+    return np.append(minutos, np.nan)[codigos]  # El código -1 (falta) toma el NaN del final
+
+
+def _minutos(hora: str) -> float:
+    horas, minutos = hora.split(':')
+    return int(horas) * 60 + int(minutos)
+
+
+def formato_hora(minutos) -> str:
+    """Minutos desde medianoche → 'HH:MM'."""
+    if minutos is None or pd.isna(minutos):
+        return ""
+    minutos = int(round(minutos))
+    return f"{minutos // 60:02d}:{minutos % 60:02d}"
+
+
+def minutos_viaje(lat1, lon1, lat2, lon2) -> np.ndarray:
+    """Minutos estimados de cada tramo (arreglos de igual largo)."""
+    metros = distancia_metros(np.asarray(lat1, dtype=float), np.asarray(lon1, dtype=float), lat2, lon2)
+    minutos = metros * FACTOR_DESVIO / (VELOCIDAD_KMH * 1000 / 60) + MINUTOS_POR_TRAMO
+    return np.where(np.isnan(minutos), MINUTOS_SIN_COORDENADAS, minutos)
+
+
+# ================================================================
+# PASADA VECTORIZADA
+# ================================================================
+
+def preparar_visitas(plan: pd.DataFrame, salas: pd.DataFrame, atencion: dict = None,
+                     horario: tuple = HORARIO_SALA) -> pd.DataFrame:
+    """Plan (supervisor_id, sala_id, dia_semana, orden) con nombre, coordenadas, ventana y atención de cada sala.
+
+    Queda ordenado por supervisor, día y orden, como lo espera calcular_horas; si
+    el plan trae `fecha` (días de la agenda), se conserva y se ordena también por ella.
+    """
+    atencion = atencion or MINUTOS_ATENCION
+    fecha = ['fecha'] if 'fecha' in plan.columns else []
+    v = plan[['supervisor_id', *fecha, 'sala_id', 'dia_semana', 'orden']].copy()
+    # Una sola búsqueda en el catálogo para todas las columnas de la sala
+    catalogo = salas.set_index('id').reindex(v['sala_id'].to_numpy())
+    v['sala_nombre'] = catalogo['nombre'].to_numpy()
+    v['quintil'] = catalogo['quintil'].to_numpy()
+    v['latitud'] = catalogo['latitud'].to_numpy(dtype=float)
+    v['longitud'] = catalogo['longitud'].to_numpy(dtype=float)
+    for columna, origen, defecto in (('apertura', 'hora_apertura', horario[0]), ('cierre', 'hora_cierre', horario[1])):
+        horas = catalogo[origen].to_numpy() if origen in catalogo.columns else [None] * len(v)
+        v[columna] = np.nan_to_num(a_minutos(horas), nan=_minutos(defecto))
+    v['atencion_min'] = v['quintil'].map(atencion).fillna(MINUTOS_ATENCION_DEFECTO).astype(float)
+    v['_dia'] = v['dia_semana'].map({d: i for i, d in enumerate(DIAS_SEMANA)})
+    v = v.sort_values(['supervisor_id', *fecha, '_dia', 'orden'], kind='stable').drop(columns='_dia')
+    return v.reset_index(drop=True)
+
+
+def _primeras_del_dia(v: pd.DataFrame) -> np.ndarray:
+    """Máscara de la primera visita de cada (supervisor, día) en un frame ordenado; por fecha si la trae."""
+    sup, dia = v['supervisor_id'].to_numpy(), v['fecha' if 'fecha' in v.columns else 'dia_semana'].to_numpy()
+    primera = np.ones(len(v), dtype=bool)
+    primera[1:] = (sup[1:] != sup[:-1]) | (dia[1:] != dia[:-1])
+    return primera
+
+
+def calcular_horas(v: pd.DataFrame, inicio: str = INICIO_JORNADA, fin: str = FIN_JORNADA) -> pd.DataFrame:
+    """Llegada, inicio de atención y salida de cada visita, para todos los días a la vez.
+
+    Con c_i = viaje acumulado hasta i + atención acumulada antes de i, la atención
+    de la parada i empieza en c_i + max(inicio, max_{j<=i}(apertura_j - c_j)):
+    la espera por apertura se propaga como un máximo acumulado por día.
+    """
+    inicio, fin = _minutos(inicio), _minutos(fin)
+    primera = _primeras_del_dia(v)
+    grupo = np.cumsum(primera) - 1
+
+    lat, lon = v['latitud'].to_numpy(), v['longitud'].to_numpy()
+    tramo = np.zeros(len(v))
+    tramo[1:] = minutos_viaje(lat[:-1], lon[:-1], lat[1:], lon[1:])
+    tramo[primera] = 0  # El día empieza en la primera sala
+    atencion = v['atencion_min'].to_numpy()
+    previa = np.concatenate([[0.0], atencion[:-1]])
+    previa[primera] = 0
+
+    x = tramo + previa
+    acumulado = np.cumsum(x)
+    c = acumulado - (acumulado - x)[primera][grupo]
+    holgura = pd.Series(v['apertura'].to_numpy() - c).groupby(grupo).cummax().to_numpy()
+    comienzo = c + np.maximum(inicio, holgura)
+    salida = comienzo + atencion
+    llegada = np.concatenate([[inicio], salida[:-1]]) + tramo
+    llegada[primera] = inicio
+
+    r = v.copy()
+    r['llegada'] = llegada.round()
+    r['inicio'] = comienzo.round()
+    r['salida'] = salida.round()
+    r['viaje_min'] = tramo.round()
+    r['espera_min'] = np.maximum(comienzo - llegada, 0).round()
+    r['fuera_horario'] = salida > r['cierre'].to_numpy()
+    r['fuera_jornada'] = salida > fin
+    return r
+
+
+# ================================================================
+# REPARACIÓN DE DÍAS QUE NO CABEN
+# ================================================================
+
+def _simular(orden, viaje, atencion, apertura, cierre, inicio) -> tuple:
+    """(visitas fuera de horario, hora de término) de un orden de visita."""
+    t, fuera, previa = inicio, 0, None
+    for i in orden:
+        if previa is not None:
+            t += viaje[previa, i]
+        t = max(t, apertura[i]) + atencion[i]
+        fuera += t > cierre[i]
+        previa = i
+    return fuera, t
+
+
+def _dos_opt(orden: list, viaje: np.ndarray) -> list:
+    """Mejora un recorrido abierto invirtiendo tramos mientras baje el viaje total."""
+    n = len(orden)
+    mejora = True
+    while mejora:
+        mejora = False
+        for i in range(n - 1):
+            for j in range(i + 3, n + 1):
+                a, b = orden[i], orden[i + 1]
+                # Invertir orden[i+1:j]: cambia la arista (i, i+1) y la que sale de j-1
+                antes = viaje[a, b] + (viaje[orden[j - 1], orden[j]] if j < n else 0)
+                despues = viaje[a, orden[j - 1]] + (viaje[b, orden[j]] if j < n else 0)
+                if despues < antes - 1e-9:
+                    orden[i + 1:j] = reversed(orden[i + 1:j])
+                    mejora = True
+    return orden
+
+
+def _vecino_mas_cercano(viaje: np.ndarray, origen: int) -> list:
+    orden, libres = [origen], set(range(len(viaje))) - {origen}
+    while libres:
+        siguiente = min(libres, key=lambda j: viaje[orden[-1], j])
+        orden.append(siguiente)
+        libres.remove(siguiente)
+    return orden
+
+
+def reparar_dia(d, inicio: float, fin: float) -> tuple:
+    """Mejor orden para un día que no cabe y las paradas que conviene sacar.
+
+    `d` tiene las columnas de calcular_horas (DataFrame o dict de arreglos). Prueba
+    el orden del plan, por hora de cierre y vecino más cercano + 2-opt; si ninguno
+    cabe, saca primero las visitas de menor quintil.
+    Retorna (orden de posiciones, posiciones a mover).
+    """
+    lat, lon = np.asarray(d['latitud']), np.asarray(d['longitud'])
+    n = len(lat)
+    viaje = minutos_viaje(np.repeat(lat, n), np.repeat(lon, n), np.tile(lat, n), np.tile(lon, n)).reshape(n, n)
+    atencion, apertura, cierre = (np.asarray(d[c]) for c in ('atencion_min', 'apertura', 'cierre'))
+
+    def costo(orden):
+        fuera, termino = _simular(orden, viaje, atencion, apertura, cierre, inicio)
+        return fuera, max(termino - fin, 0), termino
+
+    candidatos = [list(range(n)), sorted(range(n), key=lambda i: (cierre[i], apertura[i]))]
+    # Orígenes del vecino más cercano: la primera sala del plan y los extremos del día
+    extremos = np.unravel_index(np.argmax(viaje), viaje.shape)
+    candidatos += [_dos_opt(_vecino_mas_cercano(viaje, int(i)), viaje) for i in {0, *extremos}]
+    orden = min(candidatos, key=costo)
+
+    # Sacar visitas de menor quintil (a igualdad, la que más acorta el día) hasta que quepa
+    quintil = np.nan_to_num(np.asarray(d['quintil'], dtype=float))
+    a_mover = []
+    while len(orden) > 1 and costo(orden)[:2] != (0, 0):
+        menor = min(quintil[i] for i in orden)
+        sacar = min((i for i in orden if quintil[i] == menor), key=lambda i: costo([j for j in orden if j != i]))
+        orden = [j for j in orden if j != sacar]
+        a_mover.append(sacar)
+    return orden, a_mover
+
+
+COLUMNAS_REPARACION = ('latitud', 'longitud', 'atencion_min', 'apertura', 'cierre', 'quintil')
+
+
+@lru_cache(maxsize=4096)
+def _reparar_dia_memo(datos: bytes, inicio: float, fin: float) -> tuple:
+    """reparar_dia de un día dado como COLUMNAS_REPARACION en float64: al guardar un día no se reparan los demás."""
+    columnas = np.frombuffer(datos).reshape(len(COLUMNAS_REPARACION), -1)
+    orden, a_mover = reparar_dia(dict(zip(COLUMNAS_REPARACION, columnas)), inicio, fin)
+    return tuple(orden), tuple(a_mover)
+
+
+def _holgura_por_dia(horas: pd.DataFrame, inicio: float, fin: float) -> dict:
+    """{supervisor: {día: minutos libres}} de la semana, incluidos los días sin visitas."""
+    termino = horas.groupby(['supervisor_id', 'dia_semana'])['salida'].max()
+    holgura = {s: {d: fin - inicio for d in DIAS_SEMANA} for s in horas['supervisor_id'].unique()}
+    for (s, d), t in termino.items():
+        holgura[s][d] = fin - t
+    return holgura
+
+
+def programar_semana(plan: pd.DataFrame, salas: pd.DataFrame, inicio: str = INICIO_JORNADA,
+                     fin: str = FIN_JORNADA, atencion: dict = None, horario: tuple = HORARIO_SALA,
+                     reparar: bool = True) -> pd.DataFrame:
+    """Itinerario (COLUMNAS_ITINERARIO) de la semana de todos los supervisores del plan en un lote.
+
+    Los días que no caben quedan en el orden sugerido (orden_plan conserva el
+    original) y las visitas que sobran van al final con `sugerencia`.
+    """
+    if plan.empty:
+        return pd.DataFrame(columns=COLUMNAS_ITINERARIO)
+    v = preparar_visitas(plan, salas, atencion, horario).rename(columns={'orden': 'orden_plan'})
+    horas = calcular_horas(v, inicio, fin)
+    malos = horas['fuera_horario'] | horas['fuera_jornada']
+    if reparar and malos.any():
+        t0, t1 = _minutos(inicio), _minutos(fin)
+        holgura = _holgura_por_dia(horas, t0, t1)
+        dias_sala = set(zip(horas['supervisor_id'], horas['dia_semana'], horas['sala_id']))
+        columnas = {c: horas[c].to_numpy() for c in ('latitud', 'longitud', 'atencion_min', 'apertura', 'cierre',
+                                                      'quintil', 'supervisor_id', 'dia_semana', 'sala_id')}
+        malos = malos.to_numpy()
+        limites = [*np.flatnonzero(_primeras_del_dia(horas)), len(horas)]
+        # Cada día es un tramo contiguo del frame: se reordena dentro de su tramo
+        posiciones = np.arange(len(horas))
+        sugerencias = np.full(len(horas), None, dtype=object)
+        for a, b in zip(limites[:-1], limites[1:]):
+            if not malos[a:b].any():
+                continue
+            dia = np.array([columnas[c][a:b] for c in COLUMNAS_REPARACION], dtype=float)
+            orden, a_mover = _reparar_dia_memo(dia.tobytes(), t0, t1)
+            posiciones[a:b] = a + np.array(orden + a_mover)
+            sup, dia = columnas['supervisor_id'][a], columnas['dia_semana'][a]
+            for k, i in enumerate(a_mover, start=b - len(a_mover)):
+                sala_id, costo = columnas['sala_id'][a + i], columnas['atencion_min'][a + i] + MINUTOS_SIN_COORDENADAS
+                # Día con más holgura en que la sala no esté ya planificada
+                h, destino = max(((h, o) for o, h in holgura[sup].items()
+                                  if o != dia and (sup, o, sala_id) not in dias_sala), default=(0, None))
+                if destino is not None and h >= costo:
+                    sugerencias[k] = f"mover a {destino}"
+                    holgura[sup][destino] = h - costo
+                    dias_sala.add((sup, destino, sala_id))
+                else:
+                    sugerencias[k] = "sin día con holgura"
+        horas = calcular_horas(horas.iloc[posiciones].reset_index(drop=True), inicio, fin)
+        horas['sugerencia'] = pd.array(sugerencias, dtype="string")
+    else:
+        horas['sugerencia'] = pd.Series(pd.NA, index=horas.index, dtype="string")
+    horas['orden'] = horas.groupby(['supervisor_id', 'dia_semana'], sort=False).cumcount() + 1
+    return horas[COLUMNAS_ITINERARIO]
+
+
+def resumen_dias(itinerario: pd.DataFrame, fin: str = FIN_JORNADA) -> pd.DataFrame:
+    """Un registro por supervisor y día (COLUMNAS_DIA): término, horas extra y si cabe en la jornada.
+
+    Espera el orden de programar_semana (o un filtro de él): cada día es un tramo
+    contiguo, así que se resume con reduceat sin agrupar.
+    """
+    if itinerario.empty:
+        return pd.DataFrame(columns=COLUMNAS_DIA)
+    inicios = np.flatnonzero(_primeras_del_dia(itinerario))
+    x = {c: itinerario[c].to_numpy() for c in ('supervisor_id', 'dia_semana', 'orden', 'orden_plan', 'llegada',
+                                                  'salida', 'viaje_min', 'espera_min', 'fuera_horario')}
+
+    def suma(valores):
+        return np.add.reduceat(np.asarray(valores, dtype=float), inicios)
+
+    termino = np.maximum.reduceat(x['salida'].astype(float), inicios)
+    extra = np.maximum(termino - _minutos(fin), 0)
+    fuera_horario = suma(x['fuera_horario']).astype(int)
+    return pd.DataFrame({
+        'supervisor_id': x['supervisor_id'][inicios], 'dia_semana': x['dia_semana'][inicios],
+        'visitas': np.diff([*inicios, len(itinerario)]), 'inicio': x['llegada'][inicios], 'fin': termino,
+        'viaje_min': suma(x['viaje_min']), 'espera_min': suma(x['espera_min']), 'horas_extra_min': extra,
+        'fuera_horario': fuera_horario, 'reordenado': suma(x['orden'] != x['orden_plan']) > 0,
+        'a_mover': suma(itinerario['sugerencia'].notna().to_numpy()).astype(int),
+        'factible': (extra == 0) & (fuera_horario == 0),
+    }, columns=COLUMNAS_DIA)
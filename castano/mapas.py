@@ -0,0 +1,208 @@
+"""
+Mapas
+=====
+Capas de pydeck para rutas y salas, con la agregación hecha en el servidor:
+- agrupar_puntos: un punto por celda de una grilla en coordenadas Mercator
+  cuyo tamaño depende del zoom (como un geohash ajustado a la escala),
+  vectorizado con numpy; el navegador recibe celdas y no miles de salas
+- vista_region: recorta al rectángulo visible alrededor de un centro y agrupa
+  a ese zoom, así la cantidad de puntos enviados queda acotada por la pantalla
+- mapa_ruta: recorrido del día en orden de visita con las salas numeradas,
+  memorizado por recorrido (los reruns no vuelven a armar el Deck)
+
+Requiere pydeck (dependencia de Streamlit).
+"""
+
+from dataclasses import dataclass
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+
+from castano.arranque import importar_diferido
+
+pdk = importar_diferido('pydeck')  # Sólo lo cargan las páginas que dibujan un mapa
+
+TAMANO_TESELA = 256        # px de una tesela Mercator a zoom 0
+PIXELES_CELDA = 56         # Lado en pantalla de la celda que agrupa salas
+ANCHO_VISTA = 1024         # Vista de referencia: tablet apaisada
+ALTO_VISTA = 500           # Alto de st.pydeck_chart
+ZOOM_MINIMO = 4
+ZOOM_MAXIMO = 17
+LATITUD_MAXIMA = 85.05     # Límite de la proyección Mercator
+
+COLOR_CUBIERTA = [46, 160, 67, 220]     # Salas con visitas planificadas
+COLOR_SIN_PLAN = [230, 126, 34, 220]
+COLOR_RUTA = [102, 126, 234]
+
+
+# ================================================================
+# PROYECCIÓN Y AGRUPACIÓN
+# ================================================================
+
+def a_mundo(lat, lon) -> tuple:
+    """Coordenadas Mercator normalizadas (x, y en [0, 1]) de arreglos de latitud y longitud."""
+    lat = np.clip(np.asarray(lat, dtype=float), -LATITUD_MAXIMA, LATITUD_MAXIMA)
+    x = (np.asarray(lon, dtype=float) + 180) / 360
+    s = np.sin(np.radians(lat))
+    return x, 0.5 - np.log((1 + s) / (1 - s)) / (4 * np.pi)
+
+
+def desde_mundo(x, y) -> tuple:
+    """Inversa de a_mundo: (latitud, longitud)."""
+    return np.degrees(np.arctan(np.sinh(np.pi * (1 - 2 * np.asarray(y))))), np.asarray(x) * 360 - 180
+
+
+def _escala(zoom: int) -> float:
+    """Pixeles por unidad de mundo."""
+    return TAMANO_TESELA * 2.0 ** zoom
+
+
+def zoom_para(lats, lons, ancho: int = ANCHO_VISTA, alto: int = ALTO_VISTA) -> int:
+    """Mayor zoom entero en que todos los puntos caben en la vista."""
+    x, y = a_mundo(lats, lons)
+    dx, dy = max(np.ptp(x), 1e-9), max(np.ptp(y), 1e-9)
+    zoom = np.log2(min(ancho / (dx * TAMANO_TESELA), alto / (dy * TAMANO_TESELA)))
+    return int(np.clip(np.floor(zoom), ZOOM_MINIMO, ZOOM_MAXIMO))
+
+
+def encuadre(lats, lons, ancho: int = ANCHO_VISTA, alto: int = ALTO_VISTA) -> tuple:
+    """(latitud, longitud, zoom) que centra y muestra todos los puntos."""
+    x, y = a_mundo(lats, lons)
+    latitud, longitud = desde_mundo((x.min() + x.max()) / 2, (y.min() + y.max()) / 2)
+    return float(latitud), float(longitud), zoom_para(lats, lons, ancho, alto)
+
+
+def agrupar_puntos(df: pd.DataFrame, zoom: int, sumar: tuple = ()) -> pd.DataFrame:
+    """Un punto por celda de PIXELES_CELDA px al zoom dado.
+
+    `df` tiene id, nombre, latitud y longitud. Retorna latitud/longitud del
+    centroide, n y la suma de las columnas `sumar`; id y nombre sólo quedan en
+    las celdas con una sala.
+    """
+    x, y = a_mundo(df['latitud'], df['longitud'])
+    celdas = _escala(zoom) / PIXELES_CELDA
+    # Clave entera única por celda: columna en los 32 bits altos, fila en los bajos
+    clave = (np.floor(x * celdas).astype(np.int64) << 32) + np.floor(y * celdas).astype(np.int64)
+    _, primera, grupo, n = np.unique(clave, return_index=True, return_inverse=True, return_counts=True)
+    sola = n == 1
+    r = pd.DataFrame({
+        'latitud': np.bincount(grupo, weights=df['latitud'].to_numpy(), minlength=len(n)) / n,
+        'longitud': np.bincount(grupo, weights=df['longitud'].to_numpy(), minlength=len(n)) / n,
+        'n': n,
+        'id': np.where(sola, df['id'].to_numpy()[primera], None),
+        'nombre': np.where(sola, df['nombre'].to_numpy()[primera], None),
+    })
+    for c in sumar:
+        r[c] = np.bincount(grupo, weights=df[c].to_numpy(), minlength=len(n)).astype(df[c].dtype)
+    return r
+
+
+@dataclass
+class VistaMapa:
+    """Puntos agrupados de una vista y su encuadre."""
+    puntos: pd.DataFrame
+    latitud: float
+    longitud: float
+    zoom: int
+    salas: int          # Salas dentro de la vista (antes de agrupar)
+
+    @property
+    def ampliable(self) -> bool:
+        return self.zoom < ZOOM_MAXIMO
+
+
+def vista_region(salas: pd.DataFrame, centro: tuple = None, zoom: int = None, sumar: tuple = (),
+                 ancho: int = ANCHO_VISTA, alto: int = ALTO_VISTA) -> VistaMapa:
+    """Salas visibles alrededor de `centro` (lat, lon) agrupadas al zoom; sin centro, encuadra todas."""
+    salas = salas.dropna(subset=['latitud', 'longitud'])
+    if salas.empty:
+        return VistaMapa(agrupar_puntos(salas, ZOOM_MINIMO, sumar), 0.0, 0.0, ZOOM_MINIMO, 0)
+    if centro is None:
+        *centro, zoom = encuadre(salas['latitud'], salas['longitud'], ancho, alto)
+    x, y = a_mundo(salas['latitud'], salas['longitud'])
+    zoom = int(np.clip(zoom, ZOOM_MINIMO, ZOOM_MAXIMO))
+    x0, y0 = a_mundo(centro[0], centro[1])
+    # Media vista de margen por lado: al arrastrar el mapa no aparecen huecos de inmediato
+    visibles = (np.abs(x - x0) <= ancho / _escala(zoom)) & (np.abs(y - y0) <= alto / _escala(zoom))
+    en_vista = salas[visibles]
+    return VistaMapa(agrupar_puntos(en_vista, zoom, sumar), float(centro[0]), float(centro[1]), zoom, len(en_vista))
+
+
+# ================================================================
+# CAPAS PYDECK
+# ================================================================
+
+def capas_ruta(df_dia: pd.DataFrame, id_capa: str = 'ruta') -> list:
+    """Recorrido en orden de visita (PathLayer) y salas numeradas; df_dia tiene orden, sala_nombre, latitud, longitud."""
+    return _capas_recorrido(_recorrido(df_dia), id_capa)
+
+
+def _recorrido(df_dia: pd.DataFrame) -> tuple:
+    """(orden, sala_nombre, latitud, longitud) de las paradas con coordenadas, en orden de visita."""
+    paradas = df_dia.dropna(subset=['latitud', 'longitud']).sort_values('orden')
+    return tuple(zip(*(paradas[c].tolist() for c in ('orden', 'sala_nombre', 'latitud', 'longitud'))))
+
+
+def _capas_recorrido(recorrido: tuple, id_capa: str) -> list:
+    # Registros con sólo los campos que usan las capas (pydeck serializa cada registro completo)
+    paradas = [{'latitud': lat, 'longitud': lon, 'etiqueta': str(orden), 'descripcion': f"{orden}. {nombre}"}
+               for orden, nombre, lat, lon in recorrido]
+    camino = [[lon, lat] for _, _, lat, lon in recorrido]
+    return [
+        pdk.Layer('PathLayer', data=[{'path': camino}], id=f"{id_capa}_recorrido", get_path='path',
+                  get_color=COLOR_RUTA, width_units='pixels', get_width=4, joint_rounded=True, cap_rounded=True),
+        pdk.Layer('ScatterplotLayer', data=paradas, id=f"{id_capa}_paradas", get_position='[longitud, latitud]',
+                  get_fill_color=COLOR_RUTA, radius_units='pixels', get_radius=11, pickable=True,
+                  stroked=True, get_line_color=[255, 255, 255], line_width_min_pixels=2),
+        pdk.Layer('TextLayer', data=paradas, id=f"{id_capa}_numeros", get_position='[longitud, latitud]',
+                  get_text='etiqueta', get_size=13, get_color=[255, 255, 255], get_alignment_baseline="'center'"),
+    ]
+
+
+def mapa_ruta(df_dia: pd.DataFrame):
+    """Deck con el recorrido de un día, encuadrado a sus salas."""
+    return _mapa_ruta(_recorrido(df_dia))
+
+
+@lru_cache(maxsize=512)
+def _mapa_ruta(recorrido: tuple):
+    """Deck de mapa_ruta, armado una vez por recorrido: pydeck copia los datos en cada capa al crearla."""
+    _, _, latitudes, longitudes = zip(*recorrido)
+    latitud, longitud, zoom = encuadre(latitudes, longitudes)
+    vista = pdk.ViewState(latitude=latitud, longitude=longitud, zoom=min(zoom, 15))
+    return pdk.Deck(layers=_capas_recorrido(recorrido, 'ruta'), initial_view_state=vista, map_style=None,
+                    tooltip={'text': '{descripcion}'})
+
+
+def mapa_region(vista: VistaMapa, capas_extra: list = ()):
+    """Deck con los puntos agrupados de la vista (capa 'salas', seleccionable).
+
+    Si los puntos traen la columna `con_visitas` (salas con visitas planificadas),
+    se colorean según la cobertura.
+    """
+    p = vista.puntos
+    cubiertas = p['con_visitas'] if 'con_visitas' in p.columns else p['n']
+    # Sólo las columnas que usan las capas: pydeck serializa cada fila completa al navegador
+    puntos = pd.DataFrame({
+        'latitud': p['latitud'].round(5), 'longitud': p['longitud'].round(5), 'n': p['n'],
+        'cubierta': cubiertas > 0,
+        'radio': (7 + 4 * np.log2(p['n'])).round(1),
+        'descripcion': np.where(
+            p['n'] > 1,
+            p['n'].astype(str) + " salas · " + cubiertas.astype(int).astype(str) + " con visitas · clic para acercar",
+            p['nombre'].fillna("").astype(str),
+        ),
+    })
+    grupos = puntos.loc[puntos['n'] > 1, ['latitud', 'longitud', 'n']]
+    capas = [
+        pdk.Layer('ScatterplotLayer', data=puntos, id='salas', get_position='[longitud, latitud]',
+                  get_fill_color=f"cubierta ? {COLOR_CUBIERTA} : {COLOR_SIN_PLAN}",
+                  get_radius='radio', radius_units='pixels', pickable=True, stroked=True,
+                  get_line_color=[255, 255, 255], line_width_min_pixels=1),
+        pdk.Layer('TextLayer', data=grupos, id='salas_conteo', get_position='[longitud, latitud]',
+                  get_text='n', get_size=12, get_color=[255, 255, 255], get_alignment_baseline="'center'"),
+        *capas_extra,
+    ]
+    return pdk.Deck(layers=capas, map_style=None, tooltip={'text': '{descripcion}'},
+                    initial_view_state=pdk.ViewState(latitude=vista.latitud, longitude=vista.longitud, zoom=vista.zoom))
@@ -0,0 +1,308 @@
+"""
+Notificaciones de cambios
+=========================
+Avisos de escritura para que las sesiones abiertas vean datos frescos sin
+consultar los backends a intervalos:
+- Cambio: tema (PLAN, EXCEPCIONES, RENDICIONES) e id del supervisor afectado
+  (TODOS en un feriado general)
+- BusCambios: pub/sub del proceso; quien escribe publica, `al_cambiar` invalida
+  las cachés afectadas y cada (tema, id) lleva un contador de versión que las
+  páginas abiertas comparan en memoria
+- Canales entre réplicas: CanalMemoria (una sola réplica), CanalSQLite (archivo
+  compartido por las réplicas de un host) y CanalSpanner (tabla Cambio leída
+  con un change stream)
+
+Los cambios de otras réplicas llegan por el canal y se aplican igual que los
+locales; los propios se ignoran al volver.
+"""
+
+import json
+import sqlite3
+import threading
+import time
+import uuid
+from abc import ABC, abstractmethod
+from collections import Counter
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from urllib.parse import urlparse
+
+from castano.repositorio import TODOS
+
+PLAN = 'plan'                   # Días de visita de un supervisor
+EXCEPCIONES = 'excepciones'     # Feriados y excepciones de la agenda
+RENDICIONES = 'rendiciones'
+
+ESPERA_SQLITE = 1.0             # Segundos entre lecturas del archivo de cambios
+RETENCION = 24 * 3600           # Segundos que se guardan los cambios en el canal
+LATIDO_MS = 10_000              # Heartbeat del change stream de Spanner
+
+
+@dataclass(frozen=True)
+class Cambio:
+    """Escritura en los datos de un supervisor (o de todos)."""
+    tema: str
+    id: str
+    origen: str = None          # Réplica que lo publicó
+
+
+# ================================================================
+# CANALES ENTRE RÉPLICAS
+# ================================================================
+
+class CanalCambios(ABC):
+    """Difunde los cambios publicados en una réplica a todas las demás."""
+
+    @abstractmethod
+    def publicar(self, cambios: list) -> None:
+        """Envía los cambios a las réplicas que escuchan."""
+
+    @abstractmethod
+    def escuchar(self, entregar) -> None:
+        """Empieza a llamar, desde un hilo, entregar(cambios) con lo publicado de aquí en adelante (propios incluidos)."""
+
+    def cerrar(self) -> None:
+        """Deja de escuchar."""
+
+
+class CanalMemoria(CanalCambios):
+    """Sin otras réplicas: los cambios ya se aplicaron en el proceso al publicarlos."""
+
+    def publicar(self, cambios: list) -> None:
+        pass
+
+    def escuchar(self, entregar) -> None:
+        pass
+
+
+class CanalSQLite(CanalCambios):
+    """Cambios en un archivo SQLite compartido por las réplicas de un mismo host.
+
+    Cada réplica lee las filas nuevas cada `espera` segundos: es una lectura
+    del archivo local, no de los backends de datos.
+    """
+
+    def __init__(self, ruta: str, espera: float = ESPERA_SQLITE, retencion: float = RETENCION):
+        self.ruta = ruta
+        self.espera = espera
+        self.retencion = retencion
+        self._local = threading.local()
+        self._detener = threading.Event()
+        self._hilo = None
+        with self.conexion as con:
+            con.execute(
+                "CREATE TABLE IF NOT EXISTS Cambio (seq INTEGER PRIMARY KEY AUTOINCREMENT, tema TEXT NOT NULL, "
+                "id TEXT NOT NULL, origen TEXT NOT NULL, instante REAL NOT NULL)"
+            )
+
+    @property
+    def conexion(self) -> sqlite3.Connection:
+        con = getattr(self._local, 'con', None)
+        if con is None:
+            con = self._local.con = sqlite3.connect(self.ruta, timeout=30)
+            con.execute("PRAGMA journal_mode=WAL")
+        return con
+
+    def publicar(self, cambios: list) -> None:
+        ahora = time.time()
+        with self.conexion as con:
+            con.executemany("INSERT INTO Cambio (tema, id, origen, instante) VALUES (?, ?, ?, ?)",
+                            [(c.tema, c.id, c.origen, ahora) for c in cambios])
+            # Limpieza oportunista: una réplica que arranca no lee el historial
+            con.execute("DELETE FROM Cambio WHERE instante < ?", (ahora - self.retencion,))
+
+    def escuchar(self, entregar) -> None:
+        ultimo = self.conexion.execute("SELECT COALESCE(MAX(seq), 0) FROM Cambio").fetchone()[0]
+        self._hilo = threading.Thread(target=self._bucle, args=(entregar, ultimo), name="castano-cambios", daemon=True)
+        self._hilo.start()
+
+    def _bucle(self, entregar, ultimo: int) -> None:
+        # SQLite serializa las escrituras: seq crece en el orden de los commits y no quedan huecos por leer
+        while not self._detener.wait(self.espera):
+            try:
+                filas = self.conexion.execute(
+                    "SELECT seq, tema, id, origen FROM Cambio WHERE seq > ? ORDER BY seq", (ultimo,)
+                ).fetchall()
+            except sqlite3.Error:
+                continue  # Archivo bloqueado o reemplazado: se reintenta en la próxima vuelta
+            if filas:
+                ultimo = filas[-1][0]
+                entregar([Cambio(tema, id_, origen) for _, tema, id_, origen in filas])
+
+    def cerrar(self) -> None:
+        self._detener.set()
+        if self._hilo is not None:
+            self._hilo.join(timeout=5)
+
+
+class CanalSpanner(CanalCambios):
+    """Cambios en la tabla Cambio de Spanner, leídos con un change stream (DDL en el README).
+
+    Se lee cada partición del stream en su propio hilo, siguiendo las
+    particiones hijas a medida que Spanner las divide o las une. Requiere
+    `google-cloud-spanner`.
+    """
+
+    def __init__(self, database, flujo: str = 'CambiosCastano', latido_ms: int = LATIDO_MS):
+        from google.cloud import spanner
+        from google.cloud.spanner_v1 import TypeCode
+        self._spanner = spanner
+        self._codigos = TypeCode
+        self.database = database
+        self.flujo = flujo
+        self.latido_ms = latido_ms
+        self._lock = threading.Lock()
+        self._particiones = set()
+        self._detener = threading.Event()
+
+    def publicar(self, cambios: list) -> None:
+        with self.database.batch() as batch:
+            batch.insert('Cambio', columns=('evento', 'tema', 'id', 'origen', 'instante'), values=[
+                (uuid.uuid4().hex, c.tema, c.id, c.origen, self._spanner.COMMIT_TIMESTAMP) for c in cambios
+            ])
+
+    def escuchar(self, entregar) -> None:
+        self._leer(None, datetime.now(timezone.utc), entregar)
+
+    def _leer(self, token: str, desde: datetime, entregar) -> None:
+        with self._lock:
+            if token in self._particiones:
+                return  # Una partición que une a dos padres se anuncia en ambos
+            self._particiones.add(token)
+        threading.Thread(target=self._bucle, args=(token, desde, entregar), name="castano-cambios",
+                         daemon=True).start()
+
+    def _nombrar(self, valor, tipo):
+        """Los STRUCT llegan como listas: se convierten en dicts con los nombres de sus campos."""
+        if valor is None:
+            return None
+        if tipo.code == self._codigos.ARRAY:
+            return [self._nombrar(v, tipo.array_element_type) for v in valor]
+        if tipo.code == self._codigos.STRUCT:
+            return {c.name: self._nombrar(v, c.type_) for c, v in zip(tipo.struct_type.fields, valor)}
+        return valor
+
+    def _bucle(self, token: str, desde: datetime, entregar) -> None:
+        tipos = self._spanner.param_types
+        query = f"""
+            SELECT ChangeRecord FROM READ_{self.flujo}(
+                start_timestamp => @desde, end_timestamp => NULL,
+                partition_token => @token, heartbeat_milliseconds => @latido)
+        """
+        while not self._detener.is_set():
+            try:
+                with self.database.snapshot() as snapshot:
+                    resultado = snapshot.execute_sql(
+                        query, params={'desde': desde, 'token': token, 'latido': self.latido_ms},
+                        param_types={'desde': tipos.TIMESTAMP, 'token': tipos.STRING, 'latido': tipos.INT64},
+                    )
+                    for (registros,) in resultado:
+                        for registro in self._nombrar(registros, resultado.fields[0].type_):
+                            desde = self._procesar(registro, desde, entregar)
+                return  # La consulta termina cuando la partición se cierra: siguen sus hijas
+            except Exception:
+                # Se retoma desde el último registro leído; un cambio repetido sólo invalida de nuevo
+                self._detener.wait(self.latido_ms / 1000)
+
+    def _procesar(self, registro: dict, desde: datetime, entregar) -> datetime:
+        """Entrega los cambios de un registro del stream y retorna hasta dónde se leyó."""
+        for latido in registro['heartbeat_record'] or []:
+            desde = max(desde, latido['timestamp'])
+        for datos in registro['data_change_record'] or []:
+            if datos['mod_type'] == 'INSERT':  # Los borrados por retención no son cambios
+                valores = [m['new_values'] for m in datos['mods']]
+                valores = [v if isinstance(v, dict) else json.loads(v) for v in valores]
+                entregar([Cambio(v['tema'], v['id'], v['origen']) for v in valores])
+            desde = max(desde, datos['commit_timestamp'])
+        for hijas in registro['child_partitions_record'] or []:
+            for hija in hijas['child_partitions']:
+                self._leer(hija['token'], hijas['start_timestamp'], entregar)
+        return desde
+
+    def cerrar(self) -> None:
+        self._detener.set()  # Las consultas abiertas terminan con el proceso
+
+
+def crear_canal(url: str, conectar_spanner=None) -> CanalCambios:
+    """Crea el canal según la URL: memoria://, sqlite:///ruta.db o spanner://<change stream>.
+
+    `conectar_spanner()` retorna la base de Spanner; sólo se llama con spanner://.
+    """
+    partes = urlparse(url)
+    if partes.scheme == 'memoria':
+        return CanalMemoria()
+    if partes.scheme == 'sqlite':
+        return CanalSQLite(url[len('sqlite:///'):])
+    if partes.scheme == 'spanner':
+        database = conectar_spanner() if conectar_spanner else None
+        if database is None:
+            raise ValueError("El canal spanner:// necesita una conexión a Spanner")
+        return CanalSpanner(database, partes.netloc or 'CambiosCastano')
+    raise ValueError(f"Canal de cambios no soportado: {url}")
+
+
+# ================================================================
+# BUS DEL PROCESO
+# ================================================================
+
+class BusCambios:
+    """Pub/sub de cambios del proceso, conectado a las demás réplicas por un canal.
+
+    `al_cambiar(cambios)` se llama con cada lote, local o de otra réplica, antes
+    de subir las versiones: quien ve una versión nueva ya encuentra las cachés
+    invalidadas.
+    """
+
+    def __init__(self, canal: CanalCambios = None, al_cambiar=None, replica: str = None):
+        self.canal = canal or CanalMemoria()
+        self._al_cambiar = al_cambiar
+        self.replica = replica or uuid.uuid4().hex
+        self._lock = threading.Lock()
+        self._versiones = Counter()     # (tema, id) → cambios; (tema, None) → total del tema
+        self.remotos = 0                # Cambios recibidos de otras réplicas
+        self.ultimo_error = None
+        self.canal.escuchar(self._recibir)
+
+    def publicar(self, tema: str, ids) -> None:
+        """Aplica en el proceso el cambio de esos supervisores y lo difunde a las demás réplicas."""
+        cambios = [Cambio(tema, id_, self.replica) for id_ in dict.fromkeys(ids)]
+        if not cambios:
+            return
+        self._aplicar(cambios)
+        try:
+            self.canal.publicar(cambios)
+        except Exception as e:
+            # Lo escrito ya quedó en el backend: las demás réplicas lo ven con su refresco periódico
+            self.ultimo_error = f"{type(e).__name__}: {e}"
+
+    def _recibir(self, cambios: list) -> None:
+        ajenos = [c for c in cambios if c.origen != self.replica]
+        if ajenos:
+            self.remotos += len(ajenos)
+            self._aplicar(ajenos)
+
+    def _aplicar(self, cambios: list) -> None:
+        if self._al_cambiar is not None:
+            try:
+                self._al_cambiar(cambios)
+            except Exception as e:
+                self.ultimo_error = f"{type(e).__name__}: {e}"
+        with self._lock:
+            for c in cambios:
+                self._versiones[(c.tema, c.id)] += 1
+                self._versiones[(c.tema, None)] += 1
+
+    def version(self, tema: str, id_: str = None) -> int:
+        """Cambios recibidos de (tema, id), incluidos los que afectan a TODOS; sin id, los de todo el tema."""
+        with self._lock:
+            if id_ is None:
+                return self._versiones[(tema, None)]
+            return self._versiones[(tema, id_)] + self._versiones[(tema, TODOS)]
+
+    def versiones(self, claves) -> tuple:
+        """Versiones de una lista de (tema, id)."""
+        return tuple(self.version(tema, id_) for tema, id_ in claves)
+
+    def cerrar(self) -> None:
+        """Deja de escuchar a las demás réplicas."""
+        self.canal.cerrar()
@@ -0,0 +1,188 @@
+"""
+Organización
+============
+Árbol Zonal → Supervisor → Sala de toda la empresa, para el explorador del
+administrador:
+- Se carga con un solo recorrido de dos saltos sobre el grafo de Spanner
+  (Repositorio.organizacion), no con una consulta por nivel
+- ArbolOrganizacion: relaciones y visitas en memoria, con agregados por nodo
+  (supervisores, salas distintas, visitas por semana, gasto) y un índice
+  padre → tramo de hijos; bajar un nivel es un corte del frame, sin consultas
+- Un cambio de plan recarga sólo las visitas de los supervisores afectados y
+  recalcula los agregados en memoria; el recorrido completo se repite cada
+  cierto tiempo para recoger cambios de jerarquía o de salas
+"""
+
+import threading
+import time
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from castano.repositorio import COLUMNAS_ORGANIZACION
+
+REFRESCO = 60 * 60      # Segundos entre recorridos completos del grafo
+
+COLUMNAS_RELACION = ['zonal_id', 'zonal_nombre', 'supervisor_id', 'supervisor_nombre']
+COLUMNAS_VISITAS = ['supervisor_id', 'sala_id', 'sala_nombre', 'visitas']
+
+
+def dividir_organizacion(aristas: pd.DataFrame) -> tuple:
+    """(relaciones zonal → supervisor, visitas supervisor → sala) de las aristas COLUMNAS_ORGANIZACION."""
+    aristas = aristas.reindex(columns=COLUMNAS_ORGANIZACION)
+    relaciones = aristas[COLUMNAS_RELACION].drop_duplicates(ignore_index=True)
+    # Un supervisor con dos zonales trae sus salas dos veces
+    visitas = aristas.dropna(subset=['sala_id']).drop_duplicates(['supervisor_id', 'sala_id'])
+    return relaciones, visitas[COLUMNAS_VISITAS].reset_index(drop=True)
+
+
+def visitas_por_sala(plan: pd.DataFrame, salas: pd.DataFrame) -> pd.DataFrame:
+    """Visitas semanales por supervisor y sala (COLUMNAS_VISITAS) desde el plan (COLUMNAS_PLAN) y el catálogo."""
+    visitas = plan.groupby(['supervisor_id', 'sala_id'], as_index=False).size().rename(columns={'size': 'visitas'})
+    visitas['sala_nombre'] = visitas['sala_id'].map(salas.set_index('id')['nombre'])
+    return visitas[COLUMNAS_VISITAS]
+
+
+def _tramos(df: pd.DataFrame, clave: str) -> dict:
+    """clave → (desde, hasta) de un frame ordenado por `clave`."""
+    valores = df[clave].to_numpy()
+    if not len(valores):
+        return {}
+    inicios = np.flatnonzero(np.r_[True, valores[1:] != valores[:-1]])
+    return dict(zip(valores[inicios], zip(inicios.tolist(), np.append(inicios[1:], len(valores)).tolist())))
+
+
+def agregar_arbol(relaciones: pd.DataFrame, visitas: pd.DataFrame, gasto: pd.Series) -> dict:
+    """Niveles del árbol con sus agregados, ordenados por padre y nombre, el tramo de hijos de cada padre y
+    los totales del país.
+
+    `gasto` es el gasto por supervisor_id. Una sala que visitan dos supervisores
+    de un zonal cuenta una vez en el zonal.
+    """
+    por_supervisor = visitas.groupby('supervisor_id').agg(salas=('sala_id', 'size'), visitas=('visitas', 'sum'))
+    supervisores = relaciones.join(por_supervisor, on='supervisor_id')
+    supervisores[['salas', 'visitas']] = supervisores[['salas', 'visitas']].fillna(0).astype(int)
+    supervisores['gasto'] = supervisores['supervisor_id'].map(gasto).fillna(0).astype(int)
+    supervisores = supervisores.sort_values(['zonal_id', 'supervisor_nombre'], ignore_index=True)
+
+    salas_zonal = relaciones[['zonal_id', 'supervisor_id']].merge(visitas[['supervisor_id', 'sala_id']]) \
+        .groupby('zonal_id')['sala_id'].nunique()
+    zonales = supervisores.groupby(['zonal_id', 'zonal_nombre'], as_index=False).agg(
+        supervisores=('supervisor_id', 'size'), visitas=('visitas', 'sum'), gasto=('gasto', 'sum'))
+    zonales.insert(3, 'salas', zonales['zonal_id'].map(salas_zonal).fillna(0).astype(int))
+
+    salas = visitas.sort_values(['supervisor_id', 'sala_nombre'], ignore_index=True)
+    unicos = supervisores.drop_duplicates('supervisor_id')
+    return {
+        'zonales': zonales.sort_values('zonal_nombre', ignore_index=True),
+        'supervisores': supervisores,
+        'salas': salas,
+        'tramos_supervisores': _tramos(supervisores, 'zonal_id'),
+        'tramos_salas': _tramos(salas, 'supervisor_id'),
+        'totales': {
+            'zonales': len(zonales), 'supervisores': len(unicos), 'salas': visitas['sala_id'].nunique(),
+            'visitas': int(unicos['visitas'].sum()), 'gasto': int(unicos['gasto'].sum()),
+        },
+    }
+
+
+# ================================================================
+# ÁRBOL EN MEMORIA
+# ================================================================
+
+class ArbolOrganizacion:
+    """Árbol de la empresa cargado a demanda y compartido por todas las sesiones del proceso.
+
+    `cargar_organizacion()` entrega las aristas (COLUMNAS_ORGANIZACION),
+    `cargar_visitas(supervisor_ids)` las visitas de esos supervisores
+    (COLUMNAS_VISITAS) y `cargar_gasto()` el gasto por supervisor_id; el gasto se
+    vuelve a leer cuando cambia `version_gasto()`. Crearlo no consulta nada.
+    """
+
+    def __init__(self, cargar_organizacion, cargar_visitas, cargar_gasto, version_gasto=lambda: None,
+                 refresco: float = REFRESCO):
+        self._cargar_organizacion = cargar_organizacion
+        self._cargar_visitas = cargar_visitas
+        self._cargar_gasto = cargar_gasto
+        self._version_gasto = version_gasto
+        self.refresco = refresco
+        self._lock = threading.Lock()          # Protege el estado; nunca se tiene durante una consulta
+        self._lock_carga = threading.Lock()    # Una recarga a la vez
+        self._invalidaciones = 0
+        self._relaciones = self._visitas = None
+        self._gasto, self._version = pd.Series(dtype=float), None
+        self._pendientes = set()
+        self._niveles = None
+        self.cargado_en = None      # time.monotonic() del último recorrido completo
+        self.actualizado_en = None  # datetime de la última actualización, para mostrar
+
+    def actualizar_supervisores(self, supervisor_ids) -> None:
+        """Marca el plan de esos supervisores como cambiado; la próxima lectura recarga sólo sus visitas."""
+        with self._lock:
+            self._pendientes.update(supervisor_ids)
+
+    def invalidar(self) -> None:
+        """Fuerza un recorrido completo en la próxima lectura."""
+        with self._lock:
+            self.cargado_en = None
+            self._invalidaciones += 1
+
+    def _vigente(self, version) -> bool:
+        return (self._niveles is not None and not self._pendientes and version == self._version
+                and self.cargado_en is not None and time.monotonic() - self.cargado_en <= self.refresco)
+
+    def _al_dia(self) -> dict:
+        version = self._version_gasto()
+        with self._lock:
+            if self._vigente(version):
+                return self._niveles
+        # Las consultas corren fuera de self._lock: actualizar_supervisores, que llaman
+        # aplicar_cambios y el canal de cambios, no espera un recorrido completo
+        with self._lock_carga:
+            version = self._version_gasto()
+            with self._lock:
+                if self._vigente(version):
+                    return self._niveles  # La recargó otra lectura mientras se esperaba
+                completo = self.cargado_en is None or time.monotonic() - self.cargado_en > self.refresco
+                ids, invalidaciones = list(self._pendientes), self._invalidaciones
+                relaciones, visitas, gasto = self._relaciones, self._visitas, self._gasto
+                recargar_gasto = self._niveles is None or version != self._version
+            inicio = time.monotonic()
+            if completo:
+                relaciones, visitas = dividir_organizacion(self._cargar_organizacion())
+            elif ids:
+                otros = visitas[~visitas['supervisor_id'].isin(ids)]
+                visitas = pd.concat([otros, self._cargar_visitas(ids)[COLUMNAS_VISITAS]], ignore_index=True)
+            if recargar_gasto:
+                gasto = self._cargar_gasto()
+            niveles = agregar_arbol(relaciones, visitas, gasto)
+            with self._lock:
+                # Lo marcado durante la carga queda pendiente para la próxima lectura
+                self._pendientes.difference_update(ids)
+                if completo and invalidaciones == self._invalidaciones:
+                    self.cargado_en = inicio
+                self._relaciones, self._visitas, self._gasto, self._version = relaciones, visitas, gasto, version
+                self._niveles = niveles
+                self.actualizado_en = datetime.now()
+            return niveles
+
+    def totales(self) -> dict:
+        """Zonales, supervisores, salas distintas, visitas por semana y gasto de toda la empresa."""
+        return self._al_dia()['totales']
+
+    def zonales(self) -> pd.DataFrame:
+        """Zonales con supervisores, salas, visitas y gasto de su equipo, por nombre."""
+        return self._al_dia()['zonales']
+
+    def supervisores(self, zonal_id: str) -> pd.DataFrame:
+        """Supervisores del zonal con sus salas, visitas y gasto, por nombre."""
+        niveles = self._al_dia()
+        desde, hasta = niveles['tramos_supervisores'].get(zonal_id, (0, 0))
+        return niveles['supervisores'].iloc[desde:hasta].reset_index(drop=True)
+
+    def salas(self, supervisor_id: str) -> pd.DataFrame:
+        """Salas del plan del supervisor con sus visitas por semana, por nombre."""
+        niveles = self._al_dia()
+        desde, hasta = niveles['tramos_salas'].get(supervisor_id, (0, 0))
+        return niveles['salas'].iloc[desde:hasta].reset_index(drop=True)
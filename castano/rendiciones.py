@@ -0,0 +1,157 @@
+"""
+Carga masiva de rendiciones
+===========================
+Valida una planilla de gastos (fecha, monto, categoria, comentario y, opcional,
+id_rendicion) de forma vectorizada, descarta duplicados contra lo ya rendido y
+deja las filas listas para una carga por lotes en Fact_Rendicion.
+
+Duplicados:
+- Por id_rendicion, si la planilla lo trae
+- Por huella de contenido (supervisor, fecha, monto, categoría, comentario),
+  para que subir dos veces la misma planilla no duplique gastos
+"""
+
+import hashlib
+import numbers
+import uuid
+from datetime import date, timedelta
+
+import pandas as pd
+
+from castano.importacion import ErrorFormatoPlan, bloques_archivo
+
+CATEGORIAS = ['TRANSPORTE', 'ALIMENTACION', 'MATERIALES', 'OTROS']
+COLUMNAS_CARGA = ['id_rendicion', 'id_supervisor', 'fecha', 'monto', 'categoria', 'comentario']
+
+MONTO_MAXIMO = 2_000_000
+ANTIGUEDAD_MAXIMA_DIAS = 90
+
+# Estados por fila del resultado
+CARGADA = "✅ Cargada"
+DUPLICADA = "⚠️ Duplicada"
+RECHAZADA = "❌ Rechazada"
+
+
+def _sin_tildes(serie: pd.Series) -> pd.Series:
+    s = serie.astype("string").str.strip().str.upper()
+    return s.str.normalize('NFKD').str.encode('ascii', 'ignore').str.decode('ascii')
+
+
+def huella_rendicion(df: pd.DataFrame) -> pd.Series:
+    """Hash de contenido por fila (id_supervisor, fecha, monto, categoria, comentario)."""
+    texto = (
+        df['id_supervisor'].astype(str) + "|" + pd.Series([f.isoformat() for f in df['fecha']], index=df.index)
+        + "|" + df['monto'].astype('int64').astype(str) + "|" + df['categoria'].astype(str)
+        + "|" + df['comentario'].fillna("").astype(str).str.strip().str.lower()
+    )
+    return texto.map(lambda t: hashlib.sha256(t.encode()).hexdigest()[:32])
+
+
+def parsear_fechas(serie: pd.Series) -> pd.Series:
+    """Fechas en formato chileno (dd-mm-aaaa) o ISO; NaT si no se reconocen."""
+    texto = serie.astype("string").str.strip()
+    iso = texto.str.match(r'^\d{4}-\d{2}-\d{2}').fillna(False)
+    fecha = pd.to_datetime(texto.where(iso), errors='coerce', format='ISO8601')
+    return fecha.fillna(pd.to_datetime(texto.where(~iso), errors='coerce', dayfirst=True, format='mixed'))
+
+
+def parsear_montos(serie: pd.Series) -> pd.Series:
+    """Montos en pesos; NaN si no se reconocen.
+
+    Las celdas numéricas de una planilla se toman como número. En texto se
+    aceptan el signo $ y el punto como separador de miles sólo con grupos de
+    tres dígitos ("15.000", "$ 1.234"); cualquier otro punto o coma es decimal,
+    así "15000.0" es 15000 y "12.5" queda como 12,5 (y se rechaza por no ser entero).
+    """
+    if pd.api.types.is_numeric_dtype(serie) and not pd.api.types.is_bool_dtype(serie):
+        return pd.to_numeric(serie, errors='coerce').astype(float)
+    es_numero = serie.map(lambda v: isinstance(v, numbers.Real) and not isinstance(v, bool)).astype(bool)
+    texto = serie.where(~es_numero).astype("string").str.replace(r'[\s$]', '', regex=True)
+    miles = texto.str.fullmatch(r'-?\d{1,3}(\.\d{3})+(,\d+)?').fillna(False)
+    texto = texto.mask(miles, texto.str.replace('.', '', regex=False)).str.replace(',', '.', regex=False)
+    # Sólo dígitos con un decimal opcional: sin exponentes ni separadores sueltos
+    texto = texto.where(texto.str.fullmatch(r'-?\d+(\.\d+)?').fillna(False))
+    monto = pd.to_numeric(texto, errors='coerce').astype(float)
+    return monto.where(~es_numero, pd.to_numeric(serie.where(es_numero), errors='coerce').astype(float))
+
+
+def leer_rendiciones(archivo, nombre: str) -> pd.DataFrame:
+    """Planilla completa con columna `fila` (número de línea en el archivo); en un XLSX los montos quedan numéricos."""
+    partes, inicio = [], 0
+    for bloque in bloques_archivo(archivo, nombre, como_texto=False):
+        bloque = bloque.rename(columns=lambda c: str(c).strip().lower())
+        partes.append(bloque.assign(fila=range(inicio + 2, inicio + 2 + len(bloque))))
+        inicio += len(bloque)
+    if not partes:
+        raise ErrorFormatoPlan("El archivo está vacío")
+    df = pd.concat(partes, ignore_index=True)
+    faltantes = {'fecha', 'monto', 'categoria'} - set(df.columns)
+    if faltantes:
+        raise ErrorFormatoPlan(f"Faltan las columnas: {', '.join(sorted(faltantes))}")
+    for opcional in ('comentario', 'id_rendicion'):
+        if opcional not in df.columns:
+            df[opcional] = pd.NA
+    return df
+
+
+def validar_rendiciones(df: pd.DataFrame, supervisor_id: str, existentes: pd.DataFrame,
+                        hoy: date = None) -> pd.DataFrame:
+    """Resultado por fila: columnas de carga + fila, huella, estado y motivo.
+
+    `existentes` son las rendiciones ya registradas del supervisor en el período
+    de la planilla (al menos id_rendicion y las columnas de la huella).
+    """
+    hoy = hoy or date.today()
+    r = pd.DataFrame({'fila': df['fila'], 'id_supervisor': supervisor_id})
+    r['motivo'] = pd.Series(pd.NA, index=df.index, dtype="string")
+
+    def marcar(condicion, motivo):
+        r.loc[condicion & r['motivo'].isna(), 'motivo'] = motivo
+
+    fecha = parsear_fechas(df['fecha'])
+    marcar(fecha.isna(), "fecha inválida")
+    marcar(fecha.dt.date > hoy, "fecha futura")
+    marcar(fecha.dt.date < hoy - timedelta(days=ANTIGUEDAD_MAXIMA_DIAS),
+           f"fecha con más de {ANTIGUEDAD_MAXIMA_DIAS} días")
+
+    monto = parsear_montos(df['monto'])
+    marcar(monto.isna() | (monto % 1 != 0), "monto inválido")
+    marcar(monto <= 0, "el monto debe ser mayor a 0")
+    marcar(monto > MONTO_MAXIMO, f"monto sobre ${MONTO_MAXIMO:,}")
+
+    categoria = _sin_tildes(df['categoria'])
+    marcar(~categoria.isin(CATEGORIAS), f"categoría inválida (usar {', '.join(CATEGORIAS)})")
+
+    validas = r['motivo'].isna()
+    r['fecha'] = fecha.dt.date
+    r['monto'] = monto.where(validas).astype('Int64')
+    r['categoria'] = categoria
+    r['comentario'] = df['comentario'].astype("string").str.strip().fillna("")
+    r['id_rendicion'] = df['id_rendicion'].astype("string").str.strip()
+    r.loc[r['id_rendicion'].isna() | (r['id_rendicion'] == ''), 'id_rendicion'] = pd.NA
+    r['huella'] = pd.Series(pd.NA, index=r.index, dtype="string")
+    if validas.any():
+        r.loc[validas, 'huella'] = huella_rendicion(r[validas])
+
+    # Duplicados contra lo registrado y dentro de la misma planilla
+    huellas_existentes = pd.Index(huella_rendicion(existentes)) if len(existentes) else pd.Index([])
+    ids_existentes = pd.Index(existentes['id_rendicion']) if len(existentes) else pd.Index([])
+    r['estado'] = RECHAZADA
+    duplicada = validas & (r['huella'].isin(huellas_existentes) | r['id_rendicion'].isin(ids_existentes))
+    r.loc[duplicada, 'motivo'] = "ya estaba rendida"
+    repetida = validas & ~duplicada & (
+        r.duplicated('huella', keep='first') | (r['id_rendicion'].notna() & r.duplicated('id_rendicion', keep='first'))
+    )
+    r.loc[repetida, 'motivo'] = "repetida en la planilla"
+    r.loc[duplicada | repetida, 'estado'] = DUPLICADA
+
+    nuevas = validas & ~duplicada & ~repetida
+    r.loc[nuevas, 'estado'] = CARGADA
+    faltan_id = nuevas & r['id_rendicion'].isna()
+    r.loc[faltan_id, 'id_rendicion'] = [str(uuid.uuid4()) for _ in range(int(faltan_id.sum()))]
+    return r
+
+
+def filas_a_cargar(resultado: pd.DataFrame) -> pd.DataFrame:
+    """Filas nuevas del resultado con COLUMNAS_CARGA."""
+    return resultado.loc[resultado['estado'] == CARGADA, COLUMNAS_CARGA].reset_index(drop=True)
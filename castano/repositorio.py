@@ -0,0 +1,959 @@
+"""
+Repositorio de datos
+====================
+Interfaz única para rutas (Visita_Planificada), jerarquía (Zonal/Supervisor/
+Reporta_A), cuentas de acceso (Cuenta), rendiciones (Fact_Rendicion) y sus
+alertas de revisión (Alerta_Rendicion), check-ins de visitas (Fact_Checkin) y
+feriados y excepciones de la agenda (Excepcion_Agenda), con backends
+intercambiables:
+- RepositorioGCP: Spanner Graph + BigQuery (producción)
+- RepositorioSQLite: base local indexada, para demo, perfiles y pruebas de carga
+"""
+
+import json
+import sqlite3
+import threading
+import uuid
+from abc import ABC, abstractmethod
+from datetime import date
+from itertools import islice
+from typing import Iterator
+
+import pandas as pd
+
+DIAS_SEMANA = ['LUNES', 'MARTES', 'MIERCOLES', 'JUEVES', 'VIERNES', 'SABADO']
+
+COLUMNAS_RUTA = ['dia_semana', 'orden', 'sala_id', 'sala_nombre', 'quintil', 'latitud', 'longitud']
+COLUMNAS_SUPERVISOR = ['id', 'nombre', 'email', 'total_visitas']
+COLUMNAS_RENDICION = ['fecha', 'monto', 'categoria', 'comentario', 'comprobante']
+COLUMNAS_SALA = ['id', 'nombre', 'quintil', 'latitud', 'longitud', 'hora_apertura', 'hora_cierre']
+COLUMNAS_JERARQUIA = ['zonal_id', 'zonal_nombre', 'supervisor_id', 'supervisor_nombre', 'supervisor_email']
+COLUMNAS_ORGANIZACION = ['zonal_id', 'zonal_nombre', 'supervisor_id', 'supervisor_nombre', 'sala_id', 'sala_nombre',
+                         'visitas']
+COLUMNAS_CUENTA = ['usuario', 'id', 'nombre', 'rol', 'password_hash']
+COLUMNAS_PLAN = ['supervisor_id', 'sala_id', 'dia_semana', 'orden']
+COLUMNAS_EXPORT_PLAN = ['supervisor_id', 'dia_semana', 'orden', 'sala_id', 'sala_nombre', 'quintil']
+COLUMNAS_EXPORT_RENDICION = ['id_rendicion', 'id_supervisor', 'fecha', 'monto', 'categoria', 'comentario']
+COLUMNAS_ALERTA = ['id_rendicion', 'id_supervisor', 'fecha', 'monto', 'categoria', 'motivo', 'puntaje', 'estado']
+COLUMNAS_CHECKIN = ['id_evento', 'id_supervisor', 'sala_id', 'fecha', 'ts', 'latitud', 'longitud',
+                    'precision_m', 'distancia_m', 'valido']
+COLUMNAS_EXCEPCION = ['fecha', 'supervisor_id', 'sala_id', 'tipo', 'motivo']
+
+# Comodín de supervisor_id / sala_id en Excepcion_Agenda: ('*', '*') es un feriado para todos
+TODOS = '*'
+
+# Spanner admite 80.000 mutaciones por commit (columnas escritas + índices); se deja margen
+MUTACIONES_POR_COMMIT = 40_000
+
+# Filas por load job de BigQuery en cargas masivas de rendiciones
+FILAS_POR_CARGA_BQ = 10_000
+
+# Filas por request de streaming a BigQuery (eventos de check-in)
+FILAS_POR_STREAMING_BQ = 500
+
+# Orden de los días para ORDER BY (mismo CASE en Spanner y SQLite)
+ORDEN_DIA_SQL = """
+    CASE vp.dia_semana
+        WHEN 'LUNES' THEN 1
+        WHEN 'MARTES' THEN 2
+        WHEN 'MIERCOLES' THEN 3
+        WHEN 'JUEVES' THEN 4
+        WHEN 'VIERNES' THEN 5
+        WHEN 'SABADO' THEN 6
+    END"""
+
+
+def pivotar_dias(df_visitas: pd.DataFrame) -> pd.DataFrame:
+    """Convierte filas (sala_id, sala_nombre, dia_semana) en una columna booleana por día."""
+    if df_visitas.empty:
+        return pd.DataFrame(columns=['sala_id', 'sala_nombre'] + DIAS_SEMANA)
+    pivot = pd.crosstab([df_visitas['sala_id'], df_visitas['sala_nombre']], df_visitas['dia_semana']) > 0
+    pivot = pivot.reindex(columns=DIAS_SEMANA, fill_value=False).reset_index()
+    pivot.columns.name = None
+    return pivot
+
+
+class Repositorio(ABC):
+    """Operaciones de datos que usa la aplicación, independientes del backend."""
+
+    # ---------------- Rutas ----------------
+
+    @abstractmethod
+    def rutas_supervisor(self, supervisor_id: str) -> pd.DataFrame:
+        """Visitas planificadas del supervisor ordenadas por día y orden (COLUMNAS_RUTA)."""
+
+    @abstractmethod
+    def rutas_editables(self, supervisor_id: str) -> pd.DataFrame:
+        """Salas del supervisor con una columna booleana por día de la semana."""
+
+    @abstractmethod
+    def guardar_dias_sala(self, supervisor_id: str, sala_id: str, dias: dict) -> None:
+        """Deja planificada la sala exactamente en los días marcados como True."""
+
+    @abstractmethod
+    def plan_vigente(self, supervisor_ids: list) -> pd.DataFrame:
+        """Visitas planificadas de varios supervisores en formato largo (COLUMNAS_PLAN)."""
+
+    @abstractmethod
+    def aplicar_plan(self, altas: pd.DataFrame, bajas: pd.DataFrame) -> int:
+        """Inserta/actualiza `altas` (COLUMNAS_PLAN) y elimina `bajas` en lotes; retorna los commits hechos."""
+
+    # ---------------- Jerarquía ----------------
+
+    @abstractmethod
+    def zonal_de_supervisor(self, supervisor_id: str) -> str:
+        """Nombre del zonal al que reporta el supervisor, o None si no tiene."""
+
+    @abstractmethod
+    def supervisores_de_zonal(self, zonal_id: str) -> pd.DataFrame:
+        """Supervisores que reportan al zonal con su total de visitas (COLUMNAS_SUPERVISOR)."""
+
+    @abstractmethod
+    def jerarquia(self) -> pd.DataFrame:
+        """Relación completa zonal → supervisor (COLUMNAS_JERARQUIA)."""
+
+    @abstractmethod
+    def organizacion(self) -> pd.DataFrame:
+        """Árbol zonal → supervisor → sala con las visitas semanales a cada sala (COLUMNAS_ORGANIZACION).
+
+        Los supervisores sin plan vienen con sala_id None y 0 visitas.
+        """
+
+    # ---------------- Catálogo ----------------
+
+    @abstractmethod
+    def catalogo_salas(self) -> pd.DataFrame:
+        """Todas las salas con quintil, coordenadas y horario 'HH:MM' si lo informan (COLUMNAS_SALA)."""
+
+    # ---------------- Cuentas ----------------
+
+    @abstractmethod
+    def cuentas(self) -> pd.DataFrame:
+        """Todas las cuentas de acceso con su hash de contraseña (COLUMNAS_CUENTA)."""
+
+    @abstractmethod
+    def guardar_cuentas(self, cuentas: list) -> None:
+        """Crea o reemplaza cuentas (dicts con COLUMNAS_CUENTA)."""
+
+    # ---------------- Rendiciones ----------------
+
+    @abstractmethod
+    def insertar_rendicion(self, fila: dict) -> None:
+        """Inserta una fila en Fact_Rendicion (comprobante es opcional). Lanza excepción si falla."""
+
+    @abstractmethod
+    def cargar_rendiciones(self, df: pd.DataFrame) -> int:
+        """Carga en bloque filas de Fact_Rendicion (COLUMNAS_EXPORT_RENDICION); retorna los lotes usados."""
+
+    @abstractmethod
+    def rendiciones_supervisor(self, supervisor_id: str, limite: int = 20) -> pd.DataFrame:
+        """Últimas rendiciones del supervisor, más recientes primero (COLUMNAS_RENDICION)."""
+
+    # ---------------- Alertas de rendiciones ----------------
+
+    @abstractmethod
+    def guardar_alertas(self, df: pd.DataFrame) -> None:
+        """Crea o reemplaza alertas (COLUMNAS_ALERTA); una por id_rendicion."""
+
+    @abstractmethod
+    def alertas_rendiciones(self, supervisor_ids: list, estado: str = 'pendiente') -> pd.DataFrame:
+        """Alertas en ese estado, más recientes primero (COLUMNAS_ALERTA); supervisor_ids=None son todas."""
+
+    @abstractmethod
+    def resolver_alertas(self, ids_rendicion: list, estado: str) -> None:
+        """Cambia el estado de revisión de las alertas."""
+
+    # ---------------- Check-ins ----------------
+
+    @abstractmethod
+    def registrar_checkins(self, df: pd.DataFrame) -> int:
+        """Agrega eventos de check-in (COLUMNAS_CHECKIN), sin modificar los existentes; retorna los requests."""
+
+    @abstractmethod
+    def checkins_supervisor(self, supervisor_id: str, fecha: date) -> pd.DataFrame:
+        """Eventos de check-in del supervisor en una fecha, en orden de llegada (COLUMNAS_CHECKIN)."""
+
+    # ---------------- Agenda ----------------
+
+    @abstractmethod
+    def excepciones_agenda(self, desde: date, hasta: date) -> pd.DataFrame:
+        """Feriados y excepciones entre dos fechas inclusive, por fecha (COLUMNAS_EXCEPCION)."""
+
+    @abstractmethod
+    def guardar_excepciones(self, df: pd.DataFrame) -> None:
+        """Crea o reemplaza excepciones (COLUMNAS_EXCEPCION); una por fecha, supervisor_id y sala_id."""
+
+    @abstractmethod
+    def eliminar_excepciones(self, df: pd.DataFrame) -> None:
+        """Elimina las excepciones de las filas (fecha, supervisor_id, sala_id)."""
+
+    # ---------------- Exportación por bloques ----------------
+
+    @abstractmethod
+    def iterar_plan(self, supervisor_ids: list, tamano_bloque: int) -> Iterator[pd.DataFrame]:
+        """Plan de los supervisores (COLUMNAS_EXPORT_PLAN) en bloques de hasta tamano_bloque filas."""
+
+    @abstractmethod
+    def iterar_rendiciones(self, supervisor_ids: list, desde: date, hasta: date,
+                           tamano_bloque: int) -> Iterator[pd.DataFrame]:
+        """Rendiciones entre dos fechas inclusive (COLUMNAS_EXPORT_RENDICION); supervisor_ids=None son todas."""
+
+    @abstractmethod
+    def iterar_checkins(self, supervisor_ids: list, desde: date, hasta: date,
+                        tamano_bloque: int) -> Iterator[pd.DataFrame]:
+        """Check-ins entre dos fechas inclusive (COLUMNAS_CHECKIN); supervisor_ids=None son todos."""
+
+
+# ================================================================
+# BACKEND GCP: SPANNER + BIGQUERY
+# ================================================================
+
+class RepositorioGCP(Repositorio):
+    """Rutas y jerarquía en Spanner Graph; rendiciones en BigQuery."""
+
+    def __init__(self, database, client_bq, tabla_rendiciones: str, tabla_checkins: str = None):
+        from google.cloud import bigquery, spanner
+        self._spanner = spanner
+        self._bigquery = bigquery
+        self.database = database
+        self.client_bq = client_bq
+        self.tabla_rendiciones = tabla_rendiciones
+        # Por defecto, Fact_Checkin en el mismo dataset que las rendiciones
+        self.tabla_checkins = tabla_checkins or f"{tabla_rendiciones.rsplit('.', 1)[0]}.Fact_Checkin"
+
+    def _consultar(self, query: str, **params) -> list:
+        tipos = {k: self._spanner.param_types.STRING for k in params}
+        with self.database.snapshot() as snapshot:
+            return list(snapshot.execute_sql(query, params=params, param_types=tipos))
+
+    def rutas_supervisor(self, supervisor_id: str) -> pd.DataFrame:
+        query = f"""
+        SELECT
+            vp.dia_semana,
+            vp.orden,
+            vp.sala_id,
+            s.nombre as sala_nombre,
+            s.quintil,
+            s.latitud,
+            s.longitud
+        FROM Visita_Planificada vp
+        JOIN Sala s ON vp.sala_id = s.id
+        WHERE vp.supervisor_id = @supervisor_id
+        ORDER BY {ORDEN_DIA_SQL},
+            vp.orden
+        """
+        rows = self._consultar(query, supervisor_id=supervisor_id)
+        return pd.DataFrame(rows, columns=COLUMNAS_RUTA) if rows else pd.DataFrame()
+
+    def rutas_editables(self, supervisor_id: str) -> pd.DataFrame:
+        query = """
+        SELECT vp.sala_id, s.nombre as sala_nombre, vp.dia_semana
+        FROM Visita_Planificada vp
+        JOIN Sala s ON vp.sala_id = s.id
+        WHERE vp.supervisor_id = @supervisor_id
+        """
+        rows = self._consultar(query, supervisor_id=supervisor_id)
+        if not rows:
+            return pd.DataFrame()
+        return pivotar_dias(pd.DataFrame(rows, columns=['sala_id', 'sala_nombre', 'dia_semana']))
+
+    def guardar_dias_sala(self, supervisor_id: str, sala_id: str, dias: dict) -> None:
+        string = self._spanner.param_types.STRING
+
+        def transaccion(tx):
+            params = {"supervisor_id": supervisor_id, "sala_id": sala_id}
+            tipos = {"supervisor_id": string, "sala_id": string}
+            actuales = {row[0] for row in tx.execute_sql(
+                "SELECT dia_semana FROM Visita_Planificada "
+                "WHERE supervisor_id = @supervisor_id AND sala_id = @sala_id",
+                params=params, param_types=tipos,
+            )}
+            for dia in DIAS_SEMANA:
+                marcado = bool(dias.get(dia, False))
+                params_dia = dict(params, dia_semana=dia)
+                tipos_dia = dict(tipos, dia_semana=string)
+                if marcado and dia not in actuales:
+                    tx.execute_update(
+                        "INSERT INTO Visita_Planificada (supervisor_id, sala_id, dia_semana, orden) "
+                        "SELECT @supervisor_id, @sala_id, @dia_semana, COALESCE(MAX(orden), 0) + 1 "
+                        "FROM Visita_Planificada WHERE supervisor_id = @supervisor_id AND dia_semana = @dia_semana",
+                        params=params_dia, param_types=tipos_dia,
+                    )
+                elif not marcado and dia in actuales:
+                    tx.execute_update(
+                        "DELETE FROM Visita_Planificada WHERE supervisor_id = @supervisor_id "
+                        "AND sala_id = @sala_id AND dia_semana = @dia_semana",
+                        params=params_dia, param_types=tipos_dia,
+                    )
+
+        self.database.run_in_transaction(transaccion)
+
+    def plan_vigente(self, supervisor_ids: list) -> pd.DataFrame:
+        query = f"""
+        SELECT {', '.join(COLUMNAS_PLAN)} FROM Visita_Planificada
+        WHERE supervisor_id IN UNNEST(@ids)
+        """
+        tipos = {"ids": self._spanner.param_types.Array(self._spanner.param_types.STRING)}
+        with self.database.snapshot() as snapshot:
+            rows = list(snapshot.execute_sql(query, params={"ids": list(supervisor_ids)}, param_types=tipos))
+        return pd.DataFrame(rows, columns=COLUMNAS_PLAN)
+
+    def aplicar_plan(self, altas: pd.DataFrame, bajas: pd.DataFrame) -> int:
+        # Cada fila de altas escribe 4 columnas y toca el índice por sala; una baja, la fila y el índice
+        filas_alta = MUTACIONES_POR_COMMIT // (len(COLUMNAS_PLAN) + 1)
+        filas_baja = MUTACIONES_POR_COMMIT // 2
+        valores = altas[COLUMNAS_PLAN].astype(object).values.tolist()
+        claves = bajas[['supervisor_id', 'dia_semana', 'sala_id']].values.tolist()  # orden de la clave primaria
+        commits = 0
+        # Lotes independientes: si uno falla, reimportar el mismo archivo converge al plan completo
+        for inicio in range(0, len(valores), filas_alta):
+            with self.database.batch() as batch:
+                batch.insert_or_update(table='Visita_Planificada', columns=COLUMNAS_PLAN,
+                                       values=valores[inicio:inicio + filas_alta])
+            commits += 1
+        for inicio in range(0, len(claves), filas_baja):
+            with self.database.batch() as batch:
+                batch.delete('Visita_Planificada', self._spanner.KeySet(keys=claves[inicio:inicio + filas_baja]))
+            commits += 1
+        return commits
+
+    def zonal_de_supervisor(self, supervisor_id: str) -> str:
+        query = """
+        SELECT z.nombre
+        FROM Reporta_A ra
+        JOIN Zonal z ON ra.zonal_id = z.id
+        WHERE ra.supervisor_id = @supervisor_id
+        """
+        rows = self._consultar(query, supervisor_id=supervisor_id)
+        return rows[0][0] if rows else None
+
+    def supervisores_de_zonal(self, zonal_id: str) -> pd.DataFrame:
+        query = """
+        SELECT s.id, s.nombre, s.email,
+            (SELECT COUNT(*) FROM Visita_Planificada vp WHERE vp.supervisor_id = s.id) AS total_visitas
+        FROM Reporta_A ra
+        JOIN Supervisor s ON ra.supervisor_id = s.id
+        WHERE ra.zonal_id = @zonal_id
+        """
+        rows = self._consultar(query, zonal_id=zonal_id)
+        return pd.DataFrame(rows, columns=COLUMNAS_SUPERVISOR) if rows else pd.DataFrame()
+
+    def jerarquia(self) -> pd.DataFrame:
+        query = """
+        SELECT z.id, z.nombre, s.id, s.nombre, s.email
+        FROM Reporta_A ra
+        JOIN Zonal z ON ra.zonal_id = z.id
+        JOIN Supervisor s ON ra.supervisor_id = s.id
+        """
+        return pd.DataFrame(self._consultar(query), columns=COLUMNAS_JERARQUIA)
+
+    def organizacion(self) -> pd.DataFrame:
+        # Un solo recorrido de dos saltos sobre el grafo Organizacion (ver README)
+        query = """
+        GRAPH Organizacion
+        MATCH (z:Zonal)<-[:Reporta_A]-(s:Supervisor)
+        OPTIONAL MATCH (s)-[v:Visita]->(sa:Sala)
+        RETURN z.id AS zonal_id, z.nombre AS zonal_nombre, s.id AS supervisor_id, s.nombre AS supervisor_nombre,
+            sa.id AS sala_id, sa.nombre AS sala_nombre, COUNT(v) AS visitas
+        GROUP BY z.id, z.nombre, s.id, s.nombre, sa.id, sa.nombre
+        """
+        return pd.DataFrame(self._consultar(query), columns=COLUMNAS_ORGANIZACION)
+
+    def catalogo_salas(self) -> pd.DataFrame:
+        query = "SELECT id, nombre, quintil, latitud, longitud, hora_apertura, hora_cierre FROM Sala"
+        return pd.DataFrame(self._consultar(query), columns=COLUMNAS_SALA)
+
+    def cuentas(self) -> pd.DataFrame:
+        query = f"SELECT {', '.join(COLUMNAS_CUENTA)} FROM Cuenta"
+        return pd.DataFrame(self._consultar(query), columns=COLUMNAS_CUENTA)
+
+    def guardar_cuentas(self, cuentas: list) -> None:
+        with self.database.batch() as batch:
+            batch.insert_or_update(
+                table='Cuenta', columns=COLUMNAS_CUENTA,
+                values=[[c[col] for col in COLUMNAS_CUENTA] for c in cuentas],
+            )
+
+    def insertar_rendicion(self, fila: dict) -> None:
+        errors = self.client_bq.insert_rows_json(self.tabla_rendiciones, [fila])
+        if errors:
+            raise RuntimeError(f"Error al insertar: {errors}")
+
+    def cargar_rendiciones(self, df: pd.DataFrame) -> int:
+        # Load jobs en vez de streaming: sin costo por fila y sin buffer de streaming
+        job_config = self._bigquery.LoadJobConfig(
+            write_disposition=self._bigquery.WriteDisposition.WRITE_APPEND,
+            schema=[
+                self._bigquery.SchemaField("id_rendicion", "STRING"),
+                self._bigquery.SchemaField("id_supervisor", "STRING"),
+                self._bigquery.SchemaField("fecha", "DATE"),
+                self._bigquery.SchemaField("monto", "INT64"),
+                self._bigquery.SchemaField("categoria", "STRING"),
+                self._bigquery.SchemaField("comentario", "STRING"),
+            ],
+        )
+        lotes = 0
+        for inicio in range(0, len(df), FILAS_POR_CARGA_BQ):
+            lote = df.iloc[inicio:inicio + FILAS_POR_CARGA_BQ][COLUMNAS_EXPORT_RENDICION]
+            self.client_bq.load_table_from_dataframe(lote, self.tabla_rendiciones, job_config=job_config).result()
+            lotes += 1
+        return lotes
+
+    def rendiciones_supervisor(self, supervisor_id: str, limite: int = 20) -> pd.DataFrame:
+        query = f"""
+        SELECT fecha, monto, categoria, comentario, comprobante
+        FROM `{self.tabla_rendiciones}`
+        WHERE id_supervisor = @supervisor_id
+        ORDER BY fecha DESC
+        LIMIT {int(limite)}
+        """
+        job_config = self._bigquery.QueryJobConfig(
+            query_parameters=[
+                self._bigquery.ScalarQueryParameter("supervisor_id", "STRING", supervisor_id)
+            ]
+        )
+        return self.client_bq.query(query, job_config=job_config).to_dataframe()
+
+    def guardar_alertas(self, df: pd.DataFrame) -> None:
+        # Alertas en Spanner y no en BigQuery: el zonal actualiza su estado
+        alertas = df[COLUMNAS_ALERTA]
+        valores = alertas.astype(object).where(alertas.notna(), None).values.tolist()
+        por_commit = MUTACIONES_POR_COMMIT // (len(COLUMNAS_ALERTA) + 1)
+        for inicio in range(0, len(valores), por_commit):
+            with self.database.batch() as batch:
+                batch.insert_or_update(table='Alerta_Rendicion', columns=COLUMNAS_ALERTA,
+                                       values=valores[inicio:inicio + por_commit])
+
+    def alertas_rendiciones(self, supervisor_ids: list, estado: str = 'pendiente') -> pd.DataFrame:
+        tipos = self._spanner.param_types
+        params, param_types = {"estado": estado}, {"estado": tipos.STRING}
+        filtro = ""
+        if supervisor_ids is not None:
+            filtro = "AND id_supervisor IN UNNEST(@ids)"
+            params["ids"], param_types["ids"] = list(supervisor_ids), tipos.Array(tipos.STRING)
+        query = f"""
+        SELECT {', '.join(COLUMNAS_ALERTA)} FROM Alerta_Rendicion
+        WHERE estado = @estado {filtro}
+        ORDER BY fecha DESC
+        """
+        with self.database.snapshot() as snapshot:
+            rows = list(snapshot.execute_sql(query, params=params, param_types=param_types))
+        return pd.DataFrame(rows, columns=COLUMNAS_ALERTA)
+
+    def resolver_alertas(self, ids_rendicion: list, estado: str) -> None:
+        with self.database.batch() as batch:
+            batch.update(table='Alerta_Rendicion', columns=['id_rendicion', 'estado'],
+                         values=[[id_, estado] for id_ in ids_rendicion])
+
+    def registrar_checkins(self, df: pd.DataFrame) -> int:
+        # Streaming por lotes y no load jobs: la cuota de load jobs por tabla no alcanza para un
+        # vaciado cada pocos segundos. row_ids = id_evento deduplica los reintentos.
+        eventos = df[COLUMNAS_CHECKIN].assign(
+            fecha=[f.isoformat() for f in df['fecha']], ts=[t.isoformat() for t in df['ts']],
+        )
+        filas = eventos.astype(object).where(eventos.notna(), None).to_dict('records')
+        requests = 0
+        for inicio in range(0, len(filas), FILAS_POR_STREAMING_BQ):
+            lote = filas[inicio:inicio + FILAS_POR_STREAMING_BQ]
+            errors = self.client_bq.insert_rows_json(self.tabla_checkins, lote,
+                                                     row_ids=[f['id_evento'] for f in lote])
+            if errors:
+                raise RuntimeError(f"Error al registrar check-ins: {errors[:3]}")
+            requests += 1
+        return requests
+
+    def checkins_supervisor(self, supervisor_id: str, fecha: date) -> pd.DataFrame:
+        bq = self._bigquery
+        query = f"""
+        SELECT {', '.join(COLUMNAS_CHECKIN)}
+        FROM `{self.tabla_checkins}`
+        WHERE fecha = @fecha AND id_supervisor = @supervisor_id
+        ORDER BY ts
+        """
+        job_config = bq.QueryJobConfig(query_parameters=[
+            bq.ScalarQueryParameter("fecha", "DATE", fecha),
+            bq.ScalarQueryParameter("supervisor_id", "STRING", supervisor_id),
+        ])
+        return self.client_bq.query(query, job_config=job_config).to_dataframe()
+
+    def excepciones_agenda(self, desde: date, hasta: date) -> pd.DataFrame:
+        query = f"""
+        SELECT {', '.join(COLUMNAS_EXCEPCION)} FROM Excepcion_Agenda
+        WHERE fecha BETWEEN @desde AND @hasta
+        ORDER BY fecha
+        """
+        tipos = {"desde": self._spanner.param_types.DATE, "hasta": self._spanner.param_types.DATE}
+        with self.database.snapshot() as snapshot:
+            rows = list(snapshot.execute_sql(query, params={"desde": desde, "hasta": hasta}, param_types=tipos))
+        return pd.DataFrame(rows, columns=COLUMNAS_EXCEPCION)
+
+    def guardar_excepciones(self, df: pd.DataFrame) -> None:
+        excepciones = df[COLUMNAS_EXCEPCION]
+        with self.database.batch() as batch:
+            batch.insert_or_update(table='Excepcion_Agenda', columns=COLUMNAS_EXCEPCION,
+                                   values=excepciones.astype(object).where(excepciones.notna(), None).values.tolist())
+
+    def eliminar_excepciones(self, df: pd.DataFrame) -> None:
+        claves = df[['fecha', 'supervisor_id', 'sala_id']].values.tolist()
+        with self.database.batch() as batch:
+            batch.delete('Excepcion_Agenda', self._spanner.KeySet(keys=claves))
+
+    def iterar_plan(self, supervisor_ids: list, tamano_bloque: int) -> Iterator[pd.DataFrame]:
+        query = f"""
+        SELECT vp.supervisor_id, vp.dia_semana, vp.orden, vp.sala_id, s.nombre, s.quintil
+        FROM Visita_Planificada vp
+        JOIN Sala s ON vp.sala_id = s.id
+        WHERE vp.supervisor_id IN UNNEST(@ids)
+        ORDER BY vp.supervisor_id, {ORDEN_DIA_SQL}, vp.orden
+        """
+        tipos = {"ids": self._spanner.param_types.Array(self._spanner.param_types.STRING)}
+        with self.database.snapshot() as snapshot:
+            # execute_sql entrega las filas en streaming; se agrupan sin leer todo el resultado
+            filas = iter(snapshot.execute_sql(query, params={"ids": list(supervisor_ids)}, param_types=tipos))
+            while bloque := list(islice(filas, tamano_bloque)):
+                yield pd.DataFrame(bloque, columns=COLUMNAS_EXPORT_PLAN)
+
+    def iterar_rendiciones(self, supervisor_ids: list, desde: date, hasta: date,
+                           tamano_bloque: int) -> Iterator[pd.DataFrame]:
+        bq = self._bigquery
+        parametros = [bq.ScalarQueryParameter("desde", "DATE", desde), bq.ScalarQueryParameter("hasta", "DATE", hasta)]
+        filtro = ""
+        if supervisor_ids is not None:
+            filtro = "AND id_supervisor IN UNNEST(@ids)"
+            parametros.append(bq.ArrayQueryParameter("ids", "STRING", list(supervisor_ids)))
+        query = f"""
+        SELECT {', '.join(COLUMNAS_EXPORT_RENDICION)}
+        FROM `{self.tabla_rendiciones}`
+        WHERE fecha BETWEEN @desde AND @hasta {filtro}
+        ORDER BY fecha, id_supervisor
+        """
+        trabajo = self.client_bq.query(query, job_config=bq.QueryJobConfig(query_parameters=parametros))
+        # Paginado de la API de BigQuery: una página por bloque
+        yield from trabajo.result(page_size=tamano_bloque).to_dataframe_iterable()
+
+    def iterar_checkins(self, supervisor_ids: list, desde: date, hasta: date,
+                        tamano_bloque: int) -> Iterator[pd.DataFrame]:
+        bq = self._bigquery
+        parametros = [bq.ScalarQueryParameter("desde", "DATE", desde), bq.ScalarQueryParameter("hasta", "DATE", hasta)]
+        filtro = ""
+        if supervisor_ids is not None:
+            filtro = "AND id_supervisor IN UNNEST(@ids)"
+            parametros.append(bq.ArrayQueryParameter("ids", "STRING", list(supervisor_ids)))
+        query = f"""
+        SELECT {', '.join(COLUMNAS_CHECKIN)}
+        FROM `{self.tabla_checkins}`
+        WHERE fecha BETWEEN @desde AND @hasta {filtro}
+        ORDER BY fecha, id_supervisor
+        """
+        trabajo = self.client_bq.query(query, job_config=bq.QueryJobConfig(query_parameters=parametros))
+        yield from trabajo.result(page_size=tamano_bloque).to_dataframe_iterable()
+
+
+# ================================================================
+# BACKEND SQLITE LOCAL
+# ================================================================
+
+ESQUEMA_SQLITE = """
+CREATE TABLE IF NOT EXISTS Zonal (
+    id TEXT PRIMARY KEY,
+    nombre TEXT NOT NULL,
+    email TEXT
+);
+CREATE TABLE IF NOT EXISTS Supervisor (
+    id TEXT PRIMARY KEY,
+    nombre TEXT NOT NULL,
+    email TEXT
+);
+CREATE TABLE IF NOT EXISTS Reporta_A (
+    supervisor_id TEXT NOT NULL,
+    zonal_id TEXT NOT NULL,
+    PRIMARY KEY (supervisor_id, zonal_id)
+);
+CREATE INDEX IF NOT EXISTS idx_reporta_a_zonal ON Reporta_A (zonal_id);
+CREATE TABLE IF NOT EXISTS Sala (
+    id TEXT PRIMARY KEY,
+    nombre TEXT NOT NULL,
+    quintil INTEGER,
+    latitud REAL,
+    longitud REAL,
+    hora_apertura TEXT,  -- 'HH:MM'; NULL usa el horario por defecto de los itinerarios
+    hora_cierre TEXT
+);
+CREATE TABLE IF NOT EXISTS Visita_Planificada (
+    supervisor_id TEXT NOT NULL,
+    sala_id TEXT NOT NULL,
+    dia_semana TEXT NOT NULL,
+    orden INTEGER NOT NULL,
+    PRIMARY KEY (supervisor_id, dia_semana, sala_id)
+);
+CREATE INDEX IF NOT EXISTS idx_visita_sala ON Visita_Planificada (sala_id);
+CREATE TABLE IF NOT EXISTS Fact_Rendicion (
+    id_rendicion TEXT PRIMARY KEY,
+    id_supervisor TEXT NOT NULL,
+    fecha TEXT NOT NULL,
+    monto INTEGER NOT NULL,
+    categoria TEXT NOT NULL,
+    comentario TEXT,
+    comprobante TEXT  -- clave del objeto con la foto de la boleta
+);
+CREATE INDEX IF NOT EXISTS idx_rendicion_supervisor_fecha ON Fact_Rendicion (id_supervisor, fecha DESC);
+CREATE INDEX IF NOT EXISTS idx_rendicion_fecha ON Fact_Rendicion (fecha);
+CREATE TABLE IF NOT EXISTS Alerta_Rendicion (
+    id_rendicion TEXT PRIMARY KEY,
+    id_supervisor TEXT NOT NULL,
+    fecha TEXT NOT NULL,
+    monto INTEGER NOT NULL,
+    categoria TEXT NOT NULL,
+    motivo TEXT NOT NULL,
+    puntaje REAL,
+    estado TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_alerta_estado_supervisor ON Alerta_Rendicion (estado, id_supervisor);
+CREATE TABLE IF NOT EXISTS Fact_Checkin (
+    id_evento TEXT PRIMARY KEY,
+    id_supervisor TEXT NOT NULL,
+    sala_id TEXT,
+    fecha TEXT NOT NULL,
+    ts TEXT NOT NULL,
+    latitud REAL NOT NULL,
+    longitud REAL NOT NULL,
+    precision_m REAL,
+    distancia_m REAL,
+    valido INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_checkin_supervisor_fecha ON Fact_Checkin (id_supervisor, fecha);
+CREATE TABLE IF NOT EXISTS Cuenta (
+    usuario TEXT PRIMARY KEY,
+    id TEXT NOT NULL,
+    nombre TEXT NOT NULL,
+    rol TEXT NOT NULL,
+    password_hash TEXT NOT NULL
+);
+CREATE UNIQUE INDEX IF NOT EXISTS idx_cuenta_id ON Cuenta (id);
+CREATE TABLE IF NOT EXISTS Excepcion_Agenda (
+    fecha TEXT NOT NULL,
+    supervisor_id TEXT NOT NULL,  -- '*': todos los supervisores
+    sala_id TEXT NOT NULL,        -- '*': el día completo
+    tipo TEXT NOT NULL,           -- 'quitar' o 'agregar'
+    motivo TEXT,
+    PRIMARY KEY (fecha, supervisor_id, sala_id)
+);
+"""
+
+
+class RepositorioSQLite(Repositorio):
+    """Mismo modelo de datos que Spanner/BigQuery en un archivo SQLite con índices.
+
+    Cada hilo de Streamlit usa su propia conexión; con ruta ':memory:' se usa una
+    base en memoria compartida entre hilos que vive mientras viva el repositorio.
+    """
+
+    def __init__(self, ruta: str = ':memory:'):
+        if ruta == ':memory:':
+            self._dsn = f"file:castano_{uuid.uuid4().hex}?mode=memory&cache=shared"
+        else:
+            self._dsn = f"file:{ruta}"
+        self.ruta = ruta
+        self._local = threading.local()
+        self._ancla = self._conectar()  # Mantiene viva la base en memoria
+        self._ancla.executescript(ESQUEMA_SQLITE)
+        self._migrar()
+
+    def _migrar(self):
+        """Agrega columnas nuevas a bases creadas con una versión anterior del esquema."""
+        columnas = {row[1] for row in self._ancla.execute("PRAGMA table_info(Fact_Rendicion)")}
+        if 'comprobante' not in columnas:
+            with self._ancla:
+                self._ancla.execute("ALTER TABLE Fact_Rendicion ADD COLUMN comprobante TEXT")
+        columnas = {row[1] for row in self._ancla.execute("PRAGMA table_info(Sala)")}
+        if 'hora_apertura' not in columnas:
+            with self._ancla:
+                self._ancla.execute("ALTER TABLE Sala ADD COLUMN hora_apertura TEXT")
+                self._ancla.execute("ALTER TABLE Sala ADD COLUMN hora_cierre TEXT")
+
+    def _conectar(self) -> sqlite3.Connection:
+        con = sqlite3.connect(self._dsn, uri=True, check_same_thread=False, timeout=30)
+        if self.ruta != ':memory:':
+            con.execute("PRAGMA journal_mode=WAL")
+            con.execute("PRAGMA synchronous=NORMAL")
+        return con
+
+    @property
+    def conexion(self) -> sqlite3.Connection:
+        con = getattr(self._local, 'con', None)
+        if con is None:
+            con = self._local.con = self._conectar()
+        return con
+
+    def _consultar(self, query: str, params=()) -> list:
+        return self.conexion.execute(query, params).fetchall()
+
+    def esta_vacio(self) -> bool:
+        """True si aún no hay supervisores cargados."""
+        return self._consultar("SELECT COUNT(*) FROM Supervisor")[0][0] == 0
+
+    def cargar_filas(self, tabla: str, columnas: list, filas) -> int:
+        """Inserta en bloque un iterable de tuplas en una tabla del esquema."""
+        marcadores = ", ".join("?" for _ in columnas)
+        con = self.conexion
+        with con:
+            cursor = con.executemany(
+                f"INSERT OR REPLACE INTO {tabla} ({', '.join(columnas)}) VALUES ({marcadores})", filas
+            )
+        return cursor.rowcount
+
+    def cargar_dataframe(self, tabla: str, df: pd.DataFrame) -> int:
+        """Inserta en bloque un DataFrame cuyas columnas coinciden con la tabla."""
+        filas = df.astype(object).where(df.notna(), None).itertuples(index=False, name=None)
+        return self.cargar_filas(tabla, list(df.columns), filas)
+
+    def analizar(self):
+        """Actualiza las estadísticas del planificador tras cargas masivas."""
+        self.conexion.execute("ANALYZE")
+
+    def rutas_supervisor(self, supervisor_id: str) -> pd.DataFrame:
+        query = f"""
+        SELECT vp.dia_semana, vp.orden, vp.sala_id, s.nombre AS sala_nombre, s.quintil, s.latitud, s.longitud
+        FROM Visita_Planificada vp
+        JOIN Sala s ON vp.sala_id = s.id
+        WHERE vp.supervisor_id = ?
+        ORDER BY {ORDEN_DIA_SQL}, vp.orden
+        """
+        rows = self._consultar(query, (supervisor_id,))
+        return pd.DataFrame(rows, columns=COLUMNAS_RUTA) if rows else pd.DataFrame()
+
+    def rutas_editables(self, supervisor_id: str) -> pd.DataFrame:
+        query = """
+        SELECT vp.sala_id, s.nombre AS sala_nombre, vp.dia_semana
+        FROM Visita_Planificada vp
+        JOIN Sala s ON vp.sala_id = s.id
+        WHERE vp.supervisor_id = ?
+        """
+        rows = self._consultar(query, (supervisor_id,))
+        if not rows:
+            return pd.DataFrame()
+        return pivotar_dias(pd.DataFrame(rows, columns=['sala_id', 'sala_nombre', 'dia_semana']))
+
+    def guardar_dias_sala(self, supervisor_id: str, sala_id: str, dias: dict) -> None:
+        con = self.conexion
+        with con:
+            actuales = {row[0] for row in con.execute(
+                "SELECT dia_semana FROM Visita_Planificada WHERE supervisor_id = ? AND sala_id = ?",
+                (supervisor_id, sala_id),
+            )}
+            for dia in DIAS_SEMANA:
+                marcado = bool(dias.get(dia, False))
+                if marcado and dia not in actuales:
+                    con.execute(
+                        "INSERT INTO Visita_Planificada (supervisor_id, sala_id, dia_semana, orden) "
+                        "SELECT ?, ?, ?, COALESCE(MAX(orden), 0) + 1 "
+                        "FROM Visita_Planificada WHERE supervisor_id = ? AND dia_semana = ?",
+                        (supervisor_id, sala_id, dia, supervisor_id, dia),
+                    )
+                elif not marcado and dia in actuales:
+                    con.execute(
+                        "DELETE FROM Visita_Planificada WHERE supervisor_id = ? AND sala_id = ? AND dia_semana = ?",
+                        (supervisor_id, sala_id, dia),
+                    )
+
+    def plan_vigente(self, supervisor_ids: list) -> pd.DataFrame:
+        ids = list(supervisor_ids)
+        partes = []
+        for inicio in range(0, len(ids), 900):  # Límite de parámetros por sentencia
+            lote = ids[inicio:inicio + 900]
+            partes += self._consultar(
+                f"SELECT {', '.join(COLUMNAS_PLAN)} FROM Visita_Planificada "
+                f"WHERE supervisor_id IN ({', '.join('?' for _ in lote)})", lote,
+            )
+        return pd.DataFrame(partes, columns=COLUMNAS_PLAN)
+
+    def aplicar_plan(self, altas: pd.DataFrame, bajas: pd.DataFrame) -> int:
+        # Sin límite de mutaciones: un solo commit deja el plan atómico
+        con = self.conexion
+        with con:
+            con.executemany(
+                f"INSERT OR REPLACE INTO Visita_Planificada ({', '.join(COLUMNAS_PLAN)}) VALUES (?, ?, ?, ?)",
+                altas[COLUMNAS_PLAN].astype(object).itertuples(index=False, name=None),
+            )
+            con.executemany(
+                "DELETE FROM Visita_Planificada WHERE supervisor_id = ? AND sala_id = ? AND dia_semana = ?",
+                bajas[['supervisor_id', 'sala_id', 'dia_semana']].astype(object).itertuples(index=False, name=None),
+            )
+        return 1
+
+    def zonal_de_supervisor(self, supervisor_id: str) -> str:
+        rows = self._consultar(
+            "SELECT z.nombre FROM Reporta_A ra JOIN Zonal z ON ra.zonal_id = z.id WHERE ra.supervisor_id = ?",
+            (supervisor_id,),
+        )
+        return rows[0][0] if rows else None
+
+    def supervisores_de_zonal(self, zonal_id: str) -> pd.DataFrame:
+        query = """
+        SELECT s.id, s.nombre, s.email,
+            (SELECT COUNT(*) FROM Visita_Planificada vp WHERE vp.supervisor_id = s.id) AS total_visitas
+        FROM Reporta_A ra
+        JOIN Supervisor s ON ra.supervisor_id = s.id
+        WHERE ra.zonal_id = ?
+        """
+        rows = self._consultar(query, (zonal_id,))
+        return pd.DataFrame(rows, columns=COLUMNAS_SUPERVISOR) if rows else pd.DataFrame()
+
+    def jerarquia(self) -> pd.DataFrame:
+        query = """
+        SELECT z.id, z.nombre, s.id, s.nombre, s.email
+        FROM Reporta_A ra
+        JOIN Zonal z ON ra.zonal_id = z.id
+        JOIN Supervisor s ON ra.supervisor_id = s.id
+        """
+        return pd.DataFrame(self._consultar(query), columns=COLUMNAS_JERARQUIA)
+
+    def organizacion(self) -> pd.DataFrame:
+        query = """
+        SELECT z.id, z.nombre, s.id, s.nombre, vp.sala_id, sa.nombre, COUNT(vp.sala_id)
+        FROM Reporta_A ra
+        JOIN Zonal z ON ra.zonal_id = z.id
+        JOIN Supervisor s ON ra.supervisor_id = s.id
+        LEFT JOIN Visita_Planificada vp ON vp.supervisor_id = s.id
+        LEFT JOIN Sala sa ON vp.sala_id = sa.id
+        GROUP BY z.id, z.nombre, s.id, s.nombre, vp.sala_id, sa.nombre
+        """
+        return pd.DataFrame(self._consultar(query), columns=COLUMNAS_ORGANIZACION)
+
+    def catalogo_salas(self) -> pd.DataFrame:
+        rows = self._consultar("SELECT id, nombre, quintil, latitud, longitud, hora_apertura, hora_cierre FROM Sala")
+        return pd.DataFrame(rows, columns=COLUMNAS_SALA)
+
+    def cuentas(self) -> pd.DataFrame:
+        rows = self._consultar(f"SELECT {', '.join(COLUMNAS_CUENTA)} FROM Cuenta")
+        return pd.DataFrame(rows, columns=COLUMNAS_CUENTA)
+
+    def guardar_cuentas(self, cuentas: list) -> None:
+        self.cargar_filas('Cuenta', COLUMNAS_CUENTA, ([c[col] for col in COLUMNAS_CUENTA] for c in cuentas))
+
+    def insertar_rendicion(self, fila: dict) -> None:
+        self.cargar_filas('Fact_Rendicion', list(fila), [tuple(fila.values())])
+
+    def cargar_rendiciones(self, df: pd.DataFrame) -> int:
+        filas = df[COLUMNAS_EXPORT_RENDICION].assign(fecha=[f.isoformat() for f in df['fecha']])
+        self.cargar_dataframe('Fact_Rendicion', filas)
+        return 1
+
+    def rendiciones_supervisor(self, supervisor_id: str, limite: int = 20) -> pd.DataFrame:
+        rows = self._consultar(
+            "SELECT fecha, monto, categoria, comentario, comprobante FROM Fact_Rendicion "
+            "WHERE id_supervisor = ? ORDER BY fecha DESC LIMIT ?",
+            (supervisor_id, int(limite)),
+        )
+        if not rows:
+            return pd.DataFrame()
+        df = pd.DataFrame(rows, columns=COLUMNAS_RENDICION)
+        df['fecha'] = pd.to_datetime(df['fecha']).dt.date
+        return df
+
+    def guardar_alertas(self, df: pd.DataFrame) -> None:
+        alertas = df[COLUMNAS_ALERTA].assign(fecha=[f.isoformat() for f in df['fecha']])
+        self.cargar_dataframe('Alerta_Rendicion', alertas)
+
+    def alertas_rendiciones(self, supervisor_ids: list, estado: str = 'pendiente') -> pd.DataFrame:
+        query = f"SELECT {', '.join(COLUMNAS_ALERTA)} FROM Alerta_Rendicion WHERE estado = ?"
+        params = [estado]
+        if supervisor_ids is not None:
+            query += " AND id_supervisor IN (SELECT value FROM json_each(?))"
+            params.append(json.dumps(list(supervisor_ids)))
+        df = pd.DataFrame(self._consultar(query + " ORDER BY fecha DESC", params), columns=COLUMNAS_ALERTA)
+        df['fecha'] = pd.to_datetime(df['fecha']).dt.date
+        return df
+
+    def resolver_alertas(self, ids_rendicion: list, estado: str) -> None:
+        con = self.conexion
+        with con:
+            con.executemany("UPDATE Alerta_Rendicion SET estado = ? WHERE id_rendicion = ?",
+                            [(estado, id_) for id_ in ids_rendicion])
+
+    def registrar_checkins(self, df: pd.DataFrame) -> int:
+        eventos = df[COLUMNAS_CHECKIN].assign(
+            fecha=[f.isoformat() for f in df['fecha']], ts=[t.isoformat() for t in df['ts']],
+            valido=df['valido'].astype(int),
+        )
+        self.cargar_dataframe('Fact_Checkin', eventos)
+        return 1
+
+    def checkins_supervisor(self, supervisor_id: str, fecha: date) -> pd.DataFrame:
+        rows = self._consultar(
+            f"SELECT {', '.join(COLUMNAS_CHECKIN)} FROM Fact_Checkin WHERE id_supervisor = ? AND fecha = ? ORDER BY ts",
+            (supervisor_id, fecha.isoformat()),
+        )
+        df = pd.DataFrame(rows, columns=COLUMNAS_CHECKIN)
+        df['fecha'] = pd.to_datetime(df['fecha']).dt.date
+        df['ts'] = pd.to_datetime(df['ts'], utc=True, format='ISO8601')
+        df['valido'] = df['valido'].astype(bool)
+        return df
+
+    def excepciones_agenda(self, desde: date, hasta: date) -> pd.DataFrame:
+        rows = self._consultar(
+            f"SELECT {', '.join(COLUMNAS_EXCEPCION)} FROM Excepcion_Agenda WHERE fecha BETWEEN ? AND ? ORDER BY fecha",
+            (desde.isoformat(), hasta.isoformat()),
+        )
+        df = pd.DataFrame(rows, columns=COLUMNAS_EXCEPCION)
+        df['fecha'] = pd.to_datetime(df['fecha']).dt.date
+        return df
+
+    def guardar_excepciones(self, df: pd.DataFrame) -> None:
+        self.cargar_dataframe('Excepcion_Agenda', df[COLUMNAS_EXCEPCION].assign(
+            fecha=[f.isoformat() for f in df['fecha']]))
+
+    def eliminar_excepciones(self, df: pd.DataFrame) -> None:
+        con = self.conexion
+        with con:
+            con.executemany(
+                "DELETE FROM Excepcion_Agenda WHERE fecha = ? AND supervisor_id = ? AND sala_id = ?",
+                [(f.isoformat(), s, sala) for f, s, sala in df[['fecha', 'supervisor_id', 'sala_id']].itertuples(
+                    index=False, name=None)],
+            )
+
+    def _iterar(self, query: str, params, columnas: list, tamano_bloque: int) -> Iterator[pd.DataFrame]:
+        # Conexión propia: el cursor queda abierto mientras el consumidor recorre los bloques
+        con = self._conectar()
+        try:
+            cursor = con.execute(query, params)
+            while filas := cursor.fetchmany(tamano_bloque):
+                yield pd.DataFrame(filas, columns=columnas)
+        finally:
+            con.close()
+
+    def iterar_plan(self, supervisor_ids: list, tamano_bloque: int) -> Iterator[pd.DataFrame]:
+        query = f"""
+        SELECT vp.supervisor_id, vp.dia_semana, vp.orden, vp.sala_id, s.nombre, s.quintil
+        FROM Visita_Planificada vp
+        JOIN Sala s ON vp.sala_id = s.id
+        WHERE vp.supervisor_id IN (SELECT value FROM json_each(?))
+        ORDER BY vp.supervisor_id, {ORDEN_DIA_SQL}, vp.orden
+        """
+        yield from self._iterar(query, (json.dumps(list(supervisor_ids)),), COLUMNAS_EXPORT_PLAN, tamano_bloque)
+
+    def iterar_rendiciones(self, supervisor_ids: list, desde: date, hasta: date,
+                           tamano_bloque: int) -> Iterator[pd.DataFrame]:
+        query = f"SELECT {', '.join(COLUMNAS_EXPORT_RENDICION)} FROM Fact_Rendicion WHERE fecha BETWEEN ? AND ?"
+        params = [desde.isoformat(), hasta.isoformat()]
+        if supervisor_ids is not None:
+            query += " AND id_supervisor IN (SELECT value FROM json_each(?))"
+            params.append(json.dumps(list(supervisor_ids)))
+        query += " ORDER BY fecha, id_supervisor"
+        for bloque in self._iterar(query, params, COLUMNAS_EXPORT_RENDICION, tamano_bloque):
+            bloque['fecha'] = pd.to_datetime(bloque['fecha']).dt.date
+            yield bloque
+
+    def iterar_checkins(self, supervisor_ids: list, desde: date, hasta: date,
+                        tamano_bloque: int) -> Iterator[pd.DataFrame]:
+        query = f"SELECT {', '.join(COLUMNAS_CHECKIN)} FROM Fact_Checkin WHERE fecha BETWEEN ? AND ?"
+        params = [desde.isoformat(), hasta.isoformat()]
+        if supervisor_ids is not None:
+            query += " AND id_supervisor IN (SELECT value FROM json_each(?))"
+            params.append(json.dumps(list(supervisor_ids)))
+        query += " ORDER BY fecha, id_supervisor"
+        for bloque in self._iterar(query, params, COLUMNAS_CHECKIN, tamano_bloque):
+            bloque['fecha'] = pd.to_datetime(bloque['fecha']).dt.date
+            bloque['ts'] = pd.to_datetime(bloque['ts'], utc=True, format='ISO8601')
+            bloque['valido'] = bloque['valido'].astype(bool)
+            yield bloque
@@ -0,0 +1,215 @@
+"""
+Semillas para el repositorio SQLite
+===================================
+- sembrar_demo: equipo de Ricardo Millar con las salas, rendiciones, feriados y cuentas de la demo
+- sembrar_sintetico: volúmenes de producción (millones de filas) generados por lotes
+
+Uso:
+    python -m castano.semilla --db castano.db --demo
+    python -m castano.semilla --db castano.db --supervisores 5000 --salas 60000 \\
+        --visitas-por-supervisor 400 --rendiciones 5000000
+"""
+
+import argparse
+import time
+import uuid
+from datetime import date
+
+import numpy as np
+
+from castano.agenda import QUITAR
+from castano.rendiciones import CATEGORIAS
+from castano.repositorio import COLUMNAS_EXCEPCION, DIAS_SEMANA, TODOS, RepositorioSQLite
+from castano.usuarios import cuentas_hasheadas
+
+# ================================================================
+# DATOS DEMO
+# ================================================================
+
+ZONALES_DEMO = [
+    ('zce0bf2f8', 'Ricardo Millar', 'ricardo.millar@castano.cl'),
+    ('z002', 'Alvaro Sauterel', 'alvaro.sauterel@castano.cl'),
+    ('z003', 'Jerson Placencia', 'jerson.placencia@castano.cl'),
+]
+
+SUPERVISORES_DEMO = [
+    ('s41861921', 'Harry Urra', 'harry.urra@castano.cl', 'zce0bf2f8'),
+    ('s3048eab6', 'Rodrigo Castro', 'rodrigo.castro@castano.cl', 'zce0bf2f8'),
+    ('s52b7164b', 'Daniela Leon', 'daniela.leon@castano.cl', 'zce0bf2f8'),
+    ('s4e75d6f2', 'Alejandro Perez', 'alejandro.perez@castano.cl', 'zce0bf2f8'),
+    ('s0d9492dc', 'Lisset Medina', 'lisset.medina@castano.cl', 'zce0bf2f8'),
+    ('s1dc69e68', 'Gema Nuñez', 'gema.nunez@castano.cl', 'zce0bf2f8'),
+    ('s88ae2d48', 'Wladimir Lara', 'wladimir.lara@castano.cl', 'zce0bf2f8'),
+    ('s0df53ceb', 'Alexander Yañez', 'alexander.yanez@castano.cl', 'zce0bf2f8'),
+    ('sbe29bbd6', 'Edgardo Ordenes', 'edgardo.ordenes@castano.cl', 'z002'),
+    ('s03ff5266', 'Mauro Saenz', 'mauro.saenz@castano.cl', 'z003'),
+]
+
+SALAS_DEMO = [
+    ('sala001', 'TOT FLO WALKER MARTINEZ / 55', 3, -33.5205, -70.5987, None, None),
+    ('sala002', 'S10 ROJAS MAGALLANES / 80', 4, -33.5291, -70.5802, None, None),
+    ('sala003', 'UNI FLO ROJAS MAGALLANES / 258', 4, -33.5313, -70.5751, None, None),
+    ('sala004', 'JUMBO KENNEDY', 5, -33.3917, -70.5732, '09:00', '22:00'),
+    ('sala005', 'LIDER EXPRESS MAIPU', 3, -33.5107, -70.7571, None, None),
+    ('sala006', 'JUMBO PARQUE ARAUCO', 5, -33.4024, -70.5787, '10:00', '21:00'),
+    ('sala007', 'LIDER MAIPU', 3, -33.5092, -70.7610, None, None),
+    ('sala008', 'UNIMARC PROVIDENCIA', 4, -33.4262, -70.6107, '08:30', '21:30'),
+    ('sala009', 'TOTTUS LA FLORIDA', 3, -33.5227, -70.5963, None, None),
+]
+
+# Plan semanal de Harry Urra: sala -> días (L M X J V S)
+PLAN_DEMO = {
+    'sala001': [1, 1, 1, 1, 1, 1],
+    'sala002': [1, 0, 0, 0, 1, 1],
+    'sala003': [1, 1, 1, 1, 1, 1],
+    'sala004': [0, 1, 0, 1, 0, 0],
+    'sala005': [1, 0, 1, 0, 1, 0],
+}
+
+RENDICIONES_DEMO = [
+    ('s41861921', date(2026, 2, 1), 15000, 'TRANSPORTE', 'Combustible semana'),
+    ('s41861921', date(2026, 2, 3), 8500, 'ALIMENTACION', 'Almuerzo reunión'),
+    ('s41861921', date(2026, 2, 5), 22000, 'TRANSPORTE', 'Peajes + estacionamiento'),
+]
+
+# Feriados nacionales (Chile): excepciones de la agenda para todos los supervisores
+FERIADOS_DEMO = [
+    (date(2026, 1, 1), 'Año Nuevo'),
+    (date(2026, 4, 3), 'Viernes Santo'),
+    (date(2026, 4, 4), 'Sábado Santo'),
+    (date(2026, 5, 1), 'Día del Trabajo'),
+    (date(2026, 5, 21), 'Día de las Glorias Navales'),
+    (date(2026, 6, 29), 'San Pedro y San Pablo'),
+    (date(2026, 7, 16), 'Virgen del Carmen'),
+    (date(2026, 8, 15), 'Asunción de la Virgen'),
+    (date(2026, 9, 18), 'Independencia Nacional'),
+    (date(2026, 9, 19), 'Glorias del Ejército'),
+    (date(2026, 10, 12), 'Encuentro de Dos Mundos'),
+    (date(2026, 10, 31), 'Día de las Iglesias Evangélicas'),
+    (date(2026, 12, 8), 'Inmaculada Concepción'),
+    (date(2026, 12, 25), 'Navidad'),
+    (date(2027, 1, 1), 'Año Nuevo'),
+]
+
+# Cuentas demo: (usuario, id, nombre, rol, contraseña)
+CUENTAS_DEMO = [('admin', 'admin001', 'Administrador', 'admin', 'castano2026')]
+CUENTAS_DEMO += [(z[1].split()[0].lower(), z[0], z[1], 'zonal', 'zonal123') for z in ZONALES_DEMO]
+CUENTAS_DEMO += [(s[1].split()[0].lower(), s[0], s[1], 'supervisor', 'ruta123') for s in SUPERVISORES_DEMO]
+
+# Las contraseñas demo son públicas: un costo de hash bajo evita segundos de arranque
+ITERACIONES_DEMO = 10_000
+
+
+def _visitas_de_plan(supervisor_id: str, plan: dict) -> list:
+    visitas, orden = [], {dia: 0 for dia in DIAS_SEMANA}
+    for sala_id, marcas in plan.items():
+        for dia, marcado in zip(DIAS_SEMANA, marcas):
+            if marcado:
+                orden[dia] += 1
+                visitas.append((supervisor_id, sala_id, dia, orden[dia]))
+    return visitas
+
+
+def sembrar_demo(repo: RepositorioSQLite):
+    """Carga el dataset demo (zonales, supervisores, salas, plan, rendiciones y cuentas)."""
+    repo.cargar_filas('Zonal', ['id', 'nombre', 'email'], ZONALES_DEMO)
+    repo.cargar_filas('Supervisor', ['id', 'nombre', 'email'], [s[:3] for s in SUPERVISORES_DEMO])
+    repo.cargar_filas('Reporta_A', ['supervisor_id', 'zonal_id'], [(s[0], s[3]) for s in SUPERVISORES_DEMO])
+    repo.cargar_filas('Sala', ['id', 'nombre', 'quintil', 'latitud', 'longitud', 'hora_apertura', 'hora_cierre'],
+                      SALAS_DEMO)
+
+    visitas = _visitas_de_plan('s41861921', PLAN_DEMO)
+    # El resto del equipo recibe un plan rotado sobre el mismo catálogo
+    salas = [s[0] for s in SALAS_DEMO]
+    for i, sup in enumerate(SUPERVISORES_DEMO[1:], start=1):
+        plan = {salas[(i + k) % len(salas)]: [(i + k + d) % 2 for d in range(6)] for k in range(4)}
+        visitas += _visitas_de_plan(sup[0], plan)
+    repo.cargar_filas('Visita_Planificada', ['supervisor_id', 'sala_id', 'dia_semana', 'orden'], visitas)
+
+    repo.cargar_filas(
+        'Fact_Rendicion', ['id_rendicion', 'id_supervisor', 'fecha', 'monto', 'categoria', 'comentario'],
+        [(str(uuid.uuid4()), s, f.isoformat(), m, c, co) for s, f, m, c, co in RENDICIONES_DEMO],
+    )
+    repo.cargar_filas('Excepcion_Agenda', COLUMNAS_EXCEPCION,
+                      [(f.isoformat(), TODOS, TODOS, QUITAR, nombre) for f, nombre in FERIADOS_DEMO])
+    repo.guardar_cuentas(cuentas_hasheadas(CUENTAS_DEMO, iteraciones=ITERACIONES_DEMO))
+
+
+# ================================================================
+# DATOS SINTÉTICOS A ESCALA
+# ================================================================
+
+def sembrar_sintetico(repo: RepositorioSQLite, zonales: int, supervisores: int, salas: int,
+                      visitas_por_supervisor: int, rendiciones: int, lote: int = 100_000, semilla: int = 42):
+    """Genera y carga por lotes un dataset del tamaño de producción."""
+    rng = np.random.default_rng(semilla)
+
+    repo.cargar_filas('Zonal', ['id', 'nombre', 'email'],
+                      ((f"z{i:06d}", f"Zonal {i}", f"zonal{i}@castano.cl") for i in range(zonales)))
+    repo.cargar_filas('Supervisor', ['id', 'nombre', 'email'],
+                      ((f"s{i:08d}", f"Supervisor {i}", f"supervisor{i}@castano.cl") for i in range(supervisores)))
+    repo.cargar_filas('Reporta_A', ['supervisor_id', 'zonal_id'],
+                      ((f"s{i:08d}", f"z{i % zonales:06d}") for i in range(supervisores)))
+
+    for inicio in range(0, salas, lote):
+        n = min(lote, salas - inicio)
+        quintil = rng.integers(1, 6, n)
+        lat = rng.uniform(-33.65, -33.30, n).round(6)
+        lon = rng.uniform(-70.85, -70.50, n).round(6)
+        repo.cargar_filas('Sala', ['id', 'nombre', 'quintil', 'latitud', 'longitud'], (
+            (f"sala{inicio + i:08d}", f"SALA {inicio + i}", int(quintil[i]), float(lat[i]), float(lon[i]))
+            for i in range(n)
+        ))
+
+    # Visitas: cada supervisor reparte sus visitas en los 6 días; orden correlativo por día
+    sup_por_lote = max(1, lote // max(visitas_por_supervisor, 1))
+    posicion = np.arange(visitas_por_supervisor)
+    dias = np.array(DIAS_SEMANA)[posicion % len(DIAS_SEMANA)]
+    ordenes = posicion // len(DIAS_SEMANA) + 1
+    for inicio in range(0, supervisores, sup_por_lote):
+        fin = min(inicio + sup_por_lote, supervisores)
+        sala_idx = rng.integers(0, salas, (fin - inicio, visitas_por_supervisor))
+        repo.cargar_filas('Visita_Planificada', ['supervisor_id', 'sala_id', 'dia_semana', 'orden'], (
+            (f"s{s:08d}", f"sala{sala_idx[s - inicio, v]:08d}", dias[v], int(ordenes[v]))
+            for s in range(inicio, fin) for v in range(visitas_por_supervisor)
+        ))
+
+    base = date(2025, 1, 1).toordinal()
+    for inicio in range(0, rendiciones, lote):
+        n = min(lote, rendiciones - inicio)
+        sup = rng.integers(0, supervisores, n)
+        dia = rng.integers(0, 400, n)
+        monto = rng.integers(1, 100, n) * 500
+        cat = rng.integers(0, len(CATEGORIAS), n)
+        repo.cargar_filas('Fact_Rendicion', ['id_rendicion', 'id_supervisor', 'fecha', 'monto', 'categoria', 'comentario'], (
+            (f"r{inicio + i:010d}", f"s{sup[i]:08d}", date.fromordinal(base + int(dia[i])).isoformat(),
+             int(monto[i]), CATEGORIAS[cat[i]], "") for i in range(n)
+        ))
+
+    repo.analizar()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Siembra una base SQLite de Castaño Logistics")
+    parser.add_argument('--db', required=True, help="Archivo SQLite a crear o ampliar")
+    parser.add_argument('--demo', action='store_true', help="Cargar sólo el dataset demo")
+    parser.add_argument('--zonales', type=int, default=50)
+    parser.add_argument('--supervisores', type=int, default=2000)
+    parser.add_argument('--salas', type=int, default=20000)
+    parser.add_argument('--visitas-por-supervisor', type=int, default=120)
+    parser.add_argument('--rendiciones', type=int, default=1_000_000)
+    parser.add_argument('--lote', type=int, default=100_000)
+    args = parser.parse_args(argv)
+
+    repo = RepositorioSQLite(args.db)
+    inicio = time.perf_counter()
+    if args.demo:
+        sembrar_demo(repo)
+    else:
+        sembrar_sintetico(repo, args.zonales, args.supervisores, args.salas,
+                          args.visitas_por_supervisor, args.rendiciones, args.lote)
+    print(f"✅ Base {args.db} sembrada en {time.perf_counter() - inicio:.1f} s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,220 @@
+"""
+Sesiones externas
+=================
+Estado de login fuera del proceso Streamlit, para que una sesión sobreviva a
+reinicios y funcione en cualquier réplica detrás del balanceador.
+
+- AlmacenSesiones: interfaz clave-valor con expiración
+- AlmacenSesionesMemoria / AlmacenSesionesSQLite / AlmacenSesionesRedis
+- GestorSesiones: emite y valida tokens firmados con HMAC-SHA256
+
+El token viaja en la URL (?sesion=...) y sólo contiene el id de sesión y su
+firma; los datos de la sesión quedan en el almacén.
+"""
+
+import hashlib
+import hmac
+import json
+import secrets
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from urllib.parse import urlparse
+
+
+# ================================================================
+# ALMACENES
+# ================================================================
+
+class AlmacenSesiones(ABC):
+    """Almacén clave-valor de sesiones con expiración."""
+
+    @abstractmethod
+    def guardar(self, sesion_id: str, datos: dict, ttl: float) -> None:
+        """Guarda (o reemplaza) los datos de la sesión por ttl segundos."""
+
+    @abstractmethod
+    def obtener(self, sesion_id: str) -> dict:
+        """Datos de la sesión, o None si no existe o expiró."""
+
+    @abstractmethod
+    def renovar(self, sesion_id: str, datos: dict, ttl: float) -> bool:
+        """Reemplaza los datos y la expiración sólo si la sesión sigue vigente; False si ya no existe."""
+
+    @abstractmethod
+    def eliminar(self, sesion_id: str) -> None:
+        """Elimina la sesión si existe."""
+
+
+class AlmacenSesionesMemoria(AlmacenSesiones):
+    """Sesiones en el proceso. Sólo para una réplica; se pierden al reiniciar."""
+
+    def __init__(self):
+        self._datos = {}
+        self._lock = threading.Lock()
+
+    def guardar(self, sesion_id: str, datos: dict, ttl: float) -> None:
+        with self._lock:
+            self._datos[sesion_id] = (json.dumps(datos), time.time() + ttl)
+
+    def obtener(self, sesion_id: str) -> dict:
+        with self._lock:
+            entrada = self._datos.get(sesion_id)
+            if entrada is None:
+                return None
+            if entrada[1] < time.time():
+                del self._datos[sesion_id]
+                return None
+            return json.loads(entrada[0])
+
+    def renovar(self, sesion_id: str, datos: dict, ttl: float) -> bool:
+        with self._lock:
+            entrada = self._datos.get(sesion_id)
+            if entrada is None or entrada[1] < time.time():
+                self._datos.pop(sesion_id, None)
+                return False
+            self._datos[sesion_id] = (json.dumps(datos), time.time() + ttl)
+            return True
+
+    def eliminar(self, sesion_id: str) -> None:
+        with self._lock:
+            self._datos.pop(sesion_id, None)
+
+
+class AlmacenSesionesSQLite(AlmacenSesiones):
+    """Sesiones en un archivo SQLite compartido por las réplicas de un mismo host."""
+
+    def __init__(self, ruta: str):
+        self.ruta = ruta
+        self._local = threading.local()
+        with self.conexion as con:
+            con.execute(
+                "CREATE TABLE IF NOT EXISTS Sesion (id TEXT PRIMARY KEY, datos TEXT NOT NULL, expira REAL NOT NULL)"
+            )
+            con.execute("CREATE INDEX IF NOT EXISTS idx_sesion_expira ON Sesion (expira)")
+
+    @property
+    def conexion(self) -> sqlite3.Connection:
+        con = getattr(self._local, 'con', None)
+        if con is None:
+            con = self._local.con = sqlite3.connect(self.ruta, timeout=30)
+            con.execute("PRAGMA journal_mode=WAL")
+        return con
+
+    def guardar(self, sesion_id: str, datos: dict, ttl: float) -> None:
+        ahora = time.time()
+        with self.conexion as con:
+            con.execute(
+                "INSERT OR REPLACE INTO Sesion (id, datos, expira) VALUES (?, ?, ?)",
+                (sesion_id, json.dumps(datos), ahora + ttl),
+            )
+            # Limpieza oportunista de sesiones vencidas
+            con.execute("DELETE FROM Sesion WHERE expira < ?", (ahora,))
+
+    def obtener(self, sesion_id: str) -> dict:
+        row = self.conexion.execute(
+            "SELECT datos FROM Sesion WHERE id = ? AND expira >= ?", (sesion_id, time.time())
+        ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def renovar(self, sesion_id: str, datos: dict, ttl: float) -> bool:
+        ahora = time.time()
+        with self.conexion as con:
+            cursor = con.execute(
+                "UPDATE Sesion SET datos = ?, expira = ? WHERE id = ? AND expira >= ?",
+                (json.dumps(datos), ahora + ttl, sesion_id, ahora),
+            )
+        return cursor.rowcount > 0
+
+    def eliminar(self, sesion_id: str) -> None:
+        with self.conexion as con:
+            con.execute("DELETE FROM Sesion WHERE id = ?", (sesion_id,))
+
+
+class AlmacenSesionesRedis(AlmacenSesiones):
+    """Sesiones en Redis o un servidor compatible (Valkey, KeyDB, Dragonfly). Requiere `redis`."""
+
+    PREFIJO = "castano:sesion:"
+
+    def __init__(self, url: str):
+        import redis
+        self.cliente = redis.Redis.from_url(url)
+
+    def guardar(self, sesion_id: str, datos: dict, ttl: float) -> None:
+        self.cliente.set(self.PREFIJO + sesion_id, json.dumps(datos), ex=max(1, int(ttl)))
+
+    def obtener(self, sesion_id: str) -> dict:
+        valor = self.cliente.get(self.PREFIJO + sesion_id)
+        return json.loads(valor) if valor else None
+
+    def renovar(self, sesion_id: str, datos: dict, ttl: float) -> bool:
+        # XX: sólo escribe si la clave existe (Redis la borra al expirar)
+        return bool(self.cliente.set(self.PREFIJO + sesion_id, json.dumps(datos), ex=max(1, int(ttl)), xx=True))
+
+    def eliminar(self, sesion_id: str) -> None:
+        self.cliente.delete(self.PREFIJO + sesion_id)
+
+
+def crear_almacen(url: str) -> AlmacenSesiones:
+    """Crea el almacén según la URL: memoria://, sqlite:///ruta.db o redis://host:puerto/db."""
+    esquema = urlparse(url).scheme
+    if esquema == 'memoria':
+        return AlmacenSesionesMemoria()
+    if esquema == 'sqlite':
+        return AlmacenSesionesSQLite(url[len('sqlite:///'):])
+    if esquema in ('redis', 'rediss', 'unix'):
+        return AlmacenSesionesRedis(url)
+    raise ValueError(f"Almacén de sesiones no soportado: {url}")
+
+
+# ================================================================
+# TOKENS FIRMADOS
+# ================================================================
+
+class GestorSesiones:
+    """Crea, valida, renueva y cierra sesiones identificadas por token firmado."""
+
+    def __init__(self, almacen: AlmacenSesiones, secreto: str, ttl: float):
+        if not secreto:
+            raise ValueError("Se requiere un secreto para firmar las sesiones")
+        self.almacen = almacen
+        self._secreto = secreto.encode()
+        self.ttl = ttl
+
+    def _firma(self, sesion_id: str) -> str:
+        return hmac.new(self._secreto, sesion_id.encode(), hashlib.sha256).hexdigest()
+
+    def _sesion_id(self, token: str) -> str:
+        """Id de sesión del token si la firma es válida, o None."""
+        sesion_id, _, firma = (token or "").partition('.')
+        if not sesion_id or not hmac.compare_digest(firma, self._firma(sesion_id)):
+            return None
+        return sesion_id
+
+    def crear(self, datos: dict) -> str:
+        """Registra una sesión nueva y retorna su token."""
+        sesion_id = secrets.token_urlsafe(24)
+        self.almacen.guardar(sesion_id, datos, self.ttl)
+        return f"{sesion_id}.{self._firma(sesion_id)}"
+
+    def cargar(self, token: str) -> dict:
+        """Datos de la sesión del token, o None si es inválido o expiró."""
+        sesion_id = self._sesion_id(token)
+        return self.almacen.obtener(sesion_id) if sesion_id else None
+
+    def actualizar(self, token: str, datos: dict) -> bool:
+        """Reemplaza los datos de la sesión y renueva su expiración.
+
+        Retorna False si la sesión se cerró o expiró: un token viejo no la revive.
+        """
+        sesion_id = self._sesion_id(token)
+        if sesion_id is None:
+            return False
+        return self.almacen.renovar(sesion_id, datos, self.ttl)
+
+    def cerrar(self, token: str) -> None:
+        """Elimina la sesión del almacén."""
+        sesion_id = self._sesion_id(token)
+        if sesion_id:
+            self.almacen.eliminar(sesion_id)
@@ -0,0 +1,255 @@
+"""
+Directorio de usuarios
+======================
+Cuentas de acceso cargadas desde el repositorio (tabla Cuenta) en vez de
+estar escritas en el código, para dar de alta supervisores sin redeploy.
+
+- Contraseñas con PBKDF2-SHA256 y sal por cuenta ("pbkdf2_sha256$iter$sal$hash")
+- Verificación con hashlib, que libera el GIL: un login lento no frena a las
+  demás sesiones. Un pool acota cuántas corren a la vez (una ráfaga de logins
+  no ocupa todos los núcleos); el rerun que hace login espera su resultado
+- Índices en memoria por usuario e id, refrescados periódicamente y ante un
+  usuario desconocido
+- Bloqueo temporal tras varios intentos fallidos por usuario; los registros
+  de fallos vencidos se descartan
+
+Uso:
+    python -m castano.usuarios --db castano.db alta --usuario pedro --id s123 --nombre "Pedro Soto"
+    python -m castano.usuarios --db castano.db importar cuentas.csv
+    python -m castano.usuarios --app importar cuentas.csv   # repositorio de la app (GCP)
+"""
+
+import argparse
+import base64
+import getpass
+import hashlib
+import hmac
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+
+from castano.repositorio import COLUMNAS_CUENTA
+
+ALGORITMO = "pbkdf2_sha256"
+ITERACIONES_PBKDF2 = 600_000
+ROLES = ('supervisor', 'zonal', 'admin')
+
+
+# ================================================================
+# HASH DE CONTRASEÑAS
+# ================================================================
+
+def hashear_password(password: str, iteraciones: int = ITERACIONES_PBKDF2) -> str:
+    """Hash con sal aleatoria, en formato autodescriptivo."""
+    sal = os.urandom(16)
+    dk = hashlib.pbkdf2_hmac('sha256', password.encode(), sal, iteraciones)
+    return "$".join([ALGORITMO, str(iteraciones), base64.b64encode(sal).decode(), base64.b64encode(dk).decode()])
+
+
+def verificar_password(password: str, codificado: str) -> bool:
+    """True si la contraseña corresponde al hash (comparación en tiempo constante)."""
+    try:
+        algoritmo, iteraciones, sal, esperado = codificado.split("$")
+    except (AttributeError, ValueError):
+        return False
+    if algoritmo != ALGORITMO:
+        return False
+    dk = hashlib.pbkdf2_hmac('sha256', password.encode(), base64.b64decode(sal), int(iteraciones))
+    return hmac.compare_digest(dk, base64.b64decode(esperado))
+
+
+def normalizar_usuario(usuario: str) -> str:
+    return (usuario or "").strip().lower()
+
+
+# ================================================================
+# DIRECTORIO
+# ================================================================
+
+class LoginBloqueado(Exception):
+    """Demasiados intentos fallidos; `segundos` indica cuánto falta para reintentar."""
+
+    def __init__(self, segundos: float):
+        super().__init__(f"Demasiados intentos fallidos, reintenta en {segundos:.0f} s")
+        self.segundos = segundos
+
+
+class DirectorioUsuarios:
+    """Cuentas indexadas por usuario e id, con a lo sumo `workers` verificaciones de contraseña a la vez."""
+
+    def __init__(self, cargador, refresco: float = 300, recarga_minima: float = 30,
+                 workers: int = 4, max_fallos: int = 5, ventana: float = 300, bloqueo: float = 60):
+        self._cargador = cargador  # () -> DataFrame con COLUMNAS_CUENTA
+        self.refresco = refresco
+        self.recarga_minima = recarga_minima
+        self.max_fallos = max_fallos
+        self.ventana = ventana
+        self.bloqueo = bloqueo
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="castano-kdf")
+        self._lock = threading.Lock()
+        self._por_usuario = {}
+        self._por_id = {}
+        self._cargado_en = None
+        self._fallos = {}  # usuario -> deque de timestamps de fallos recientes
+        self._barrido_en = time.monotonic()
+        # Hash señuelo: un usuario inexistente cuesta lo mismo que una contraseña errónea
+        self._senuelo = hashear_password(os.urandom(8).hex())
+
+    # ---------------- Índices ----------------
+
+    def recargar(self) -> None:
+        """Relee las cuentas del repositorio y reconstruye los índices."""
+        df = self._cargador()
+        registros = df[COLUMNAS_CUENTA].to_dict('records') if len(df) else []
+        por_usuario = {normalizar_usuario(r['usuario']): r for r in registros}
+        por_id = {r['id']: r for r in registros}
+        with self._lock:
+            self._por_usuario, self._por_id = por_usuario, por_id
+            self._cargado_en = time.monotonic()
+
+    def _vigente(self, forzar: bool = False) -> None:
+        edad = None if self._cargado_en is None else time.monotonic() - self._cargado_en
+        if edad is None or edad > self.refresco or (forzar and edad > self.recarga_minima):
+            self.recargar()
+
+    def _buscar(self, indice: str, valor: str) -> dict:
+        self._vigente()
+        cuenta = getattr(self, indice).get(valor)
+        if cuenta is None:
+            # Puede ser una cuenta recién creada
+            self._vigente(forzar=True)
+            cuenta = getattr(self, indice).get(valor)
+        return cuenta
+
+    def por_usuario(self, usuario: str) -> dict:
+        """Datos públicos de la cuenta (sin hash), o None."""
+        cuenta = self._buscar('_por_usuario', normalizar_usuario(usuario))
+        return _publica(cuenta) if cuenta else None
+
+    def por_id(self, id_: str) -> dict:
+        """Datos públicos de la cuenta con ese id de supervisor/zonal, o None."""
+        cuenta = self._buscar('_por_id', id_)
+        return _publica(cuenta) if cuenta else None
+
+    def __len__(self):
+        self._vigente()
+        return len(self._por_usuario)
+
+    # ---------------- Login ----------------
+
+    def autenticar(self, usuario: str, password: str) -> dict:
+        """Datos públicos de la cuenta si las credenciales son válidas, o None.
+
+        Lanza LoginBloqueado si el usuario superó el máximo de intentos fallidos.
+        """
+        usuario = normalizar_usuario(usuario)
+        espera = self.espera_bloqueo(usuario)
+        if espera > 0:
+            raise LoginBloqueado(espera)
+
+        cuenta = self._buscar('_por_usuario', usuario)
+        codificado = cuenta['password_hash'] if cuenta else self._senuelo
+        # Bloquea este rerun hasta tener el resultado; el pool sólo limita los cálculos simultáneos
+        valido = self._pool.submit(verificar_password, password, codificado).result()
+        if valido and cuenta:
+            with self._lock:
+                self._fallos.pop(usuario, None)
+            return _publica(cuenta)
+
+        self._registrar_fallo(usuario)
+        return None
+
+    def espera_bloqueo(self, usuario: str) -> float:
+        """Segundos que faltan para que el usuario pueda reintentar (0 si no está bloqueado)."""
+        ahora = time.monotonic()
+        with self._lock:
+            fallos = self._fallos.get(normalizar_usuario(usuario))
+            if not fallos:
+                return 0.0
+            while fallos and ahora - fallos[0] > self.ventana:
+                fallos.popleft()
+            if len(fallos) < self.max_fallos:
+                if not fallos:
+                    del self._fallos[normalizar_usuario(usuario)]
+                return 0.0
+            return max(0.0, fallos[-1] + self.bloqueo - ahora)
+
+    def _registrar_fallo(self, usuario: str) -> None:
+        ahora = time.monotonic()
+        with self._lock:
+            self._fallos.setdefault(usuario, deque(maxlen=self.max_fallos)).append(ahora)
+            if ahora - self._barrido_en > self.ventana:
+                # Usuarios que no volvieron a intentar (p. ej. nombres inventados): ya no bloquean
+                vigencia = max(self.ventana, self.bloqueo)
+                self._fallos = {u: f for u, f in self._fallos.items() if ahora - f[-1] <= vigencia}
+                self._barrido_en = ahora
+
+
+def _publica(cuenta: dict) -> dict:
+    return {'username': cuenta['usuario'], 'nombre': cuenta['nombre'], 'id': cuenta['id'], 'rol': cuenta['rol']}
+
+
+def cuentas_hasheadas(filas, iteraciones: int = ITERACIONES_PBKDF2, workers: int = 4) -> list:
+    """Convierte filas (usuario, id, nombre, rol, password) en cuentas con hash, en paralelo."""
+    filas = list(filas)
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        hashes = pool.map(lambda f: hashear_password(f[4], iteraciones), filas)
+        return [
+            {'usuario': normalizar_usuario(u), 'id': id_, 'nombre': nombre, 'rol': rol, 'password_hash': h}
+            for (u, id_, nombre, rol, _), h in zip(filas, hashes)
+        ]
+
+
+# ================================================================
+# CLI DE ALTA
+# ================================================================
+
+def main(argv=None):
+    from castano import arranque
+    from castano.repositorio import RepositorioSQLite
+
+    parser = argparse.ArgumentParser(description="Administra las cuentas de Castaño Logistics")
+    destino = parser.add_mutually_exclusive_group(required=True)
+    destino.add_argument('--db', help="Archivo SQLite de la aplicación")
+    destino.add_argument('--app', action='store_true',
+                         help="Usa el repositorio configurado en app_logistics.py (GCP fuera de DEMO_MODE)")
+    sub = parser.add_subparsers(dest='comando', required=True)
+    alta = sub.add_parser('alta', help="Crea o actualiza una cuenta (pide la contraseña)")
+    alta.add_argument('--usuario', required=True)
+    alta.add_argument('--id', required=True, help="Id del supervisor o zonal")
+    alta.add_argument('--nombre', required=True)
+    alta.add_argument('--rol', choices=ROLES, default='supervisor')
+    importar = sub.add_parser('importar', help="Carga un CSV con columnas usuario,id,nombre,rol,password")
+    importar.add_argument('csv')
+    args = parser.parse_args(argv)
+
+    if args.db:
+        repo = RepositorioSQLite(args.db)
+    else:
+        # Mismo repositorio que get_repositorio() en la app: Spanner/BigQuery o la base SQLite configurada
+        app = arranque.cargar_app(arranque.APP_DEFECTO)
+        if app.DEMO_MODE and app.SQLITE_DB == ':memory:':
+            parser.error("La app usa una base demo en memoria; indica --db o CASTANO_SQLITE_DB")
+        repo = app.get_repositorio()
+    if args.comando == 'alta':
+        password = getpass.getpass("Contraseña: ")
+        filas = [(args.usuario, args.id, args.nombre, args.rol, password)]
+    else:
+        df = pd.read_csv(args.csv, dtype=str).fillna({'rol': 'supervisor'})
+        invalidos = df[~df['rol'].isin(ROLES) | df['password'].isna() | df['usuario'].isna()]
+        if len(invalidos):
+            parser.error(f"{len(invalidos)} filas inválidas (rol, usuario o password), primera en línea {invalidos.index[0] + 2}")
+        filas = df[['usuario', 'id', 'nombre', 'rol', 'password']].itertuples(index=False, name=None)
+
+    inicio = time.perf_counter()
+    cuentas = cuentas_hasheadas(filas)
+    repo.guardar_cuentas(cuentas)
+    print(f"✅ {len(cuentas)} cuentas guardadas en {time.perf_counter() - inicio:.1f} s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,45 @@
+"""Agenda fechada: el recálculo de un supervisor espera a que alguien lea su ruta."""
+
+import time
+from datetime import date, timedelta
+
+import pytest
+
+from benchmarks.backends_falsos import crear_backend
+from benchmarks.datos_sinteticos import TamanoDataset, generar_dataset
+from castano.agenda import AgendaFechada
+
+
+@pytest.fixture
+def agenda(tmp_path):
+    repo = crear_backend(generar_dataset(TamanoDataset(zonales=1, supervisores=2, salas=20, visitas=40,
+                                                       rendiciones=0))).repo
+    leidos = []
+
+    def cargar_plan(supervisor_ids):
+        leidos.append(None if supervisor_ids is None else list(supervisor_ids))
+        return repo.plan_vigente(supervisor_ids if supervisor_ids is not None else repo.jerarquia()['supervisor_id'])
+
+    agenda = AgendaFechada(str(tmp_path), cargar_plan, repo.catalogo_salas, repo.excepciones_agenda)
+    agenda.supervisor = repo.jerarquia()['supervisor_id'].iloc[0]
+    agenda.leidos = leidos
+    yield agenda
+    agenda.cerrar()
+
+
+def _dia_habil() -> date:
+    dia = date.today() + timedelta(days=1)
+    return dia + timedelta(days=dia.weekday() == 6)
+
+
+def test_recalcular_espera_la_lectura_de_la_ruta(agenda):
+    agenda.ruta(agenda.supervisor, _dia_habil())  # Espera la generación inicial
+    assert agenda.leidos == [None]
+    agenda.recalcular([agenda.supervisor])
+    agenda.recalcular([agenda.supervisor])
+    agenda._detener.wait(0.2)
+    assert agenda.leidos == [None]
+    inicio = time.monotonic()
+    agenda.ruta(agenda.supervisor, _dia_habil())
+    assert agenda.leidos == [None, [agenda.supervisor]]
+    assert time.monotonic() - inicio < agenda.agrupar  # La lectura no espera la ventana de agrupación
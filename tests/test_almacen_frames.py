@@ -0,0 +1,35 @@
+"""Almacén de frames: versiones que no se repiten y registro acotado."""
+
+import pandas as pd
+
+from castano.almacen_frames import COMPACTAR_DESDE, AlmacenFrames
+
+
+def _frame(valor) -> pd.DataFrame:
+    return pd.DataFrame({'x': [valor]})
+
+
+def test_invalidar_entidad_libera_todos_sus_ids():
+    almacen = AlmacenFrames(1 << 20)
+    viejas = [almacen.obtener_o_cargar('excepciones', f"2026-10-{d}", lambda: _frame(1))[0] for d in (1, 2)]
+    almacen.obtener_o_cargar('salas', '*', lambda: _frame(2))
+    almacen.invalidar_entidad('excepciones')
+    assert all(almacen.obtener(clave) is None for clave in viejas)
+    assert almacen.clave('excepciones', '2026-10-1') not in viejas
+    assert almacen.estadisticas()['claves'] == 1  # Las salas siguen
+
+
+def test_ids_sin_frames_se_olvidan_sin_repetir_version():
+    almacen = AlmacenFrames(1 << 20)
+    vigente = almacen.obtener_o_cargar('checkins', 's1|hoy', lambda: _frame('hoy'))[0]
+    usadas = set()
+    for dia in range(5 * COMPACTAR_DESDE):
+        id_ = f"s1|{dia}"
+        usadas.add(almacen.obtener_o_cargar('checkins', id_, lambda: _frame(dia))[0])
+        almacen.invalidar('checkins', id_)
+    assert len(almacen._versiones['checkins']) <= 2 + COMPACTAR_DESDE
+    assert almacen.obtener(vigente) is not None  # El id con frame conserva su versión
+    # Un id olvidado no vuelve a una versión con la que se guardó un frame
+    olvidados = [f"s1|{dia}" for dia in range(5 * COMPACTAR_DESDE) if f"s1|{dia}" not in almacen._versiones['checkins']]
+    assert olvidados
+    assert all(almacen.clave('checkins', id_) not in usadas for id_ in olvidados)
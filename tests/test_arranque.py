@@ -0,0 +1,61 @@
+"""Recursos de proceso: una sola creación por nombre, sin bloquear a los demás."""
+
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from castano import arranque
+
+
+@pytest.fixture(autouse=True)
+def registro_limpio(monkeypatch):
+    monkeypatch.setattr(arranque, '_recursos', {})
+    monkeypatch.setattr(arranque, '_creando', {})
+
+
+def test_se_crea_una_sola_vez_con_pedidos_concurrentes():
+    creados = []
+
+    def fabrica():
+        time.sleep(0.05)
+        creados.append(object())
+        return creados[-1]
+
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        valores = list(pool.map(lambda _: arranque.recurso('lento', fabrica), range(8)))
+    assert len(creados) == 1
+    assert all(v is creados[0] for v in valores)
+
+
+def test_un_recurso_lento_no_bloquea_a_otro():
+    liberar = threading.Event()
+    hilo = threading.Thread(target=arranque.recurso, args=('lento', lambda: liberar.wait(5) and 'lento'))
+    hilo.start()
+    try:
+        inicio = time.monotonic()
+        assert arranque.recurso('rapido', lambda: 'rapido') == 'rapido'
+        assert time.monotonic() - inicio < 1
+    finally:
+        liberar.set()
+        hilo.join()
+
+
+def test_un_recurso_puede_pedir_otro_al_crearse():
+    repo = lambda: arranque.recurso('repositorio', lambda: 'repo')
+    assert arranque.recurso('agenda', lambda: f"agenda de {repo()}") == 'agenda de repo'
+
+
+def test_pedirse_a_si_mismo_falla_en_vez_de_colgarse():
+    with pytest.raises(RuntimeError):
+        arranque.recurso('ciclo', lambda: arranque.recurso('ciclo', lambda: 'x'))
+
+
+def test_un_fallo_no_queda_registrado():
+    def falla():
+        raise ConnectionError("sin GCP")
+
+    with pytest.raises(ConnectionError):
+        arranque.recurso('repositorio', falla)
+    assert arranque.recurso('repositorio', lambda: 'repo') == 'repo'
@@ -0,0 +1,48 @@
+"""Importación masiva de planes: validación y orden de las visitas de cada día."""
+
+import pandas as pd
+
+from castano.importacion import validar_plan
+
+SALAS = ['a', 'b', 'c', 'd', 'e']
+
+
+def _plan(filas: list) -> pd.DataFrame:
+    """filas: (supervisor_id, sala_id, dia_semana, orden o None)."""
+    plan = pd.DataFrame(filas, columns=['supervisor_id', 'sala_id', 'dia_semana', 'orden'], dtype="string")
+    return plan.assign(fila=range(2, 2 + len(plan)))
+
+
+def _ordenes(validas: pd.DataFrame) -> dict:
+    return dict(zip(validas['sala_id'], validas['orden']))
+
+
+def test_orden_explicito_gana_a_la_posicion():
+    validas, errores = validar_plan(_plan([('s1', 'b', 'MARTES', None), ('s1', 'c', 'MARTES', '1')]), SALAS, ['s1'])
+    assert errores.empty
+    assert _ordenes(validas) == {'b': 2, 'c': 1}
+
+
+def test_filas_sin_orden_llenan_los_huecos_en_orden_del_archivo():
+    plan = _plan([('s1', 'a', 'LUNES', None), ('s1', 'b', 'LUNES', '2'), ('s1', 'c', 'LUNES', None),
+                  ('s1', 'd', 'LUNES', '4'), ('s1', 'e', 'LUNES', None)])
+    validas, _ = validar_plan(plan, SALAS, ['s1'])
+    assert _ordenes(validas) == {'a': 1, 'b': 2, 'c': 3, 'd': 4, 'e': 5}
+
+
+def test_sin_columna_orden_usa_la_posicion_por_dia():
+    plan = _plan([('s1', 'a', 'LUNES', None), ('s1', 'b', 'MARTES', None), ('s1', 'c', 'LUNES', None)])
+    validas, _ = validar_plan(plan.drop(columns='orden'), SALAS, ['s1'])
+    assert _ordenes(validas) == {'a': 1, 'b': 1, 'c': 2}
+
+
+def test_orden_no_entero_o_repetido_se_rechaza():
+    plan = _plan([('s1', 'a', 'LUNES', '1'), ('s1', 'b', 'LUNES', '2.5'), ('s1', 'c', 'LUNES', 'x'),
+                  ('s1', 'd', 'LUNES', '1'), ('s2', 'a', 'LUNES', '1')])
+    validas, errores = validar_plan(plan, SALAS, ['s1', 's2'])
+    assert errores.set_index('fila')['motivo'].to_dict() == {
+        3: "orden debe ser un entero positivo",
+        4: "orden debe ser un entero positivo",
+        5: "orden repetido en el mismo día",
+    }
+    assert validas['orden'].tolist() == [1, 1]
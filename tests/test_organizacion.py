@@ -0,0 +1,39 @@
+"""Árbol de la organización: las recargas no frenan a quien marca cambios."""
+
+import threading
+import time
+
+import pandas as pd
+
+from castano.organizacion import ArbolOrganizacion
+from castano.repositorio import COLUMNAS_ORGANIZACION
+
+ARISTAS = pd.DataFrame([('z1', 'Zonal', 's1', 'Ana', 'a', 'Sala A', 2),
+                        ('z1', 'Zonal', 's2', 'Beto', 'b', 'Sala B', 3)], columns=COLUMNAS_ORGANIZACION)
+
+
+def test_actualizar_supervisores_no_espera_un_recorrido_completo():
+    en_carga, liberar = threading.Event(), threading.Event()
+    visitas = {'s1': 2}
+
+    def cargar_organizacion():
+        en_carga.set()
+        liberar.wait(5)
+        return ARISTAS
+
+    def cargar_visitas(ids):
+        return pd.DataFrame([(s, 'a', 'Sala A', visitas[s]) for s in ids],
+                            columns=['supervisor_id', 'sala_id', 'sala_nombre', 'visitas'])
+
+    arbol = ArbolOrganizacion(cargar_organizacion, cargar_visitas, lambda: pd.Series(dtype=float))
+    lector = threading.Thread(target=arbol.totales)
+    lector.start()
+    assert en_carga.wait(5)
+    inicio = time.monotonic()
+    visitas['s1'] = 5
+    arbol.actualizar_supervisores(['s1'])  # Cambio de plan durante el recorrido
+    assert time.monotonic() - inicio < 1
+    liberar.set()
+    lector.join()
+    # Lo marcado durante la carga se recarga en la lectura siguiente
+    assert arbol.salas('s1')['visitas'].tolist() == [5]
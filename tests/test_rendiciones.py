@@ -0,0 +1,60 @@
+"""Carga masiva de rendiciones: lectura de montos de CSV y XLSX."""
+
+import io
+from datetime import date, datetime
+
+import openpyxl
+import pandas as pd
+import pytest
+
+from castano.rendiciones import CARGADA, RECHAZADA, leer_rendiciones, validar_rendiciones
+
+HOY = date(2026, 10, 19)
+
+
+def _validar(df: pd.DataFrame) -> pd.DataFrame:
+    return validar_rendiciones(df, 's1', pd.DataFrame(), hoy=HOY)
+
+
+def _csv(montos: list) -> pd.DataFrame:
+    filas = "\n".join(f'2026-10-01;"{m}";TRANSPORTE;gasto {i}' for i, m in enumerate(montos))
+    return leer_rendiciones(io.BytesIO(f"fecha;monto;categoria;comentario\n{filas}\n".encode()), "gastos.csv")
+
+
+def _xlsx(montos: list) -> pd.DataFrame:
+    libro = openpyxl.Workbook()
+    hoja = libro.active
+    hoja.append(['fecha', 'monto', 'categoria', 'comentario'])
+    for i, m in enumerate(montos):
+        hoja.append([datetime(2026, 10, 1), m, 'TRANSPORTE', f"gasto {i}"])
+    salida = io.BytesIO()
+    libro.save(salida)
+    salida.seek(0)
+    return leer_rendiciones(salida, "gastos.xlsx")
+
+
+@pytest.mark.parametrize('texto, esperado', [
+    ('15000.0', 15000),
+    ('15.000', 15000),
+    ('$ 1.234', 1234),
+    ('15000', 15000),
+])
+def test_monto_csv_aceptado(texto, esperado):
+    r = _validar(_csv([texto]))
+    assert r['estado'].tolist() == [CARGADA]
+    assert r['monto'].tolist() == [esperado]
+
+
+@pytest.mark.parametrize('texto', ['12.5', '1.5', '1,5', '1.23', 'abc'])
+def test_monto_csv_no_entero_rechazado(texto):
+    r = _validar(_csv([texto]))
+    assert r['estado'].tolist() == [RECHAZADA]
+    assert r['motivo'].tolist() == ["monto inválido"]
+
+
+def test_monto_xlsx_numerico():
+    r = _validar(_xlsx([15000.0, 12.5, 1500, '15.000']))
+    assert r['estado'].tolist() == [CARGADA, RECHAZADA, CARGADA, CARGADA]
+    assert r['monto'].tolist()[::2] == [15000, 1500]
+    assert r['monto'].iloc[3] == 15000
+    assert r['fecha'].iloc[0] == date(2026, 10, 1)
@@ -0,0 +1,38 @@
+"""CLI de cuentas: destino --db o el repositorio configurado en la app."""
+
+from types import SimpleNamespace
+
+import pytest
+
+from castano import arranque, usuarios
+from castano.repositorio import RepositorioSQLite
+
+
+@pytest.fixture
+def cuentas_csv(tmp_path):
+    ruta = tmp_path / "cuentas.csv"
+    ruta.write_text("usuario,id,nombre,rol,password\nPedro,s123,Pedro Soto,,secreta\n")
+    return ruta
+
+
+def test_importar_en_base_sqlite(tmp_path, cuentas_csv):
+    db = tmp_path / "castano.db"
+    usuarios.main(['--db', str(db), 'importar', str(cuentas_csv)])
+    cuenta = RepositorioSQLite(str(db)).cuentas().iloc[0]
+    assert (cuenta['usuario'], cuenta['id'], cuenta['rol']) == ('pedro', 's123', 'supervisor')
+    assert usuarios.verificar_password('secreta', cuenta['password_hash'])
+
+
+def test_app_usa_el_repositorio_configurado(monkeypatch, tmp_path, cuentas_csv):
+    repo = RepositorioSQLite(str(tmp_path / "gcp.db"))  # Hace las veces de RepositorioGCP
+    app = SimpleNamespace(DEMO_MODE=False, SQLITE_DB=':memory:', get_repositorio=lambda: repo)
+    monkeypatch.setattr(arranque, 'cargar_app', lambda ruta: app)
+    usuarios.main(['--app', 'importar', str(cuentas_csv)])
+    assert repo.cuentas()['usuario'].tolist() == ['pedro']
+
+
+def test_app_con_base_demo_en_memoria_se_rechaza(monkeypatch, cuentas_csv):
+    app = SimpleNamespace(DEMO_MODE=True, SQLITE_DB=':memory:', get_repositorio=None)
+    monkeypatch.setattr(arranque, 'cargar_app', lambda ruta: app)
+    with pytest.raises(SystemExit):
+        usuarios.main(['--app', 'importar', str(cuentas_csv)])